@@ -1,15 +1,24 @@
 import os
-from flask import Flask, request,render_template, jsonify
+import logging
+from flask import Flask, request,render_template, jsonify, Response, stream_with_context, g
 from dotenv import load_dotenv
 from PIL import Image
-import openai
-import base64
-import requests
 import json
+import numpy as np
 import re
 import importlib.util
 import sys
+import time
+from contextlib import nullcontext
 from pathlib import Path
+from jobs import JobQueue, QueueFull
+from sessions import SessionStore
+from solver_workers import SolverPool, WorkerError, WorkerTimeout, worker_authkey
+from speculation import SPOT_FIELDS, SpeculativeSolves
+from canonical import canonicalize_spot, card_to_str, cards_from_str
+from images import ExtractionCache, InvalidImage, prepare_image
+from llm import LLMError, LLMGateway, LLMTimeout, OpenAIBackend, Prompts, StubBackend, image_message, text_message
+from metrics import Metrics
 
 
 module_path = Path('postflop-solver/main.py')
@@ -22,94 +31,785 @@ spec.loader.exec_module(solver)
 
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = './uploads'  # Directory to store uploaded files
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg'}  # Allowed file extensions
+app.logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
-# OpenAI API key setup
+# Stage timings: one JSON line per request or job on the "gto.trace" logger, histograms on /metrics
+trace_logger = logging.getLogger("gto.trace")
+if not trace_logger.handlers:
+    trace_logger.addHandler(logging.StreamHandler())
+trace_logger.setLevel(os.getenv("TRACE_LOG_LEVEL", "INFO"))
+metrics = Metrics(trace_logger)
+
+@app.before_request
+def begin_trace():
+    if request.endpoint not in (None, "static", "prometheus_metrics"):
+        g.trace = metrics.begin("request", route=request.endpoint)
+
+@app.after_request
+def record_status(response):
+    g.status = response.status_code
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        metrics.end(trace, method=request.method, status=g.get("status", 500))
+
+# LLM calls: prompts are read once, responses are cached, LLM_BACKEND=stub answers offline
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+prompts = Prompts(os.getenv("PROMPTS_DIR", "../prompts"))
+llm = LLMGateway(
+    StubBackend() if os.getenv("LLM_BACKEND") == "stub" else OpenAIBackend(os.getenv("OPENAI_API_KEY")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+    timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", 60)),
+    cache_entries=int(os.getenv("LLM_CACHE_ENTRIES", 256)),
+    cache_ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", 3600)),
+)
+
+# Cache of solved spots (in-memory hot tier + zstd files on disk + optional read-only library)
+solver.configure_cache(
+    os.getenv("SOLVE_CACHE_DIR", "./solve_cache"),
+    int(os.getenv("SOLVE_CACHE_DISK_BYTES", 4 * 1024 ** 3)),
+    int(os.getenv("SOLVE_CACHE_MEMORY_BYTES", 1024 ** 3)),
+    os.getenv("SOLVE_LIBRARY_DIR"),  # precomputed solutions from postflop-solver/batch_solve.py
+)
+
+# Memory of running solves; defaults to 75% of RAM. Games that don't fit are compressed, queued or rejected
+if os.getenv("SOLVE_MEMORY_BUDGET_BYTES"):
+    solver.configure_memory_budget(
+        int(os.getenv("SOLVE_MEMORY_BUDGET_BYTES")),
+        float(os.getenv("SOLVE_MEMORY_WAIT_SECONDS", 30.0)),
+    )
+
+# Bunching-effect tables, computed in the background the first time a preflop line and flop are
+# requested with "bunching" (up to 3.4 GB and minutes each with 4 folded players)
+solver.configure_bunching(
+    os.getenv("BUNCHING_CACHE_DIR", "./bunching_cache"),
+    int(os.getenv("BUNCHING_WORKERS", 1)),
+    int(os.getenv("BUNCHING_MEMORY_ENTRIES", 2)),
+)
 
-client = openai.OpenAI()
+# Preflop ranges are parsed once; the index file is memory-mapped on later starts
+try:
+    app.logger.info("Range repository loaded: %s", solver.load_range_repository(
+        os.getenv("GTO_RANGES_DIR", "./postflop-solver/GTOWizard_Scraped_Ranges/Cash6m50z100bbGeneral"),
+        os.getenv("GTO_RANGES_INDEX", "./postflop-solver/ranges.idx"),
+    ))
+except OSError as e:
+    app.logger.error("Range repository not loaded, solves will fail: %s", e)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def encode_image(image_path):
-    """Encodes image to base64 for inclusion in JSON payload."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+# Screenshots are decoded and downscaled in memory; extraction results are reused for
+# screenshots with exactly the same pixels
+extractions = ExtractionCache(
+    max_entries=int(os.getenv("EXTRACTION_CACHE_ENTRIES", 256)),
+)
+
+def read_upload(file):
+    """Returns the uploaded screenshot prepared for the vision model."""
+    with metrics.span("prepare_image"):
+        return prepare_image(
+            file.stream,
+            max_side=int(os.getenv("UPLOAD_MAX_SIDE", 1280)),
+            max_bytes=int(os.getenv("UPLOAD_MAX_BYTES", 400 * 1024)),
+        )
+
+def ask_llm(model, messages, **params):
+    """Completes `messages` through the gateway; the round trip is timed as the `llm` stage."""
+    with metrics.span("llm", model=model):
+        return llm.complete(model, messages, **params)
+
+def extract_from_image(prompt_name, image):
+    """Asks the vision model to read a screenshot with the prompt `prompt_name`."""
+    output = extractions.get(prompt_name, image)
+    if output is None:
+        output = ask_llm("gpt-4o", [image_message(prompts[prompt_name], image.base64(), image.image_type)], max_tokens=300)
+        extractions.put(prompt_name, image, output)
+    return output
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/submit', methods = ['POST'])
-def submit():
+class InvalidSpot(ValueError):
+    """Raised by `parse_spot_form` for a form that doesn't describe a valid spot."""
+
+@app.errorhandler(InvalidSpot)
+def invalid_spot(e):
+    return jsonify({'error': str(e)}), 400
+
+def parse_spot_form(form):
+    """Converts the submitted form into solver inputs, the hero's hole cards and the `SuitMap`.
+
+    The board and the hole cards are returned in canonical suits, so that suit-isomorphic spots
+    share one solve (and one cache entry); the `SuitMap` converts cards back to the user's suits.
+    A missing field or invalid cards raise `InvalidSpot` (a 400), before anything reaches the solver.
+    """
     def convert_numerical_strings_to_int(d):
         for key, value in d.items():
             if isinstance(value, str) and value.isdigit():  # Check if value is a digit string
                 d[key] = int(value)  # Convert to integer
         return d
 
-    d = request.form.to_dict()
-    data = convert_numerical_strings_to_int(d)
-    hc = data["hole_cards"].replace(",", '')
-    del data['hole_cards']
-    data['flop_cards'] = data['flop_cards'].replace(",", '')
-    # data = {
-    #     "effective_stack": 900,
-    #     "pot_before_flop": 200,
-    #     "preflop_action": "BTN,SB,BB,SB",
-    #     "flop_cards": "Td9d6h",
-    #     "flop_bet": 120,  # Example value
-    #     "turn_card": "Qc",
-    #     "turn_bet": 200,  # Example value
-    #     "river_card": "7s",
-    #     "river_bet": 300,  # Example value
-    # }
-    res = solver.process(data)
-    # compute avg
-    all_ranges = []
-    for k in res["Hero"]:
-        probs = res["Hero"][k]["Actions Probabilities"]
-        all_ranges.append(probs)
-    ans = []
-    for j in range(len(all_ranges[0])):
-        s = 0
-        for i in range(len(all_ranges)):
-            s += all_ranges[i][j]
-        s /= len(all_ranges)
-        ans.append(s)
-    hero_bucket = res['Hero Equity Buckets']
-    villain_bucket = res['Villain Equity Buckets']
-    actions = res['Legal Actions']
-    hand_info = res['Hero'][hc]
+    with metrics.span("parse_form"):
+        try:
+            d = dict(form)
+            data = convert_numerical_strings_to_int(d)
+            hc = data["hole_cards"].replace(",", '')
+            del data['hole_cards']
+            data['flop_cards'] = data['flop_cards'].replace(",", '')
+            data['bunching'] = str(data.get('bunching', '')).lower() in ('1', 'on', 'true', 'yes')
+            data['subgame'] = str(data.get('subgame', '')).lower() in ('1', 'on', 'true', 'yes')
+            # data = {
+            #     "effective_stack": 900,
+            #     "pot_before_flop": 200,
+            #     "preflop_action": "BTN,SB,BB,SB",
+            #     "flop_cards": "Td9d6h",
+            #     "flop_bet": 120,  # Example value
+            #     "turn_card": "Qc",
+            #     "turn_bet": 200,  # Example value
+            #     "river_card": "7s",
+            #     "river_bet": 300,  # Example value
+            #     "tier": "standard",  # fast / standard / precise
+            #     "bunching": True,  # model the card removal of the folded players
+            #     "subgame": True,  # solve only the current street, with the actual pot and narrowed ranges
+            # }
+            return canonicalize_spot(data, hc)
+        except KeyError as e:
+            raise InvalidSpot(f"Missing field {e}") from e
+        except (AttributeError, TypeError, ValueError) as e:
+            raise InvalidSpot(str(e)) from e
+
+# Solver worker processes (solver_workers.py); without SOLVER_WORKERS, spots are solved in-process.
+# Sessions and /stream keep their games in this process and always solve here.
+workers = SolverPool(
+    os.getenv("SOLVER_WORKERS").split(","),
+    rejected=solver.SolveRejected,
+    cancelled=solver.SolveCancelled,
+    authkey=worker_authkey(),
+    retry_seconds=float(os.getenv("SOLVER_WORKER_RETRY_SECONDS", 5.0)),
+    timeout_seconds=float(os.getenv("SOLVER_WORKER_TIMEOUT_SECONDS", 300.0)),
+) if os.getenv("SOLVER_WORKERS") else None
+
+class WorkerSolve:
+    """A solve on the solver workers, with the interface of `SolveTask` that speculations use.
+
+    The whole solve is one step, so a speculation on the workers only pauses before it starts.
+    """
+
+    def __init__(self, inputs, cancel=None):
+        self.inputs = inputs
+        self.cancel = cancel
+        self.res = None
+
+    def step(self):
+        self.res = workers.solve(self.inputs, self.cancel)
+        return True
+
+    def snapshot(self):
+        strategy = np.asarray(self.res.hero.strategy)
+        return {
+            "legal_actions": self.res.legal_actions,
+            "index": self.res.hero.index,
+            "strategy": strategy,
+            "range_strategy": range_strategy(strategy, self.res.hero.weights),
+        }
+
+    def result(self):
+        return self.res
+
+# Solves started as soon as /fill has read a complete spot, while the user reviews the form; the
+# request submitting the same spot (with the returned `speculation_id`) attaches to them, and
+# solves it itself if the speculation has not finished within SPECULATIVE_SOLVE_WAIT_SECONDS
+speculations = SpeculativeSolves(
+    WorkerSolve if workers is not None else solver.start_solve,
+    solver.CancelToken,
+    ttl=float(os.getenv("SPECULATIVE_SOLVE_TTL_SECONDS", 300)),
+    max_entries=int(os.getenv("SPECULATIVE_SOLVE_ENTRIES", 8)),
+) if os.getenv("SPECULATIVE_SOLVES", "1") != "0" else None
+speculation_wait_seconds = float(os.getenv("SPECULATIVE_SOLVE_WAIT_SECONDS", 120))
+
+def claim_speculation(data, speculation_id):
+    """Speculative solve of the spot, if one was started; cancels that of `speculation_id` if
+    the user edited the spot since."""
+    if speculations is None:
+        return None
+    return speculations.claim(data, speculation_id)
+
+def foreground_solve():
+    """Pauses the speculative solves that nobody waits for yet while a request solves."""
+    return speculations.foreground() if speculations is not None else nullcontext()
+
+def analyze_spot(data, hc, cancel=None, speculation_id=None):
+    """Solves the spot and asks the LLM to explain the hero's decision."""
+    with metrics.span("solve_request"):
+        speculation = claim_speculation(data, speculation_id)
+        res = speculation.wait(cancel, speculation_wait_seconds) if speculation is not None else None
+        if res is None:
+            with foreground_solve():
+                if workers is not None:
+                    res = workers.solve(data, cancel)
+                else:
+                    res = solver.process_columnar(data, cancel)
+    metrics.add_solver_spans(res.stage_seconds)
+    return explain_solution(res, data, hc)
+
+def range_strategy(strategy, weights):
+    """Action frequencies of a whole range: the strategies of its hands (`[action x hand]`)
+    weighted by their normalized weights, as in the snapshots of /stream."""
+    weights = np.asarray(weights)
+    total = weights.sum()
+    if total <= 0:
+        return [0.0] * len(strategy)
+    return ((strategy * weights).sum(axis=1) / total).tolist()
+
+def solution_summary(res, hc):
+    """The results of a solved spot that the LLM explains: the hero's range strategy, the equity
+    buckets and the hero's hand."""
+    strategy = np.asarray(res.hero.strategy)  # [action x hand], no copy
+    ans = range_strategy(strategy, res.hero.weights)
+    hero_bucket = res.hero_buckets
+    villain_bucket = res.villain_buckets
+    i = res.hero.index[hc]
+    hand_info = {
+        "EV": float(np.asarray(res.hero.ev)[i]),
+        "Equity": float(np.asarray(res.hero.equity)[i]),
+        "EQR": float(np.asarray(res.hero.eqr)[i]),
+        "Actions Probabilities": strategy[:, i].tolist(),
+    }
 
     all_info = {}
     all_info["Hero overall range action probabilities"] = ans
     all_info["Hero bucket"] = hero_bucket
     all_info["Villain bucket"] = villain_bucket
     all_info["Hand info"] = hand_info
-    
-    with open("../prompts/GTOo1.txt", "r") as f:
-        GTOo1_prompt = f.read()
-    f.close()
-
-    with open("../prompts/sample_response.txt", "r") as f:
-        sample_response = f.read()
-    f.close()
-    GTOo1_prompt = GTOo1_prompt.format(GTO_data = jsonify(all_info), sample_response = sample_response)
-    response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "user", "content": GTOo1_prompt}
-            ]
-        )
-    content = response.choices[0].message.content
+    return all_info
+
+def explain_solution(res, data, hc):
+    """Asks the LLM to explain the hero's decision in a solved spot."""
+    all_info = solution_summary(res, hc)
+
+    # json.dumps rather than jsonify: this also runs in job worker threads without an app context
+    GTOo1_prompt = prompts.format("GTOo1", GTO_data = json.dumps(all_info), sample_response = prompts["sample_response"])
+    content = ask_llm("gpt-4o-mini", [text_message(GTOo1_prompt)])
     content = content.split("```")[1]
     content = content[content.find("{"):]
+
+    # Report how accurate the solve behind the explanation is
+    explanation = json.loads(content)
+    explanation["Solver"] = {
+        "Tier": res.tier,
+        "Exploitability (% of pot)": exploitability_pct(res.exploitability, res.starting_pot),
+        "Iterations": res.iterations,
+        "Iterations saved by warm start (estimated)": res.estimated_iterations_saved,
+        "Solve time (s)": round(res.solve_seconds, 2),
+        "Stopped by": res.stop_reason,
+        "Cache": res.cache,
+        "Bunching effect": res.bunching,
+    }
+    return json.dumps(explanation)
+
+def run_analysis_job(payload, cancel):
+    data, hc, speculation_id = payload
+    with metrics.trace("job"):
+        return analyze_spot(data, hc, cancel, speculation_id)
+
+# Background solves: a bounded worker pool so long solves don't block the web workers
+jobs = JobQueue(
+    run_analysis_job,
+    # with solver workers, this many solves per worker are dispatched at once
+    max_workers=int(os.getenv("SOLVE_WORKERS", 2)) * (len(workers) if workers is not None else 1),
+    max_queued=int(os.getenv("SOLVE_QUEUE_DEPTH", 16)),
+    token_factory=solver.CancelToken,
+    rejected=(solver.SolveRejected,),
+)
+
+# /batch: spots solved at once (default: one per solver thread) and the memory their games may take
+batch_max_parallel = int(os.getenv("BATCH_MAX_PARALLEL")) if os.getenv("BATCH_MAX_PARALLEL") else None
+batch_memory_budget = int(os.getenv("BATCH_MEMORY_BUDGET_BYTES")) if os.getenv("BATCH_MEMORY_BUDGET_BYTES") else None
+
+@app.route('/submit', methods = ['POST'])
+def submit():
+    form = request.form.to_dict()
+    speculation_id = form.pop("speculation_id", None)
+    data, hc, _ = parse_spot_form(form)
+    try:
+        content = analyze_spot(data, hc, speculation_id=speculation_id)
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'LLM returned invalid JSON: {e}'}), 502
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except solver.SolveRejected as e:
+        return jsonify({'error': str(e)}), 503
+    except WorkerTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except WorkerError as e:
+        return jsonify({'error': str(e)}), 503
+    except LLMTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except LLMError as e:
+        return jsonify({'error': str(e)}), 502
     return content, 200
 
+@app.route('/equity', methods = ['POST'])
+def spot_equity():
+    """Equity of the hero's hand and of both ranges (same form as /submit), without solving.
+
+    Answers in milliseconds, so the equity part of an explanation can be shown while the solve of
+    the same spot runs (e.g. as a job).
+    """
+    form = request.form.to_dict()
+    form.pop("speculation_id", None)
+    data, hc, suit_map = parse_spot_form(form)
+    try:
+        with metrics.span("equity"):
+            res = solver.range_equity(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    metrics.add_solver_spans(res["Stage Seconds"])
+
+    def hands_equity(hands):
+        return {suit_map.hand_to_user(hand): info["Equity"] for hand, info in hands.items()}
+
+    return jsonify({
+        "Hand info": {"Equity": res["Hero"][hc]["Equity"]} if hc in res["Hero"] else None,
+        "Hero Range Equity": res["Hero Range Equity"],
+        "Villain Range Equity": res["Villain Range Equity"],
+        "Hero bucket": res["Hero Equity Buckets"],
+        "Villain bucket": res["Villain Equity Buckets"],
+        "Hero": hands_equity(res["Hero"]),
+        "Villain": hands_equity(res["Villain"]),
+    }), 200
+
+@app.route('/jobs', methods = ['POST'])
+def submit_job():
+    form = request.form.to_dict()
+    speculation_id = form.pop("speculation_id", None)
+    data, hc, _ = parse_spot_form(form)
+    try:
+        job = jobs.submit((data, hc, speculation_id))
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs', methods = ['GET'])
+def job_queue_stats():
+    return jsonify({**jobs.stats(), "memory": solver.memory_status()}), 200
+
+@app.route('/workers', methods = ['GET'])
+def worker_stats():
+    """Load of each solver worker: dispatcher counters and the worker's own queue and caches."""
+    if workers is None:
+        return jsonify({'error': 'Spots are solved in-process (SOLVER_WORKERS is not set)'}), 404
+    return jsonify(workers.stats()), 200
+
+@app.route('/jobs/<job_id>', methods = ['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/result', methods = ['GET'])
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.state == "done":
+        return job.result, 200
+    if job.state == "failed":
+        return jsonify({'error': job.error}), 500
+    if job.state == "rejected":
+        return jsonify({'error': job.error}), 503
+    if job.state == "cancelled":
+        return jsonify({'error': 'Job was cancelled'}), 409
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods = ['DELETE'])
+def cancel_job(job_id):
+    if not jobs.cancel(job_id):
+        return jsonify({'error': 'Unknown or finished job'}), 404
+    return jsonify(jobs.get(job_id).to_dict()), 200
+
+@app.route('/batch', methods = ['POST'])
+def batch():
+    """Solves many spots in one request, e.g. every decision of a hand history.
+
+    The JSON body is {"spots": [...], "explain": false, "max_parallel": null}, each spot with the
+    fields of the /submit form. The response is NDJSON with one line per spot as it finishes:
+    {"index": i, "result": ...} with the solver results sent to the LLM (or, with "explain", the
+    LLM's explanation), or {"index": i, "error": ...}; every spot gets exactly one line. The spots
+    are solved in this process.
+    """
+    body = request.get_json(silent=True) or {}
+    spots = body.get("spots")
+    if not isinstance(spots, list) or not spots:
+        return jsonify({'error': 'Expected a non-empty list of spots'}), 400
+    try:
+        parsed = [parse_spot_form(spot) for spot in spots]
+    except (KeyError, ValueError, AttributeError) as e:
+        return jsonify({'error': f'Invalid spot: {e}'}), 400
+    explain = bool(body.get("explain"))
+
+    cancel = solver.CancelToken()
+    results = solver.solve_poker_spots(
+        [data for data, _, _ in parsed],
+        max_parallel=body.get("max_parallel") or batch_max_parallel,
+        memory_budget=batch_memory_budget,
+        cancel=cancel,
+    )
+
+    def generate():
+        unfinished = set(range(len(parsed)))
+        try:
+            for index, res in results:
+                data, hc, _ = parsed[index]
+                if isinstance(res, BaseException):  # including the PanicException of a solver panic
+                    line = {"index": index, "error": str(res) or type(res).__name__}
+                else:
+                    metrics.add_solver_spans(res.stage_seconds)
+                    try:
+                        if explain:
+                            result = json.loads(explain_solution(res, data, hc))
+                        else:
+                            result = solution_summary(res, hc)
+                        line = {"index": index, "result": result}
+                    except KeyError:
+                        line = {"index": index, "error": "Hole cards are not in the hero's range"}
+                    except LLMError as e:
+                        line = {"index": index, "error": str(e)}
+                    except Exception as e:
+                        app.logger.exception("Spot %d of the batch failed", index)
+                        line = {"index": index, "error": f"{type(e).__name__}: {e}"}
+                yield json.dumps(line) + "\n"
+                unfinished.discard(index)
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            # every spot gets a line, even if the batch itself failed
+            app.logger.exception("Batch failed")
+            for index in sorted(unfinished):
+                yield json.dumps({"index": index, "error": f"Spot was not solved: {str(e) or type(e).__name__}"}) + "\n"
+        finally:
+            # the client went away: don't solve the remaining spots
+            cancel.cancel()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def exploitability_pct(exploitability, starting_pot):
+    return round(100 * exploitability / starting_pot, 3)
+
+@app.route('/stream', methods = ['GET', 'POST'])
+def stream():
+    """Solves a spot and streams Server-Sent Events while it converges.
+
+    Events: `progress` after every exploitability check, `snapshot` (hero's current root strategy)
+    at most every `snapshot_interval` seconds, `solved`, then `explanation` with the same content
+    as /submit. A failure ends the stream with an `error` event.
+    """
+    form = request.values.to_dict()
+    speculation_id = form.pop("speculation_id", None)
+    data, hc, _ = parse_spot_form(form)
+    interval = float(data.pop("snapshot_interval", os.getenv("STREAM_SNAPSHOT_SECONDS", 1.0)))
+
+    def snapshot_event(snapshot, iteration, exploitability, starting_pot):
+        strategy = np.asarray(snapshot["strategy"])
+        i = snapshot["index"].get(hc)
+        return sse_event("snapshot", {
+            "iteration": iteration,
+            "exploitability_pct": exploitability_pct(exploitability, starting_pot),
+            "actions": snapshot["legal_actions"],
+            "range_strategy": snapshot["range_strategy"],
+            "hand_strategy": strategy[:, i].tolist() if i is not None else None,
+        })
+
+    def task_snapshot_event(task):
+        return snapshot_event(task.snapshot(), task.iteration, task.exploitability, task.starting_pot)
+
+    def speculation_events(speculation):
+        """Progress of a speculative solve until it ends; returns its result (None if it failed)."""
+        try:
+            while not speculation.done.wait(min(interval, 0.25)):
+                progress = speculation.progress
+                if progress is not None:
+                    yield sse_event("progress", {
+                        "iteration": progress["iteration"],
+                        "exploitability_pct": exploitability_pct(progress["exploitability"], progress["starting_pot"]),
+                        "elapsed": round(progress["elapsed"], 2),
+                    })
+        finally:
+            # a disconnect stops the solve, as below
+            if not speculation.done.is_set():
+                speculation.cancel_token.cancel()
+        res = speculation.result
+        if res is not None:
+            yield snapshot_event(speculation.snapshot, res.iterations, res.exploitability, res.starting_pot)
+        return res
+
+    def generate():
+        # the events are produced after the view has returned, so they get their own trace
+        with metrics.trace("stream"):
+            yield from stream_events()
+
+    def stream_events():
+        try:
+            speculation = claim_speculation(data, speculation_id)
+            res = (yield from speculation_events(speculation)) if speculation is not None else None
+            if res is None:
+                with foreground_solve():
+                    task = solver.start_solve(data)
+                    last_snapshot = time.monotonic()
+                    while not task.step():
+                        yield sse_event("progress", {
+                            "iteration": task.iteration,
+                            "exploitability_pct": exploitability_pct(task.exploitability, task.starting_pot),
+                            "elapsed": round(task.elapsed_seconds, 2),
+                        })
+                        if time.monotonic() - last_snapshot >= interval:
+                            last_snapshot = time.monotonic()
+                            yield task_snapshot_event(task)
+                    yield task_snapshot_event(task)
+                    res = task.result()
+            metrics.add_solver_spans(res.stage_seconds)
+            yield sse_event("solved", {
+                "tier": res.tier,
+                "exploitability_pct": exploitability_pct(res.exploitability, res.starting_pot),
+                "iterations": res.iterations,
+                "estimated_iterations_saved": res.estimated_iterations_saved,
+                "elapsed": round(res.solve_seconds, 2),
+                "stop_reason": res.stop_reason,
+                "cache": res.cache,
+            })
+            yield sse_event("explanation", json.loads(explain_solution(res, data, hc)))
+        except GeneratorExit:
+            # the client went away
+            raise
+        # BaseException: a Rust panic raises PyO3's PanicException, which must end the stream
+        # with an error event too
+        except BaseException as e:
+            yield sse_event("error", {"error": str(e) or type(e).__name__})
+
+    # the solve advances only while the client reads, so a disconnect stops it
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Solved games kept for follow-up questions on the same hand (LRU, bounded by game memory)
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", 64)),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", 2 * 1024 ** 3)),
+)
+
+def session_state(session):
+    """Describes the current node of a session, with cards in the user's suits."""
+    game = session.game
+    suit_map, hc = session.context["suit_map"], session.context["hc"]
+    terminal = game.is_terminal_node()
+    player = game.current_player()
+    state = {
+        "session_id": session.id,
+        "history": game.history,
+        "board": suit_map.to_user(game.current_board()),
+        "player": {0: "OOP", 1: "IP"}.get(player),
+        "terminal": terminal,
+        "actions": [] if game.is_chance_node() else game.available_actions(),
+        "cards": [suit_map.to_user(card_to_str(card)) for card in game.possible_cards()],
+        "bets": game.total_bet_amount(),
+    }
+
+    # the hero is OOP, as in /submit
+    hands = game.private_cards(0)
+    if not terminal and hc in hands:
+        i = hands.index(hc)
+        state["hero"] = {
+            "EV": float(np.asarray(game.expected_values(0))[i]),
+            "Equity": float(np.asarray(game.equity(0))[i]),
+        }
+        if player == 0:
+            strategy = np.asarray(game.strategy())
+            state["hero"]["Actions Probabilities"] = strategy[:, i].tolist()
+    return state
+
+def session_or_404(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        return None, (jsonify({'error': 'Unknown or expired session'}), 404)
+    return session, None
+
+@app.route('/sessions', methods = ['POST'])
+def open_session():
+    """Solves a spot (same form as /submit) and keeps the game for navigation."""
+    data, hc, suit_map = parse_spot_form(request.form.to_dict())
+    try:
+        game = solver.open_session(data)
+    except solver.SolveRejected as e:
+        return jsonify({'error': str(e)}), 503
+    session = sessions.add(game, hc=hc, suit_map=suit_map)
+    with session.lock:
+        return jsonify(session_state(session)), 201
+
+@app.route('/sessions', methods = ['GET'])
+def session_stats():
+    return jsonify(sessions.stats()), 200
+
+@app.route('/sessions/<session_id>', methods = ['GET'])
+def get_session(session_id):
+    session, error = session_or_404(session_id)
+    if error:
+        return error
+    with session.lock:
+        return jsonify(session_state(session)), 200
+
+@app.route('/sessions/<session_id>/play', methods = ['POST'])
+def play_session(session_id):
+    """Plays `action` (index into `actions`) or deals `card` (e.g. "Qc") at a chance node."""
+    session, error = session_or_404(session_id)
+    if error:
+        return error
+    with session.lock:
+        try:
+            if "card" in request.values:
+                card = session.context["suit_map"].to_canonical(request.values["card"])
+                session.game.play(cards_from_str(card)[0])
+            else:
+                session.game.play(int(request.values["action"]))
+        except (KeyError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(session_state(session)), 200
+
+@app.route('/sessions/<session_id>/history', methods = ['POST'])
+def set_session_history(session_id):
+    """Moves to the node reached by `history` (comma-separated, as returned in `history`)."""
+    session, error = session_or_404(session_id)
+    if error:
+        return error
+    history = request.values.get("history", "")
+    with session.lock:
+        try:
+            session.game.apply_history([int(action) for action in history.split(",") if action])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(session_state(session)), 200
+
+def what_if_results(results, hero_index, player):
+    """Range-level results of a what-if scenario (or its base), plus the hero's hand."""
+    out = {
+        "Range Strategy": results["range_strategy"],
+        "Range EV": {"OOP": results["range_ev"][0], "IP": results["range_ev"][1]},
+    }
+    if "range_ev_diff" in results:
+        out["Range Strategy Diff"] = results["range_strategy_diff"]
+        out["Range EV Diff"] = {"OOP": results["range_ev_diff"][0], "IP": results["range_ev_diff"][1]}
+    if hero_index is not None:
+        out["Hero EV"] = float(np.asarray(results["expected_values"][0])[hero_index])
+        if "ev_diff" in results:
+            out["Hero EV Diff"] = float(np.asarray(results["ev_diff"][0])[hero_index])
+        if player == 0:
+            out["Hero Actions Probabilities"] = np.asarray(results["strategy"])[:, hero_index].tolist()
+    return out
+
+@app.route('/sessions/<session_id>/what_if', methods = ['POST'])
+def session_what_if(session_id):
+    """Re-solves the session's spot with strategies locked at some nodes (node locking).
+
+    The JSON body has `scenarios`, a list of scenarios that are each a list of locks
+    `{"history": [...], "range": [p_action, ...], "hands": {"AsKd": [p_action, ...]}}`, and
+    optionally `max_iterations`, `target_exploitability_pct` and `deadline_seconds` per scenario.
+    Returns how the range strategy and EVs at the current node change in each scenario.
+    """
+    session, error = session_or_404(session_id)
+    if error:
+        return error
+    body = request.get_json(silent=True) or {}
+    suit_map, hc = session.context["suit_map"], session.context["hc"]
+    try:
+        scenarios = [
+            [
+                {
+                    "history": [int(action) for action in lock["history"]],
+                    "range": lock.get("range"),
+                    "hands": {suit_map.hand_to_canonical(hand): probabilities
+                              for hand, probabilities in (lock.get("hands") or {}).items()},
+                }
+                for lock in scenario
+            ]
+            for scenario in body["scenarios"]
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid scenarios: {e}"}), 400
+
+    options = {key: body[key] for key in ("max_iterations", "target_exploitability_pct", "deadline_seconds")
+               if body.get(key) is not None}
+    with session.lock:
+        game = session.game
+        try:
+            results = game.what_if(scenarios, **options)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        except solver.SolveRejected as e:
+            return jsonify({'error': str(e)}), 503
+        hands = game.private_cards(0)
+        hero_index = hands.index(hc) if hc in hands else None
+        player = game.current_player()
+        state = session_state(session)
+
+    scenarios = []
+    for scenario in results["scenarios"]:
+        out = what_if_results(scenario, hero_index, player)
+        out["Iterations"] = scenario["iterations"]
+        out["Estimated Iterations Saved"] = scenario["estimated_iterations_saved"]
+        out["Solve Seconds"] = scenario["solve_seconds"]
+        out["Stop Reason"] = scenario["stop_reason"]
+        out["Exploitability (% of pot)"] = exploitability_pct(scenario["exploitability"], game.starting_pot)
+        scenarios.append(out)
+    return jsonify({
+        **state,
+        "base": what_if_results(results["base"], hero_index, player),
+        "scenarios": scenarios,
+    }), 200
+
+@app.route('/sessions/<session_id>', methods = ['DELETE'])
+def close_session(session_id):
+    if not sessions.remove(session_id):
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    return '', 204
+
+def start_speculation(fields, options):
+    """Starts solving the spot read from a screenshot, if it is complete (stack, pot, preflop
+    line and flop). `options` may set the tier, bunching and subgame as the form will."""
+    if speculations is None:
+        return None
+    form = {field: str(fields[field]) for field in SPOT_FIELDS if fields.get(field) not in (None, "")}
+    if not all(field in form for field in ("effective_stack", "pot_before_flop", "preflop_action", "flop_cards")):
+        return None
+    form.update({field: options[field] for field in ("tier", "bunching", "subgame") if field in options})
+    form["hole_cards"] = str(fields.get("hole_cards") or "")
+    try:
+        data, _, _ = parse_spot_form(form)
+        return speculations.start({**dict.fromkeys(SPOT_FIELDS), **data})
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        app.logger.info("Spot not speculatively solved: %s", e)
+        return None
+
+@app.route('/speculations', methods = ['GET'])
+def speculation_stats():
+    if speculations is None:
+        return jsonify({'error': 'Speculative solves are disabled'}), 404
+    return jsonify(speculations.stats()), 200
+
+@app.route('/speculations/<speculation_id>', methods = ['DELETE'])
+def cancel_speculation(speculation_id):
+    """Cancels the speculative solve started by /fill, e.g. when the user edits the spot."""
+    if speculations is None or not speculations.cancel(speculation_id):
+        return jsonify({'error': 'Unknown or claimed speculation'}), 404
+    return '', 204
+
 @app.route('/fill', methods = ['POST'])
 def upload_autofill():
     # Check if the request contains a file
@@ -121,52 +821,31 @@ def upload_autofill():
             return jsonify({'error': 'No selected file'}), 400
         
     if file and allowed_file(file.filename):
-        filename = file.filename
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        image_type = filepath.split('.')[-1]
-        
-        if image_type not in {'png', 'jpg', 'jpeg'}:
-            return jsonify({'error': 'File type not allowed'}), 400
-        base64_image = encode_image(filepath)
-        
-        headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {openai.api_key}"
-        }
-        with open("../prompts/Autofill.txt", "r") as f:
-            Autofill = f.read()
-        f.close()
-
-        payload = {
-        "model": "gpt-4o",
-        "messages": [
-            {
-            "role": "user",
-            "content": [
-                {
-                "type": "text",
-                "text": Autofill
-                },
-                {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/{image_type};base64,{base64_image}"
-                }
-                }
-            ]
-            }
-        ],
-        "max_tokens": 300
-        }
+        try:
+            image = read_upload(file)
+        except InvalidImage as e:
+            return jsonify({'error': str(e)}), 400
 
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        output = response.json()['choices'][0]['message']['content']
+        try:
+            output = extract_from_image("Autofill", image)
+        except LLMTimeout as e:
+            return jsonify({'error': str(e)}), 504
+        except LLMError as e:
+            return jsonify({'error': str(e)}), 502
         json_string = re.search(r'```json(.*?)```', output, re.DOTALL)
         if json_string:
             json_content = json_string.group(1).strip()  # Extract the JSON part
             print(json_content)
-            return json_content, 200
+            try:
+                fields = json.loads(json_content)
+            except ValueError:
+                return json_content, 200
+            if "pot_before_flop" not in fields and "pot_preflop" in fields:
+                fields["pot_before_flop"] = fields["pot_preflop"]  # the prompt's name for it
+            speculation = start_speculation(fields, request.form.to_dict())
+            if speculation is not None:
+                fields["speculation_id"] = speculation.id
+            return jsonify(fields), 200
         else:
             return jsonify({'error': 'Error: Invalid JSON format.'}), 400
 
@@ -185,65 +864,21 @@ def upload_file():
         return jsonify({'error': 'No selected file'}), 400
     
     if file and allowed_file(file.filename):
-        filename = file.filename
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        image_type = filepath.split('.')[-1]
-        
-        if image_type not in {'png', 'jpg', 'jpeg'}:
-            return jsonify({'error': 'File type not allowed'}), 400
-        base64_image = encode_image(filepath)
-        
-        headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {openai.api_key}"
-        }
-        
-        with open("../prompts/GTOextract.txt", "r") as f:
-            GTOextract_prompt = f.read()
-        f.close()
-
-        payload = {
-        "model": "gpt-4o",
-        "messages": [
-            {
-            "role": "user",
-            "content": [
-                {
-                "type": "text",
-                "text": GTOextract_prompt
-                },
-                {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/{image_type};base64,{base64_image}"
-                }
-                }
-            ]
-            }
-        ],
-        "max_tokens": 300
-        }
+        try:
+            image = read_upload(file)
+        except InvalidImage as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            GTO_data = extract_from_image("GTOextract", image)
 
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        GTO_data = response.json()['choices'][0]['message']['content']
-
-        # gpt4o (o1) for response
-        with open("../prompts/GTOo1.txt", "r") as f:
-            GTOo1_prompt = f.read()
-        f.close()
-
-        with open("../prompts/sample_response.txt", "r") as f:
-            sample_response = f.read()
-        f.close()
-        GTOo1_prompt = GTOo1_prompt.format(GTO_data = GTO_data, sample_response = sample_response)
-        response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "user", "content": GTOo1_prompt}
-                ]
-            )
-        content = response.choices[0].message.content
+            # gpt4o (o1) for response
+            GTOo1_prompt = prompts.format("GTOo1", GTO_data = GTO_data, sample_response = prompts["sample_response"])
+            content = ask_llm("gpt-4o-mini", [text_message(GTOo1_prompt)])
+        except LLMTimeout as e:
+            return jsonify({'error': str(e)}), 504
+        except LLMError as e:
+            return jsonify({'error': str(e)}), 502
         # print(content)
         content = content.split("```")[1]
         content = content[content.find("{"):]
@@ -252,6 +887,107 @@ def upload_file():
     else:
         return jsonify({'error': 'File type not allowed'}), 400
 
+def hit_ratio(hits, misses):
+    return hits / (hits + misses) if hits + misses else 0.0
+
+@app.route('/metrics', methods = ['GET'])
+def prometheus_metrics():
+    """Stage latency histograms, solve metrics and cache/queue counters in the Prometheus text format."""
+    cache = solver.cache_stats()
+    memory = solver.memory_status()
+    llm_stats = llm.stats()
+    extraction_stats = extractions.stats()
+    job_stats = jobs.stats()
+    session_stats = sessions.stats()
+    bunching = solver.bunching_status()
+    solve_hits = cache["memory_hits"] + cache["disk_hits"] + cache["library_hits"]
+
+    counters = [
+        ("gto_cache_hits_total", "Cache hits", [
+            ({"cache": "solve", "tier": "memory"}, cache["memory_hits"]),
+            ({"cache": "solve", "tier": "disk"}, cache["disk_hits"]),
+            ({"cache": "solve", "tier": "library"}, cache["library_hits"]),
+            ({"cache": "llm"}, llm_stats["cache_hits"]),
+            ({"cache": "extraction"}, extraction_stats["hits"]),
+            ({"cache": "bunching", "tier": "memory"}, bunching["memory_hits"]),
+            ({"cache": "bunching", "tier": "disk"}, bunching["disk_hits"]),
+        ]),
+        ("gto_cache_misses_total", "Cache misses", [
+            ({"cache": "solve"}, cache["misses"]),
+            ({"cache": "llm"}, llm_stats["cache_misses"]),
+            ({"cache": "extraction"}, extraction_stats["misses"]),
+        ]),
+        ("gto_solver_admissions_total", "Solves admitted by the solver memory budget, by outcome", [
+            ({"outcome": outcome}, memory[outcome]) for outcome in ("admitted", "compressed", "queued", "rejected")
+        ]),
+        ("gto_bunching_tables_total", "Bunching-effect tables computed in the background, by outcome", [
+            ({"outcome": "computed"}, bunching["computed"]),
+            ({"outcome": "failed"}, bunching["failed"]),
+        ]),
+        ("gto_llm_calls_total", "LLM backend calls", [({}, llm_stats["calls"])]),
+        ("gto_llm_failures_total", "Failed or timed out LLM backend calls", [({}, llm_stats["failures"])]),
+        ("gto_sessions_evicted_total", "Sessions evicted from the session store", [({}, session_stats["evicted"])]),
+    ]
+    if speculations is not None:
+        speculation_stats = speculations.stats()
+        counters.append(("gto_speculative_solves_total", "Speculative solves started after /fill, by outcome", [
+            ({"outcome": outcome}, speculation_stats[outcome])
+            for outcome in ("started", "claimed", "cancelled", "expired", "failed")
+        ]))
+    gauges = [
+        ("gto_cache_hit_ratio", "Hits / lookups since startup", [
+            ({"cache": "solve"}, hit_ratio(solve_hits, cache["misses"])),
+            ({"cache": "llm"}, hit_ratio(llm_stats["cache_hits"], llm_stats["cache_misses"])),
+            ({"cache": "extraction"}, hit_ratio(extraction_stats["hits"], extraction_stats["misses"])),
+        ]),
+        ("gto_cache_entries", "Cache entries", [
+            ({"cache": "solve", "tier": "memory"}, cache["memory_entries"]),
+            ({"cache": "solve", "tier": "disk"}, cache["disk_entries"]),
+            ({"cache": "llm"}, llm_stats["cache_entries"]),
+            ({"cache": "extraction"}, extraction_stats["entries"]),
+            ({"cache": "bunching", "tier": "memory"}, bunching["memory_entries"]),
+        ]),
+        ("gto_cache_bytes", "Size of the cache of solved games", [
+            ({"cache": "solve", "tier": "memory"}, cache["memory_bytes"]),
+            ({"cache": "solve", "tier": "disk"}, cache["disk_bytes"]),
+        ]),
+        ("gto_solver_memory_budget_bytes", "Memory budget of running solves", [({}, memory["budget_bytes"])]),
+        ("gto_solver_memory_reserved_bytes", "Memory reserved by running solves", [({}, memory["reserved_bytes"])]),
+        ("gto_solver_active_solves", "Solves holding a memory reservation", [({}, memory["active_solves"])]),
+        ("gto_solver_waiting_solves", "Solves waiting for memory", [({}, memory["waiting_solves"])]),
+        ("gto_bunching_pending", "Bunching-effect tables queued or being computed", [({}, bunching["pending"])]),
+        ("gto_llm_in_flight", "LLM calls in flight", [({}, llm_stats["in_flight"])]),
+        ("gto_jobs", "Background jobs by state", [
+            ({"state": state}, job_stats[state]) for state in ("queued", "running", "done", "failed", "rejected", "cancelled")
+        ]),
+        ("gto_job_queue_depth", "Jobs waiting for a worker", [({}, job_stats["queue_depth"])]),
+        ("gto_sessions", "Open sessions", [({}, session_stats["sessions"])]),
+        ("gto_session_bytes", "Game memory held by sessions", [({}, session_stats["bytes"])]),
+    ]
+    if workers is not None:
+        worker_states = workers.stats(timeout=0.2)["workers"]
+        counters += [
+            ("gto_worker_requests_total", "Solves sent to each solver worker", [
+                ({"worker": w["address"]}, w["requests"]) for w in worker_states
+            ]),
+            ("gto_worker_busy_total", "Solves a full solver worker turned away", [
+                ({"worker": w["address"]}, w["busy"]) for w in worker_states
+            ]),
+            ("gto_worker_failures_total", "Times a solver worker could not be reached", [
+                ({"worker": w["address"]}, w["failures"]) for w in worker_states
+            ]),
+        ]
+        gauges += [
+            ("gto_worker_up", "Whether the solver worker is reachable", [
+                ({"worker": w["address"]}, int(w["up"])) for w in worker_states
+            ]),
+            ("gto_worker_in_flight", "Solves running or queued on each solver worker", [
+                ({"worker": w["address"]}, w["worker"]["in_flight"] if "worker" in w else w["in_flight"])
+                for w in worker_states
+            ]),
+        ]
+    text = metrics.render(solver.solver_metrics(), counters, gauges)
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
 if __name__ == '__main__':
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     app.run(debug=True)
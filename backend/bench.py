@@ -0,0 +1,221 @@
+"""Benchmark of the end-to-end solve path.
+
+Runs a fixed catalog of spots (flop/turn/river, low to deep SPR, monotone and paired boards) and
+times each stage separately:
+  - `solver.profile_solve`: range lookup, tree build, allocate_memory, the iterations (and
+    iterations/s), equity/EV extraction and Python marshalling of a cold solve;
+  - `app.py` `/submit`: form parsing, the cold request, the cached request and the explanation step
+    (with the stub LLM backend, so no API calls are made).
+
+Every spot runs in a fresh process with an empty solve cache, so the peak RSS is that of the spot.
+Results are written as JSON and can be compared across commits:
+
+    python bench.py --out bench_results/$(git rev-parse --short HEAD).json
+    python bench.py --compare bench_results/a1b2c3d.json bench_results/e4f5a6b.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+# name -> (form fields as sent by the frontend, hero hole cards)
+CATALOG = {
+    "flop_srp_dry": ({"effective_stack": 975, "pot_before_flop": 55, "preflop_action": "BTN,BB",
+                      "flop_cards": "Kc,7d,2h"}, "QdJd"),
+    "flop_srp_monotone": ({"effective_stack": 975, "pot_before_flop": 55, "preflop_action": "BTN,BB",
+                           "flop_cards": "Ah,9h,4h"}, "KcQc"),
+    "flop_srp_paired": ({"effective_stack": 975, "pot_before_flop": 55, "preflop_action": "CO,BB",
+                         "flop_cards": "8s,8d,3c"}, "9h9c"),
+    "flop_3bet_low_spr": ({"effective_stack": 780, "pot_before_flop": 440, "preflop_action": "UTG,CO,UTG",
+                           "flop_cards": "Qd,Ts,5c"}, "AsKs"),
+    "turn_srp": ({"effective_stack": 850, "pot_before_flop": 300, "preflop_action": "BTN,BB",
+                  "flop_cards": "Td,9d,6h", "turn_card": "Qc"}, "JcJh"),
+    "turn_monotone": ({"effective_stack": 850, "pot_before_flop": 300, "preflop_action": "BTN,BB",
+                       "flop_cards": "Js,8s,3s", "turn_card": "2d"}, "AhQh"),
+    "river_srp_deep": ({"effective_stack": 700, "pot_before_flop": 600, "preflop_action": "BTN,BB",
+                        "flop_cards": "Td,9d,6h", "turn_card": "Qc", "river_card": "2s"}, "KhJh"),
+    "river_paired_low_spr": ({"effective_stack": 300, "pot_before_flop": 900, "preflop_action": "CO,BB",
+                              "flop_cards": "7c,7h,4d", "turn_card": "Kd", "river_card": "4s"}, "8c8d"),
+}
+
+# stages compared by --compare (lower is better), then the throughput (higher is better)
+TIME_STAGES = [
+    "range_lookup", "tree_build", "allocate_memory", "solve", "extraction", "marshalling_dict",
+    "marshalling_columnar", "parse_form", "submit_cold", "submit_cached", "explain",
+]
+HIGHER_IS_BETTER = ["iterations_per_second"]
+
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_spot(name, tier):
+    """Benchmarks one spot; runs in its own process."""
+    form, hole_cards = CATALOG[name]
+    form = {**{key: str(value) for key, value in form.items()}, "hole_cards": hole_cards, "tier": tier}
+
+    cache_dir = tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ.update({"SOLVE_CACHE_DIR": cache_dir, "LLM_BACKEND": "stub"})
+    os.environ.pop("SOLVE_LIBRARY_DIR", None)
+    os.chdir(HERE)  # app.py resolves the solver and the prompts relative to backend/
+    sys.path.insert(0, str(HERE))
+    try:
+        result = {"spot": name, **measure_stages(form)}
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    return result
+
+
+def measure_stages(form):
+    import app
+
+    result = {}
+    (data, hc, _), result["parse_form"] = timed(app.parse_spot_form, form)
+    result.update(app.solver.profile_solve(data))
+
+    client = app.app.test_client()
+    response, result["submit_cold"] = timed(client.post, "/submit", data=form)
+    if response.status_code != 200:
+        result["error"] = f"/submit returned {response.status_code}: {response.get_data(as_text=True)}"
+        return result
+    _, result["submit_cached"] = timed(client.post, "/submit", data=form)
+
+    res = app.solver.process_columnar(data)
+    _, result["explain"] = timed(app.explain_solution, res, data, hc)
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(spots, tier, repeat):
+    results = []
+    # a fresh process per run, so that peak RSS and allocator state don't carry over
+    context = multiprocessing.get_context("spawn")
+    for name in spots:
+        for _ in range(repeat):
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                try:
+                    result = pool.apply(run_spot, (name, tier))
+                except Exception as e:
+                    result = {"spot": name, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            if "error" in result:
+                print(f"{name}: FAILED {result['error']}")
+            else:
+                print(f"{name}: solve {result['solve']:.2f}s ({result['iterations']} it, "
+                      f"{result['iterations_per_second']:.1f} it/s), tree {result['tree_build'] * 1e3:.1f}ms, "
+                      f"alloc {result['allocate_memory'] * 1e3:.1f}ms, extract {result['extraction'] * 1e3:.1f}ms, "
+                      f"marshal {result['marshalling_dict'] * 1e3:.1f}/{result['marshalling_columnar'] * 1e3:.1f}ms, "
+                      f"/submit {result['submit_cold']:.2f}s cold {result['submit_cached'] * 1e3:.1f}ms cached, "
+                      f"peak RSS {result['peak_rss_bytes'] / 1024 ** 2:.0f} MB")
+    return results
+
+
+def best_by_spot(results):
+    """Keeps the best value of every metric over the runs of each spot."""
+    best = {}
+    for result in results:
+        if "error" in result:
+            continue
+        spot = best.setdefault(result["spot"], {})
+        for metric, value in result.items():
+            if not isinstance(value, (int, float)) or metric not in spot:
+                spot[metric] = value
+            elif metric in HIGHER_IS_BETTER:
+                spot[metric] = max(spot[metric], value)
+            else:
+                spot[metric] = min(spot[metric], value)
+    return best
+
+
+def compare(old_path, new_path, threshold, min_seconds):
+    """Prints the change of every stage per spot; returns the number of regressions."""
+    old_report = json.loads(Path(old_path).read_text())
+    new_report = json.loads(Path(new_path).read_text())
+    old, new = best_by_spot(old_report["results"]), best_by_spot(new_report["results"])
+    print(f"{old_report['environment']['commit']} -> {new_report['environment']['commit']}")
+
+    regressions = 0
+    for name in sorted(old.keys() & new.keys()):
+        changes = []
+        for stage in TIME_STAGES + HIGHER_IS_BETTER + ["peak_rss_bytes"]:
+            before, after = old[name].get(stage), new[name].get(stage)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            if stage in HIGHER_IS_BETTER:
+                worse = ratio < 1 / (1 + threshold)
+            else:
+                # sub-millisecond stages are too noisy to compare by ratio alone
+                worse = ratio > 1 + threshold and (stage not in TIME_STAGES or after - before > min_seconds)
+            regressions += worse
+            changes.append(f"{stage} {ratio:.2f}x{' REGRESSION' if worse else ''}")
+        print(f"{name}: " + ", ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="JSON file to write the results to")
+    parser.add_argument("--spots", default=",".join(CATALOG), help="comma-separated spot names")
+    parser.add_argument("--tier", default="standard", choices=["fast", "standard", "precise"])
+    parser.add_argument("--repeat", type=int, default=1, help="runs per spot (the best of each stage is compared)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression (default 10%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.005,
+                        help="smallest absolute slowdown of a stage reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold, args.min_seconds) else 0)
+
+    spots = args.spots.split(",")
+    unknown = [name for name in spots if name not in CATALOG]
+    if unknown:
+        parser.error(f"unknown spots: {', '.join(unknown)}")
+
+    report = {
+        "environment": environment(),
+        "tier": args.tier,
+        "results": run(spots, args.tier, args.repeat),
+    }
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Suit-isomorphic canonicalization of spots.
+
+The preflop ranges are suit-symmetric, so two spots whose boards differ only by a permutation of
+suits (e.g. `Td9d6h` and `Th9h6s`) have the same solution up to that permutation. Spots are solved
+and looked up in canonical suits; hands are mapped into canonical suits before reading per-hand
+results, and back to the user's suits when results are shown.
+
+Cards use the solver's encoding: `4 * rank + suit`, ranks `23456789TJQKA`, suits `cdhs`.
+"""
+
+from itertools import combinations, permutations
+
+RANKS = "23456789TJQKA"
+SUITS = "cdhs"
+SUIT_PERMUTATIONS = list(permutations(range(4)))
+
+
+def card_from_str(card):
+    """Parses a card such as `"As"`; raises `ValueError` if `card` is not one."""
+    if not isinstance(card, str) or len(card) != 2 or card[0].upper() not in RANKS or card[1].lower() not in SUITS:
+        raise ValueError(f"Invalid card: {card!r}")
+    return 4 * RANKS.index(card[0].upper()) + SUITS.index(card[1].lower())
+
+
+def card_to_str(card):
+    return RANKS[card // 4] + SUITS[card % 4]
+
+
+def cards_from_str(cards):
+    """Parses `"Td9d6h"` or `"Td,9d,6h"` into a list of card ids."""
+    if not isinstance(cards, str):
+        raise ValueError(f"Invalid cards: {cards!r}")
+    cards = cards.replace(",", "").replace(" ", "")
+    if len(cards) % 2:
+        raise ValueError(f"Invalid cards: {cards!r}")
+    return [card_from_str(cards[i:i + 2]) for i in range(0, len(cards), 2)]
+
+
+def permute(card, perm):
+    return card - card % 4 + perm[card % 4]
+
+
+class SuitMap:
+    """A permutation of suits from the user's suits to the canonical ones."""
+
+    def __init__(self, perm):
+        self.perm = tuple(perm)
+        self.inverse = tuple(self.perm.index(suit) for suit in range(4))
+
+    def to_canonical(self, cards):
+        return "".join(card_to_str(permute(card, self.perm)) for card in cards_from_str(cards))
+
+    def to_user(self, cards):
+        return "".join(card_to_str(permute(card, self.inverse)) for card in cards_from_str(cards))
+
+    def hand_to_canonical(self, hand):
+        """Maps a hand into canonical suits, in the solver's high-card-first order (e.g. `AsTd`)."""
+        return hand_to_str(permute(card, self.perm) for card in cards_from_str(hand))
+
+    def hand_to_user(self, hand):
+        return hand_to_str(permute(card, self.inverse) for card in cards_from_str(hand))
+
+    def remap_index(self, index):
+        """Converts a canonical `hand -> position` mapping (e.g. `SpotResult.hero.index`) to user suits."""
+        return {self.hand_to_user(hand): i for hand, i in index.items()}
+
+    def remap_hands(self, hands):
+        """Converts a canonical `hand -> value` dictionary (e.g. `result["Hero"]`) to user suits."""
+        return {self.hand_to_user(hand): value for hand, value in hands.items()}
+
+
+def hand_to_str(cards):
+    return "".join(card_to_str(card) for card in sorted(cards, reverse=True))
+
+
+def board_key(flop, turn, river, perm):
+    return (
+        tuple(sorted(permute(card, perm) for card in flop)),
+        permute(turn, perm) if turn is not None else -1,
+        permute(river, perm) if river is not None else -1,
+    )
+
+
+def canonicalize_board(flop, turn=None, river=None):
+    """Returns the canonical `(flop, turn, river)` strings and the `SuitMap` leading to them.
+
+    `flop` is a string of three cards; `turn` and `river` are single cards or `None`. Among the 24
+    suit permutations, the one giving the smallest `(sorted flop, turn, river)` is canonical.
+    Raises `ValueError` unless the cards form a valid board.
+    """
+    flop = cards_from_str(flop)
+    if len(flop) != 3:
+        raise ValueError(f"The flop must have 3 cards, not {len(flop)}")
+    turn = card_from_str(turn) if turn else None
+    river = card_from_str(river) if river else None
+    if river is not None and turn is None:
+        raise ValueError("A river card needs a turn card")
+    board = flop + [card for card in (turn, river) if card is not None]
+    if len(set(board)) != len(board):
+        raise ValueError("The board has duplicate cards")
+
+    perm = min(SUIT_PERMUTATIONS, key=lambda perm: board_key(flop, turn, river, perm))
+    canonical_flop, canonical_turn, canonical_river = board_key(flop, turn, river, perm)
+
+    return (
+        hand_to_str(canonical_flop),
+        card_to_str(canonical_turn) if turn is not None else None,
+        card_to_str(canonical_river) if river is not None else None,
+    ), SuitMap(perm)
+
+
+def canonicalize_spot(data, hole_cards):
+    """Rewrites the board of solver inputs and the hero's hole cards into canonical suits.
+
+    Returns the new inputs, the canonical hole cards and the `SuitMap` to map results back.
+    Raises `ValueError` for an invalid board, or hole cards (if given) that aren't two cards off
+    the board.
+    """
+    (flop, turn, river), suit_map = canonicalize_board(
+        data["flop_cards"], data.get("turn_card"), data.get("river_card")
+    )
+    if hole_cards:
+        hole = cards_from_str(hole_cards)
+        if len(hole) != 2 or hole[0] == hole[1]:
+            raise ValueError(f"Invalid hole cards: {hole_cards!r}")
+        board = cards_from_str(flop + (turn or "") + (river or ""))
+        if any(permute(card, suit_map.perm) in board for card in hole):
+            raise ValueError("The hole cards are on the board")
+    data = dict(data)
+    data["flop_cards"] = flop
+    if turn is not None:
+        data["turn_card"] = turn
+    if river is not None:
+        data["river_card"] = river
+    return data, suit_map.hand_to_canonical(hole_cards), suit_map
+
+
+def canonical_flops():
+    """Returns the strategically distinct flops (1,755), high card first."""
+    flops = set()
+    for flop in combinations(range(52), 3):
+        flops.add(min(board_key(flop, None, None, perm)[0] for perm in SUIT_PERMUTATIONS))
+    return sorted(hand_to_str(flop) for flop in flops)
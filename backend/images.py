@@ -0,0 +1,128 @@
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageChops, UnidentifiedImageError
+
+FORMATS = {"PNG": "png", "JPEG": "jpeg"}
+
+
+class InvalidImage(Exception):
+    """Raised when an upload is not a PNG or JPEG image."""
+
+
+class PreparedImage:
+    def __init__(self, data, image_type, digest, size):
+        self.data = data
+        self.image_type = image_type
+        self.digest = digest
+        self.size = size
+
+    def base64(self):
+        return base64.b64encode(self.data).decode("utf-8")
+
+
+def prepare_image(stream, max_side=1280, max_bytes=400 * 1024):
+    """Decodes an uploaded screenshot in memory and shrinks it for the vision model.
+
+    Uniform borders are cropped and the image is downscaled so that its longer side is at most
+    `max_side`. It is re-encoded as the smaller of PNG and high-quality JPEG (or kept as uploaded if
+    nothing was cropped or downscaled and the upload is smaller), then as JPEG at lower qualities
+    and further downscaled until it fits in `max_bytes`.
+    """
+    raw = stream.read()
+    try:
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except Image.DecompressionBombError:
+        raise InvalidImage("Image has too many pixels") from None
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImage("Not a readable PNG or JPEG image") from None
+    if image.format not in FORMATS:
+        raise InvalidImage(f"Image format {image.format} not allowed")
+
+    original = (raw, FORMATS[image.format], image.size)
+    image = crop_borders(image.convert("RGB"))
+    digest = pixel_digest(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    candidates = [(encode(image, "PNG"), "png"), (encode(image, "JPEG", quality=85), "jpeg")]
+    if image.size == original[2]:
+        candidates.append(original[:2])
+    data, image_type = min(candidates, key=lambda candidate: len(candidate[0]))
+    while len(data) > max_bytes:
+        image_type = "jpeg"
+        for quality in (70, 55, 40):
+            data = encode(image, "JPEG", quality=quality)
+            if len(data) <= max_bytes:
+                break
+        else:
+            if max(image.size) <= 256:
+                break  # keep the smallest readable version
+            image = image.resize((image.width * 3 // 4, image.height * 3 // 4), Image.LANCZOS)
+    return PreparedImage(data, image_type, digest, image.size)
+
+
+def crop_borders(image, tolerance=24):
+    """Crops the borders of about the same color as the top-left pixel (up to `tolerance` per
+    channel, so that JPEG noise does not count as content)."""
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    difference = ImageChops.difference(image, background).convert("L")
+    bbox = difference.point(lambda v: 255 if v > tolerance else 0).getbbox()
+    return image.crop(bbox) if bbox else image
+
+
+def encode(image, image_format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, optimize=True, **params)
+    return buffer.getvalue()
+
+
+def pixel_digest(image):
+    """SHA-256 of the size and pixels of `image` at full resolution: the same screen uploaded again
+    (even re-encoded losslessly or with other metadata) matches, while any changed pixel, such as
+    a different pot or stack digit, does not."""
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """LRU cache of model outputs by the exact pixels of the screenshot (see `pixel_digest`).
+
+    A lookup matches an entry of the same `kind` (e.g. the prompt used) and digest. Perceptual
+    matching is not safe here: two screenshots of the same table that differ only in a few digits
+    of the pot or a stack look alike at any thumbnail size, yet must be read again.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (kind, digest) -> result
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, kind, image):
+        key = (kind, image.digest)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, kind, image, result):
+        key = (kind, image.digest)
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,137 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when the job queue has reached its maximum depth."""
+
+
+class Job:
+    def __init__(self, payload, cancel_token):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.cancel_token = cancel_token
+        self.state = "queued"
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded worker pool running `handler(payload, cancel_token)` in background threads.
+
+    At most `max_queued` jobs wait for a worker; further submissions raise `QueueFull`.
+    Finished jobs are kept for `retention` seconds so their result can be fetched. A job raising
+    one of the `rejected` exception types ends in the "rejected" state instead of "failed".
+    """
+
+    def __init__(self, handler, max_workers, max_queued, token_factory, retention=600, rejected=()):
+        self.handler = handler
+        self.token_factory = token_factory
+        self.rejected = rejected
+        self.retention = retention
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=max_queued)
+        self.workers = [
+            threading.Thread(target=self._work, name=f"solve-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, payload):
+        job = Job(payload, self.token_factory())
+        with self.lock:
+            self._purge()
+            try:
+                self.pending.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"{self.pending.maxsize} jobs are already queued")
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job. Returns False if the job is unknown or finished."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.done.is_set():
+                return False
+            job.cancel_token.cancel()
+            if job.state == "queued":
+                self._finish(job, "cancelled")
+        return True
+
+    def stats(self):
+        with self.lock:
+            states = [job.state for job in self.jobs.values()]
+        return {
+            "workers": len(self.workers),
+            "queue_depth": self.pending.qsize(),
+            "max_queue_depth": self.pending.maxsize,
+            **{state: states.count(state) for state in ("queued", "running", "done", "failed", "rejected", "cancelled")},
+        }
+
+    def _work(self):
+        while True:
+            job = self.pending.get()
+            with self.lock:
+                if job.done.is_set():
+                    continue
+                job.state = "running"
+                job.started_at = time.time()
+            try:
+                result = self.handler(job.payload, job.cancel_token)
+            # BaseException: a Rust panic in the solver raises PyO3's PanicException, which would
+            # otherwise end this worker thread for good
+            except BaseException as e:
+                with self.lock:
+                    if job.cancel_token.is_cancelled():
+                        self._finish(job, "cancelled")
+                    elif isinstance(e, self.rejected):
+                        self._finish(job, "rejected", error=str(e))
+                    else:
+                        logger.exception("Job %s failed", job.id)
+                        self._finish(job, "failed", error=str(e) or type(e).__name__)
+            else:
+                with self.lock:
+                    self._finish(job, "done", result=result)
+
+    def _finish(self, job, state, result=None, error=None):
+        """Ends `job`; called with `self.lock` held."""
+        job.result = result
+        job.error = error
+        job.state = state
+        job.finished_at = time.time()
+        job.done.set()
+
+    def _purge(self):
+        deadline = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at is not None and job.finished_at < deadline
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
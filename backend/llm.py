@@ -0,0 +1,242 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class LLMError(Exception):
+    """Raised when the LLM backend fails or returns no usable response."""
+
+
+class LLMTimeout(LLMError):
+    """Raised when an LLM call does not finish within its timeout."""
+
+
+class Prompts:
+    """Prompt templates read once from the `*.txt` files of `directory`, by file stem."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.templates = {path.stem: path.read_text() for path in sorted(self.directory.glob("*.txt"))}
+
+    def __getitem__(self, name):
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise KeyError(f"No prompt {name!r} in {self.directory}") from None
+
+    def format(self, name, **fields):
+        return self[name].format(**fields)
+
+
+def text_message(text):
+    return {"role": "user", "content": text}
+
+
+def image_message(text, image_b64, image_type):
+    """User message with a prompt and a base64-encoded image."""
+    return {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": text},
+            {"type": "image_url", "image_url": {"url": f"data:image/{image_type};base64,{image_b64}"}},
+        ],
+    }
+
+
+class OpenAIBackend:
+    """Chat completions through one `AsyncOpenAI` client, so HTTP connections are kept alive and
+    reused across calls (at most `max_connections` at a time)."""
+
+    def __init__(self, api_key=None, base_url=None, max_connections=16):
+        import httpx
+        import openai
+
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=1,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            ),
+        )
+
+    async def complete(self, model, messages, timeout, **params):
+        response = await self.client.chat.completions.create(
+            model=model, messages=messages, timeout=timeout, **params
+        )
+        return response.choices[0].message.content
+
+
+class StubBackend:
+    """Offline backend: `respond(model, messages)` returns the completion text.
+
+    By default every call returns an empty JSON object in a ```json block, which the routes parse
+    like a real response.
+    """
+
+    def __init__(self, respond=None, delay=0.0):
+        self.respond = respond or (lambda model, messages: "```json\n{}\n```")
+        self.delay = delay
+        self.calls = 0
+
+    async def complete(self, model, messages, timeout, **params):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.respond(model, messages)
+
+
+class ResponseCache:
+    """Completions by request hash, expiring after `ttl` seconds and bounded to `max_entries`
+    (least recently used first)."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires at, text)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model, messages, params):
+        request = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, text):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, text)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class LLMGateway:
+    """Single entry point for LLM calls.
+
+    Calls run on an event loop in a background thread, at most `max_concurrency` at a time, each
+    bounded by `timeout` seconds including the wait for a free slot. Responses are cached by a hash
+    of the model, messages (prompt and payload) and parameters; failures are not, so the next call
+    tries again. `submit` returns a `concurrent.futures.Future`; `complete` blocks only the calling
+    thread, and at most `timeout` seconds.
+    """
+
+    def __init__(self, backend, max_concurrency=8, timeout=60.0, cache_entries=256, cache_ttl=3600):
+        self.backend = backend
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_entries, cache_ttl)
+        self.calls = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-gateway", daemon=True)
+        self.thread.start()
+        self.semaphore = asyncio.run_coroutine_threadsafe(
+            self._make_semaphore(max_concurrency), self.loop
+        ).result()
+
+    @staticmethod
+    async def _make_semaphore(max_concurrency):
+        # created on the gateway loop, which it must belong to
+        return asyncio.Semaphore(max_concurrency)
+
+    async def acomplete(self, model, messages, timeout=None, **params):
+        """Returns the completion text; must be awaited on the gateway loop."""
+        key = self.cache.key(model, messages, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        timeout = self.timeout if timeout is None else timeout
+        call = asyncio.ensure_future(self._call(model, messages, timeout, params))
+        try:
+            done, _ = await asyncio.wait({call}, timeout=timeout)
+        finally:
+            if not call.done():
+                # timed out or cancelled: the call must not outlive it on the loop
+                call.cancel()
+                await asyncio.gather(call, return_exceptions=True)
+        if not done:
+            self.failures += 1
+            raise LLMTimeout(f"{model} did not answer within {timeout}s")
+        text = call.result()
+
+        if not text:
+            raise LLMError(f"{model} returned an empty response")
+        self.cache.put(key, text)
+        return text
+
+    async def _call(self, model, messages, timeout, params):
+        async with self.semaphore:
+            self.calls += 1
+            self.in_flight += 1
+            try:
+                return await self.backend.complete(model, messages, timeout, **params)
+            except Exception as e:
+                self.failures += 1
+                raise LLMError(f"{model} call failed: {e}") from e
+            finally:
+                self.in_flight -= 1
+
+    def submit(self, model, messages, timeout=None, **params):
+        return asyncio.run_coroutine_threadsafe(
+            self.acomplete(model, messages, timeout, **params), self.loop
+        )
+
+    def complete(self, model, messages, timeout=None, **params):
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(model, messages, timeout, **params)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # the call timed out on the loop at the same moment, unless the loop is stuck
+            future.cancel()
+            raise LLMTimeout(f"{model} did not answer within {timeout}s") from None
+
+    def close(self):
+        """Cancels the calls in progress, then stops the gateway loop and joins its thread."""
+        if self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._cancel_calls(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    @staticmethod
+    async def _cancel_calls():
+        calls = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "cache_entries": len(self.cache.entries),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
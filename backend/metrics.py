@@ -0,0 +1,194 @@
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets, in seconds (same as the solver binding)
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Trace of the request being handled in this thread (or job)
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds, as exposed by Prometheus."""
+
+    def __init__(self, bounds=SECONDS_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # per bucket, the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """Same format as the histograms of `solver.solver_metrics()`."""
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class Trace:
+    """Stages of one request or job, logged as one JSON line when it ends."""
+
+    def __init__(self, event, fields):
+        self.event = event
+        self.fields = fields
+        self.spans = {}
+        self.start = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+
+class Metrics:
+    """Latency histograms of the backend stages and structured logs of each request.
+
+    `span(stage)` times a block into the histogram of the stage and into the trace of the current
+    request; `trace(event)` (or `begin`/`end`) delimits a request and logs its stages as JSON to
+    `logger` when it ends. `render` writes the histograms, together with the solver histograms and
+    any other counters, in the Prometheus text format.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("gto.trace")
+        self.histograms = {}  # (name, sorted labels) -> Histogram
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_seconds", elapsed, stage=stage, **labels)
+            trace = current_trace.get()
+            if trace is not None:
+                trace.add(stage, elapsed)
+
+    def add_solver_spans(self, stage_seconds):
+        """Adds the stages timed by the solver binding to the current trace (their histograms are
+        kept by the binding)."""
+        trace = current_trace.get()
+        if trace is not None:
+            for stage, seconds in stage_seconds.items():
+                trace.add(f"solver.{stage}", seconds)
+
+    def begin(self, event, **fields):
+        trace = Trace(event, fields)
+        trace.token = current_trace.set(trace)
+        return trace
+
+    def end(self, trace, **fields):
+        current_trace.reset(trace.token)
+        elapsed = time.perf_counter() - trace.start
+        self.observe("request_seconds", elapsed, event=trace.event, **trace.fields)
+        self.logger.info(json.dumps({
+            "event": trace.event,
+            **trace.fields,
+            **fields,
+            "seconds": round(elapsed, 6),
+            "spans": {stage: round(seconds, 6) for stage, seconds in trace.spans.items()},
+        }))
+
+    @contextmanager
+    def trace(self, event, **fields):
+        trace = self.begin(event, **fields)
+        outcome = "ok"
+        try:
+            yield trace
+        except BaseException as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            self.end(trace, outcome=outcome)
+
+    def render(self, solver_metrics=None, counters=(), gauges=()):
+        """Returns the metrics in the Prometheus text format.
+
+        `solver_metrics` is the dictionary returned by `solver.solver_metrics()`; `counters` and
+        `gauges` are `(name, help, [(labels, value), ...])` families.
+        """
+        with self.lock:
+            histograms = [(key, histogram.snapshot()) for key, histogram in sorted(self.histograms.items())]
+        families = {}
+        for (name, labels), snapshot in histograms:
+            families.setdefault(name, []).append((dict(labels), snapshot))
+
+        lines = []
+        write_histogram(lines, "gto_stage_seconds", "Time spent in each backend stage",
+                        families.get("stage_seconds", []))
+        write_histogram(lines, "gto_request_seconds", "Time spent handling each request or job",
+                        families.get("request_seconds", []))
+        if solver_metrics is not None:
+            write_histogram(lines, "gto_solver_stage_seconds", "Time spent in each solver stage",
+                            [({"stage": stage}, snapshot)
+                             for stage, snapshot in sorted(solver_metrics["stage_seconds"].items())])
+            write_histogram(lines, "gto_solver_iterations", "Iterations of finished solves",
+                            [({}, solver_metrics["iterations"])])
+            write_histogram(lines, "gto_solver_exploitability_pct",
+                            "Final exploitability of finished solves, in % of the starting pot",
+                            [({}, solver_metrics["exploitability_pct"])])
+            write_histogram(lines, "gto_solver_tree_nodes", "Game tree nodes of finished solves",
+                            [({}, solver_metrics["tree_nodes"])])
+            write_histogram(lines, "gto_solver_allocated_bytes", "Game memory of finished solves",
+                            [({}, solver_metrics["allocated_bytes"])])
+            write_samples(lines, "gto_solver_solves_total", "counter", "Finished solves by stop reason",
+                          [({"stop_reason": reason}, count)
+                           for reason, count in sorted(solver_metrics["solves"].items())])
+        for name, help_text, samples in counters:
+            write_samples(lines, name, "counter", help_text, samples)
+        for name, help_text, samples in gauges:
+            write_samples(lines, name, "gauge", help_text, samples)
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def write_histogram(lines, name, help_text, series):
+    if not series:
+        return
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, snapshot in series:
+        for bound, count in snapshot["buckets"]:
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(snapshot['sum'])}")
+        lines.append(f"{name}_count{format_labels(labels)} {snapshot['count']}")
+
+
+def write_samples(lines, name, kind, help_text, samples):
+    if not samples:
+        return
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
@@ -0,0 +1,181 @@
+"""Offline batch solver that builds a library of precomputed flop solutions.
+
+Enumerates preflop lines of the range tree x canonical flops x (effective stack, pot) configs,
+solves them in a process pool and saves every game (zstd) under its cache key. A backend started
+with SOLVE_LIBRARY_DIR pointing at the output directory serves these spots without solving.
+
+Spots are solved to the target exploitability of the tier without its deadline (or with the
+build-only --deadline); a spot that stops before the target is recorded as failed, not saved, and
+solved again by the next run. Every solve already uses all cores, so more than one worker only
+pays off for small games, at the cost of one game in memory per worker.
+
+Every finished spot is appended to <out>/manifest.jsonl with its solve time and memory usage;
+running the same command again skips the spots already in the manifest. With --solution-street,
+every spot is also saved as a solution file (<digest>.sol) whose nodes down to that street can be
+read one at a time with `open_solution`.
+
+    python batch_solve.py --out ../solve_library --configs 900:200,800:300 --flops 200
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import main as solver
+
+HERE = Path(__file__).resolve().parent
+
+spec = importlib.util.spec_from_file_location("canonical", HERE.parent / "canonical.py")
+canonical = importlib.util.module_from_spec(spec)
+sys.modules["canonical"] = canonical
+spec.loader.exec_module(canonical)
+
+
+def spot_id(line, flop, stack, pot, tier):
+    return f"{line}|{flop}|{stack}|{pot}|{tier}"
+
+
+def spot_inputs(line, flop, stack, pot, tier):
+    return {
+        "effective_stack": stack,
+        "pot_before_flop": pot,
+        "preflop_action": line,
+        "flop_cards": flop,
+        "flop_bet": None,
+        "turn_card": None,
+        "turn_bet": None,
+        "river_card": None,
+        "river_bet": None,
+        "tier": tier,
+    }
+
+
+def parse_configs(configs):
+    """Parses `"900:200,800:300"` into [(900, 200), (800, 300)]."""
+    return [tuple(int(v) for v in config.split(":")) for config in configs.split(",")]
+
+
+def sample_flops(count):
+    flops = canonical.canonical_flops()
+    if not count or count >= len(flops):
+        return flops
+    # spread the sample over the whole (sorted) list rather than taking the lowest flops
+    step = len(flops) / count
+    return [flops[int(i * step)] for i in range(count)]
+
+
+def read_manifest(path):
+    """Returns the spot ids solved successfully according to the manifest."""
+    done = set()
+    if path.exists():
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written last line
+                if "error" not in entry:
+                    done.add(entry["spot"])
+    return done
+
+
+def init_worker(ranges, index, threads):
+    # rayon reads this when its thread pool is created, i.e. on the first solve
+    os.environ["RAYON_NUM_THREADS"] = str(threads)
+    solver.load_range_repository(ranges, index)
+
+
+def solve_one(spot, inputs, out, solution_street, deadline):
+    try:
+        result = solver.solve_and_save(inputs, out, solution_street, deadline)
+    except Exception as e:
+        return {"spot": spot, "error": str(e)}
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException as e:  # the PanicException of a solver panic fails the spot, not the build
+        return {"spot": spot, "error": f"{type(e).__name__}: {e}"}
+    return {"spot": spot, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="library directory")
+    parser.add_argument("--ranges", default=os.getenv("GTO_RANGES_DIR", str(HERE / "GTOWizard_Scraped_Ranges" / "Cash6m50z100bbGeneral")))
+    parser.add_argument("--index", default=os.getenv("GTO_RANGES_INDEX", str(HERE / "ranges.idx")))
+    parser.add_argument("--lines", help="preflop lines separated by ';', e.g. 'BTN,BB;CO,BTN' (default: all lines of the range tree)")
+    parser.add_argument("--max-actions", type=int, default=4, help="longest preflop line to enumerate")
+    parser.add_argument("--flops", type=int, default=0, help="number of canonical flops (default: all 1,755)")
+    parser.add_argument("--configs", default="900:200", help="effective_stack:pot_before_flop pairs")
+    parser.add_argument("--tier", default="standard", help="must match the tier of the requests to serve")
+    parser.add_argument("--deadline", type=float, help="seconds per solve (default: none)")
+    parser.add_argument("--workers", type=int, default=1, help="spots solved at once")
+    parser.add_argument("--solution-street", choices=("flop", "turn", "river"),
+                        help="also save a solution file with the nodes down to this street")
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    manifest = out / "manifest.jsonl"
+
+    solver.load_range_repository(args.ranges, args.index)
+    lines = args.lines.split(";") if args.lines else solver.preflop_lines(args.max_actions)
+    flops = sample_flops(args.flops)
+    configs = parse_configs(args.configs)
+
+    done = read_manifest(manifest)
+    todo = [
+        (spot_id(line, flop, stack, pot, args.tier), spot_inputs(line, flop, stack, pot, args.tier))
+        for line in lines
+        for stack, pot in configs
+        for flop in flops
+    ]
+    todo = [(spot, inputs) for spot, inputs in todo if spot not in done]
+    print(f"{len(lines)} lines x {len(flops)} flops x {len(configs)} configs: "
+          f"{len(todo)} spots to solve, {len(done)} already done")
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    started = time.time()
+    solved = failed = 0
+    solve_seconds = 0.0
+    peak_memory = 0
+
+    with open(manifest, "a") as f, ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=init_worker,
+        initargs=(args.ranges, args.index, threads),
+    ) as pool:
+        futures = [pool.submit(solve_one, spot, inputs, str(out), args.solution_street, args.deadline) for spot, inputs in todo]
+        for future in as_completed(futures):
+            entry = future.result()
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+
+            if "error" in entry:
+                failed += 1
+                print(f"FAILED {entry['spot']}: {entry['error']}")
+                continue
+
+            solved += 1
+            solve_seconds += entry["solve_seconds"]
+            peak_memory = max(peak_memory, entry["memory_bytes"])
+            print(f"[{solved + failed}/{len(todo)}] {entry['spot']}: "
+                  f"{entry['solve_seconds']:.1f}s, {entry['iterations']} iterations, "
+                  f"exploitability {entry['exploitability']:.3f}, "
+                  f"memory {entry['memory_bytes'] / 1024 ** 2:.0f} MB "
+                  f"({entry['memory_bytes_compressed'] / 1024 ** 2:.0f} MB compressed), "
+                  f"file {entry['file_bytes'] / 1024 ** 2:.1f} MB"
+                  + (f", solution {entry['solution_bytes'] / 1024 ** 2:.1f} MB"
+                     if entry.get("solution_bytes") is not None else ""))
+
+    print(f"Solved {solved} spots ({failed} failed) in {time.time() - started:.0f}s; "
+          f"mean solve time {solve_seconds / max(solved, 1):.1f}s, "
+          f"peak game memory {peak_memory / 1024 ** 2:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,67 @@
 import python_lib
 
+CancelToken = python_lib.CancelToken
+SolveCancelled = python_lib.SolveCancelled
+SolveRejected = python_lib.SolveRejected
+
+
+def configure_cache(directory, disk_budget_bytes, memory_budget_bytes, library=None):
+    # Solved spots are cached in memory and, if `directory` is set, on disk (zstd);
+    # `library` is a read-only directory of precomputed solutions (see batch_solve.py)
+    python_lib.configure_cache(directory, disk_budget_bytes, memory_budget_bytes, library)
+
+
+def cache_stats():
+    return python_lib.cache_stats()
+
+
+def configure_memory_budget(budget_bytes, max_wait_seconds=30.0):
+    # Running solves reserve their game memory from this budget: a game that doesn't fit uncompressed
+    # is compressed (16-bit), otherwise it waits up to `max_wait_seconds` and raises SolveRejected
+    python_lib.configure_memory_budget(budget_bytes, max_wait_seconds)
+
+
+def memory_status():
+    return python_lib.memory_status()
+
+
+def configure_bunching(directory=None, workers=1, memory_entries=2):
+    # Bunching-effect tables (card removal of the folded players) are computed by `workers`
+    # background threads and saved in `directory`; spots requested with "bunching" are solved
+    # without it until their table is ready
+    python_lib.configure_bunching(directory, workers, memory_entries)
+
+
+def bunching_status():
+    return python_lib.bunching_status()
+
+
+def load_range_repository(root, index_path=None, rebuild=False):
+    # Parses the scraped preflop range tree once (or memory-maps `index_path` if it exists)
+    return python_lib.load_range_repository(root, index_path, rebuild)
+
+
+def preflop_lines(max_actions=4):
+    # Preflop action sequences (e.g. "BTN,BB") the range repository has ranges for
+    return python_lib.preflop_lines(max_actions)
+
+
+def solve_and_save(inputs, library, solution_street=None, deadline_seconds=None):
+    # Solves without the cache and writes the game into `library` under its cache key; with
+    # `solution_street` ("flop", "turn" or "river"), also a solution file for `open_solution`.
+    # The solve ignores the tier's deadline (or stops after `deadline_seconds`) and raises
+    # RuntimeError instead of saving if it stops before the tier's target exploitability
+    return python_lib.solve_and_save(inputs, library, solution_street, deadline_seconds)
+
+
+def open_solution(inputs):
+    # Memory-mapped solution file of the spot in the library, or None: solution.node([...]) decodes
+    # only the requested node (same histories as GameSession), without loading the game
+    return python_lib.open_solution(inputs)
+
 # Define the inputs
 
-def process(inputs):
+def process(inputs, cancel=None):
 
     # inputs = {
     #     "effective_stack": 900,
@@ -14,10 +73,15 @@ def process(inputs):
     #     "turn_bet": 200,  # Example value
     #     "river_card": "7s",
     #     "river_bet": 300,  # Example value
+    #     "tier": "standard",  # optional: fast / standard / precise
+    #     "bunching": True,  # optional: model the card removal of the folded players
+    #     "subgame": True,  # optional: solve only the current street, from the actual pot and
+    #                       # the ranges narrowed by the solution of the previous street
     # }
 
     # Call the solver function
-    result = python_lib.solve_poker_spot(inputs)
+    # The GIL is released during the solve; `cancel` is an optional CancelToken
+    result = python_lib.solve_poker_spot(inputs, cancel)
 
     # Access the results
     hero_ranges = result["Hero"]
@@ -31,3 +95,49 @@ def process(inputs):
 
     # 
     return result
+
+
+
+def process_columnar(inputs, cancel=None):
+    # Same solve as `process`, but per-hand values come back as f32 buffers
+    # (use numpy.asarray / memoryview on result.hero.equity, result.hero.strategy, ...)
+    return python_lib.solve_poker_spot_columnar(inputs, cancel)
+
+
+def solve_poker_spots(inputs_list, max_parallel=None, memory_budget=None, cancel=None):
+    # Many spots in one call (e.g. a hand history), scheduled inside the binding: identical spots
+    # are solved once, ranges and trees are shared, and a large game gets every thread while small
+    # ones are solved side by side. Iterate over (index, SpotResult or exception) as they finish
+    return python_lib.solve_poker_spots(inputs_list, max_parallel, memory_budget, cancel)
+
+
+def range_equity(inputs):
+    # Equity of every hand of both ranges (and the equity buckets) on the board, from the preflop
+    # ranges and every runout, without solving: milliseconds instead of a solve
+    return python_lib.range_equity(inputs)
+
+
+def start_solve(inputs, cancel=None):
+    # Step-by-step solve: call task.step() until it returns True; task.snapshot() shows the
+    # current root strategy in between and task.result() the columnar result at the end
+    return python_lib.SolveTask(inputs, cancel)
+
+
+def open_session(inputs, cancel=None):
+    # Solved game kept for navigation: session.play(i) / apply_history([...]) and then
+    # strategy(), equity(player), expected_values(player) at the new node, without re-solving;
+    # session.what_if(scenarios) re-solves with strategies locked at some nodes, starting from the
+    # session's solution, and returns how the results at the current node change
+    return python_lib.GameSession(inputs, cancel)
+
+
+def solver_metrics():
+    # Latency histograms of the solver stages (range lookup, tree build, memory admission, solve,
+    # extraction, marshalling) and of finished solves (iterations, exploitability, tree nodes, memory)
+    return python_lib.solver_metrics()
+
+
+def profile_solve(inputs):
+    # Cold solve (no cache, no warm start) timed stage by stage: range lookup, tree build,
+    # memory allocation, iterations, root extraction and Python marshalling (see backend/bench.py)
+    return python_lib.profile_solve(inputs)
@@ -0,0 +1,446 @@
+// Batches of solves scheduled inside the binding.
+//
+// Analyzing a hand history spot by spot from Python pays the round trip, the range lookup and the
+// tree build of every spot, and solves started from several Python threads compete for the rayon
+// threads. `solve_poker_spots` takes the whole list instead. Identical spots are solved once, and
+// the spots share their parsed ranges and action trees. The threads are split by tree size: a
+// large game is solved alone with every thread (the solver parallelizes within the tree), while
+// small games, which gain little from that, are solved side by side on one thread each.
+
+use crate::cache::{self, CacheStatus, SharedGame, SolveStats, SpotKey};
+use crate::columnar::build_columnar_result;
+use crate::memory::Reservation;
+use crate::metrics::{self, Spans};
+use crate::ranges::RangeRepository;
+use crate::{
+    game_ranges, game_with_tree, preflop_ranges, reserve_memory, run_solver, set_bunching,
+    tree_config, warm_start, CancelToken, SolveError, SolvedSpot, SpotRequest,
+};
+use postflop_solver::*;
+use pyo3::exceptions::PyRuntimeError;
+use pyo3::prelude::*;
+use pyo3::types::PyDict;
+use std::any::Any;
+use std::collections::{BTreeSet, HashMap, VecDeque};
+use std::panic::{self, AssertUnwindSafe};
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::mpsc::{self, Receiver, Sender};
+use std::sync::{Arc, Condvar, Mutex, MutexGuard, RwLock};
+use std::time::{Duration, Instant};
+
+/// Games whose storage takes at least this many bytes are solved with every thread.
+const PARALLEL_TREE_BYTES: u64 = 128 << 20;
+
+const POLL_INTERVAL: Duration = Duration::from_millis(100);
+
+/// Spots of a batch with the same key, solved once.
+struct Group {
+    /// Index of each spot in the batch, with its request.
+    requests: Vec<(usize, SpotRequest)>,
+}
+
+/// A solved (or failed) group, sent back to the iterator.
+struct Finished {
+    requests: Vec<(usize, SpotRequest)>,
+    result: Result<(SharedGame, SolveStats, CacheStatus), SolveError>,
+}
+
+/// Ranges and action trees shared by the spots of a batch.
+#[derive(Default)]
+struct Setup {
+    /// Preflop ranges of OOP and IP by ranges path and positions.
+    ranges: Mutex<HashMap<(String, String, String), [Range; 2]>>,
+    /// Action trees by street, pot, stack and bet sizes (see `tree_config`).
+    trees: Mutex<HashMap<(bool, bool, i32, i32, (String, String)), ActionTree>>,
+}
+
+impl Setup {
+    fn ranges(
+        &self,
+        repository: &RangeRepository,
+        key: &SpotKey,
+        cancel: &AtomicBool,
+    ) -> Result<[Range; 2], SolveError> {
+        // the ranges of a subgame come from the solution of its upstream spot
+        if key.subgame.is_some() {
+            return game_ranges(repository, key, cancel);
+        }
+
+        let id = (
+            key.ranges_path.clone(),
+            key.oop_position.clone(),
+            key.ip_position.clone(),
+        );
+        if let Some(&ranges) = lock(&self.ranges).get(&id) {
+            return Ok(ranges);
+        }
+        let ranges = preflop_ranges(repository, key)?;
+        lock(&self.ranges).insert(id, ranges);
+        Ok(ranges)
+    }
+
+    fn game(&self, ranges: [Range; 2], key: &SpotKey) -> Result<PostFlopGame, SolveError> {
+        let id = (
+            key.turn != NOT_DEALT,
+            key.river != NOT_DEALT,
+            key.starting_pot,
+            key.effective_stack,
+            key.bet_sizes.clone(),
+        );
+        let cached = lock(&self.trees).get(&id).cloned();
+        let action_tree = match cached {
+            Some(action_tree) => action_tree,
+            None => {
+                let action_tree =
+                    ActionTree::new(tree_config(key)?).map_err(SolveError::Invalid)?;
+                lock(&self.trees).insert(id, action_tree.clone());
+                action_tree
+            }
+        };
+        game_with_tree(ranges, key, action_tree)
+    }
+}
+
+fn lock<T>(mutex: &Mutex<T>) -> MutexGuard<T> {
+    mutex.lock().unwrap_or_else(|e| e.into_inner())
+}
+
+/// Memory of the games of a batch being solved, on top of the solver memory budget.
+///
+/// A game is admitted if it fits in what is left of the budget, or if no other game of the batch
+/// is being solved.
+struct BatchMemory {
+    budget: u64,
+    reserved: Mutex<u64>,
+    released: Condvar,
+}
+
+/// Memory reserved by a game of a batch; released on drop.
+struct BatchReservation<'a> {
+    memory: &'a BatchMemory,
+    bytes: u64,
+}
+
+impl BatchMemory {
+    fn reserve(&self, bytes: u64, cancel: &AtomicBool) -> Result<BatchReservation, SolveError> {
+        let mut reserved = lock(&self.reserved);
+        while *reserved > 0 && *reserved + bytes > self.budget {
+            if cancel.load(Ordering::Relaxed) {
+                return Err(SolveError::Cancelled);
+            }
+            reserved = self
+                .released
+                .wait_timeout(reserved, POLL_INTERVAL)
+                .unwrap_or_else(|e| e.into_inner())
+                .0;
+        }
+        *reserved += bytes;
+        Ok(BatchReservation {
+            memory: self,
+            bytes,
+        })
+    }
+}
+
+impl Drop for BatchReservation<'_> {
+    fn drop(&mut self) {
+        *lock(&self.memory.reserved) -= self.bytes;
+        self.memory.released.notify_all();
+    }
+}
+
+/// State shared by the workers of a batch.
+struct Batch {
+    repository: Arc<RangeRepository>,
+    setup: Setup,
+    memory: BatchMemory,
+    /// Held shared by the small games being solved and exclusively by a large one.
+    threads: RwLock<()>,
+    queue: Mutex<VecDeque<Group>>,
+    cancel: Arc<AtomicBool>,
+}
+
+/// Solves the groups of the queue until it is empty (or the results are no longer read).
+///
+/// With `single_threaded`, small games are solved on a thread pool of their own with one thread.
+fn work(batch: &Batch, sender: &Sender<Finished>, single_threaded: bool) {
+    let pool = if single_threaded {
+        rayon::ThreadPoolBuilder::new().num_threads(1).build().ok()
+    } else {
+        None
+    };
+
+    loop {
+        let Some(group) = lock(&batch.queue).pop_front() else {
+            return;
+        };
+        let (_, request) = &group.requests[0];
+        let (key, spans) = (&request.key, &request.spans);
+
+        let result = if batch.cancel.load(Ordering::Relaxed) {
+            Err(SolveError::Cancelled)
+        } else {
+            let start = Instant::now();
+            // a panic fails the spots of the group, not the thread and the groups left to it
+            let result = panic::catch_unwind(AssertUnwindSafe(|| {
+                cache::get_or_solve(key, || solve(batch, key, spans, pool.as_ref()))
+            }))
+            .unwrap_or_else(|payload| Err(SolveError::Panicked(panic_message(payload))));
+            if let Ok((_, _, status)) = &result {
+                if *status != CacheStatus::Miss {
+                    spans.record("cache_lookup", start.elapsed());
+                }
+            }
+            result
+        };
+
+        let finished = Finished {
+            requests: group.requests,
+            result,
+        };
+        if sender.send(finished).is_err() {
+            return;
+        }
+    }
+}
+
+/// Returns the message of a caught panic.
+pub(crate) fn panic_message(payload: Box<dyn Any + Send>) -> String {
+    let message = match payload.downcast::<String>() {
+        Ok(message) => *message,
+        Err(payload) => match payload.downcast::<&'static str>() {
+            Ok(message) => message.to_string(),
+            Err(_) => "unknown panic".to_string(),
+        },
+    };
+    format!("Solver panicked: {message}")
+}
+
+/// Builds and solves the game of `key` like `solve_spot`, with the ranges and action tree shared
+/// by the batch, on one thread of `pool` if the game is small.
+///
+/// The memory reservations of the game are returned with it, to be held until the game is handed
+/// over to the cache.
+fn solve<'a>(
+    batch: &'a Batch,
+    key: &SpotKey,
+    spans: &Spans,
+    pool: Option<&rayon::ThreadPool>,
+) -> Result<
+    (
+        PostFlopGame,
+        SolveStats,
+        (Reservation, BatchReservation<'a>),
+    ),
+    SolveError,
+> {
+    let cancel = &*batch.cancel;
+    let stage = if key.subgame.is_some() {
+        "subgame_ranges"
+    } else {
+        "range_lookup"
+    };
+    let ranges = spans.time(stage, || batch.setup.ranges(&batch.repository, key, cancel))?;
+    let mut game = spans.time("tree_build", || batch.setup.game(ranges, key))?;
+    if key.bunching.is_some() {
+        spans.time("bunching_load", || set_bunching(&mut game, key))?;
+    }
+
+    let (uncompressed, _) = game.memory_usage();
+    let pool = pool.filter(|_| uncompressed < PARALLEL_TREE_BYTES);
+    let batch_reservation = spans.time("batch_admission", || {
+        batch.memory.reserve(uncompressed, cancel)
+    })?;
+    // small games share the threads, a large one waits to have them all
+    let (_shared, _exclusive);
+    if pool.is_some() {
+        _shared = batch.threads.read().unwrap_or_else(|e| e.into_inner());
+    } else {
+        _exclusive = batch.threads.write().unwrap_or_else(|e| e.into_inner());
+    }
+
+    let reservation = spans.time("memory_admission", || reserve_memory(&game, key, cancel))?;
+    spans.time("allocate_memory", || {
+        game.allocate_memory(reservation.compressed())
+    });
+    let cold_iterations = spans.time("warm_start", || warm_start(&mut game, key));
+    let stats = spans.time("solve", || {
+        let solve = |game: &mut PostFlopGame| {
+            run_solver(
+                game,
+                key.max_num_iterations,
+                key.target_exploitability,
+                key.deadline,
+                cold_iterations,
+                cancel,
+            )
+        };
+        match pool {
+            Some(pool) => pool.install(|| solve(&mut game)),
+            None => solve(&mut game),
+        }
+    })?;
+    metrics::record_solve(&game, key, &stats);
+
+    Ok((game, stats, (reservation, batch_reservation)))
+}
+
+/// Results of `solve_poker_spots`, in the order the spots finish.
+#[pyclass]
+pub struct SpotBatch {
+    receiver: Mutex<Receiver<Finished>>,
+    /// Results to return before waiting for the next group.
+    ready: VecDeque<(usize, Result<SolvedSpot, PyErr>)>,
+    /// Indices of the spots sent to the workers and not finished yet.
+    pending: BTreeSet<usize>,
+    cancel: Arc<AtomicBool>,
+}
+
+#[pymethods]
+impl SpotBatch {
+    fn __iter__(slf: PyRef<Self>) -> PyRef<Self> {
+        slf
+    }
+
+    /// Waits for the next spot to finish and returns its index in the inputs and its `SpotResult`,
+    /// or the exception it failed with (`SolveCancelled`, `SolveRejected`, ...). Every index is
+    /// returned once.
+    fn __next__(&mut self, py: Python) -> PyResult<Option<(usize, PyObject)>> {
+        loop {
+            if let Some((index, result)) = self.ready.pop_front() {
+                let value = match result.and_then(|solved| {
+                    let mut game = solved.game.lock().unwrap_or_else(|e| e.into_inner());
+                    build_columnar_result(py, &mut game, &solved)
+                }) {
+                    Ok(result) => result.into_py(py),
+                    Err(err) => err.into_py(py),
+                };
+                return Ok(Some((index, value)));
+            }
+
+            let receiver = &self.receiver;
+            let Some(Finished { requests, result }) =
+                py.allow_threads(|| lock(receiver).recv().ok())
+            else {
+                // the workers are gone; the spots they did not finish fail rather than vanish
+                for index in std::mem::take(&mut self.pending) {
+                    let err = PyRuntimeError::new_err("Spot was not solved: the batch stopped");
+                    self.ready.push_back((index, Err(err)));
+                }
+                if self.ready.is_empty() {
+                    return Ok(None);
+                }
+                continue;
+            };
+            for (index, _) in &requests {
+                self.pending.remove(index);
+            }
+            match result {
+                Ok((game, stats, status)) => {
+                    for (index, request) in requests {
+                        let solved = SolvedSpot {
+                            game: game.clone(),
+                            stats,
+                            status,
+                            tier: request.tier.name,
+                            pot: request.pot,
+                            bunching: request.bunching,
+                            spans: request.spans,
+                        };
+                        self.ready.push_back((index, Ok(solved)));
+                    }
+                }
+                Err(err) => {
+                    let err = PyErr::from(err);
+                    for (index, _) in requests {
+                        self.ready.push_back((index, Err(err.clone_ref(py))));
+                    }
+                }
+            }
+        }
+    }
+
+    /// Cancels the spots that are not solved yet; they finish with `SolveCancelled`.
+    fn cancel(&self) {
+        self.cancel.store(true, Ordering::Relaxed);
+    }
+}
+
+impl Drop for SpotBatch {
+    fn drop(&mut self) {
+        self.cancel.store(true, Ordering::Relaxed);
+    }
+}
+
+/// Solves many spots (each in the format of `solve_poker_spot`) and returns an iterator over
+/// `(index, result)` in the order they finish.
+///
+/// `result` is the `SpotResult` of `inputs[index]`, or the exception its request or solve failed
+/// with; a failed spot does not stop the others. At most `max_parallel` spots (by default, the
+/// number of solver threads) are solved at once, and a game taking at least 128 MB is solved alone
+/// with every thread. With `memory_budget`, the games of the batch solved at once take at most
+/// this many bytes (the solver memory budget still applies). Cached spots are returned without
+/// solving. Cancelling `cancel`, or dropping the iterator, cancels the spots not solved yet.
+#[pyfunction]
+#[pyo3(signature = (inputs, max_parallel = None, memory_budget = None, cancel = None))]
+pub fn solve_poker_spots(
+    inputs: Vec<&PyDict>,
+    max_parallel: Option<usize>,
+    memory_budget: Option<u64>,
+    cancel: Option<CancelToken>,
+) -> PyResult<SpotBatch> {
+    let cancel = cancel.unwrap_or_default().flag;
+    let mut ready = VecDeque::new();
+    let mut groups: Vec<Group> = Vec::new();
+    for (index, inputs) in inputs.into_iter().enumerate() {
+        match SpotRequest::extract(inputs) {
+            Ok(request) => match groups
+                .iter_mut()
+                .find(|group| group.requests[0].1.key == request.key)
+            {
+                Some(group) => group.requests.push((index, request)),
+                None => groups.push(Group {
+                    requests: vec![(index, request)],
+                }),
+            },
+            Err(err) => ready.push_back((index, Err(err))),
+        }
+    }
+
+    let pending: BTreeSet<usize> = groups
+        .iter()
+        .flat_map(|group| group.requests.iter().map(|&(index, _)| index))
+        .collect();
+    let (sender, receiver) = mpsc::channel();
+    if let Some(repository) = groups
+        .first()
+        .map(|group| group.requests[0].1.repository.clone())
+    {
+        let num_workers = max_parallel
+            .unwrap_or_else(rayon::current_num_threads)
+            .clamp(1, groups.len());
+        let batch = Arc::new(Batch {
+            repository,
+            setup: Setup::default(),
+            memory: BatchMemory {
+                budget: memory_budget.unwrap_or(u64::MAX),
+                reserved: Mutex::new(0),
+                released: Condvar::new(),
+            },
+            threads: RwLock::new(()),
+            queue: Mutex::new(groups.into()),
+            cancel: cancel.clone(),
+        });
+        for _ in 0..num_workers {
+            let (batch, sender) = (batch.clone(), sender.clone());
+            std::thread::spawn(move || work(&batch, &sender, num_workers > 1));
+        }
+    }
+
+    Ok(SpotBatch {
+        receiver: Mutex::new(receiver),
+        ready,
+        pending,
+        cancel,
+    })
+}
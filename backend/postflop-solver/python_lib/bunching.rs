@@ -0,0 +1,422 @@
+// Cache of `BunchingData` tables, for solves that model the card removal of the folded players.
+//
+// A table depends only on the ranges the other players folded and on the flop, so it is shared by
+// every spot of the same preflop line and flop. Computing one takes minutes and up to 3.4 GB of
+// temporary memory with 4 folded players, so tables are never computed on the request path:
+// `status` queues a missing table for a pool of background workers and the spot is solved without
+// the bunching effect in the meantime. Tables are saved with `save_data_to_file` (zstd) in their
+// own directory, named after the digest of their `BunchingKey`, and the most recently used ones
+// are kept in memory. A saved table that cannot be loaded is deleted and computed again; a table
+// whose computation failed is not queued again until a delay that doubles with every failure.
+
+use crate::batch::panic_message;
+use crate::cache::fnv1a;
+use crate::memory::{self, AdmissionError};
+use postflop_solver::*;
+use std::collections::{HashMap, HashSet, VecDeque};
+use std::fs;
+use std::panic::{self, AssertUnwindSafe};
+use std::path::{Path, PathBuf};
+use std::sync::atomic::AtomicBool;
+use std::sync::{Arc, Condvar, Mutex, MutexGuard, OnceLock};
+use std::thread;
+use std::time::{Duration, Instant};
+
+const FILE_PREFIX: &str = "bunching-";
+const FILE_EXTENSION: &str = "bin";
+const COMPRESSION_LEVEL: i32 = 3;
+
+const DEFAULT_WORKERS: usize = 1;
+const DEFAULT_MEMORY_ENTRIES: usize = 2;
+
+/// Delay before a table whose computation failed is queued again, doubled with every further
+/// failure up to `MAX_RETRY_DELAY`.
+const RETRY_DELAY: Duration = Duration::from_secs(60);
+const MAX_RETRY_DELAY: Duration = Duration::from_secs(3600);
+
+/// Memory of a computed table.
+const RESULT_BYTES: u64 = 62 << 20;
+/// Additional memory needed to compute a table, by number of folded players (see `BunchingData`).
+const TEMP_BYTES: [u64; 4] = [19 << 10, 2 << 20, 123 << 20, 3502 << 20];
+
+/// The inputs of a `BunchingData` table.
+#[derive(Debug, Clone, PartialEq)]
+pub struct BunchingKey {
+    /// Non-empty fold ranges, in a canonical order.
+    pub fold_ranges: Vec<Range>,
+    /// Sorted flop.
+    pub flop: [Card; 3],
+}
+
+impl BunchingKey {
+    /// Returns the key of the table for `fold_ranges` and `flop`, or an error if `BunchingData`
+    /// does not accept them (no folded player, more than 4, or ranges that are not
+    /// suit-symmetric).
+    pub fn new(fold_ranges: &[Range], mut flop: [Card; 3]) -> Result<Self, String> {
+        // the order of the folded players does not matter
+        let mut fold_ranges = fold_ranges
+            .iter()
+            .filter(|range| !range.is_empty())
+            .copied()
+            .collect::<Vec<_>>();
+        fold_ranges.sort_by_cached_key(|range| {
+            range
+                .raw_data()
+                .iter()
+                .map(|weight| weight.to_bits())
+                .collect::<Vec<_>>()
+        });
+        flop.sort_unstable();
+
+        BunchingData::new(&fold_ranges, flop)?;
+        Ok(Self { fold_ranges, flop })
+    }
+
+    /// Returns the content address of the key (hex-encoded 128-bit FNV-1a of the flop and the
+    /// weights of the fold ranges).
+    pub fn digest(&self) -> String {
+        let weights = self
+            .fold_ranges
+            .iter()
+            .flat_map(|range| range.raw_data())
+            .flat_map(|weight| weight.to_le_bytes());
+        format!("{:032x}", fnv1a(self.flop.into_iter().chain(weights)))
+    }
+
+    fn file_name(&self) -> String {
+        format!("{FILE_PREFIX}{}.{FILE_EXTENSION}", self.digest())
+    }
+}
+
+/// Whether a solve modeled the bunching effect.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+pub enum BunchingStatus {
+    /// Not requested.
+    Off,
+    /// Modeled.
+    Ready,
+    /// The table is being computed; the spot was solved without it.
+    Pending,
+    /// The computation of the table failed recently; the spot was solved without it.
+    Failed,
+    /// The fold ranges of the spot cannot be modeled (see `BunchingKey::new`).
+    Unavailable,
+}
+
+impl BunchingStatus {
+    pub fn as_str(&self) -> &'static str {
+        match self {
+            BunchingStatus::Off => "off",
+            BunchingStatus::Ready => "ready",
+            BunchingStatus::Pending => "pending",
+            BunchingStatus::Failed => "failed",
+            BunchingStatus::Unavailable => "unavailable",
+        }
+    }
+}
+
+#[derive(Default, Clone, Copy)]
+pub struct BunchingStats {
+    pub memory_hits: u64,
+    pub disk_hits: u64,
+    pub computed: u64,
+    pub failed: u64,
+}
+
+struct State {
+    directory: Option<PathBuf>,
+    workers: usize,
+    running: usize,
+    memory_entries: usize,
+    /// Tables in memory, least recently used first.
+    hot: Vec<(String, Arc<BunchingData>)>,
+    /// Digests of the queued or running tables.
+    pending: HashSet<String>,
+    /// Digests of the tables whose last computation failed: when, and how many times in a row.
+    failures: HashMap<String, (Instant, u32)>,
+    queue: VecDeque<BunchingKey>,
+    stats: BunchingStats,
+    last_error: Option<String>,
+}
+
+pub struct BunchingCache {
+    state: Mutex<State>,
+    queued: Condvar,
+}
+
+impl BunchingCache {
+    fn lock(&self) -> MutexGuard<State> {
+        self.state.lock().unwrap_or_else(|e| e.into_inner())
+    }
+
+    /// Returns `(directory, workers, memory entries, pending tables, counters, last error)`.
+    pub fn status(
+        &self,
+    ) -> (
+        Option<PathBuf>,
+        usize,
+        usize,
+        usize,
+        BunchingStats,
+        Option<String>,
+    ) {
+        let state = self.lock();
+        (
+            state.directory.clone(),
+            state.workers,
+            state.hot.len(),
+            state.pending.len(),
+            state.stats,
+            state.last_error.clone(),
+        )
+    }
+}
+
+impl State {
+    fn file_path(&self, key: &BunchingKey) -> Option<PathBuf> {
+        self.directory.as_ref().map(|d| d.join(key.file_name()))
+    }
+
+    fn lookup_hot(&mut self, digest: &str) -> Option<Arc<BunchingData>> {
+        let i = self.hot.iter().position(|(d, _)| d == digest)?;
+        let entry = self.hot.remove(i);
+        let data = entry.1.clone();
+        self.hot.push(entry);
+        Some(data)
+    }
+
+    fn insert_hot(&mut self, digest: String, data: Arc<BunchingData>) {
+        self.hot.retain(|(d, _)| *d != digest);
+        self.hot.push((digest, data));
+        let excess = self.hot.len().saturating_sub(self.memory_entries);
+        self.hot.drain(..excess);
+    }
+}
+
+static CACHE: OnceLock<BunchingCache> = OnceLock::new();
+
+/// Returns the global cache. Unless configured, it is created from the environment variables
+/// `BUNCHING_CACHE_DIR`, `BUNCHING_WORKERS` and `BUNCHING_MEMORY_ENTRIES`.
+pub fn global() -> &'static BunchingCache {
+    CACHE.get_or_init(|| {
+        let env_usize = |name: &str, default: usize| {
+            std::env::var(name)
+                .ok()
+                .and_then(|v| v.parse().ok())
+                .unwrap_or(default)
+        };
+        BunchingCache {
+            state: Mutex::new(State {
+                directory: create_directory(std::env::var_os("BUNCHING_CACHE_DIR")),
+                workers: env_usize("BUNCHING_WORKERS", DEFAULT_WORKERS),
+                running: 0,
+                memory_entries: env_usize("BUNCHING_MEMORY_ENTRIES", DEFAULT_MEMORY_ENTRIES),
+                hot: Vec::new(),
+                pending: HashSet::new(),
+                failures: HashMap::new(),
+                queue: VecDeque::new(),
+                stats: BunchingStats::default(),
+                last_error: None,
+            }),
+            queued: Condvar::new(),
+        }
+    })
+}
+
+/// Changes the directory of the tables, the number of background workers and the number of tables
+/// kept in memory. Queued tables are kept.
+pub fn configure(directory: Option<PathBuf>, workers: usize, memory_entries: usize) {
+    let cache = global();
+    let mut state = cache.lock();
+    state.directory = create_directory(directory);
+    state.workers = workers;
+    state.memory_entries = memory_entries;
+    let excess = state.hot.len().saturating_sub(memory_entries);
+    state.hot.drain(..excess);
+    spawn_workers(&mut state);
+    drop(state);
+    // idle workers beyond the new count exit
+    cache.queued.notify_all();
+}
+
+fn create_directory(directory: Option<impl Into<PathBuf>>) -> Option<PathBuf> {
+    let directory = directory?.into();
+    fs::create_dir_all(&directory).ok()?;
+    Some(directory)
+}
+
+/// Returns `Ready` if the table of `key` is in memory or can be loaded from disk (into memory);
+/// `Failed` if its computation failed less than the retry delay ago; otherwise queues it for the
+/// background workers and returns `Pending`. A saved table that cannot be loaded is deleted.
+pub fn status(key: &BunchingKey) -> BunchingStatus {
+    let cache = global();
+    let digest = key.digest();
+
+    let path = {
+        let state = cache.lock();
+        if state.hot.iter().any(|(d, _)| *d == digest) {
+            return BunchingStatus::Ready;
+        }
+        state.file_path(key).filter(|path| path.exists())
+    };
+
+    // loaded now rather than by `get`, so that a damaged file is found before the solve needs it
+    let load_error = match path.as_deref().map(|path| load(path, key)) {
+        Some(Ok(data)) => {
+            let mut state = cache.lock();
+            state.stats.disk_hits += 1;
+            state.insert_hot(digest, Arc::new(data));
+            return BunchingStatus::Ready;
+        }
+        Some(Err(e)) => {
+            let _ = fs::remove_file(path.unwrap());
+            Some(format!("Deleted unreadable bunching data: {e}"))
+        }
+        None => None,
+    };
+
+    let mut state = cache.lock();
+    if load_error.is_some() {
+        state.last_error = load_error;
+    }
+
+    if let Some(&(failed_at, failures)) = state.failures.get(&digest) {
+        if failed_at.elapsed() < retry_delay(failures) {
+            return BunchingStatus::Failed;
+        }
+    }
+
+    if state.pending.insert(digest) {
+        state.queue.push_back(key.clone());
+        spawn_workers(&mut state);
+        cache.queued.notify_one();
+    }
+    BunchingStatus::Pending
+}
+
+fn retry_delay(failures: u32) -> Duration {
+    RETRY_DELAY
+        .saturating_mul(1 << failures.saturating_sub(1).min(16))
+        .min(MAX_RETRY_DELAY)
+}
+
+/// Returns the table of `key` from memory or from disk.
+pub fn get(key: &BunchingKey) -> Result<Arc<BunchingData>, String> {
+    let cache = global();
+    let digest = key.digest();
+
+    let path = {
+        let mut state = cache.lock();
+        if let Some(data) = state.lookup_hot(&digest) {
+            state.stats.memory_hits += 1;
+            return Ok(data);
+        }
+        state.file_path(key)
+    };
+
+    let path = path.ok_or_else(|| "Bunching data is not ready".to_string())?;
+    let data = match load(&path, key) {
+        Ok(data) => Arc::new(data),
+        Err(e) => {
+            // computed again on the next `status`
+            let _ = fs::remove_file(&path);
+            return Err(e);
+        }
+    };
+    let mut state = cache.lock();
+    state.stats.disk_hits += 1;
+    state.insert_hot(digest, data.clone());
+    Ok(data)
+}
+
+/// Loads a saved table if it was computed for `key`.
+fn load(path: &Path, key: &BunchingKey) -> Result<BunchingData, String> {
+    let (data, _) = load_data_from_file::<BunchingData, _>(path, None)?;
+    if data.fold_ranges() != key.fold_ranges.as_slice() || data.flop() != key.flop {
+        return Err("Bunching data file does not match its key".to_string());
+    }
+    Ok(data)
+}
+
+/// Saves a computed table to `path`, under a temporary name first.
+fn save(path: &Path, key: &BunchingKey, data: &BunchingData) -> Result<(), String> {
+    let tmp_path = path.with_extension("tmp");
+    let saved = save_data_to_file(data, &key.digest(), &tmp_path, Some(COMPRESSION_LEVEL))
+        .and_then(|_| fs::rename(&tmp_path, path).map_err(|e| e.to_string()));
+    if saved.is_err() {
+        let _ = fs::remove_file(&tmp_path);
+    }
+    saved
+}
+
+fn spawn_workers(state: &mut State) {
+    while state.running < state.workers.min(state.queue.len()) {
+        state.running += 1;
+        thread::spawn(work);
+    }
+}
+
+/// Computes queued tables until there are more workers than configured.
+fn work() {
+    let cache = global();
+    loop {
+        let key = {
+            let mut state = cache.lock();
+            loop {
+                if state.running > state.workers {
+                    state.running -= 1;
+                    return;
+                }
+                if let Some(key) = state.queue.pop_front() {
+                    break key;
+                }
+                state = cache.queued.wait(state).unwrap_or_else(|e| e.into_inner());
+            }
+        };
+
+        // a panic fails the table, like any other failed computation, not the worker
+        let computed = panic::catch_unwind(AssertUnwindSafe(|| compute(&key)))
+            .unwrap_or_else(|payload| Err(panic_message(payload)));
+        let path = cache.lock().file_path(&key);
+        let saved = match (&computed, path) {
+            (Ok(data), Some(path)) => save(&path, &key, data),
+            _ => Ok(()),
+        };
+
+        let mut state = cache.lock();
+        let digest = key.digest();
+        match computed {
+            Ok(data) => {
+                state.stats.computed += 1;
+                state.failures.remove(&digest);
+                if let Err(e) = saved {
+                    state.last_error = Some(format!("Failed to save bunching data: {e}"));
+                }
+                state.insert_hot(digest.clone(), Arc::new(data));
+            }
+            Err(e) => {
+                state.stats.failed += 1;
+                state.last_error = Some(e);
+                let failures = state.failures.get(&digest).map_or(0, |&(_, n)| n) + 1;
+                state
+                    .failures
+                    .insert(digest.clone(), (Instant::now(), failures));
+            }
+        }
+        state.pending.remove(&digest);
+    }
+}
+
+/// Computes the table of `key` within the solver memory budget.
+fn compute(key: &BunchingKey) -> Result<BunchingData, String> {
+    let mut data = BunchingData::new(&key.fold_ranges, key.flop)?;
+    let bytes = RESULT_BYTES + TEMP_BYTES[key.fold_ranges.len() - 1];
+    let _reservation = memory::global()
+        .admit(bytes, bytes, &AtomicBool::new(false))
+        .map_err(|err| match err {
+            AdmissionError::Rejected(msg) => msg,
+            AdmissionError::Cancelled => "Cancelled".to_string(),
+        })?;
+    data.process(false);
+    Ok(data)
+}
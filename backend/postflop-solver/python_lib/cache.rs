@@ -0,0 +1,744 @@
+// Content-addressed cache of solved `PostFlopGame`s.
+//
+// The cache has two tiers:
+//  - Hot tier: solved games kept in memory, bounded by the sum of their `memory_usage()`.
+//  - Disk tier: games saved with `save_data_to_file` (zstd), bounded by the total file size.
+//
+// Both tiers are evicted in least-recently-used order. Optionally, a read-only library directory
+// of precomputed solutions (in the same file format, see `save`) is consulted after the disk tier.
+// Each entry is addressed by the digest of the canonical string of its `SpotKey`, and the
+// canonical string itself is stored as the memo of the file so that a loaded game can be verified
+// against the requested spot. The `SolveStats` of the solve are appended to the memo after a `--`
+// line.
+//
+// Only solves that reached their target exploitability are served from the cache. A solve
+// stopped by its deadline or iteration limit is kept in the hot tier alone, as the warm-start
+// source of the next solve of the same spot, which refines it instead of starting over.
+//
+// A library may also hold solution files (`<digest>.sol`, see `SolutionFile`), written with the
+// same memo, from which single nodes are read without loading the game.
+
+use crate::bunching::{self, BunchingKey};
+use postflop_solver::*;
+use std::collections::HashMap;
+use std::fs;
+use std::path::{Path, PathBuf};
+use std::sync::{Arc, Mutex, MutexGuard, OnceLock};
+use std::time::{Duration, SystemTime};
+
+const FILE_EXTENSION: &str = "bin";
+const SOLUTION_EXTENSION: &str = "sol";
+const COMPRESSION_LEVEL: i32 = 3;
+
+const DEFAULT_DISK_BUDGET: u64 = 4 << 30;
+const DEFAULT_MEMORY_BUDGET: u64 = 1 << 30;
+
+/// Largest `|ln(SPR / source SPR)|` of a game used to warm-start a solve. Seeds from spots with
+/// more distant stack-to-pot ratios (or other bet sizes) slow the solve down rather than speed it
+/// up.
+const MAX_WARM_START_DISTANCE: f64 = 0.5;
+
+/// Everything that determines the outcome of a solve.
+#[derive(Debug, Clone, PartialEq)]
+pub struct SpotKey {
+    pub ranges_path: String,
+    pub oop_position: String,
+    pub ip_position: String,
+    pub flop: [Card; 3],
+    pub turn: Card,
+    pub river: Card,
+    pub effective_stack: i32,
+    pub starting_pot: i32,
+    pub bet_sizes: (String, String),
+    pub target_exploitability: f32,
+    pub max_num_iterations: u32,
+    pub deadline: Duration,
+    /// The fold ranges whose card removal is modeled, if any (see `bunching`).
+    pub bunching: Option<BunchingKey>,
+    /// The previous street whose solution narrows the ranges, for a turn or river subgame.
+    pub subgame: Option<Subgame>,
+}
+
+/// How the ranges of a turn or river subgame are derived (see `subgame`).
+#[derive(Debug, Clone, PartialEq)]
+pub struct Subgame {
+    /// The spot at the start of the previous street.
+    pub upstream: Box<SpotKey>,
+    /// Chips each player put in on the previous street.
+    pub bet: i32,
+}
+
+impl SpotKey {
+    /// Returns the canonical string representation of the key.
+    pub fn canonical(&self) -> String {
+        let mut flop = self.flop;
+        flop.sort_unstable();
+        let canonical = format!(
+            "ranges={}\noop={}\nip={}\nflop={:?}\nturn={}\nriver={}\nstack={}\npot={}\n\
+             bet={}\nraise={}\ntarget={:e}\niterations={}\ndeadline_ms={}",
+            self.ranges_path,
+            self.oop_position,
+            self.ip_position,
+            flop,
+            self.turn,
+            self.river,
+            self.effective_stack,
+            self.starting_pot,
+            self.bet_sizes.0,
+            self.bet_sizes.1,
+            self.target_exploitability,
+            self.max_num_iterations,
+            self.deadline.as_millis(),
+        );
+        // only appended when set, so that the keys of games solved without bunching (or from the
+        // preflop ranges) are unchanged
+        let canonical = match &self.bunching {
+            Some(bunching) => format!("{canonical}\nbunching={}", bunching.digest()),
+            None => canonical,
+        };
+        match &self.subgame {
+            Some(subgame) => format!(
+                "{canonical}\nupstream={}\nupstream_bet={}",
+                subgame.upstream.digest(),
+                subgame.bet
+            ),
+            None => canonical,
+        }
+    }
+
+    /// Returns the content address of the key (hex-encoded 128-bit FNV-1a of the canonical string).
+    pub fn digest(&self) -> String {
+        format!("{:032x}", fnv1a(self.canonical().bytes()))
+    }
+}
+
+/// 128-bit FNV-1a hash of `bytes`.
+pub fn fnv1a(bytes: impl IntoIterator<Item = u8>) -> u128 {
+    const OFFSET_BASIS: u128 = 0x6c62272e07bb014262b821756295c58d;
+    const PRIME: u128 = 0x0000000001000000000000000000013b;
+    bytes
+        .into_iter()
+        .fold(OFFSET_BASIS, |h, b| (h ^ b as u128).wrapping_mul(PRIME))
+}
+
+/// Why a solve stopped.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+pub enum StopReason {
+    Target,
+    Deadline,
+    MaxIterations,
+}
+
+impl StopReason {
+    pub fn as_str(&self) -> &'static str {
+        match self {
+            StopReason::Target => "target",
+            StopReason::Deadline => "deadline",
+            StopReason::MaxIterations => "max_iterations",
+        }
+    }
+
+    fn from_str(s: &str) -> Option<Self> {
+        match s {
+            "target" => Some(StopReason::Target),
+            "deadline" => Some(StopReason::Deadline),
+            "max_iterations" => Some(StopReason::MaxIterations),
+            _ => None,
+        }
+    }
+}
+
+/// Outcome of the solve that produced a cached game.
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub struct SolveStats {
+    pub exploitability: f32,
+    pub iterations: u32,
+    pub elapsed: Duration,
+    pub stop_reason: StopReason,
+    /// Estimated iterations saved by warm-starting the solve: the iterations a cold start to the
+    /// target is expected to need, minus those run. 0 for a cold start or a solve stopped before
+    /// its target, for which the estimate says nothing.
+    pub iterations_saved: u32,
+}
+
+impl SolveStats {
+    /// Whether the solve reached its target exploitability.
+    pub fn converged(&self) -> bool {
+        self.stop_reason == StopReason::Target
+    }
+
+    fn to_memo(self) -> String {
+        format!(
+            "exploitability={:e}\niterations={}\nelapsed_ms={}\nstop={}\nsaved={}",
+            self.exploitability,
+            self.iterations,
+            self.elapsed.as_millis(),
+            self.stop_reason.as_str(),
+            self.iterations_saved,
+        )
+    }
+
+    fn from_memo(memo: &str) -> Option<Self> {
+        let mut fields = HashMap::new();
+        for line in memo.lines() {
+            let (name, value) = line.split_once('=')?;
+            fields.insert(name, value);
+        }
+        Some(Self {
+            exploitability: fields.get("exploitability")?.parse().ok()?,
+            iterations: fields.get("iterations")?.parse().ok()?,
+            elapsed: Duration::from_millis(fields.get("elapsed_ms")?.parse().ok()?),
+            stop_reason: StopReason::from_str(fields.get("stop")?)?,
+            // absent in files written before warm starts
+            iterations_saved: match fields.get("saved") {
+                Some(saved) => saved.parse().ok()?,
+                None => 0,
+            },
+        })
+    }
+}
+
+/// Where a cached game was found.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+pub enum CacheStatus {
+    Memory,
+    Disk,
+    Library,
+    Miss,
+}
+
+impl CacheStatus {
+    pub fn as_str(&self) -> &'static str {
+        match self {
+            CacheStatus::Memory => "memory",
+            CacheStatus::Disk => "disk",
+            CacheStatus::Library => "library",
+            CacheStatus::Miss => "miss",
+        }
+    }
+}
+
+pub type SharedGame = Arc<Mutex<PostFlopGame>>;
+
+struct HotEntry {
+    key: SpotKey,
+    game: SharedGame,
+    stats: SolveStats,
+    size: u64,
+    last_used: u64,
+}
+
+struct DiskEntry {
+    size: u64,
+    last_used: u64,
+}
+
+#[derive(Default)]
+pub struct CacheStats {
+    pub memory_hits: u64,
+    pub disk_hits: u64,
+    pub library_hits: u64,
+    pub misses: u64,
+}
+
+pub struct SolveCache {
+    directory: Option<PathBuf>,
+    library: Option<PathBuf>,
+    disk_budget: u64,
+    memory_budget: u64,
+    hot: HashMap<String, HotEntry>,
+    hot_bytes: u64,
+    disk: HashMap<String, DiskEntry>,
+    disk_bytes: u64,
+    clock: u64,
+    stats: CacheStats,
+}
+
+impl SolveCache {
+    /// Creates a new cache. If `directory` is `None`, the disk tier is disabled.
+    pub fn new(directory: Option<PathBuf>, disk_budget: u64, memory_budget: u64) -> Self {
+        let mut cache = Self {
+            directory,
+            library: None,
+            disk_budget,
+            memory_budget,
+            hot: HashMap::new(),
+            hot_bytes: 0,
+            disk: HashMap::new(),
+            disk_bytes: 0,
+            clock: 0,
+            stats: CacheStats::default(),
+        };
+        cache.scan_directory();
+        cache
+    }
+
+    /// Indexes the files already present in the cache directory, oldest first.
+    fn scan_directory(&mut self) {
+        let Some(directory) = &self.directory else {
+            return;
+        };
+
+        if fs::create_dir_all(directory).is_err() {
+            self.directory = None;
+            return;
+        }
+
+        let mut files = Vec::new();
+        if let Ok(entries) = fs::read_dir(directory) {
+            for entry in entries.flatten() {
+                let path = entry.path();
+                if path.extension().and_then(|e| e.to_str()) != Some(FILE_EXTENSION) {
+                    continue;
+                }
+                let Some(digest) = path.file_stem().and_then(|s| s.to_str()) else {
+                    continue;
+                };
+                if let Ok(metadata) = entry.metadata() {
+                    let modified = metadata.modified().unwrap_or(SystemTime::UNIX_EPOCH);
+                    files.push((modified, digest.to_string(), metadata.len()));
+                }
+            }
+        }
+
+        files.sort();
+        for (_, digest, size) in files {
+            self.clock += 1;
+            self.disk_bytes += size;
+            self.disk.insert(
+                digest,
+                DiskEntry {
+                    size,
+                    last_used: self.clock,
+                },
+            );
+        }
+        self.evict_disk();
+    }
+
+    fn file_path(&self, digest: &str) -> Option<PathBuf> {
+        self.directory
+            .as_ref()
+            .map(|d| d.join(format!("{digest}.{FILE_EXTENSION}")))
+    }
+
+    fn tick(&mut self) -> u64 {
+        self.clock += 1;
+        self.clock
+    }
+
+    /// Returns the hot game of `digest` if its solve converged (see `SolveStats::converged`).
+    fn lookup_hot(&mut self, digest: &str) -> Option<(SharedGame, SolveStats)> {
+        let now = self.tick();
+        let entry = self.hot.get_mut(digest)?;
+        entry.last_used = now;
+        entry
+            .stats
+            .converged()
+            .then(|| (entry.game.clone(), entry.stats))
+    }
+
+    fn lookup_disk(&mut self, digest: &str) -> Option<PathBuf> {
+        let now = self.tick();
+        let entry = self.disk.get_mut(digest)?;
+        entry.last_used = now;
+        self.file_path(digest)
+    }
+
+    fn insert_hot(&mut self, key: &SpotKey, game: SharedGame, stats: SolveStats, size: u64) {
+        let now = self.tick();
+        if let Some(old) = self.hot.insert(
+            key.digest(),
+            HotEntry {
+                key: key.clone(),
+                game,
+                stats,
+                size,
+                last_used: now,
+            },
+        ) {
+            self.hot_bytes -= old.size;
+        }
+        self.hot_bytes += size;
+        self.evict_hot();
+    }
+
+    fn insert_disk(&mut self, digest: &str, size: u64) {
+        let now = self.tick();
+        if let Some(old) = self.disk.insert(
+            digest.to_string(),
+            DiskEntry {
+                size,
+                last_used: now,
+            },
+        ) {
+            self.disk_bytes -= old.size;
+        }
+        self.disk_bytes += size;
+        self.evict_disk();
+    }
+
+    fn remove_disk(&mut self, digest: &str) {
+        if let Some(entry) = self.disk.remove(digest) {
+            self.disk_bytes -= entry.size;
+        }
+        if let Some(path) = self.file_path(digest) {
+            let _ = fs::remove_file(path);
+        }
+    }
+
+    /// Evicts the least recently used games until the hot tier fits in the budget.
+    /// The most recently used game is always kept.
+    fn evict_hot(&mut self) {
+        while self.hot_bytes > self.memory_budget && self.hot.len() > 1 {
+            let digest = lru_key(self.hot.iter().map(|(k, e)| (k, e.last_used)));
+            let entry = self.hot.remove(&digest).unwrap();
+            self.hot_bytes -= entry.size;
+        }
+    }
+
+    /// Evicts the least recently used files until the disk tier fits in the budget.
+    /// The most recently used file is always kept.
+    fn evict_disk(&mut self) {
+        while self.disk_bytes > self.disk_budget && self.disk.len() > 1 {
+            let digest = lru_key(self.disk.iter().map(|(k, e)| (k, e.last_used)));
+            self.remove_disk(&digest);
+        }
+    }
+
+    /// Returns the statistics of the cache.
+    pub fn stats(&self) -> &CacheStats {
+        &self.stats
+    }
+
+    /// Returns the number of entries and the total bytes of the (hot, disk) tiers.
+    pub fn usage(&self) -> ((usize, u64), (usize, u64)) {
+        (
+            (self.hot.len(), self.hot_bytes),
+            (self.disk.len(), self.disk_bytes),
+        )
+    }
+
+    /// Returns the cache directory, if the disk tier is enabled.
+    pub fn directory(&self) -> Option<&Path> {
+        self.directory.as_deref()
+    }
+
+    /// Sets the read-only directory of precomputed solutions.
+    pub fn set_library(&mut self, library: Option<PathBuf>) {
+        self.library = library;
+    }
+
+    /// Returns the directory of precomputed solutions, if any.
+    pub fn library(&self) -> Option<&Path> {
+        self.library.as_deref()
+    }
+}
+
+fn lru_key<'a>(entries: impl Iterator<Item = (&'a String, u64)>) -> String {
+    entries.min_by_key(|&(_, t)| t).unwrap().0.clone()
+}
+
+/// Returns the in-memory size of a solved game.
+pub fn game_memory_usage(game: &PostFlopGame) -> u64 {
+    let (uncompressed, compressed) = game.memory_usage();
+    match game.is_memory_allocated() {
+        Some(true) => compressed,
+        _ => uncompressed,
+    }
+}
+
+static CACHE: OnceLock<Mutex<SolveCache>> = OnceLock::new();
+
+/// Returns the global cache. It is created from the environment variables
+/// `SOLVE_CACHE_DIR`, `SOLVE_CACHE_DISK_BYTES`, `SOLVE_CACHE_MEMORY_BYTES` and `SOLVE_LIBRARY_DIR`
+/// on the first use unless [`configure`] has been called before.
+pub fn global() -> MutexGuard<'static, SolveCache> {
+    CACHE
+        .get_or_init(|| {
+            let env_u64 = |name: &str, default: u64| {
+                std::env::var(name)
+                    .ok()
+                    .and_then(|v| v.parse().ok())
+                    .unwrap_or(default)
+            };
+            let mut cache = SolveCache::new(
+                std::env::var_os("SOLVE_CACHE_DIR").map(PathBuf::from),
+                env_u64("SOLVE_CACHE_DISK_BYTES", DEFAULT_DISK_BUDGET),
+                env_u64("SOLVE_CACHE_MEMORY_BYTES", DEFAULT_MEMORY_BUDGET),
+            );
+            cache.set_library(std::env::var_os("SOLVE_LIBRARY_DIR").map(PathBuf::from));
+            Mutex::new(cache)
+        })
+        .lock()
+        .unwrap_or_else(|e| e.into_inner())
+}
+
+/// Replaces the global cache with a new one.
+pub fn configure(
+    directory: Option<PathBuf>,
+    library: Option<PathBuf>,
+    disk_budget: u64,
+    memory_budget: u64,
+) {
+    let mut cache = SolveCache::new(directory, disk_budget, memory_budget);
+    cache.set_library(library);
+    match CACHE.get() {
+        Some(mutex) => *mutex.lock().unwrap_or_else(|e| e.into_inner()) = cache,
+        None => {
+            if let Err(cache) = CACHE.set(Mutex::new(cache)) {
+                *global() = cache.into_inner().unwrap();
+            }
+        }
+    }
+}
+
+/// Returns the solved game for `key` and the stats of its solve, calling `solve` only if neither
+/// tier has it.
+///
+/// The global lock is not held while loading, solving or saving a game, so independent spots can
+/// be processed concurrently.
+pub fn get_or_solve<F, G, E>(
+    key: &SpotKey,
+    solve: F,
+) -> Result<(SharedGame, SolveStats, CacheStatus), E>
+where
+    F: FnOnce() -> Result<(PostFlopGame, SolveStats, G), E>,
+{
+    if let Some(found) = lookup(key) {
+        return Ok(found);
+    }
+
+    // `_guard` (the memory reservation of the game) is released once the cache holds the game
+    let (game, stats, _guard) = solve()?;
+    Ok((insert(key, game, stats), stats, CacheStatus::Miss))
+}
+
+/// Returns the hot game nearest to `key` that can seed its solve (see `PostFlopGame::warm_start`),
+/// with its key and the stats of its solve.
+///
+/// Candidates have the same ranges, board and bet sizes as `key` and were solved to their target;
+/// the one with the closest stack-to-pot ratio is returned if it is within
+/// `MAX_WARM_START_DISTANCE`. An unconverged solve of `key` itself is a candidate too (at distance
+/// 0), so that a spot whose solves keep hitting their deadline converges over several requests.
+pub fn find_warm_start(key: &SpotKey) -> Option<(SharedGame, SolveStats, SpotKey)> {
+    let spr = |key: &SpotKey| key.effective_stack as f64 / key.starting_pot as f64;
+    let board = |key: &SpotKey| {
+        let mut flop = key.flop;
+        flop.sort_unstable();
+        (flop, key.turn, key.river)
+    };
+
+    let cache = global();
+    let (distance, entry) = cache
+        .hot
+        .values()
+        .filter(|entry| {
+            let source = &entry.key;
+            source.ranges_path == key.ranges_path
+                && source.oop_position == key.oop_position
+                && source.ip_position == key.ip_position
+                && board(source) == board(key)
+                && source.bet_sizes == key.bet_sizes
+                && source.bunching == key.bunching
+                && source.subgame == key.subgame
+                && (entry.stats.converged() || source == key)
+        })
+        .map(|entry| ((spr(key) / spr(&entry.key)).ln().abs(), entry))
+        .min_by(|(x, _), (y, _)| x.total_cmp(y))?;
+
+    if distance > MAX_WARM_START_DISTANCE {
+        return None;
+    }
+
+    Some((entry.game.clone(), entry.stats, entry.key.clone()))
+}
+
+/// Returns the solved game for `key` from the hot or the disk tier or the library, if present
+/// and converged.
+pub fn lookup(key: &SpotKey) -> Option<(SharedGame, SolveStats, CacheStatus)> {
+    let canonical = key.canonical();
+    let digest = key.digest();
+
+    // hot tier
+    let (disk_path, library_path) = {
+        let mut cache = global();
+        if let Some((game, stats)) = cache.lookup_hot(&digest) {
+            cache.stats.memory_hits += 1;
+            return Some((game, stats, CacheStatus::Memory));
+        }
+        let library_path = cache
+            .library
+            .as_ref()
+            .map(|d| d.join(format!("{digest}.{FILE_EXTENSION}")));
+        (cache.lookup_disk(&digest), library_path)
+    };
+
+    // disk tier
+    if let Some(path) = disk_path {
+        match load(&path, key, &canonical) {
+            Some((game, stats)) => {
+                if let Ok(file) = fs::File::options().append(true).open(&path) {
+                    let _ = file.set_modified(SystemTime::now());
+                }
+                let game = promote(key, game, stats, |s| s.disk_hits += 1);
+                return Some((game, stats, CacheStatus::Disk));
+            }
+            // unreadable, or written before unconverged solves were kept off disk
+            None => global().remove_disk(&digest),
+        }
+    }
+
+    // library
+    let (game, stats) = load(&library_path?, key, &canonical)?;
+    let game = promote(key, game, stats, |s| s.library_hits += 1);
+    Some((game, stats, CacheStatus::Library))
+}
+
+/// Loads a saved game if it exists, was written for the spot `key` (whose canonical string is
+/// `canonical`) and its solve converged.
+///
+/// The bunching effect is not saved with a game, so it is set again from the bunching cache.
+fn load(path: &Path, key: &SpotKey, canonical: &str) -> Option<(PostFlopGame, SolveStats)> {
+    let (mut game, memo) = load_data_from_file::<PostFlopGame, _>(path, None).ok()?;
+    let stats = parse_memo(&memo, canonical).filter(SolveStats::converged)?;
+    if let Some(bunching) = &key.bunching {
+        let data = bunching::get(bunching).ok()?;
+        game.set_bunching_effect(&data).ok()?;
+    }
+    Some((game, stats))
+}
+
+/// Moves a loaded game into the hot tier and counts the hit.
+fn promote(
+    key: &SpotKey,
+    game: PostFlopGame,
+    stats: SolveStats,
+    count: impl FnOnce(&mut CacheStats),
+) -> SharedGame {
+    let size = game_memory_usage(&game);
+    let game = Arc::new(Mutex::new(game));
+    let mut cache = global();
+    count(&mut cache.stats);
+    cache.insert_hot(key, game.clone(), stats, size);
+    game
+}
+
+/// Stores a freshly solved game for `key` and counts it as a miss.
+///
+/// The game is saved to the disk tier only if its solve converged; otherwise it is kept in the
+/// hot tier to seed the next solve of `key` (see `find_warm_start`), and is not served.
+pub fn insert(key: &SpotKey, game: PostFlopGame, stats: SolveStats) -> SharedGame {
+    let digest = key.digest();
+
+    let size = game_memory_usage(&game);
+    let path = {
+        let mut cache = global();
+        cache.stats.misses += 1;
+        cache.file_path(&digest).filter(|_| stats.converged())
+    };
+
+    if let Some(path) = path {
+        if let Ok(size) = save(&path, key, &game, stats) {
+            global().insert_disk(&digest, size);
+        }
+    }
+
+    let game = Arc::new(Mutex::new(game));
+    global().insert_hot(key, game.clone(), stats, size);
+    game
+}
+
+/// Saves a solved game to `path` in the cache file format and returns the file size.
+pub fn save(
+    path: &Path,
+    key: &SpotKey,
+    game: &PostFlopGame,
+    stats: SolveStats,
+) -> Result<u64, String> {
+    let memo = format!("{}\n--\n{}", key.canonical(), stats.to_memo());
+    save_atomically(path, |tmp_path| {
+        save_data_to_file(game, &memo, tmp_path, Some(COMPRESSION_LEVEL))
+    })
+}
+
+/// Saves the solution of a solved game to `path` as a solution file, down to `max_board_state`,
+/// and returns the file size. The current node of `game` is moved back to the root.
+pub fn save_solution(
+    path: &Path,
+    key: &SpotKey,
+    game: &mut PostFlopGame,
+    stats: SolveStats,
+    max_board_state: BoardState,
+) -> Result<u64, String> {
+    let memo = format!("{}\n--\n{}", key.canonical(), stats.to_memo());
+    save_atomically(path, |tmp_path| {
+        save_solution_to_file(
+            game,
+            &memo,
+            tmp_path,
+            max_board_state,
+            Some(COMPRESSION_LEVEL),
+        )
+    })
+}
+
+/// Writes a file with `write` under a temporary name first, so readers never see a partial file,
+/// and returns its size.
+fn save_atomically(
+    path: &Path,
+    write: impl FnOnce(&Path) -> Result<(), String>,
+) -> Result<u64, String> {
+    let tmp_path = path.with_extension("tmp");
+    let saved = write(&tmp_path)
+        .and_then(|_| fs::rename(&tmp_path, path).map_err(|e| e.to_string()))
+        .and_then(|_| fs::metadata(path).map_err(|e| e.to_string()));
+    match saved {
+        Ok(metadata) => Ok(metadata.len()),
+        Err(e) => {
+            let _ = fs::remove_file(&tmp_path);
+            Err(e)
+        }
+    }
+}
+
+/// Returns the file name of the game for `key` in a cache or library directory.
+pub fn file_name(key: &SpotKey) -> String {
+    format!("{}.{FILE_EXTENSION}", key.digest())
+}
+
+/// Returns the file name of the solution file for `key` in a library directory.
+pub fn solution_file_name(key: &SpotKey) -> String {
+    format!("{}.{SOLUTION_EXTENSION}", key.digest())
+}
+
+/// Returns the path of the solution file for `key` in the library, if it exists.
+pub fn library_solution(key: &SpotKey) -> Option<PathBuf> {
+    let library = global().library().map(Path::to_path_buf)?;
+    let path = library.join(solution_file_name(key));
+    path.exists().then_some(path)
+}
+
+/// Returns the path of the library solution file to answer a root-node request for `key` from,
+/// unless the hot tier holds the converged game, which answers it without reading a file.
+pub fn root_solution(key: &SpotKey) -> Option<PathBuf> {
+    let hot = global()
+        .hot
+        .get(&key.digest())
+        .map_or(false, |entry| entry.stats.converged());
+    if hot {
+        return None;
+    }
+    library_solution(key)
+}
+
+/// Counts a request answered from a library solution file (see `root_solution`).
+pub fn record_library_hit() {
+    global().stats.library_hits += 1;
+}
+
+/// Returns the stats stored in `memo` if it was written for the spot `canonical`.
+pub fn parse_memo(memo: &str, canonical: &str) -> Option<SolveStats> {
+    let stats = memo.strip_prefix(canonical)?.strip_prefix("\n--\n")?;
+    SolveStats::from_memo(stats)
+}
@@ -0,0 +1,377 @@
+// Columnar result format.
+//
+// Instead of one `dict` per private hand, each player's results are exposed as contiguous `f32`
+// buffers (buffer protocol, so `memoryview` and `numpy.asarray` read them without copying) and a
+// single hand-string -> index map.
+
+use crate::bunching::BunchingStatus;
+use crate::cache::{CacheStatus, SolveStats};
+use crate::metrics::Spans;
+use crate::{calculate_equity_buckets, SolvedSpot};
+use postflop_solver::*;
+use pyo3::exceptions::PyBufferError;
+use pyo3::ffi;
+use pyo3::prelude::*;
+use pyo3::types::{PyDict, PyList};
+use std::ffi::CString;
+use std::os::raw::{c_int, c_void};
+use std::ptr;
+
+/// Read-only, C-contiguous `f32` array of one or two dimensions.
+#[pyclass]
+pub struct F32Array {
+    data: Vec<f32>,
+    ndim: usize,
+    shape: [isize; 2],
+    strides: [isize; 2],
+}
+
+impl F32Array {
+    pub fn new_1d(data: Vec<f32>) -> Self {
+        let len = data.len() as isize;
+        Self {
+            data,
+            ndim: 1,
+            shape: [len, 1],
+            strides: [4, 4],
+        }
+    }
+
+    pub fn new_2d(data: Vec<f32>, rows: usize, cols: usize) -> Self {
+        assert_eq!(data.len(), rows * cols);
+        Self {
+            data,
+            ndim: 2,
+            shape: [rows as isize, cols as isize],
+            strides: [4 * cols as isize, 4],
+        }
+    }
+
+    pub fn as_slice(&self) -> &[f32] {
+        &self.data
+    }
+}
+
+#[pymethods]
+impl F32Array {
+    #[getter]
+    fn shape(&self) -> Vec<isize> {
+        self.shape[..self.ndim].to_vec()
+    }
+
+    fn __len__(&self) -> usize {
+        self.shape[0] as usize
+    }
+
+    unsafe fn __getbuffer__(
+        slf: &PyCell<Self>,
+        view: *mut ffi::Py_buffer,
+        flags: c_int,
+    ) -> PyResult<()> {
+        if view.is_null() {
+            return Err(PyBufferError::new_err("View is null"));
+        }
+
+        if (flags & ffi::PyBUF_WRITABLE) == ffi::PyBUF_WRITABLE {
+            return Err(PyBufferError::new_err("Object is not writable"));
+        }
+
+        let array = slf.borrow();
+
+        ffi::Py_INCREF(slf.as_ptr());
+        (*view).obj = slf.as_ptr();
+        (*view).buf = array.data.as_ptr() as *mut c_void;
+        (*view).len = (4 * array.data.len()) as isize;
+        (*view).readonly = 1;
+        (*view).itemsize = 4;
+
+        (*view).format = if (flags & ffi::PyBUF_FORMAT) == ffi::PyBUF_FORMAT {
+            CString::new("f").unwrap().into_raw()
+        } else {
+            ptr::null_mut()
+        };
+
+        // the pointers stay valid because the array is immutable and outlives the view
+        if (flags & ffi::PyBUF_ND) == ffi::PyBUF_ND {
+            (*view).ndim = array.ndim as c_int;
+            (*view).shape = array.shape.as_ptr() as *mut isize;
+        } else {
+            (*view).ndim = 1;
+            (*view).shape = ptr::null_mut();
+        }
+
+        (*view).strides = if (flags & ffi::PyBUF_STRIDES) == ffi::PyBUF_STRIDES {
+            array.strides.as_ptr() as *mut isize
+        } else {
+            ptr::null_mut()
+        };
+
+        (*view).suboffsets = ptr::null_mut();
+        (*view).internal = ptr::null_mut();
+
+        Ok(())
+    }
+
+    unsafe fn __releasebuffer__(&self, view: *mut ffi::Py_buffer) {
+        // release memory held by the format string
+        if !(*view).format.is_null() {
+            drop(CString::from_raw((*view).format));
+        }
+    }
+}
+
+/// Per-hand results of one player.
+#[pyclass]
+pub struct PlayerColumns {
+    /// Hand strings, e.g. `"AsKd"`.
+    #[pyo3(get)]
+    hands: Py<PyList>,
+    /// Hand string -> position in the arrays.
+    #[pyo3(get)]
+    index: Py<PyDict>,
+    #[pyo3(get)]
+    weights: Py<F32Array>,
+    #[pyo3(get)]
+    equity: Py<F32Array>,
+    #[pyo3(get)]
+    ev: Py<F32Array>,
+    #[pyo3(get)]
+    eqr: Py<F32Array>,
+    /// `[action x hand]` strategy matrix; only available for the player to act.
+    #[pyo3(get)]
+    strategy: Option<Py<F32Array>>,
+}
+
+/// Root-node results of a solved spot in columnar form.
+#[pyclass]
+pub struct SpotResult {
+    #[pyo3(get)]
+    hero: Py<PlayerColumns>,
+    #[pyo3(get)]
+    villain: Py<PlayerColumns>,
+    #[pyo3(get)]
+    legal_actions: Vec<String>,
+    #[pyo3(get)]
+    hero_buckets: Vec<f32>,
+    #[pyo3(get)]
+    villain_buckets: Vec<f32>,
+    #[pyo3(get)]
+    cache: String,
+    #[pyo3(get)]
+    tier: String,
+    /// Exploitability of the solution, in chips.
+    #[pyo3(get)]
+    exploitability: f32,
+    #[pyo3(get)]
+    iterations: u32,
+    /// Estimated iterations saved by warm-starting the solve (0 for a cold start or a solve
+    /// stopped before its target).
+    #[pyo3(get)]
+    estimated_iterations_saved: u32,
+    #[pyo3(get)]
+    solve_seconds: f64,
+    /// `"target"`, `"deadline"` or `"max_iterations"`.
+    #[pyo3(get)]
+    stop_reason: String,
+    /// `"off"`, `"ready"` (the card removal of the folded players was modeled), `"pending"`,
+    /// `"failed"` or `"unavailable"`.
+    #[pyo3(get)]
+    bunching: String,
+    /// Pot at the root of the solved game: the pot before the flop, or the actual pot at the start
+    /// of the street of a subgame.
+    #[pyo3(get)]
+    starting_pot: i32,
+    /// Seconds spent in each stage of the request (see `metrics::Spans`).
+    #[pyo3(get)]
+    stage_seconds: Py<PyDict>,
+}
+
+/// Root-node values of a solved spot, read from the game or from a solution file.
+pub struct RootValues {
+    actions: Vec<Action>,
+    private_cards: [Vec<(Card, Card)>; 2],
+    weights: [Vec<f32>; 2],
+    equity: [Vec<f32>; 2],
+    ev: [Vec<f32>; 2],
+    /// Strategy of OOP, who acts first.
+    strategy: Vec<f32>,
+    starting_pot: i32,
+}
+
+impl RootValues {
+    /// Reads the current node of `game`, whose normalized weights must be cached.
+    fn from_game(game: &PostFlopGame) -> Self {
+        Self {
+            actions: game.available_actions(),
+            private_cards: [0, 1].map(|player| game.private_cards(player).to_vec()),
+            weights: [0, 1].map(|player| game.normalized_weights(player).to_vec()),
+            equity: [0, 1].map(|player| game.equity(player)),
+            ev: [0, 1].map(|player| game.expected_values(player)),
+            strategy: game.strategy(),
+            starting_pot: game.tree_config().starting_pot,
+        }
+    }
+
+    /// Reads the root node of a solution file.
+    pub fn from_solution<B: AsRef<[u8]>>(file: &SolutionFile<B>, root: SolutionNode) -> Self {
+        Self {
+            actions: root.actions,
+            private_cards: [0, 1].map(|player| file.private_cards(player).to_vec()),
+            weights: root.normalized_weights,
+            equity: root.equity,
+            ev: root.expected_values,
+            strategy: root.strategy,
+            starting_pot: file.stacks().0,
+        }
+    }
+}
+
+/// What a `SpotResult` reports besides the root-node values.
+pub struct ResultInfo<'a> {
+    pub stats: SolveStats,
+    pub status: CacheStatus,
+    pub tier: &'static str,
+    /// Total pot used for EQR.
+    pub pot: f32,
+    pub bunching: BunchingStatus,
+    pub spans: &'a Spans,
+}
+
+fn player_columns(
+    py: Python,
+    hands: &[(Card, Card)],
+    weights: Vec<f32>,
+    equity: Vec<f32>,
+    ev: Vec<f32>,
+    pot: f32,
+    strategy: Option<Vec<f32>>,
+) -> PyResult<(Py<PlayerColumns>, Vec<f32>)> {
+    let hands = holes_to_strings(hands).unwrap();
+    let eqr = equity
+        .iter()
+        .zip(&ev)
+        .map(|(&eq, &ev)| {
+            // Handle division by zero
+            if eq != 0.0 && pot != 0.0 {
+                (ev / eq) / pot
+            } else {
+                0.0
+            }
+        })
+        .collect();
+
+    let index = PyDict::new(py);
+    for (i, hand) in hands.iter().enumerate() {
+        index.set_item(hand, i)?;
+    }
+
+    let strategy = match strategy {
+        Some(strategy) => {
+            let num_hands = hands.len();
+            let num_actions = strategy.len() / num_hands;
+            let array = F32Array::new_2d(strategy, num_actions, num_hands);
+            Some(Py::new(py, array)?)
+        }
+        None => None,
+    };
+
+    let columns = PlayerColumns {
+        hands: PyList::new(py, &hands).into(),
+        index: index.into(),
+        weights: Py::new(py, F32Array::new_1d(weights))?,
+        equity: Py::new(py, F32Array::new_1d(equity.clone()))?,
+        ev: Py::new(py, F32Array::new_1d(ev))?,
+        eqr: Py::new(py, F32Array::new_1d(eqr))?,
+        strategy,
+    };
+
+    Ok((Py::new(py, columns)?, equity))
+}
+
+/// Extracts the root-node results of a solved game in columnar form.
+pub fn build_columnar_result(
+    py: Python,
+    game: &mut PostFlopGame,
+    solved: &SolvedSpot,
+) -> PyResult<SpotResult> {
+    solved.spans.time("cache_normalized_weights", || {
+        // Cached games may have been navigated away from the root
+        game.back_to_root();
+        game.cache_normalized_weights();
+    });
+
+    let info = ResultInfo {
+        stats: solved.stats,
+        status: solved.status,
+        tier: solved.tier,
+        pot: solved.pot,
+        bunching: solved.bunching,
+        spans: &solved.spans,
+    };
+    build_root_result(py, || RootValues::from_game(game), &info)
+}
+
+/// Builds the columnar result of a solved spot from the root-node values returned by `root`.
+pub fn build_root_result(
+    py: Python,
+    root: impl FnOnce() -> RootValues,
+    info: &ResultInfo,
+) -> PyResult<SpotResult> {
+    let pot = info.pot;
+
+    // the columns are filled as they are computed, so this includes the marshalling
+    let (legal_actions, (hero, hero_equity), (villain, villain_equity), starting_pot) =
+        info.spans.time("extraction", || {
+            let RootValues {
+                actions,
+                private_cards: [hero_hands, villain_hands],
+                weights: [hero_weights, villain_weights],
+                equity: [hero_equity, villain_equity],
+                ev: [hero_ev, villain_ev],
+                strategy,
+                starting_pot,
+            } = root();
+            let legal_actions: Vec<_> = actions.iter().map(|action| action.to_string()).collect();
+            Ok::<_, PyErr>((
+                legal_actions,
+                player_columns(
+                    py,
+                    &hero_hands,
+                    hero_weights,
+                    hero_equity,
+                    hero_ev,
+                    pot,
+                    Some(strategy),
+                )?,
+                player_columns(
+                    py,
+                    &villain_hands,
+                    villain_weights,
+                    villain_equity,
+                    villain_ev,
+                    pot,
+                    None,
+                )?,
+                starting_pot,
+            ))
+        })?;
+
+    let stats = &info.stats;
+    Ok(SpotResult {
+        hero,
+        villain,
+        legal_actions,
+        hero_buckets: calculate_equity_buckets(&hero_equity).to_vec(),
+        villain_buckets: calculate_equity_buckets(&villain_equity).to_vec(),
+        cache: info.status.as_str().to_string(),
+        tier: info.tier.to_string(),
+        exploitability: stats.exploitability,
+        iterations: stats.iterations,
+        estimated_iterations_saved: stats.iterations_saved,
+        solve_seconds: stats.elapsed.as_secs_f64(),
+        stop_reason: stats.stop_reason.as_str().to_string(),
+        bunching: info.bunching.as_str().to_string(),
+        starting_pot,
+        stage_seconds: info.spans.to_dict(py)?.into(),
+    })
+}
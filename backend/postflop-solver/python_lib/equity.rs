@@ -0,0 +1,67 @@
+// Range-vs-range equity without a solve.
+//
+// Much of what the explanations rely on (the "Equity" of each hand and the equity buckets) does
+// not depend on the strategies at all: it is the showdown equity of the two ranges over every
+// runout of the board. `range_equity` computes it directly from the ranges (see
+// `postflop_solver::compute_equity`), in milliseconds, so that the backend can answer equity-only
+// requests while a full solve of the same spot runs separately.
+
+use crate::{calculate_equity_buckets, preflop_ranges, SpotRequest};
+use postflop_solver::*;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use pyo3::types::PyDict;
+use std::time::Instant;
+
+/// Computes the equity of each hand of OOP (the hero) and IP on the board of `inputs` (same
+/// inputs as `solve_poker_spot`), without solving the spot.
+///
+/// The ranges are those at the end of the preflop line, also for a `subgame`, whose ranges are
+/// only known after solving the previous street. The returned dictionary has `Hero` and `Villain`
+/// (hand -> `{"Equity": ...}`), `Hero Equity Buckets` and `Villain Equity Buckets` (as in the
+/// result of `solve_poker_spot`), `Hero Range Equity`, `Villain Range Equity` and
+/// `Stage Seconds`. The GIL is released during the computation.
+#[pyfunction]
+pub fn range_equity(py: Python, inputs: &PyDict) -> PyResult<PyObject> {
+    let SpotRequest {
+        key,
+        repository,
+        spans,
+        ..
+    } = SpotRequest::extract(inputs)?;
+
+    let result = py.allow_threads(|| {
+        let range = spans.time("range_lookup", || preflop_ranges(&repository, &key))?;
+        let card_config = CardConfig {
+            range,
+            flop: key.flop,
+            turn: key.turn,
+            river: key.river,
+        };
+        spans
+            .time("equity", || compute_equity(&card_config))
+            .map_err(PyValueError::new_err)
+    })?;
+
+    let marshalling_start = Instant::now();
+    let dict = PyDict::new(py);
+    for (player, name) in [(0, "Hero"), (1, "Villain")] {
+        let hands = PyDict::new(py);
+        let hand_strs = holes_to_strings(&result.private_cards[player]).unwrap();
+        for (hand_str, &equity) in hand_strs.iter().zip(&result.equity[player]) {
+            let hand_info = PyDict::new(py);
+            hand_info.set_item("Equity", equity)?;
+            hands.set_item(hand_str, hand_info)?;
+        }
+        dict.set_item(name, hands)?;
+        dict.set_item(
+            format!("{name} Equity Buckets"),
+            calculate_equity_buckets(&result.equity[player]),
+        )?;
+        dict.set_item(format!("{name} Range Equity"), result.range_equity(player))?;
+    }
+    spans.record("marshalling", marshalling_start.elapsed());
+    dict.set_item("Stage Seconds", spans.to_dict(py)?)?;
+
+    Ok(dict.into())
+}
@@ -1,105 +1,874 @@
+mod batch;
+mod bunching;
+mod cache;
+mod columnar;
+mod equity;
+mod locking;
+mod memory;
+mod metrics;
+mod profile;
+mod ranges;
+mod session;
+mod solution;
+mod subgame;
+mod task;
+
+use bunching::{BunchingKey, BunchingStatus};
+use cache::*;
+use columnar::*;
+use memory::{AdmissionError, Reservation};
+use metrics::Spans;
 use postflop_solver::*;
+use pyo3::create_exception;
+use pyo3::exceptions::{PyException, PyIOError, PyRuntimeError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::types::PyDict;
+use ranges::{PreflopLine, RangeRepository};
+use session::GameSession;
 use std::collections::HashMap;
-use std::fs;
-use std::path::Path;
-use std::path::PathBuf;
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::Arc;
+use std::time::{Duration, Instant};
+use task::SolveTask;
+
+create_exception!(python_lib, SolveCancelled, PyException);
+create_exception!(python_lib, SolveRejected, PyException);
+
+const MAX_NUM_ITERATIONS: u32 = 10000;
+const DEFAULT_TIER: &str = "standard";
+
+/// Accuracy/latency preset of a solve, selected with the `tier` input.
+struct Tier {
+    name: &'static str,
+    bet_sizes: (&'static str, &'static str),
+    /// Target exploitability in percent of the starting pot.
+    target_exploitability_pct: f32,
+    deadline: Duration,
+}
+
+const TIERS: [Tier; 3] = [
+    Tier {
+        name: "fast",
+        bet_sizes: ("50%", "2.5x"),
+        target_exploitability_pct: 0.5,
+        deadline: Duration::from_secs(3),
+    },
+    Tier {
+        name: "standard",
+        bet_sizes: ("50%, a", "2.5x"),
+        // the accuracy of solves before tiers existed
+        target_exploitability_pct: 0.01,
+        deadline: Duration::from_secs(15),
+    },
+    Tier {
+        name: "precise",
+        bet_sizes: ("33%, 75%, a", "2.5x, a"),
+        target_exploitability_pct: 0.005,
+        deadline: Duration::from_secs(60),
+    },
+];
+
+/// Configuration of the upstream spots of subgames, which only narrow the ranges of the next
+/// street: a small tree solved to a loose target within a short deadline, so that the solve of the
+/// previous street does not dominate a subgame request.
+const UPSTREAM_TIER: Tier = Tier {
+    name: "upstream",
+    bet_sizes: ("50%", "2.5x"),
+    target_exploitability_pct: 1.0,
+    deadline: Duration::from_secs(2),
+};
 
+fn tier_from_str(name: &str) -> PyResult<&'static Tier> {
+    TIERS.iter().find(|tier| tier.name == name).ok_or_else(|| {
+        let names = TIERS.iter().map(|tier| tier.name).collect::<Vec<_>>();
+        PyValueError::new_err(format!(
+            "Unknown tier: {} (expected one of {})",
+            name,
+            names.join(", ")
+        ))
+    })
+}
+
+/// Inputs of a single spot, as sent by the backend.
+struct SpotInputs {
+    effective_stack: i32,
+    pot_before_flop: i32,
+    preflop_action: String,
+    flop_cards: String,
+    flop_bet: Option<i32>,
+    turn_card: Option<String>,
+    turn_bet: Option<i32>,
+    river_card: Option<String>,
+    river_bet: Option<i32>,
+    tier: String,
+    /// Whether to model the card removal of the folded players.
+    bunching: bool,
+    /// Whether to solve a turn or river spot as a subgame of the previous street.
+    subgame: bool,
+}
+
+/// Reasons why a solve did not produce a game.
+enum SolveError {
+    Io(String),
+    /// The spot cannot be built, e.g. its stacks or bet sizes are invalid.
+    Invalid(String),
+    Cancelled,
+    /// The game does not fit in the solver memory budget.
+    Rejected(String),
+    /// The solver panicked.
+    Panicked(String),
+}
+
+impl From<SolveError> for PyErr {
+    fn from(err: SolveError) -> PyErr {
+        match err {
+            SolveError::Io(msg) => PyIOError::new_err(msg),
+            SolveError::Invalid(msg) => PyValueError::new_err(msg),
+            SolveError::Cancelled => SolveCancelled::new_err("Solve was cancelled"),
+            SolveError::Rejected(msg) => SolveRejected::new_err(msg),
+            SolveError::Panicked(msg) => PyRuntimeError::new_err(msg),
+        }
+    }
+}
+
+/// A flag shared between Python and a running solve to request its cancellation.
+#[pyclass]
+#[derive(Clone, Default)]
+struct CancelToken {
+    flag: Arc<AtomicBool>,
+}
+
+#[pymethods]
+impl CancelToken {
+    #[new]
+    fn new() -> Self {
+        Self::default()
+    }
+
+    /// Requests the cancellation. The solve stops before its next iteration.
+    fn cancel(&self) {
+        self.flag.store(true, Ordering::Relaxed);
+    }
+
+    fn is_cancelled(&self) -> bool {
+        self.flag.load(Ordering::Relaxed)
+    }
+}
+
+/// Returns the input `name`, which must be present (possibly `None`).
+fn required<'py>(inputs: &'py PyDict, name: &str) -> PyResult<&'py PyAny> {
+    inputs
+        .get_item(name)
+        .ok_or_else(|| PyValueError::new_err(format!("Missing input: {name}")))
+}
+
+impl SpotInputs {
+    fn extract(inputs: &PyDict) -> PyResult<Self> {
+        Ok(Self {
+            effective_stack: required(inputs, "effective_stack")?.extract()?,
+            pot_before_flop: required(inputs, "pot_before_flop")?.extract()?,
+            preflop_action: required(inputs, "preflop_action")?.extract()?,
+            flop_cards: required(inputs, "flop_cards")?.extract()?,
+            flop_bet: required(inputs, "flop_bet")?.extract()?,
+            turn_card: required(inputs, "turn_card")?.extract()?,
+            turn_bet: required(inputs, "turn_bet")?.extract()?,
+            river_card: required(inputs, "river_card")?.extract()?,
+            river_bet: required(inputs, "river_bet")?.extract()?,
+            tier: match inputs.get_item("tier") {
+                Some(tier) if !tier.is_none() => tier.extract()?,
+                _ => DEFAULT_TIER.to_string(),
+            },
+            bunching: match inputs.get_item("bunching") {
+                Some(bunching) if !bunching.is_none() => bunching.is_true()?,
+                _ => false,
+            },
+            subgame: match inputs.get_item("subgame") {
+                Some(subgame) if !subgame.is_none() => subgame.is_true()?,
+                _ => false,
+            },
+        })
+    }
+
+    /// Calculates the total pot based on bets made on the flop, turn, and river.
+    fn total_pot(&self) -> f32 {
+        let mut pot = self.pot_before_flop as f32;
+        for bet in [self.flop_bet, self.turn_bet, self.river_bet]
+            .into_iter()
+            .flatten()
+        {
+            pot += 2.0 * bet as f32; // Assuming both players put in the bet
+        }
+        pot
+    }
+}
+
+/// Solves a spot and returns the root-node results.
+///
+/// The GIL is released while the game is loaded or solved. If `cancel` is given and cancelled
+/// during the solve, `SolveCancelled` is raised. If the game does not fit in the solver memory
+/// budget (see `configure_memory_budget`), `SolveRejected` is raised.
+#[pyfunction]
+#[pyo3(signature = (inputs, cancel = None))]
+fn solve_poker_spot(
+    py: Python,
+    inputs: &PyDict,
+    cancel: Option<CancelToken>,
+) -> PyResult<PyObject> {
+    let (_, solved) = solve_inputs(py, inputs, cancel)?;
+    let mut game = solved.game.lock().unwrap_or_else(|e| e.into_inner());
+
+    let result = build_result(py, &mut game, solved.pot, &solved.spans)?;
+    result.set_item("Cache", solved.status.as_str())?;
+    result.set_item("Tier", solved.tier)?;
+    result.set_item("Exploitability", solved.stats.exploitability)?;
+    result.set_item("Iterations", solved.stats.iterations)?;
+    result.set_item("Estimated Iterations Saved", solved.stats.iterations_saved)?;
+    result.set_item("Solve Seconds", solved.stats.elapsed.as_secs_f64())?;
+    result.set_item("Stop Reason", solved.stats.stop_reason.as_str())?;
+    result.set_item("Bunching", solved.bunching.as_str())?;
+    result.set_item("Starting Pot", game.tree_config().starting_pot)?;
+    result.set_item("Stage Seconds", solved.spans.to_dict(py)?)?;
+
+    Ok(result.into())
+}
+
+/// Same as `solve_poker_spot`, but returns a `SpotResult` whose per-hand values are contiguous
+/// `f32` buffers instead of one `dict` per hand.
+///
+/// If the game is not in memory and the library has a solution file of the spot, the root node
+/// is read from the file without loading the game.
 #[pyfunction]
-fn solve_poker_spot(py: Python, inputs: &PyDict) -> PyResult<PyObject> {
-    // Extract inputs from the Python dictionary
-    let effective_stack: i32 = inputs.get_item("effective_stack").unwrap().extract()?;
-    let pot_before_flop: i32 = inputs.get_item("pot_before_flop").unwrap().extract()?;
-    let preflop_action: String = inputs.get_item("preflop_action").unwrap().extract()?;
-    let flop_cards: String = inputs.get_item("flop_cards").unwrap().extract()?;
-    let flop_bet: Option<i32> = inputs.get_item("flop_bet").unwrap().extract()?;
-    let turn_card: Option<String> = inputs.get_item("turn_card").unwrap().extract()?;
-    let turn_bet: Option<i32> = inputs.get_item("turn_bet").unwrap().extract()?;
-    let river_card: Option<String> = inputs.get_item("river_card").unwrap().extract()?;
-    let river_bet: Option<i32> = inputs.get_item("river_bet").unwrap().extract()?;
-
-    let (ranges_path, position1, position2) = construct_ranges_path(&preflop_action);
-    println!("Ranges path: {}", ranges_path);
-
-    // Determine who is in position
-    let order1 = position_to_order(&position1);
-    let order2 = position_to_order(&position2);
-
-    // Calculate the total pot based on bets made on the flop, turn, and river
-    let mut pot = pot_before_flop as f32;
-
-    if let Some(flop_bet_amount) = flop_bet {
-        pot += 2.0 * flop_bet_amount as f32; // Assuming both players put in the bet
+#[pyo3(signature = (inputs, cancel = None))]
+fn solve_poker_spot_columnar(
+    py: Python,
+    inputs: &PyDict,
+    cancel: Option<CancelToken>,
+) -> PyResult<SpotResult> {
+    let request = SpotRequest::extract(inputs)?;
+
+    // the root node of a library solution file is read without loading the game
+    let start = Instant::now();
+    if let Some((root, stats)) = py.allow_threads(|| solution::library_root(&request.key)) {
+        request.spans.record("cache_lookup", start.elapsed());
+        let info = ResultInfo {
+            stats,
+            status: CacheStatus::Library,
+            tier: request.tier.name,
+            pot: request.pot,
+            bunching: request.bunching,
+            spans: &request.spans,
+        };
+        return build_root_result(py, || root, &info);
     }
-    if let Some(turn_bet_amount) = turn_bet {
-        pot += 2.0 * turn_bet_amount as f32;
+
+    let (_, solved) = solve_request(py, request, cancel)?;
+    let mut game = solved.game.lock().unwrap_or_else(|e| e.into_inner());
+    build_columnar_result(py, &mut game, &solved)
+}
+
+/// A solved spot and where it came from.
+struct SolvedSpot {
+    game: SharedGame,
+    stats: SolveStats,
+    status: CacheStatus,
+    tier: &'static str,
+    /// Total pot used for EQR.
+    pot: f32,
+    /// Whether the solve modeled the bunching effect.
+    bunching: BunchingStatus,
+    /// Stages of the request that produced this result.
+    spans: Spans,
+}
+
+/// A spot ready to be looked up or solved.
+struct SpotRequest {
+    key: SpotKey,
+    tier: &'static Tier,
+    /// Total pot used for EQR.
+    pot: f32,
+    repository: Arc<RangeRepository>,
+    /// Whether the bunching effect is modeled (`key.bunching` is set only if it is ready).
+    bunching: BunchingStatus,
+    /// Stages of the request, starting with the range path lookup.
+    spans: Spans,
+}
+
+/// Looks up or solves the spot described by `inputs` without holding the GIL.
+fn solve_inputs(
+    py: Python,
+    inputs: &PyDict,
+    cancel: Option<CancelToken>,
+) -> PyResult<(SpotKey, SolvedSpot)> {
+    solve_request(py, SpotRequest::extract(inputs)?, cancel)
+}
+
+/// Looks up or solves an extracted spot without holding the GIL.
+fn solve_request(
+    py: Python,
+    request: SpotRequest,
+    cancel: Option<CancelToken>,
+) -> PyResult<(SpotKey, SolvedSpot)> {
+    let SpotRequest {
+        key,
+        tier,
+        pot,
+        repository,
+        bunching,
+        spans,
+    } = request;
+
+    let cancel = cancel.unwrap_or_default();
+    let start = Instant::now();
+    let (game, stats, status) = py.allow_threads(|| {
+        cache::get_or_solve(&key, || solve_spot(&repository, &key, &cancel.flag, &spans))
+    })?;
+    if status != CacheStatus::Miss {
+        spans.record("cache_lookup", start.elapsed());
     }
-    if let Some(river_bet_amount) = river_bet {
-        pot += 2.0 * river_bet_amount as f32;
+
+    let solved = SolvedSpot {
+        game,
+        stats,
+        status,
+        tier: tier.name,
+        pot,
+        bunching,
+        spans,
+    };
+    Ok((key, solved))
+}
+
+impl SpotRequest {
+    fn extract(inputs: &PyDict) -> PyResult<Self> {
+        let py = inputs.py();
+        // Extract inputs from the Python dictionary
+        let inputs = SpotInputs::extract(inputs)?;
+        let tier = tier_from_str(&inputs.tier)?;
+
+        let repository = ranges::global().map_err(PyIOError::new_err)?;
+        let spans = Spans::default();
+        let line = spans
+            .time("range_path", || repository.resolve(&inputs.preflop_action))
+            .map_err(PyValueError::new_err)?;
+        let PreflopLine {
+            path: ranges_path,
+            position1,
+            position2,
+            ..
+        } = line.clone();
+
+        // Determine who is in position
+        let order1 = position_to_order(&position1);
+        let order2 = position_to_order(&position2);
+
+        let pot = inputs.total_pot();
+
+        let (oop_position, ip_position) = if order1 < order2 {
+            (position1.clone(), position2.clone())
+        } else {
+            (position2.clone(), position1.clone())
+        };
+        // println!("OOP: {}, IP: {}", oop_position, ip_position);
+
+        // Parse flop, turn, river cards
+        let flop = flop_from_str(&inputs.flop_cards).map_err(PyValueError::new_err)?;
+        let turn = if let Some(card) = &inputs.turn_card {
+            card_from_str(card).map_err(PyValueError::new_err)?
+        } else {
+            NOT_DEALT
+        };
+        let river = if let Some(card) = &inputs.river_card {
+            card_from_str(card).map_err(PyValueError::new_err)?
+        } else {
+            NOT_DEALT
+        };
+
+        // The table of the fold ranges is computed in the background the first time; until it is
+        // ready, the spot is solved without the bunching effect
+        let (bunching_key, bunching) = if inputs.bunching {
+            match BunchingKey::new(&repository.fold_ranges(&line), flop) {
+                // may load the table from disk
+                Ok(key) => match py.allow_threads(|| bunching::status(&key)) {
+                    BunchingStatus::Ready => (Some(key), BunchingStatus::Ready),
+                    status => (None, status),
+                },
+                Err(_) => (None, BunchingStatus::Unavailable),
+            }
+        } else {
+            (None, BunchingStatus::Off)
+        };
+
+        let new_key = |tier: &Tier,
+                       turn: Card,
+                       river: Card,
+                       effective_stack: i32,
+                       starting_pot: i32,
+                       subgame: Option<Subgame>| SpotKey {
+            ranges_path: ranges_path.clone(),
+            oop_position: oop_position.clone(),
+            ip_position: ip_position.clone(),
+            flop,
+            turn,
+            river,
+            effective_stack,
+            starting_pot,
+            bet_sizes: (tier.bet_sizes.0.to_string(), tier.bet_sizes.1.to_string()),
+            target_exploitability: starting_pot as f32 * tier.target_exploitability_pct / 100.0,
+            max_num_iterations: MAX_NUM_ITERATIONS,
+            deadline: tier.deadline,
+            bunching: bunching_key.clone(),
+            subgame,
+        };
+
+        // A subgame starts at its street with the pot and stacks left by the bets of the previous
+        // streets, and its ranges are narrowed by the solution of the previous street (see
+        // `subgame`), which is solved with the cheap `UPSTREAM_TIER`. Otherwise the whole hand is
+        // solved from the flop pot and the preflop ranges.
+        let key = if inputs.subgame {
+            let streets = [
+                (turn, NOT_DEALT, inputs.flop_bet),
+                (turn, river, inputs.turn_bet),
+            ];
+            let num_streets = (turn != NOT_DEALT) as usize + (river != NOT_DEALT) as usize;
+            let street_tier = |street: usize| {
+                if street == num_streets {
+                    tier
+                } else {
+                    &UPSTREAM_TIER
+                }
+            };
+            let mut key = new_key(
+                street_tier(0),
+                NOT_DEALT,
+                NOT_DEALT,
+                inputs.effective_stack,
+                inputs.pot_before_flop,
+                None,
+            );
+            for (street, (turn, river, bet)) in streets.into_iter().take(num_streets).enumerate() {
+                let bet = bet.unwrap_or(0);
+                let effective_stack = key.effective_stack - bet;
+                if effective_stack <= 0 {
+                    return Err(PyValueError::new_err(
+                        "Bets of the previous streets exceed the effective stack",
+                    ));
+                }
+                let starting_pot = key.starting_pot + 2 * bet;
+                let subgame = Subgame {
+                    upstream: Box::new(key),
+                    bet,
+                };
+                key = new_key(
+                    street_tier(street + 1),
+                    turn,
+                    river,
+                    effective_stack,
+                    starting_pot,
+                    Some(subgame),
+                );
+            }
+            key
+        } else {
+            new_key(
+                tier,
+                turn,
+                river,
+                inputs.effective_stack,
+                inputs.pot_before_flop,
+                None,
+            )
+        };
+
+        Ok(Self {
+            key,
+            tier,
+            pot,
+            repository,
+            bunching,
+            spans,
+        })
     }
+}
 
-    let (oop_position, ip_position) = if order1 < order2 {
-        (position1.clone(), position2.clone())
-    } else {
-        (position2.clone(), position1.clone())
+/// Configures the cache of solved games.
+///
+/// If `directory` is `None`, only the in-memory tier is used. `library` is a read-only directory
+/// of precomputed solutions written by `solve_and_save`.
+#[pyfunction]
+#[pyo3(signature = (directory, disk_budget_bytes, memory_budget_bytes, library = None))]
+fn configure_cache(
+    directory: Option<String>,
+    disk_budget_bytes: u64,
+    memory_budget_bytes: u64,
+    library: Option<String>,
+) {
+    cache::configure(
+        directory.map(PathBuf::from),
+        library.map(PathBuf::from),
+        disk_budget_bytes,
+        memory_budget_bytes,
+    );
+}
+
+/// Solves a spot and saves the game into the directory `library`, bypassing the cache.
+///
+/// The file is named after the cache key of the spot, so that a cache configured with this
+/// library serves it. The solve runs to the target exploitability of the tier without the tier's
+/// deadline, unless `deadline_seconds` is given; a solve that stops before the target raises
+/// `RuntimeError` and nothing is saved, since the cache only serves converged solves. If
+/// `solution_street` (`"flop"`, `"turn"` or `"river"`) is given, a solution file for
+/// `open_solution` is also saved, with the nodes down to that street. Returns the file names, the
+/// solve stats and the memory usage of the game.
+#[pyfunction]
+#[pyo3(signature = (inputs, library, solution_street = None, deadline_seconds = None))]
+fn solve_and_save(
+    py: Python,
+    inputs: &PyDict,
+    library: String,
+    solution_street: Option<&str>,
+    deadline_seconds: Option<f64>,
+) -> PyResult<PyObject> {
+    let solution_street = match solution_street {
+        None => None,
+        Some("flop") => Some(BoardState::Flop),
+        Some("turn") => Some(BoardState::Turn),
+        Some("river") => Some(BoardState::River),
+        Some(street) => {
+            return Err(PyValueError::new_err(format!(
+                "Invalid solution street: {}",
+                street
+            )))
+        }
     };
-    // println!("OOP: {}, IP: {}", oop_position, ip_position);
 
-    // Now read the ranges for OOP and IP
-    let oop_range_file = format!("{}/{}.txt", ranges_path, oop_position);
-    let ip_range_file = format!("{}/{}.txt", ranges_path, ip_position);
+    let SpotRequest {
+        key,
+        tier,
+        repository,
+        bunching,
+        spans,
+        ..
+    } = SpotRequest::extract(inputs)?;
 
-    // println!("OOP range file: {}", oop_range_file);
-    // println!("IP range file: {}", ip_range_file);
+    let file_name = cache::file_name(&key);
+    let path = Path::new(&library).join(&file_name);
+    let never = AtomicBool::new(false);
 
-    // Read the ranges from the file
-    let oop_range_str = fs::read_to_string(oop_range_file).map_err(|_| {
-        PyErr::new::<pyo3::exceptions::PyIOError, _>("Failed to read OOP range file")
-    })?;
-    let ip_range_str = fs::read_to_string(ip_range_file).map_err(|_| {
-        PyErr::new::<pyo3::exceptions::PyIOError, _>("Failed to read IP range file")
+    let solution_file_name = solution_street.map(|_| cache::solution_file_name(&key));
+
+    // the game is saved under the key of the tier, whose deadline only applies to live requests
+    let build_key = SpotKey {
+        deadline: deadline_seconds.map_or(Duration::MAX, Duration::from_secs_f64),
+        ..key.clone()
+    };
+
+    let (stats, (uncompressed, compressed), file_bytes, solution_bytes) =
+        py.allow_threads(|| {
+            let (mut game, stats, _reservation) =
+                solve_spot(&repository, &build_key, &never, &spans)?;
+            if !stats.converged() {
+                return Err(PyRuntimeError::new_err(format!(
+                    "Solve stopped by {} at exploitability {} (target {}), not saved",
+                    stats.stop_reason.as_str(),
+                    stats.exploitability,
+                    key.target_exploitability
+                )));
+            }
+            let file_bytes = cache::save(&path, &key, &game, stats).map_err(SolveError::Io)?;
+            let solution_bytes = match (solution_street, &solution_file_name) {
+                (Some(street), Some(name)) => {
+                    let path = Path::new(&library).join(name);
+                    Some(
+                        cache::save_solution(&path, &key, &mut game, stats, street)
+                            .map_err(SolveError::Io)?,
+                    )
+                }
+                _ => None,
+            };
+            Ok::<_, PyErr>((stats, game.memory_usage(), file_bytes, solution_bytes))
+        })?;
+
+    let result = PyDict::new(py);
+    result.set_item("file", file_name)?;
+    result.set_item("tier", tier.name)?;
+    result.set_item("exploitability", stats.exploitability)?;
+    result.set_item("iterations", stats.iterations)?;
+    result.set_item("estimated_iterations_saved", stats.iterations_saved)?;
+    result.set_item("solve_seconds", stats.elapsed.as_secs_f64())?;
+    result.set_item("stop_reason", stats.stop_reason.as_str())?;
+    result.set_item("bunching", bunching.as_str())?;
+    result.set_item("memory_bytes", uncompressed)?;
+    result.set_item("memory_bytes_compressed", compressed)?;
+    result.set_item("file_bytes", file_bytes)?;
+    result.set_item("solution_file", solution_file_name)?;
+    result.set_item("solution_bytes", solution_bytes)?;
+    Ok(result.into())
+}
+
+/// Returns the preflop action sequences (e.g. `"BTN,BB"`) of at most `max_actions` positions that
+/// the range repository has ranges for.
+#[pyfunction]
+#[pyo3(signature = (max_actions = 4))]
+fn preflop_lines(max_actions: usize) -> PyResult<Vec<String>> {
+    let repository = ranges::global().map_err(PyIOError::new_err)?;
+    Ok(repository.preflop_lines(max_actions))
+}
+
+/// Loads the scraped preflop range tree rooted at `root` and uses it for all later solves.
+///
+/// If `index_path` is given, the compact index file is memory-mapped when it exists (unless
+/// `rebuild` is set) and written from the range tree otherwise. Returns the number of tree nodes
+/// and ranges.
+#[pyfunction]
+#[pyo3(signature = (root, index_path = None, rebuild = false))]
+fn load_range_repository(
+    py: Python,
+    root: String,
+    index_path: Option<String>,
+    rebuild: bool,
+) -> PyResult<PyObject> {
+    let repository = py
+        .allow_threads(|| {
+            ranges::load(
+                Path::new(&root),
+                index_path.as_deref().map(Path::new),
+                rebuild,
+            )
+        })
+        .map_err(PyIOError::new_err)?;
+    let repository = ranges::install(repository);
+    let (num_nodes, num_ranges) = repository.len();
+
+    let result = PyDict::new(py);
+    result.set_item("root", repository.root().to_string_lossy().to_string())?;
+    result.set_item("nodes", num_nodes)?;
+    result.set_item("ranges", num_ranges)?;
+    Ok(result.into())
+}
+
+/// Returns the hit/miss counters and the current usage of the cache of solved games.
+#[pyfunction]
+fn cache_stats(py: Python) -> PyResult<PyObject> {
+    let cache = cache::global();
+    let stats = cache.stats();
+    let ((hot_entries, hot_bytes), (disk_entries, disk_bytes)) = cache.usage();
+
+    let result = PyDict::new(py);
+    result.set_item("memory_hits", stats.memory_hits)?;
+    result.set_item("disk_hits", stats.disk_hits)?;
+    result.set_item("library_hits", stats.library_hits)?;
+    result.set_item("misses", stats.misses)?;
+    result.set_item("memory_entries", hot_entries)?;
+    result.set_item("memory_bytes", hot_bytes)?;
+    result.set_item("disk_entries", disk_entries)?;
+    result.set_item("disk_bytes", disk_bytes)?;
+    result.set_item(
+        "directory",
+        cache.directory().map(|d| d.to_string_lossy().to_string()),
+    )?;
+    result.set_item(
+        "library",
+        cache.library().map(|d| d.to_string_lossy().to_string()),
+    )?;
+    Ok(result.into())
+}
+
+/// Sets the memory budget of running solves and how long a solve waits for memory before it is
+/// rejected with `SolveRejected`.
+///
+/// Games in the cache are not counted; their memory is bounded by `configure_cache`.
+#[pyfunction]
+#[pyo3(signature = (budget_bytes, max_wait_seconds = 30.0))]
+fn configure_memory_budget(budget_bytes: u64, max_wait_seconds: f64) {
+    memory::configure(budget_bytes, Duration::from_secs_f64(max_wait_seconds));
+}
+
+/// Returns the memory budget of running solves, the memory currently reserved by them and the
+/// admission counters.
+#[pyfunction]
+fn memory_status(py: Python) -> PyResult<PyObject> {
+    let (budget, reserved, active, waiting, stats) = memory::global().status();
+
+    let result = PyDict::new(py);
+    result.set_item("budget_bytes", budget)?;
+    result.set_item("reserved_bytes", reserved)?;
+    result.set_item("available_bytes", budget.saturating_sub(reserved))?;
+    result.set_item("active_solves", active)?;
+    result.set_item("waiting_solves", waiting)?;
+    result.set_item("admitted", stats.admitted)?;
+    result.set_item("compressed", stats.compressed)?;
+    result.set_item("queued", stats.queued)?;
+    result.set_item("rejected", stats.rejected)?;
+    Ok(result.into())
+}
+
+/// Configures the cache of bunching-effect tables (see `bunching`).
+///
+/// Tables are saved in `directory` (kept in memory only if `None`), computed by `workers`
+/// background threads, and the `memory_entries` most recently used ones are kept in memory.
+#[pyfunction]
+#[pyo3(signature = (directory = None, workers = 1, memory_entries = 2))]
+fn configure_bunching(directory: Option<String>, workers: usize, memory_entries: usize) {
+    bunching::configure(directory.map(PathBuf::from), workers, memory_entries);
+}
+
+/// Returns the counters of the cache of bunching-effect tables and the number of tables being
+/// computed.
+#[pyfunction]
+fn bunching_status(py: Python) -> PyResult<PyObject> {
+    let (directory, workers, memory_entries, pending, stats, last_error) =
+        bunching::global().status();
+
+    let result = PyDict::new(py);
+    result.set_item(
+        "directory",
+        directory.map(|d| d.to_string_lossy().to_string()),
+    )?;
+    result.set_item("workers", workers)?;
+    result.set_item("memory_entries", memory_entries)?;
+    result.set_item("pending", pending)?;
+    result.set_item("memory_hits", stats.memory_hits)?;
+    result.set_item("disk_hits", stats.disk_hits)?;
+    result.set_item("computed", stats.computed)?;
+    result.set_item("failed", stats.failed)?;
+    result.set_item("last_error", last_error)?;
+    Ok(result.into())
+}
+
+/// Builds and solves the game described by `key`, recording its stages in `spans`.
+///
+/// The memory reservation of the game is returned with it, to be held until the game is handed
+/// over to the cache.
+fn solve_spot(
+    repository: &RangeRepository,
+    key: &SpotKey,
+    cancel: &AtomicBool,
+    spans: &Spans,
+) -> Result<(PostFlopGame, SolveStats, Reservation), SolveError> {
+    let (mut game, reservation) = build_game(repository, key, cancel, spans)?;
+    let cold_iterations = spans.time("warm_start", || warm_start(&mut game, key));
+    let stats = spans.time("solve", || {
+        run_solver(
+            &mut game,
+            key.max_num_iterations,
+            key.target_exploitability,
+            key.deadline,
+            cold_iterations,
+            cancel,
+        )
     })?;
+    metrics::record_solve(&game, key, &stats);
 
-    // Create ranges
-    let oop_range = oop_range_str.parse::<Range>().unwrap();
-    let ip_range = ip_range_str.parse::<Range>().unwrap();
+    Ok((game, stats, reservation))
+}
 
-    // Parse flop, turn, river cards
-    let flop = flop_from_str(&flop_cards).unwrap();
-    let turn = if let Some(card) = turn_card {
-        card_from_str(&card).unwrap()
-    } else {
-        NOT_DEALT
-    };
-    let river = if let Some(card) = river_card {
-        card_from_str(&card).unwrap()
+/// Builds the game described by `key` and allocates its memory.
+///
+/// The memory is reserved from the solver memory budget first: the game is compressed if only the
+/// compressed storage fits, and waits for running solves to finish if neither fits.
+fn build_game(
+    repository: &RangeRepository,
+    key: &SpotKey,
+    cancel: &AtomicBool,
+    spans: &Spans,
+) -> Result<(PostFlopGame, Reservation), SolveError> {
+    let stage = if key.subgame.is_some() {
+        "subgame_ranges"
     } else {
-        NOT_DEALT
+        "range_lookup"
     };
+    let ranges = spans.time(stage, || game_ranges(repository, key, cancel))?;
+    let mut game = spans.time("tree_build", || new_game(ranges, key))?;
+    if key.bunching.is_some() {
+        spans.time("bunching_load", || set_bunching(&mut game, key))?;
+    }
+    let reservation = spans.time("memory_admission", || reserve_memory(&game, key, cancel))?;
+    spans.time("allocate_memory", || {
+        game.allocate_memory(reservation.compressed())
+    });
+    Ok((game, reservation))
+}
+
+/// Looks up the ranges of OOP and IP for `key`.
+///
+/// The ranges of a subgame are narrowed in the solution of its upstream spot, which is looked up
+/// (including in the library) or solved through the cache like any other spot: a hand followed
+/// street by street solves each street once. If the upstream spot cannot be solved (e.g., it does
+/// not fit in the memory budget) or no line of it reaches the street, the preflop ranges are used.
+fn game_ranges(
+    repository: &RangeRepository,
+    key: &SpotKey,
+    cancel: &AtomicBool,
+) -> Result<[Range; 2], SolveError> {
+    if let Some(Subgame { upstream, bet }) = &key.subgame {
+        let solved = cache::get_or_solve(upstream, || {
+            solve_spot(repository, upstream, cancel, &Spans::default())
+        });
+        match solved {
+            Ok((game, _, _)) => {
+                let mut game = game.lock().unwrap_or_else(|e| e.into_inner());
+                if let Ok(ranges) = subgame::narrow_ranges(&mut game, *bet) {
+                    return Ok(ranges);
+                }
+            }
+            Err(err @ (SolveError::Cancelled | SolveError::Invalid(_))) => return Err(err),
+            Err(SolveError::Io(_) | SolveError::Rejected(_) | SolveError::Panicked(_)) => {}
+        }
+    }
+    preflop_ranges(repository, key)
+}
+
+/// Looks up the ranges of OOP and IP at the end of the preflop line of `key`.
+fn preflop_ranges(repository: &RangeRepository, key: &SpotKey) -> Result<[Range; 2], SolveError> {
+    let oop_range = repository
+        .range(&key.ranges_path, &key.oop_position)
+        .ok_or_else(|| SolveError::Io("OOP range not found in range repository".to_string()))?;
+    let ip_range = repository
+        .range(&key.ranges_path, &key.ip_position)
+        .ok_or_else(|| SolveError::Io("IP range not found in range repository".to_string()))?;
+    Ok([oop_range, ip_range])
+}
 
+/// Builds the game tree of `key` (without allocating its memory).
+fn new_game(range: [Range; 2], key: &SpotKey) -> Result<PostFlopGame, SolveError> {
+    let action_tree = ActionTree::new(tree_config(key)?).map_err(SolveError::Invalid)?;
+    game_with_tree(range, key, action_tree)
+}
+
+/// Creates the game of `key` from its action tree (see `tree_config`).
+fn game_with_tree(
+    range: [Range; 2],
+    key: &SpotKey,
+    action_tree: ActionTree,
+) -> Result<PostFlopGame, SolveError> {
     // Set up card configuration
     let card_config = CardConfig {
-        range: [oop_range, ip_range],
-        flop,
-        turn,
-        river,
+        range,
+        flop: key.flop,
+        turn: key.turn,
+        river: key.river,
     };
 
+    PostFlopGame::with_config(card_config, action_tree).map_err(SolveError::Invalid)
+}
+
+/// Returns the configuration of the action tree of `key`.
+fn tree_config(key: &SpotKey) -> Result<TreeConfig, SolveError> {
     // Define bet sizes (simplified for this example)
-    let bet_sizes = BetSizeOptions::try_from(("50%, a", "2.5x")).unwrap();
+    let bet_sizes = BetSizeOptions::try_from((key.bet_sizes.0.as_str(), key.bet_sizes.1.as_str()))
+        .map_err(SolveError::Invalid)?;
 
-    // Set up tree configuration
-    let tree_config = TreeConfig {
-        initial_state: if river != NOT_DEALT {
+    Ok(TreeConfig {
+        initial_state: if key.river != NOT_DEALT {
             BoardState::River
-        } else if turn != NOT_DEALT {
+        } else if key.turn != NOT_DEALT {
             BoardState::Turn
         } else {
             BoardState::Flop
         },
-        starting_pot: pot_before_flop,
-        effective_stack,
+        starting_pot: key.starting_pot,
+        effective_stack: key.effective_stack,
         rake_rate: 0.0,
         rake_cap: 0.0,
         flop_bet_sizes: [bet_sizes.clone(), bet_sizes.clone()],
@@ -110,37 +879,245 @@ fn solve_poker_spot(py: Python, inputs: &PyDict) -> PyResult<PyObject> {
         add_allin_threshold: 1.5,
         force_allin_threshold: 0.15,
         merging_threshold: 0.1,
-    };
+    })
+}
 
-    // Build the game tree and create the game
-    let action_tree = ActionTree::new(tree_config).unwrap();
-    let mut game = PostFlopGame::with_config(card_config, action_tree).unwrap();
+/// Sets the bunching effect of `game` if `key` models it.
+fn set_bunching(game: &mut PostFlopGame, key: &SpotKey) -> Result<(), SolveError> {
+    if let Some(bunching) = &key.bunching {
+        let data = bunching::get(bunching).map_err(SolveError::Io)?;
+        game.set_bunching_effect(&data).map_err(SolveError::Io)?;
+    }
+    Ok(())
+}
 
-    // Allocate memory and solve the game
-    game.allocate_memory(false);
-    let max_num_iterations = 10000;
-    let target_exploitability = game.tree_config().starting_pot as f32 * 0.0001;
-    solve(&mut game, max_num_iterations, target_exploitability, true);
+/// Reserves the memory of the game of `key` from the solver memory budget (see
+/// `memory::MemoryBudget`).
+fn reserve_memory(
+    game: &PostFlopGame,
+    key: &SpotKey,
+    cancel: &AtomicBool,
+) -> Result<Reservation, SolveError> {
+    let (mut uncompressed, mut compressed) = game.memory_usage();
+    if key.bunching.is_some() {
+        uncompressed += game.memory_usage_bunching();
+        compressed += game.memory_usage_bunching();
+    }
+    memory::global()
+        .admit(uncompressed, compressed, cancel)
+        .map_err(|err| match err {
+            AdmissionError::Rejected(msg) => SolveError::Rejected(msg),
+            AdmissionError::Cancelled => SolveError::Cancelled,
+        })
+}
 
-    // Cache normalized weights
-    game.cache_normalized_weights();
+/// Seeds `game` from the nearest hot solution of a similar spot (see `cache::find_warm_start`).
+///
+/// Returns the estimated number of iterations a cold start would need, or `None` if the game was
+/// not warm-started.
+fn warm_start(game: &mut PostFlopGame, key: &SpotKey) -> Option<u32> {
+    let (source, stats, source_key) = cache::find_warm_start(key)?;
+    game.warm_start(&source.lock().unwrap_or_else(|e| e.into_inner()))
+        .ok()?;
 
-    // Get equities and EVs for both players
-    let equities_oop = game.equity(0);
-    let evs_oop = game.expected_values(0);
-    let equities_ip = game.equity(1);
-    let evs_ip = game.expected_values(1);
+    // with the exploitability decaying as `1/t`, the iterations scale with the inverse of the
+    // target relative to the pot
+    let precision = |key: &SpotKey| key.target_exploitability / key.starting_pot as f32;
+    let cold_iterations = (stats.iterations + stats.iterations_saved) as f32
+        * precision(&source_key)
+        / precision(key);
+    Some(cold_iterations.round() as u32)
+}
+
+/// Runs the solver until the target exploitability, the deadline or `max_num_iterations` is
+/// reached, checking `cancel` before every iteration.
+///
+/// `cold_iterations` is the estimate returned by `warm_start` if the game was warm-started.
+fn run_solver(
+    game: &mut PostFlopGame,
+    max_num_iterations: u32,
+    target_exploitability: f32,
+    deadline: Duration,
+    cold_iterations: Option<u32>,
+    cancel: &AtomicBool,
+) -> Result<SolveStats, SolveError> {
+    let mut run = SolverRun::new(
+        game,
+        max_num_iterations,
+        target_exploitability,
+        deadline,
+        cold_iterations,
+    );
+    loop {
+        if let Some(stop_reason) = run.step(game, cancel)? {
+            return Ok(run.finish(game, stop_reason));
+        }
+    }
+}
+
+/// Progress of a solve driven step by step.
+///
+/// Computing the exploitability costs about as much as an iteration, so it is not computed at a
+/// fixed interval. After each check, the next one is scheduled where the target is expected to be
+/// reached if the exploitability keeps decaying as `1/t`, but at least far enough away to keep the
+/// checks under ~20% of the solve time and at most half the current iteration count away.
+struct SolverRun {
+    start: Instant,
+    max_num_iterations: u32,
+    target_exploitability: f32,
+    deadline: Duration,
+    iteration: u32,
+    /// Iteration number passed to `solve_step` for the first iteration of this run.
+    first_iteration: u32,
+    /// Estimated iterations of a cold start, if the game was warm-started.
+    cold_iterations: Option<u32>,
+    exploitability: f32,
+    measured_at: u32,
+    next_check: u32,
+    total_check_time: Duration,
+}
+
+impl SolverRun {
+    fn new(
+        game: &PostFlopGame,
+        max_num_iterations: u32,
+        target_exploitability: f32,
+        deadline: Duration,
+        cold_iterations: Option<u32>,
+    ) -> Self {
+        let start = Instant::now();
+        let exploitability = compute_exploitability(game);
+        Self {
+            start,
+            max_num_iterations,
+            target_exploitability,
+            deadline,
+            iteration: 0,
+            first_iteration: match cold_iterations {
+                Some(_) => WARM_START_ITERATION,
+                None => 0,
+            },
+            cold_iterations,
+            exploitability,
+            measured_at: 0,
+            next_check: 1,
+            total_check_time: start.elapsed(),
+        }
+    }
+
+    /// Runs iterations up to the next exploitability check.
+    ///
+    /// Returns the reason to stop once the solve is over; `finish` must be called then.
+    fn step(
+        &mut self,
+        game: &mut PostFlopGame,
+        cancel: &AtomicBool,
+    ) -> Result<Option<StopReason>, SolveError> {
+        loop {
+            if self.exploitability <= self.target_exploitability {
+                return Ok(Some(StopReason::Target));
+            }
+
+            if self.iteration == self.max_num_iterations {
+                return Ok(Some(StopReason::MaxIterations));
+            }
+
+            if cancel.load(Ordering::Relaxed) {
+                return Err(SolveError::Cancelled);
+            }
+
+            if self.start.elapsed() >= self.deadline {
+                return Ok(Some(StopReason::Deadline));
+            }
+
+            solve_step(game, self.first_iteration + self.iteration);
+            self.iteration += 1;
+
+            if self.iteration >= self.next_check || self.iteration == self.max_num_iterations {
+                self.check(game);
+                return Ok(None);
+            }
+        }
+    }
+
+    fn check(&mut self, game: &PostFlopGame) {
+        let t = self.iteration;
+        let check_start = Instant::now();
+        self.exploitability = compute_exploitability(game);
+        let check_time = check_start.elapsed();
+        self.total_check_time += check_time;
+        self.measured_at = t;
+
+        let iteration_time =
+            (self.start.elapsed() - self.total_check_time).as_secs_f32() / t as f32;
+        let min_gap = (4.0 * check_time.as_secs_f32() / iteration_time.max(1e-6))
+            .ceil()
+            .max(1.0);
+        let predicted = t as f32 * (self.exploitability / self.target_exploitability - 1.0);
+        self.next_check = t + predicted.clamp(min_gap, min_gap.max(t as f32 / 2.0)) as u32;
+    }
+
+    /// Finalizes the game and returns the stats of the solve.
+    fn finish(&mut self, game: &mut PostFlopGame, stop_reason: StopReason) -> SolveStats {
+        // the deadline may have been hit between two checks
+        if self.measured_at != self.iteration {
+            self.exploitability = compute_exploitability(game);
+            self.measured_at = self.iteration;
+        }
+
+        finalize(game);
+
+        SolveStats {
+            exploitability: self.exploitability,
+            iterations: self.iteration,
+            elapsed: self.start.elapsed(),
+            stop_reason,
+            iterations_saved: self
+                .cold_iterations
+                .filter(|_| stop_reason == StopReason::Target)
+                .map_or(0, |cold| cold.saturating_sub(self.iteration)),
+        }
+    }
+}
+
+/// Extracts the root-node results of a solved game into a Python dictionary.
+fn build_result<'py>(
+    py: Python<'py>,
+    game: &mut PostFlopGame,
+    pot: f32,
+    spans: &Spans,
+) -> PyResult<&'py PyDict> {
+    spans.time("cache_normalized_weights", || {
+        // Cached games may have been navigated away from the root
+        game.back_to_root();
+
+        // Cache normalized weights
+        game.cache_normalized_weights();
+    });
+
+    // Get equities, EVs and the hero's strategy
+    let (equities_oop, evs_oop, equities_ip, evs_ip, hero_range_action_prob) =
+        spans.time("extraction", || {
+            (
+                game.equity(0),
+                game.expected_values(0),
+                game.equity(1),
+                game.expected_values(1),
+                game.strategy(),
+            )
+        });
+    let marshalling_start = Instant::now();
 
     // Get the hand strings
     let oop_hands = game.private_cards(0);
     let ip_hands = game.private_cards(1);
-    let oop_hands_str = holes_to_strings(&oop_hands).unwrap();
-    let ip_hands_str = holes_to_strings(&ip_hands).unwrap();
+    let oop_hands_str = holes_to_strings(oop_hands).unwrap();
+    let ip_hands_str = holes_to_strings(ip_hands).unwrap();
 
     // Create dictionaries for hero and villain
-    let mut hero_dict = PyDict::new(py);
+    let hero_dict = PyDict::new(py);
     for (i, hand_str) in oop_hands_str.iter().enumerate() {
-        let mut hand_info = PyDict::new(py);
+        let hand_info = PyDict::new(py);
         hand_info.set_item("EV", evs_oop[i])?;
         hand_info.set_item("Equity", equities_oop[i])?;
         // Handle division by zero
@@ -155,12 +1132,11 @@ fn solve_poker_spot(py: Python, inputs: &PyDict) -> PyResult<PyObject> {
 
     // Convert the legal actions to a list
     let action_list = game.available_actions();
-    let mut action_list_ret = PyDict::new(py);
+    let action_list_ret = PyDict::new(py);
     for (i, action) in action_list.iter().enumerate() {
         action_list_ret.set_item(i, action.to_string())?;
     }
     // Calculate Hero overall range action probabilities
-    let hero_range_action_prob = game.strategy();
     let num_hands = oop_hands_str.len();
     let num_actions = hero_range_action_prob.len() / num_hands;
 
@@ -176,9 +1152,9 @@ fn solve_poker_spot(py: Python, inputs: &PyDict) -> PyResult<PyObject> {
             .set_item("Actions Probabilities", actions_prob_list)?;
     }
 
-    let mut villain_dict = PyDict::new(py);
+    let villain_dict = PyDict::new(py);
     for (i, hand_str) in ip_hands_str.iter().enumerate() {
-        let mut hand_info = PyDict::new(py);
+        let hand_info = PyDict::new(py);
         hand_info.set_item("EV", evs_ip[i])?;
         hand_info.set_item("Equity", equities_ip[i])?;
         let eqr = if equities_ip[i] != 0.0 && pot != 0.0 {
@@ -201,8 +1177,9 @@ fn solve_poker_spot(py: Python, inputs: &PyDict) -> PyResult<PyObject> {
     result.set_item("Hero Equity Buckets", hero_buckets)?;
     result.set_item("Villain Equity Buckets", villain_buckets)?;
     result.set_item("Legal Actions", action_list_ret)?;
+    spans.record("marshalling", marshalling_start.elapsed());
 
-    Ok(result.into())
+    Ok(result)
 }
 
 fn position_to_order(position: &str) -> u8 {
@@ -217,12 +1194,15 @@ fn position_to_order(position: &str) -> u8 {
     }
 }
 
-fn construct_ranges_path(preflop_action: &str) -> (String, String, String) {
-    // Base directory for ranges
-    let mut path_elements = vec![
-        "C:\\Users\\yixiu\\Desktop\\PokerGTOExplained\\backend\\postflop-solver\\GTOWizard_Scraped_Ranges\\Cash6m50z100bbGeneral"
-            .to_string(),
-    ];
+/// Walks the range tree along `preflop_action` and returns the node of the resulting line.
+///
+/// Paths are relative to the repository root. Use `RangeRepository::resolve` instead, which
+/// memoizes the result.
+fn construct_ranges_path(
+    repository: &RangeRepository,
+    preflop_action: &str,
+) -> Result<PreflopLine, String> {
+    let mut path_elements: Vec<String> = Vec::new();
 
     // Define the standard order of positions in a 6-max game
     let standard_positions = vec!["UTG", "HJ", "CO", "BTN", "SB", "BB"];
@@ -231,7 +1211,14 @@ fn construct_ranges_path(preflop_action: &str) -> (String, String, String) {
     let action_positions: Vec<&str> = preflop_action.split(",").collect();
 
     if action_positions.len() < 2 {
-        panic!("Preflop action must have at least two positions");
+        return Err("Preflop action must have at least two positions".to_string());
+    }
+    // Every position is checked before walking the tree, which looks up the next one too
+    if let Some(position) = action_positions
+        .iter()
+        .find(|position| !standard_positions.contains(position))
+    {
+        return Err(format!("Unknown position: {}", position));
     }
 
     // Keep track of positions that have raised
@@ -243,6 +1230,18 @@ fn construct_ranges_path(preflop_action: &str) -> (String, String, String) {
     // Initialize last two positions
     let mut last_two_positions = Vec::new();
 
+    // The players who folded and the node at which each of them folded; the players before the
+    // first one to act fold at the root
+    let mut folds: Vec<(String, String)> = Vec::new();
+    if let Some(first) = standard_positions
+        .iter()
+        .position(|&p| p == action_sequence[0])
+    {
+        for &position in &standard_positions[..first] {
+            folds.push((position.to_string(), position.to_string()));
+        }
+    }
+
     // Process the action sequence
     let mut i = 0;
     while i < action_sequence.len() {
@@ -254,8 +1253,7 @@ fn construct_ranges_path(preflop_action: &str) -> (String, String, String) {
         // Get the action for this position
         let action = if i < action_sequence.len() - 1 {
             // Not the last action; get a non-call/all-in action
-            if let Some(action) = get_non_call_allin_action(&PathBuf::from(path_elements.join("/")))
-            {
+            if let Some(action) = get_non_call_allin_action(repository, &path_elements.join("/")) {
                 // Check if the action is a raise
                 let is_raise = is_raise_action(&action);
                 if is_raise {
@@ -263,7 +1261,7 @@ fn construct_ranges_path(preflop_action: &str) -> (String, String, String) {
                 }
                 action
             } else {
-                panic!("No valid action found for position {}", position);
+                return Err(format!("No valid action found for position {}", position));
             }
         } else {
             // Last action; assume it's a call
@@ -280,6 +1278,14 @@ fn construct_ranges_path(preflop_action: &str) -> (String, String, String) {
                 get_skipped_positions(&standard_positions, position, next_position);
 
             for skipped_position in skipped_positions {
+                if !folds
+                    .iter()
+                    .any(|(position, _)| *position == skipped_position)
+                {
+                    let node = format!("{}/{}", path_elements.join("/"), skipped_position);
+                    folds.push((skipped_position.clone(), node));
+                }
+
                 if has_raised.get(&skipped_position) == Some(&true) {
                     // Insert fold action for the skipped position
                     path_elements.push(skipped_position.to_string());
@@ -299,12 +1305,25 @@ fn construct_ranges_path(preflop_action: &str) -> (String, String, String) {
     // Convert the path elements to a path string
     let path_str = path_elements.join("/");
 
-    // Return the path and the last two positions
-    (
-        path_str,
-        last_two_positions[0].clone(),
-        last_two_positions[1].clone(),
-    )
+    // The players yet to act after the last call fold at its node
+    for &position in &standard_positions {
+        if !last_two_positions.iter().any(|p| p == position)
+            && !folds.iter().any(|(folded, _)| folded == position)
+        {
+            folds.push((position.to_string(), format!("{}/{}", path_str, position)));
+        }
+    }
+
+    // Players who acted again after folding (malformed sequences) did not fold
+    folds.retain(|(position, _)| !last_two_positions.contains(position));
+
+    // Return the path, the last two positions and the folds
+    Ok(PreflopLine {
+        path: path_str,
+        position1: last_two_positions[0].clone(),
+        position2: last_two_positions[1].clone(),
+        folds,
+    })
 }
 
 // Helper function to get skipped positions between two positions (with wrap-around)
@@ -341,19 +1360,12 @@ fn is_raise_action(action: &str) -> bool {
     action != "call" && action != "allin" && action != "fold"
 }
 
-fn get_non_call_allin_action(position_path: &Path) -> Option<String> {
-    if let Ok(entries) = fs::read_dir(position_path) {
-        for entry in entries {
-            if let Ok(entry) = entry {
-                let file_name = entry.file_name();
-                let action = file_name.to_string_lossy();
-                if action != "call" && action != "allin" && entry.path().is_dir() {
-                    return Some(action.to_string());
-                }
-            }
-        }
-    }
-    None
+fn get_non_call_allin_action(repository: &RangeRepository, position_path: &str) -> Option<String> {
+    repository
+        .children(position_path)?
+        .iter()
+        .find(|action| *action != "call" && *action != "allin")
+        .cloned()
 }
 
 fn calculate_equity_buckets(equities: &[f32]) -> [f32; 7] {
@@ -384,5 +1396,30 @@ fn calculate_equity_buckets(equities: &[f32]) -> [f32; 7] {
 #[pymodule]
 fn python_lib(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(solve_poker_spot, m)?)?;
+    m.add_function(wrap_pyfunction!(solve_poker_spot_columnar, m)?)?;
+    m.add_function(wrap_pyfunction!(batch::solve_poker_spots, m)?)?;
+    m.add_function(wrap_pyfunction!(equity::range_equity, m)?)?;
+    m.add_function(wrap_pyfunction!(configure_cache, m)?)?;
+    m.add_function(wrap_pyfunction!(cache_stats, m)?)?;
+    m.add_function(wrap_pyfunction!(load_range_repository, m)?)?;
+    m.add_function(wrap_pyfunction!(solve_and_save, m)?)?;
+    m.add_function(wrap_pyfunction!(preflop_lines, m)?)?;
+    m.add_function(wrap_pyfunction!(configure_memory_budget, m)?)?;
+    m.add_function(wrap_pyfunction!(memory_status, m)?)?;
+    m.add_function(wrap_pyfunction!(configure_bunching, m)?)?;
+    m.add_function(wrap_pyfunction!(bunching_status, m)?)?;
+    m.add_function(wrap_pyfunction!(solution::open_solution, m)?)?;
+    m.add_function(wrap_pyfunction!(profile::profile_solve, m)?)?;
+    m.add_function(wrap_pyfunction!(metrics::solver_metrics, m)?)?;
+    m.add_class::<CancelToken>()?;
+    m.add_class::<F32Array>()?;
+    m.add_class::<PlayerColumns>()?;
+    m.add_class::<SpotResult>()?;
+    m.add_class::<SolveTask>()?;
+    m.add_class::<batch::SpotBatch>()?;
+    m.add_class::<GameSession>()?;
+    m.add_class::<solution::SolutionReader>()?;
+    m.add("SolveCancelled", _py.get_type::<SolveCancelled>())?;
+    m.add("SolveRejected", _py.get_type::<SolveRejected>())?;
     Ok(())
 }
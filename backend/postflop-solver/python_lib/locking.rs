@@ -0,0 +1,259 @@
+// Node-locking what-if solves.
+//
+// "What if villain over-bluffs here?" is answered by locking strategies at some nodes of a solved
+// spot and solving it again. Instead of a cold solve per scenario, each scenario is solved on a
+// copy of the game seeded from the current solution (see `PostFlopGame::warm_start`) under a small
+// iteration budget, since only the parts of the tree affected by the locks have to move. The copy
+// is built once per batch of scenarios and its memory is reused by every scenario.
+
+use crate::cache::{SharedGame, SolveStats, SpotKey};
+use crate::memory::Reservation;
+use crate::{reserve_memory, run_solver, set_bunching, SolveError};
+use postflop_solver::*;
+use std::collections::HashMap;
+use std::sync::atomic::AtomicBool;
+use std::time::Duration;
+
+/// Default iteration budget of a scenario.
+pub const MAX_NUM_ITERATIONS: u32 = 200;
+
+/// A strategy to lock at one node, as requested.
+pub struct Lock {
+    /// Action indices (or dealt cards) from the root to the node.
+    pub history: Vec<usize>,
+    /// Action probabilities of every hand of the player to act, if given.
+    pub range: Option<Vec<f32>>,
+    /// Action probabilities of single hands (e.g. `"AsKd"`), overriding `range`. A hand whose
+    /// probabilities are all zero is left to the solver.
+    pub hands: HashMap<String, Vec<f32>>,
+}
+
+/// A lock resolved against the game: the `[action x hand]` strategy of the node of `history`.
+pub struct ResolvedLock {
+    history: Vec<usize>,
+    strategy: Vec<f32>,
+}
+
+/// Iteration budget of each scenario.
+pub struct Budget {
+    pub max_num_iterations: u32,
+    /// In chips.
+    pub target_exploitability: f32,
+    pub deadline: Duration,
+}
+
+/// Results at one node.
+pub struct NodeResults {
+    /// Player to act, or `None` at a chance node.
+    pub player: Option<usize>,
+    /// `[action x hand]` strategy of the player to act.
+    pub strategy: Option<Vec<f32>>,
+    /// Action frequencies of the whole range of the player to act.
+    pub range_strategy: Option<Vec<f32>>,
+    /// Expected values of each hand of OOP and IP.
+    pub expected_values: [Vec<f32>; 2],
+    /// Average expected value of the range of OOP and IP.
+    pub range_ev: [f32; 2],
+}
+
+/// Returns the hand string `hand` with its cards in the order of `holes_to_strings`.
+fn hand_string(hand: &str) -> Option<String> {
+    let mut chars = hand.chars();
+    let hole = (
+        card_from_chars(&mut chars).ok()?,
+        card_from_chars(&mut chars).ok()?,
+    );
+    if chars.next().is_some() {
+        return None;
+    }
+    hole_to_string(hole).ok()
+}
+
+/// Moves to the node of `history`, checking every action (`play` panics on invalid ones).
+fn apply_checked(game: &mut PostFlopGame, history: &[usize]) -> Result<(), String> {
+    game.back_to_root();
+    for &action in history {
+        if game.is_terminal_node() {
+            return Err(format!("History {:?} goes past a terminal node", history));
+        }
+        if game.is_chance_node() {
+            if action >= 52 || game.possible_cards() & (1u64 << action) == 0 {
+                return Err(format!("Card {} cannot be dealt", action));
+            }
+        } else if action >= game.available_actions().len() {
+            return Err(format!("Action {} is out of range", action));
+        }
+        game.play(action);
+    }
+    Ok(())
+}
+
+/// Returns the average of `values` weighted by `weights`, or 0 if no hand has weight.
+fn average(values: &[f32], weights: &[f32]) -> f32 {
+    if weights.iter().all(|&w| w <= 0.0) {
+        0.0
+    } else {
+        compute_average(values, weights)
+    }
+}
+
+/// Returns the results of the solved `game` at the node of `history`, which must not be terminal.
+pub fn node_results(game: &mut PostFlopGame, history: &[usize]) -> NodeResults {
+    game.apply_history(history);
+    game.cache_normalized_weights();
+
+    let expected_values = [game.expected_values(0), game.expected_values(1)];
+    let range_ev =
+        [0, 1].map(|player| average(&expected_values[player], game.normalized_weights(player)));
+
+    let (player, strategy, range_strategy) = if game.is_chance_node() {
+        (None, None, None)
+    } else {
+        let player = game.current_player();
+        let strategy = game.strategy();
+        let weights = game.normalized_weights(player);
+        let range_strategy = strategy
+            .chunks_exact(weights.len())
+            .map(|row| average(row, weights))
+            .collect();
+        (Some(player), Some(strategy), Some(range_strategy))
+    };
+
+    NodeResults {
+        player,
+        strategy,
+        range_strategy,
+        expected_values,
+        range_ev,
+    }
+}
+
+/// A copy of a solved game on which scenarios are solved.
+pub struct WhatIfGame {
+    game: PostFlopGame,
+    /// Histories of the nodes locked by the last scenario.
+    locked: Vec<Vec<usize>>,
+    _reservation: Reservation,
+}
+
+impl WhatIfGame {
+    /// Builds the game tree of `source` again and allocates its memory from the solver memory
+    /// budget.
+    pub fn new(
+        source: &SharedGame,
+        key: &SpotKey,
+        cancel: &AtomicBool,
+    ) -> Result<Self, SolveError> {
+        let (card_config, tree_config) = {
+            let source = source.lock().unwrap_or_else(|e| e.into_inner());
+            (source.card_config().clone(), source.tree_config().clone())
+        };
+        let action_tree = ActionTree::new(tree_config).map_err(SolveError::Invalid)?;
+        let mut game =
+            PostFlopGame::with_config(card_config, action_tree).map_err(SolveError::Invalid)?;
+        set_bunching(&mut game, key)?;
+        let reservation = reserve_memory(&game, key, cancel)?;
+        game.allocate_memory(reservation.compressed());
+        Ok(Self {
+            game,
+            locked: Vec::new(),
+            _reservation: reservation,
+        })
+    }
+
+    /// Checks `lock` and returns the strategy to lock at its node.
+    pub fn resolve(&mut self, lock: &Lock) -> Result<ResolvedLock, String> {
+        let game = &mut self.game;
+        apply_checked(game, &lock.history)?;
+        if game.is_terminal_node() || game.is_chance_node() {
+            return Err(format!("No player acts at history {:?}", lock.history));
+        }
+
+        let player = game.current_player();
+        let hands = holes_to_strings(game.private_cards(player)).unwrap();
+        let num_actions = game.available_actions().len();
+        let num_hands = hands.len();
+        let check = |probabilities: &[f32]| {
+            if probabilities.len() != num_actions {
+                return Err(format!(
+                    "Expected {} action probabilities at history {:?}",
+                    num_actions, lock.history
+                ));
+            }
+            Ok(())
+        };
+
+        let mut strategy = vec![0.0; num_actions * num_hands];
+        if let Some(range) = &lock.range {
+            check(range)?;
+            for (action, &probability) in range.iter().enumerate() {
+                strategy[action * num_hands..(action + 1) * num_hands].fill(probability);
+            }
+        }
+        for (hand, probabilities) in &lock.hands {
+            check(probabilities)?;
+            let index = hand_string(hand)
+                .and_then(|hand| hands.iter().position(|h| *h == hand))
+                .ok_or_else(|| format!("Hand {} is not in the range of player {}", hand, player))?;
+            for (action, &probability) in probabilities.iter().enumerate() {
+                strategy[action * num_hands + index] = probability;
+            }
+        }
+
+        Ok(ResolvedLock {
+            history: lock.history.clone(),
+            strategy,
+        })
+    }
+
+    /// Solves the scenario `locks` from the solution of `source` under `budget`.
+    ///
+    /// `cold_iterations` is the estimated number of iterations of a cold solve to the same target
+    /// (see `warm_start`), from which the stats estimate the iterations saved by starting from
+    /// the solution of `source` if the scenario reaches its target.
+    pub fn solve(
+        &mut self,
+        source: &SharedGame,
+        locks: &[ResolvedLock],
+        cold_iterations: Option<u32>,
+        budget: &Budget,
+        cancel: &AtomicBool,
+    ) -> Result<SolveStats, SolveError> {
+        let game = &mut self.game;
+
+        // allocating the memory again resets the solution of the previous scenario, but not its
+        // locks
+        game.allocate_memory(game.is_memory_allocated() == Some(true));
+        for history in self.locked.drain(..) {
+            game.apply_history(&history);
+            game.unlock_current_strategy();
+        }
+        game.back_to_root();
+
+        {
+            let source = source.lock().unwrap_or_else(|e| e.into_inner());
+            game.warm_start(&source).map_err(SolveError::Io)?;
+        }
+
+        for lock in locks {
+            game.apply_history(&lock.history);
+            game.lock_current_strategy(&lock.strategy);
+            self.locked.push(lock.history.clone());
+        }
+        game.back_to_root();
+
+        run_solver(
+            game,
+            budget.max_num_iterations,
+            budget.target_exploitability,
+            budget.deadline,
+            cold_iterations,
+            cancel,
+        )
+    }
+
+    /// Returns the results of the last solved scenario at the node of `history`.
+    pub fn node_results(&mut self, history: &[usize]) -> NodeResults {
+        node_results(&mut self.game, history)
+    }
+}
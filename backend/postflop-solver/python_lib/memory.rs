@@ -0,0 +1,206 @@
+// Admission control for the memory of running solves.
+//
+// Before a game allocates its storage, it reserves `memory_usage()` bytes from a process-wide
+// budget. If the uncompressed storage does not fit in what is left, the game uses 16-bit
+// compression instead; if neither fits, the solve waits for running solves to release memory (up
+// to `max_wait`), and a game that could never fit is rejected immediately.
+
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::{Condvar, Mutex, MutexGuard, OnceLock};
+use std::time::{Duration, Instant};
+
+const DEFAULT_MAX_WAIT: Duration = Duration::from_secs(30);
+const POLL_INTERVAL: Duration = Duration::from_millis(100);
+
+/// Why a game was not admitted.
+pub enum AdmissionError {
+    /// The game does not fit in the budget, or did not fit within `max_wait`.
+    Rejected(String),
+    Cancelled,
+}
+
+#[derive(Default, Clone, Copy)]
+pub struct MemoryStats {
+    pub admitted: u64,
+    pub compressed: u64,
+    pub queued: u64,
+    pub rejected: u64,
+}
+
+struct State {
+    budget: u64,
+    max_wait: Duration,
+    reserved: u64,
+    active: usize,
+    waiting: usize,
+    stats: MemoryStats,
+}
+
+pub struct MemoryBudget {
+    state: Mutex<State>,
+    released: Condvar,
+}
+
+/// Memory reserved by a running solve; released on drop.
+pub struct Reservation {
+    bytes: u64,
+    compressed: bool,
+}
+
+impl Reservation {
+    pub fn compressed(&self) -> bool {
+        self.compressed
+    }
+}
+
+impl Drop for Reservation {
+    fn drop(&mut self) {
+        let budget = global();
+        let mut state = budget.lock();
+        state.reserved -= self.bytes;
+        state.active -= 1;
+        drop(state);
+        budget.released.notify_all();
+    }
+}
+
+impl MemoryBudget {
+    fn new(budget: u64, max_wait: Duration) -> Self {
+        Self {
+            state: Mutex::new(State {
+                budget,
+                max_wait,
+                reserved: 0,
+                active: 0,
+                waiting: 0,
+                stats: MemoryStats::default(),
+            }),
+            released: Condvar::new(),
+        }
+    }
+
+    fn lock(&self) -> MutexGuard<State> {
+        self.state.lock().unwrap_or_else(|e| e.into_inner())
+    }
+
+    /// Reserves memory for a game whose storage takes `uncompressed` or `compressed` bytes.
+    ///
+    /// The returned reservation tells whether the game must enable compression.
+    pub fn admit(
+        &self,
+        uncompressed: u64,
+        compressed: u64,
+        cancel: &AtomicBool,
+    ) -> Result<Reservation, AdmissionError> {
+        let mut state = self.lock();
+
+        if compressed > state.budget {
+            state.stats.rejected += 1;
+            return Err(AdmissionError::Rejected(format!(
+                "Game needs {} MB even compressed, but the solver memory budget is {} MB",
+                compressed >> 20,
+                state.budget >> 20,
+            )));
+        }
+
+        let start = Instant::now();
+        let mut queued = false;
+
+        loop {
+            // the budget may have been lowered below what running solves hold
+            let available = state.budget.saturating_sub(state.reserved);
+            let choice = if uncompressed <= available {
+                Some((uncompressed, false))
+            } else if compressed <= available {
+                Some((compressed, true))
+            } else {
+                None
+            };
+
+            if let Some((bytes, compressed)) = choice {
+                if queued {
+                    state.waiting -= 1;
+                }
+                state.reserved += bytes;
+                state.active += 1;
+                state.stats.admitted += 1;
+                if compressed {
+                    state.stats.compressed += 1;
+                }
+                return Ok(Reservation { bytes, compressed });
+            }
+
+            if !queued {
+                queued = true;
+                state.waiting += 1;
+                state.stats.queued += 1;
+            }
+
+            let waited = start.elapsed();
+            if cancel.load(Ordering::Relaxed) || waited >= state.max_wait {
+                state.waiting -= 1;
+                if cancel.load(Ordering::Relaxed) {
+                    return Err(AdmissionError::Cancelled);
+                }
+                state.stats.rejected += 1;
+                return Err(AdmissionError::Rejected(format!(
+                    "Solver memory budget is exhausted ({} of {} MB reserved)",
+                    state.reserved >> 20,
+                    state.budget >> 20,
+                )));
+            }
+
+            let timeout = POLL_INTERVAL.min(state.max_wait.saturating_sub(waited));
+            state = self
+                .released
+                .wait_timeout(state, timeout)
+                .unwrap_or_else(|e| e.into_inner())
+                .0;
+        }
+    }
+
+    /// Returns `(budget, reserved, active solves, waiting solves, counters)`.
+    pub fn status(&self) -> (u64, u64, usize, usize, MemoryStats) {
+        let state = self.lock();
+        (
+            state.budget,
+            state.reserved,
+            state.active,
+            state.waiting,
+            state.stats,
+        )
+    }
+}
+
+/// Returns the total physical memory, if it can be determined.
+fn total_memory() -> Option<u64> {
+    let meminfo = std::fs::read_to_string("/proc/meminfo").ok()?;
+    let line = meminfo.lines().find(|l| l.starts_with("MemTotal:"))?;
+    let kib = line.split_whitespace().nth(1)?.parse::<u64>().ok()?;
+    Some(kib * 1024)
+}
+
+static BUDGET: OnceLock<MemoryBudget> = OnceLock::new();
+
+/// Returns the global budget. Unless configured, it is `SOLVE_MEMORY_BUDGET_BYTES` or else 75% of
+/// the physical memory.
+pub fn global() -> &'static MemoryBudget {
+    BUDGET.get_or_init(|| {
+        let budget = std::env::var("SOLVE_MEMORY_BUDGET_BYTES")
+            .ok()
+            .and_then(|v| v.parse().ok())
+            .or_else(|| total_memory().map(|total| total / 4 * 3))
+            .unwrap_or(u64::MAX);
+        MemoryBudget::new(budget, DEFAULT_MAX_WAIT)
+    })
+}
+
+/// Changes the budget and the maximum time a solve waits for memory.
+pub fn configure(budget: u64, max_wait: Duration) {
+    let budget_state = global();
+    let mut state = budget_state.lock();
+    state.budget = budget;
+    state.max_wait = max_wait;
+    drop(state);
+    budget_state.released.notify_all();
+}
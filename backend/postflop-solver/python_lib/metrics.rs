@@ -0,0 +1,204 @@
+// Stage timings and solve metrics of the process.
+//
+// Every stage of a request (range path lookup, tree build, memory admission, solve, extraction,
+// marshalling) is timed into a `Spans` list that is returned to Python with the result, and into a
+// process-wide latency histogram per stage. Finished solves also record their iterations, final
+// exploitability, tree size and allocated memory. `solver_metrics` returns the histograms for the
+// `/metrics` endpoint of the backend.
+
+use crate::cache::{game_memory_usage, SolveStats, SpotKey};
+use postflop_solver::PostFlopGame;
+use pyo3::prelude::*;
+use pyo3::types::PyDict;
+use std::collections::BTreeMap;
+use std::sync::{Mutex, MutexGuard, OnceLock};
+use std::time::{Duration, Instant};
+
+/// Upper bounds of the latency buckets, in seconds.
+const SECONDS_BUCKETS: &[f64] = &[
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+];
+const ITERATIONS_BUCKETS: &[f64] = &[10.0, 25.0, 50.0, 100.0, 200.0, 400.0, 700.0, 1000.0, 2000.0];
+/// Exploitability in % of the starting pot.
+const EXPLOITABILITY_BUCKETS: &[f64] = &[0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0, 10.0];
+const NODES_BUCKETS: &[f64] = &[1e2, 1e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7, 1e8];
+const BYTES_BUCKETS: &[f64] = &[
+    1.0 * MIB,
+    4.0 * MIB,
+    16.0 * MIB,
+    64.0 * MIB,
+    256.0 * MIB,
+    1024.0 * MIB,
+    4096.0 * MIB,
+    16384.0 * MIB,
+];
+const MIB: f64 = 1024.0 * 1024.0;
+
+/// Cumulative histogram with fixed bucket bounds, as exposed by Prometheus.
+pub struct Histogram {
+    bounds: &'static [f64],
+    /// Number of observations in each bucket (not cumulative); the last one is `+Inf`.
+    counts: Vec<u64>,
+    sum: f64,
+    count: u64,
+}
+
+impl Histogram {
+    fn new(bounds: &'static [f64]) -> Self {
+        Self {
+            bounds,
+            counts: vec![0; bounds.len() + 1],
+            sum: 0.0,
+            count: 0,
+        }
+    }
+
+    fn observe(&mut self, value: f64) {
+        let bucket = self.bounds.partition_point(|&bound| bound < value);
+        self.counts[bucket] += 1;
+        self.sum += value;
+        self.count += 1;
+    }
+
+    /// Returns a dictionary with `buckets` (list of `(upper bound, cumulative count)`, the last
+    /// bound being `inf`), `sum` and `count`.
+    fn to_dict<'py>(&self, py: Python<'py>) -> PyResult<&'py PyDict> {
+        let mut cumulative = 0;
+        let buckets = self
+            .bounds
+            .iter()
+            .chain([f64::INFINITY].iter())
+            .zip(&self.counts)
+            .map(|(&bound, &count)| {
+                cumulative += count;
+                (bound, cumulative)
+            })
+            .collect::<Vec<_>>();
+
+        let result = PyDict::new(py);
+        result.set_item("buckets", buckets)?;
+        result.set_item("sum", self.sum)?;
+        result.set_item("count", self.count)?;
+        Ok(result)
+    }
+}
+
+struct Metrics {
+    stage_seconds: BTreeMap<&'static str, Histogram>,
+    iterations: Histogram,
+    exploitability_pct: Histogram,
+    tree_nodes: Histogram,
+    allocated_bytes: Histogram,
+    /// Finished solves by stop reason.
+    solves: BTreeMap<&'static str, u64>,
+}
+
+static METRICS: OnceLock<Mutex<Metrics>> = OnceLock::new();
+
+fn global() -> MutexGuard<'static, Metrics> {
+    METRICS
+        .get_or_init(|| {
+            Mutex::new(Metrics {
+                stage_seconds: BTreeMap::new(),
+                iterations: Histogram::new(ITERATIONS_BUCKETS),
+                exploitability_pct: Histogram::new(EXPLOITABILITY_BUCKETS),
+                tree_nodes: Histogram::new(NODES_BUCKETS),
+                allocated_bytes: Histogram::new(BYTES_BUCKETS),
+                solves: BTreeMap::new(),
+            })
+        })
+        .lock()
+        .unwrap_or_else(|e| e.into_inner())
+}
+
+/// Time spent in each stage of one request, in order.
+#[derive(Default)]
+pub struct Spans(Mutex<Vec<(&'static str, Duration)>>);
+
+impl Spans {
+    /// Runs `f` as the stage `stage`.
+    pub fn time<T>(&self, stage: &'static str, f: impl FnOnce() -> T) -> T {
+        let start = Instant::now();
+        let result = f();
+        self.record(stage, start.elapsed());
+        result
+    }
+
+    /// Records a stage timed by the caller.
+    pub fn record(&self, stage: &'static str, elapsed: Duration) {
+        global()
+            .stage_seconds
+            .entry(stage)
+            .or_insert_with(|| Histogram::new(SECONDS_BUCKETS))
+            .observe(elapsed.as_secs_f64());
+        self.lock().push((stage, elapsed));
+    }
+
+    /// Moves the stages recorded so far into a new `Spans`.
+    pub fn take(&self) -> Spans {
+        Spans(Mutex::new(std::mem::take(&mut *self.lock())))
+    }
+
+    /// Returns the stages as a dictionary of seconds (a stage run several times is summed).
+    pub fn to_dict<'py>(&self, py: Python<'py>) -> PyResult<&'py PyDict> {
+        let result = PyDict::new(py);
+        for &(stage, elapsed) in self.lock().iter() {
+            let previous = match result.get_item(stage) {
+                Some(value) => value.extract::<f64>()?,
+                None => 0.0,
+            };
+            result.set_item(stage, previous + elapsed.as_secs_f64())?;
+        }
+        Ok(result)
+    }
+
+    fn lock(&self) -> MutexGuard<'_, Vec<(&'static str, Duration)>> {
+        self.0.lock().unwrap_or_else(|e| e.into_inner())
+    }
+}
+
+/// Records a finished solve of `key`.
+pub fn record_solve(game: &PostFlopGame, key: &SpotKey, stats: &SolveStats) {
+    let num_nodes: u64 = game.num_nodes().iter().sum();
+    let memory_bytes = game_memory_usage(game);
+
+    let mut metrics = global();
+    *metrics
+        .solves
+        .entry(stats.stop_reason.as_str())
+        .or_default() += 1;
+    metrics.iterations.observe(stats.iterations as f64);
+    metrics
+        .exploitability_pct
+        .observe(100.0 * stats.exploitability as f64 / key.starting_pot as f64);
+    metrics.tree_nodes.observe(num_nodes as f64);
+    metrics.allocated_bytes.observe(memory_bytes as f64);
+}
+
+/// Returns the stage latency histograms and the histograms of finished solves.
+///
+/// The dictionary has `stage_seconds` (stage -> histogram), `iterations`, `exploitability_pct`
+/// (final exploitability in % of the starting pot), `tree_nodes`, `allocated_bytes` and `solves`
+/// (stop reason -> count). Each histogram is a dictionary with `buckets` (list of
+/// `(upper bound, cumulative count)`), `sum` and `count`.
+#[pyfunction]
+pub fn solver_metrics(py: Python) -> PyResult<PyObject> {
+    let metrics = global();
+
+    let stage_seconds = PyDict::new(py);
+    for (stage, histogram) in &metrics.stage_seconds {
+        stage_seconds.set_item(stage, histogram.to_dict(py)?)?;
+    }
+
+    let result = PyDict::new(py);
+    result.set_item("stage_seconds", stage_seconds)?;
+    result.set_item("iterations", metrics.iterations.to_dict(py)?)?;
+    result.set_item(
+        "exploitability_pct",
+        metrics.exploitability_pct.to_dict(py)?,
+    )?;
+    result.set_item("tree_nodes", metrics.tree_nodes.to_dict(py)?)?;
+    result.set_item("allocated_bytes", metrics.allocated_bytes.to_dict(py)?)?;
+    result.set_item("solves", &metrics.solves)?;
+    Ok(result.into())
+}
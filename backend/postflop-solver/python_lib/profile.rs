@@ -0,0 +1,125 @@
+// Stage-by-stage timing of a solve, for the benchmark suite (`backend/bench.py`).
+//
+// `profile_solve` runs the same stages as `solve_poker_spot` one after the other, bypassing the
+// cache (and warm starts) so that every run measures a cold solve of the spot.
+
+use crate::cache::game_memory_usage;
+use crate::columnar::build_columnar_result;
+use crate::metrics::Spans;
+use crate::{
+    build_result, game_ranges, new_game, reserve_memory, run_solver, set_bunching, CacheStatus,
+    SolveError, SolvedSpot, SpotRequest,
+};
+use postflop_solver::*;
+use pyo3::prelude::*;
+use pyo3::types::PyDict;
+use std::sync::atomic::AtomicBool;
+use std::sync::{Arc, Mutex};
+use std::time::Instant;
+
+/// Solves `inputs` without the cache and returns the time spent in each stage.
+///
+/// The returned dictionary has the stage times in seconds (`range_lookup`, `tree_build`,
+/// `allocate_memory`, `solve`, `extraction`, `marshalling_dict`, `marshalling_columnar`) and the
+/// `iterations`, `iterations_per_second`, `exploitability`, `bunching`, `num_hands` and
+/// `memory_bytes` (as allocated) of the solve. `tree_build` includes setting the bunching effect,
+/// and `range_lookup` narrowing the ranges of a subgame (its upstream spot is still looked up or
+/// solved through the cache).
+/// `extraction` covers the equity, EV and strategy computations at the root; the
+/// marshalling times are those of building the `solve_poker_spot` dictionary and the `SpotResult`
+/// minus `extraction`.
+#[pyfunction]
+pub fn profile_solve(py: Python, inputs: &PyDict) -> PyResult<PyObject> {
+    let SpotRequest {
+        key,
+        tier,
+        pot,
+        repository,
+        bunching,
+        ..
+    } = SpotRequest::extract(inputs)?;
+    let never = AtomicBool::new(false);
+
+    let (mut game, stats, times, memory_bytes) = py.allow_threads(|| {
+        let start = Instant::now();
+        let ranges = game_ranges(&repository, &key, &never)?;
+        let range_lookup = start.elapsed();
+
+        let start = Instant::now();
+        let mut game = new_game(ranges, &key)?;
+        set_bunching(&mut game, &key)?;
+        let tree_build = start.elapsed();
+
+        let start = Instant::now();
+        let reservation = reserve_memory(&game, &key, &never)?;
+        game.allocate_memory(reservation.compressed());
+        let allocate_memory = start.elapsed();
+
+        let stats = run_solver(
+            &mut game,
+            key.max_num_iterations,
+            key.target_exploitability,
+            key.deadline,
+            None,
+            &never,
+        )?;
+
+        let start = Instant::now();
+        game.back_to_root();
+        game.cache_normalized_weights();
+        for player in 0..2 {
+            game.equity(player);
+            game.expected_values(player);
+        }
+        game.strategy();
+        let extraction = start.elapsed();
+
+        let memory_bytes = game_memory_usage(&game);
+        let times = [range_lookup, tree_build, allocate_memory, extraction];
+        Ok::<_, SolveError>((game, stats, times, memory_bytes))
+    })?;
+    let [range_lookup, tree_build, allocate_memory, extraction] = times;
+
+    let start = Instant::now();
+    build_result(py, &mut game, pot, &Spans::default())?;
+    let marshalling_dict = start.elapsed().saturating_sub(extraction);
+
+    let num_hands = [game.private_cards(0).len(), game.private_cards(1).len()];
+    let solved = SolvedSpot {
+        game: Arc::new(Mutex::new(game)),
+        stats,
+        status: CacheStatus::Miss,
+        tier: tier.name,
+        pot,
+        bunching,
+        spans: Spans::default(),
+    };
+    let start = Instant::now();
+    {
+        let mut game = solved.game.lock().unwrap_or_else(|e| e.into_inner());
+        build_columnar_result(py, &mut game, &solved)?;
+    }
+    let marshalling_columnar = start.elapsed().saturating_sub(extraction);
+
+    let solve = stats.elapsed.as_secs_f64();
+    let result = PyDict::new(py);
+    result.set_item("tier", tier.name)?;
+    result.set_item("range_lookup", range_lookup.as_secs_f64())?;
+    result.set_item("tree_build", tree_build.as_secs_f64())?;
+    result.set_item("allocate_memory", allocate_memory.as_secs_f64())?;
+    result.set_item("solve", solve)?;
+    result.set_item("extraction", extraction.as_secs_f64())?;
+    result.set_item("marshalling_dict", marshalling_dict.as_secs_f64())?;
+    result.set_item("marshalling_columnar", marshalling_columnar.as_secs_f64())?;
+    result.set_item("iterations", stats.iterations)?;
+    result.set_item(
+        "iterations_per_second",
+        stats.iterations as f64 / solve.max(1e-9),
+    )?;
+    result.set_item("exploitability", stats.exploitability)?;
+    result.set_item("stop_reason", stats.stop_reason.as_str())?;
+    result.set_item("bunching", bunching.as_str())?;
+    result.set_item("num_hands", num_hands)?;
+    result.set_item("memory_bytes", memory_bytes)?;
+    Ok(result.into())
+}
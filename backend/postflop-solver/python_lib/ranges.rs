@@ -0,0 +1,450 @@
+// Repository of the scraped preflop ranges.
+//
+// The `GTOWizard_Scraped_Ranges` tree has one directory per preflop decision
+// (`<position>/<action>/<position>/<action>/...`) and one `<position>.txt` range file per player
+// still in the hand. The whole tree is parsed once into a `RangeRepository`, which can be written
+// to a compact index file and memory-mapped back, so that no request touches the range tree.
+//
+// Index file layout (all integers little-endian):
+//
+//   magic                 8 bytes, `RANGEIDX`
+//   num_nodes             u32
+//   num_ranges            u32
+//   weights_offset        u64, multiple of 4
+//   nodes                 num_nodes x node
+//   (padding)
+//   weights               num_ranges x 1326 f32
+//
+//   node = path, num_children: u32, num_children x name,
+//          num_ranges: u32, num_ranges x (name, slot: u32)
+//   path / name = len: u32, UTF-8 bytes
+
+use memmap2::Mmap;
+use postflop_solver::*;
+use std::collections::HashMap;
+use std::fs::{self, File};
+use std::io::{self, BufWriter, Write};
+use std::path::{Path, PathBuf};
+use std::sync::{Arc, Mutex, OnceLock, RwLock};
+
+const MAGIC: &[u8; 8] = b"RANGEIDX";
+const HEADER_SIZE: usize = 24;
+const NUM_WEIGHTS: usize = 52 * 51 / 2;
+const DEFAULT_ROOT: &str = "GTOWizard_Scraped_Ranges/Cash6m50z100bbGeneral";
+/// Resolved preflop lines kept per repository; the map is emptied when it is full.
+const MAX_CACHED_LINES: usize = 4096;
+
+/// A directory of the range tree.
+#[derive(Default)]
+struct Node {
+    /// Names of the subdirectories (actions or positions), sorted.
+    children: Vec<String>,
+    /// Position -> slot of its range in the weight storage.
+    ranges: HashMap<String, u32>,
+}
+
+enum Weights {
+    Owned(Vec<f32>),
+    Mapped(Mmap, usize),
+}
+
+/// The last two players of a preflop line, the tree node holding their ranges and the players who
+/// folded.
+#[derive(Clone, Debug)]
+pub struct PreflopLine {
+    /// Path of the node relative to the repository root, e.g. `"BTN/2.5bb/BB/call"`.
+    pub path: String,
+    pub position1: String,
+    pub position2: String,
+    /// The players who folded, each with the node at which they folded (e.g.
+    /// `("SB", "BTN/2.5bb/SB")`).
+    pub folds: Vec<(String, String)>,
+}
+
+/// In-memory index of the scraped preflop range tree.
+pub struct RangeRepository {
+    root: PathBuf,
+    nodes: HashMap<String, Node>,
+    num_ranges: usize,
+    weights: Weights,
+    /// Preflop action sequence -> resolved line (successful lookups only).
+    lines: Mutex<HashMap<String, PreflopLine>>,
+}
+
+impl RangeRepository {
+    /// Parses every range file under `root`.
+    pub fn scan(root: &Path) -> Result<Self, String> {
+        let mut nodes = HashMap::new();
+        let mut weights = Vec::new();
+        scan_node(root, String::new(), &mut nodes, &mut weights)?;
+
+        Ok(Self {
+            root: root.to_path_buf(),
+            nodes,
+            num_ranges: weights.len() / NUM_WEIGHTS,
+            weights: Weights::Owned(weights),
+            lines: Mutex::new(HashMap::new()),
+        })
+    }
+
+    /// Memory-maps an index file written by `write_index`.
+    pub fn open_index(root: &Path, path: &Path) -> Result<Self, String> {
+        let file = File::open(path).map_err(|e| e.to_string())?;
+        // SAFETY: the index file is only ever replaced atomically (see `write_index`)
+        let mmap = unsafe { Mmap::map(&file) }.map_err(|e| e.to_string())?;
+
+        if mmap.len() < HEADER_SIZE || &mmap[..8] != MAGIC {
+            return Err(format!("Not a range index: {}", path.display()));
+        }
+
+        let num_nodes = read_u32(&mmap, 8) as usize;
+        let num_ranges = read_u32(&mmap, 12) as usize;
+        let weights_offset = u64::from_le_bytes(mmap[16..24].try_into().unwrap()) as usize;
+
+        if weights_offset % 4 != 0 || mmap.len() != weights_offset + 4 * NUM_WEIGHTS * num_ranges {
+            return Err(format!("Corrupted range index: {}", path.display()));
+        }
+
+        let mut reader = IndexReader {
+            data: &mmap[..weights_offset],
+            pos: HEADER_SIZE,
+        };
+        let mut nodes = HashMap::with_capacity(num_nodes);
+        for _ in 0..num_nodes {
+            let path = reader.string()?;
+            let mut node = Node::default();
+            for _ in 0..reader.u32()? {
+                node.children.push(reader.string()?);
+            }
+            for _ in 0..reader.u32()? {
+                let position = reader.string()?;
+                let slot = reader.u32()?;
+                if slot as usize >= num_ranges {
+                    return Err(format!("Corrupted range index: {}", path));
+                }
+                node.ranges.insert(position, slot);
+            }
+            nodes.insert(path, node);
+        }
+
+        Ok(Self {
+            root: root.to_path_buf(),
+            nodes,
+            num_ranges,
+            weights: Weights::Mapped(mmap, weights_offset),
+            lines: Mutex::new(HashMap::new()),
+        })
+    }
+
+    /// Writes the repository to `path` in the index file format.
+    pub fn write_index(&self, path: &Path) -> io::Result<()> {
+        let mut paths = self.nodes.keys().collect::<Vec<_>>();
+        paths.sort_unstable();
+
+        let mut table = Vec::new();
+        for path in paths {
+            let node = &self.nodes[path];
+            write_string(&mut table, path);
+            table.extend_from_slice(&(node.children.len() as u32).to_le_bytes());
+            for child in &node.children {
+                write_string(&mut table, child);
+            }
+            let mut ranges = node.ranges.iter().collect::<Vec<_>>();
+            ranges.sort_unstable();
+            table.extend_from_slice(&(ranges.len() as u32).to_le_bytes());
+            for (position, slot) in ranges {
+                write_string(&mut table, position);
+                table.extend_from_slice(&slot.to_le_bytes());
+            }
+        }
+
+        let padding = (4 - (HEADER_SIZE + table.len()) % 4) % 4;
+        let weights_offset = HEADER_SIZE + table.len() + padding;
+
+        // write to a temporary file first so that readers never map a partial index
+        let tmp_path = path.with_extension("tmp");
+        let mut writer = BufWriter::new(File::create(&tmp_path)?);
+        writer.write_all(MAGIC)?;
+        writer.write_all(&(self.nodes.len() as u32).to_le_bytes())?;
+        writer.write_all(&(self.num_ranges as u32).to_le_bytes())?;
+        writer.write_all(&(weights_offset as u64).to_le_bytes())?;
+        writer.write_all(&table)?;
+        writer.write_all(&[0; 4][..padding])?;
+        for slot in 0..self.num_ranges {
+            for weight in self.weights(slot as u32) {
+                writer.write_all(&weight.to_le_bytes())?;
+            }
+        }
+        writer.into_inner()?.sync_all()?;
+
+        fs::rename(tmp_path, path)
+    }
+
+    /// Returns the root directory of the range tree.
+    pub fn root(&self) -> &Path {
+        &self.root
+    }
+
+    /// Returns the number of nodes and ranges in the repository.
+    pub fn len(&self) -> (usize, usize) {
+        (self.nodes.len(), self.num_ranges)
+    }
+
+    /// Returns the range of `position` at the node `path`.
+    pub fn range(&self, path: &str, position: &str) -> Option<Range> {
+        let slot = *self.nodes.get(path)?.ranges.get(position)?;
+        Range::from_raw_data(&self.weights(slot)).ok()
+    }
+
+    /// Returns the ranges the players of `line` folded (see `PreflopLine::folds`).
+    ///
+    /// The folding range of a player is their range when facing the decision minus the ranges they
+    /// continued with (every action other than `fold` at that node). The range they faced the
+    /// decision with is the one of the nearest node up the path holding it, or the full range if
+    /// they had not acted yet.
+    pub fn fold_ranges(&self, line: &PreflopLine) -> Vec<Range> {
+        line.folds
+            .iter()
+            .map(|(position, node)| {
+                let mut weights = self
+                    .ancestors(node)
+                    .find_map(|path| self.range(path, position))
+                    .unwrap_or_else(Range::ones)
+                    .raw_data()
+                    .to_vec();
+
+                for action in self.children(node).unwrap_or_default() {
+                    if action != "fold" {
+                        let path = format!("{}/{}", node, action);
+                        if let Some(range) = self.range(&path, position) {
+                            for (weight, continued) in weights.iter_mut().zip(range.raw_data()) {
+                                *weight = (*weight - continued).max(0.0);
+                            }
+                        }
+                    }
+                }
+
+                Range::from_raw_data(&weights).unwrap()
+            })
+            .collect()
+    }
+
+    /// Returns `path` and the paths of its ancestors up to the root (`""`), nearest first.
+    fn ancestors<'a>(&self, path: &'a str) -> impl Iterator<Item = &'a str> {
+        std::iter::successors(Some(path), |path| {
+            (!path.is_empty()).then(|| path.rsplit_once('/').map_or("", |(parent, _)| parent))
+        })
+    }
+
+    /// Returns the subdirectories of the node `path`.
+    pub fn children(&self, path: &str) -> Option<&[String]> {
+        self.nodes.get(path).map(|node| node.children.as_slice())
+    }
+
+    /// Resolves a preflop action sequence such as `"BTN,SB,BB,SB"`.
+    ///
+    /// Successful lookups are memoized (at most `MAX_CACHED_LINES` of them), so each valid
+    /// sequence usually walks the tree only once. Errors are not: the sequences come from users.
+    pub fn resolve(&self, preflop_action: &str) -> Result<PreflopLine, String> {
+        if let Some(line) = self.lines.lock().unwrap().get(preflop_action) {
+            return Ok(line.clone());
+        }
+
+        let line = crate::construct_ranges_path(self, preflop_action)?;
+        let mut lines = self.lines.lock().unwrap();
+        if lines.len() >= MAX_CACHED_LINES {
+            lines.clear();
+        }
+        lines.insert(preflop_action.to_string(), line.clone());
+        Ok(line)
+    }
+
+    /// Returns every preflop action sequence of at most `max_actions` positions (e.g. `"BTN,BB"`,
+    /// `"CO,BTN,CO"`) that resolves to a node holding the ranges of both remaining players.
+    ///
+    /// Sequences resolving to the same node are reported once.
+    pub fn preflop_lines(&self, max_actions: usize) -> Vec<String> {
+        const POSITIONS: [&str; 6] = ["UTG", "HJ", "CO", "BTN", "SB", "BB"];
+
+        let mut lines = HashMap::new();
+        let mut stack = POSITIONS.map(|position| vec![position]).to_vec();
+
+        while let Some(sequence) = stack.pop() {
+            if sequence.len() >= 2 {
+                let action = sequence.join(",");
+                if let Ok(line) = self.resolve(&action) {
+                    if line.position1 != line.position2
+                        && self.range(&line.path, &line.position1).is_some()
+                        && self.range(&line.path, &line.position2).is_some()
+                    {
+                        let shortest = lines.entry(line.path).or_insert_with(|| action.clone());
+                        if (action.len(), &action) < (shortest.len(), &*shortest) {
+                            *shortest = action;
+                        }
+                    }
+                }
+            }
+
+            if sequence.len() < max_actions {
+                for position in POSITIONS {
+                    if sequence.last() != Some(&position) {
+                        let mut next = sequence.clone();
+                        next.push(position);
+                        stack.push(next);
+                    }
+                }
+            }
+        }
+
+        let mut lines = lines.into_values().collect::<Vec<_>>();
+        lines.sort_unstable();
+        lines
+    }
+
+    fn weights(&self, slot: u32) -> Vec<f32> {
+        let start = slot as usize * NUM_WEIGHTS;
+        match &self.weights {
+            Weights::Owned(weights) => weights[start..start + NUM_WEIGHTS].to_vec(),
+            Weights::Mapped(mmap, offset) => {
+                let bytes = &mmap[offset + 4 * start..offset + 4 * (start + NUM_WEIGHTS)];
+                bytes
+                    .chunks_exact(4)
+                    .map(|b| f32::from_le_bytes(b.try_into().unwrap()))
+                    .collect()
+            }
+        }
+    }
+}
+
+fn scan_node(
+    dir: &Path,
+    path: String,
+    nodes: &mut HashMap<String, Node>,
+    weights: &mut Vec<f32>,
+) -> Result<(), String> {
+    let mut entries = fs::read_dir(dir)
+        .map_err(|e| format!("Failed to read {}: {}", dir.display(), e))?
+        .filter_map(|entry| entry.ok())
+        .collect::<Vec<_>>();
+    entries.sort_unstable_by_key(|entry| entry.file_name());
+
+    let mut node = Node::default();
+    for entry in entries {
+        let entry_path = entry.path();
+        let name = entry.file_name().to_string_lossy().to_string();
+
+        if entry_path.is_dir() {
+            let child_path = if path.is_empty() {
+                name.clone()
+            } else {
+                format!("{}/{}", path, name)
+            };
+            scan_node(&entry_path, child_path, nodes, weights)?;
+            node.children.push(name);
+        } else if let Some(position) = name.strip_suffix(".txt") {
+            let content = fs::read_to_string(&entry_path)
+                .map_err(|e| format!("Failed to read {}: {}", entry_path.display(), e))?;
+            let range = content
+                .parse::<Range>()
+                .map_err(|e| format!("{}: {}", entry_path.display(), e))?;
+            let slot = (weights.len() / NUM_WEIGHTS) as u32;
+            weights.extend_from_slice(range.raw_data());
+            node.ranges.insert(position.to_string(), slot);
+        }
+    }
+
+    nodes.insert(path, node);
+    Ok(())
+}
+
+struct IndexReader<'a> {
+    data: &'a [u8],
+    pos: usize,
+}
+
+impl IndexReader<'_> {
+    fn u32(&mut self) -> Result<u32, String> {
+        if self.pos + 4 > self.data.len() {
+            return Err("Unexpected end of range index".to_string());
+        }
+        let value = read_u32(self.data, self.pos);
+        self.pos += 4;
+        Ok(value)
+    }
+
+    fn string(&mut self) -> Result<String, String> {
+        let len = self.u32()? as usize;
+        if self.pos + len > self.data.len() {
+            return Err("Unexpected end of range index".to_string());
+        }
+        let s =
+            std::str::from_utf8(&self.data[self.pos..self.pos + len]).map_err(|e| e.to_string())?;
+        self.pos += len;
+        Ok(s.to_string())
+    }
+}
+
+fn read_u32(data: &[u8], pos: usize) -> u32 {
+    u32::from_le_bytes(data[pos..pos + 4].try_into().unwrap())
+}
+
+fn write_string(out: &mut Vec<u8>, s: &str) {
+    out.extend_from_slice(&(s.len() as u32).to_le_bytes());
+    out.extend_from_slice(s.as_bytes());
+}
+
+static REPOSITORY: OnceLock<RwLock<Option<Arc<RangeRepository>>>> = OnceLock::new();
+
+/// Loads the repository rooted at `root`.
+///
+/// If `index_path` is given, the index file is memory-mapped when it exists (unless `rebuild` is
+/// set) and (re)written from the range tree otherwise.
+pub fn load(
+    root: &Path,
+    index_path: Option<&Path>,
+    rebuild: bool,
+) -> Result<RangeRepository, String> {
+    match index_path {
+        Some(index_path) if index_path.exists() && !rebuild => {
+            RangeRepository::open_index(root, index_path)
+        }
+        Some(index_path) => {
+            let repository = RangeRepository::scan(root)?;
+            repository
+                .write_index(index_path)
+                .map_err(|e| format!("Failed to write {}: {}", index_path.display(), e))?;
+            RangeRepository::open_index(root, index_path)
+        }
+        None => RangeRepository::scan(root),
+    }
+}
+
+/// Replaces the process-wide repository.
+pub fn install(repository: RangeRepository) -> Arc<RangeRepository> {
+    let repository = Arc::new(repository);
+    let slot = REPOSITORY.get_or_init(|| RwLock::new(None));
+    *slot.write().unwrap() = Some(repository.clone());
+    repository
+}
+
+/// Returns the process-wide repository.
+///
+/// If none has been installed, it is loaded from `GTO_RANGES_DIR` (and `GTO_RANGES_INDEX`, if
+/// set) on first use.
+pub fn global() -> Result<Arc<RangeRepository>, String> {
+    let slot = REPOSITORY.get_or_init(|| RwLock::new(None));
+    if let Some(repository) = slot.read().unwrap().as_ref() {
+        return Ok(repository.clone());
+    }
+
+    let mut slot = slot.write().unwrap();
+    if let Some(repository) = slot.as_ref() {
+        return Ok(repository.clone());
+    }
+
+    let root = std::env::var("GTO_RANGES_DIR").unwrap_or_else(|_| DEFAULT_ROOT.to_string());
+    let index_path = std::env::var("GTO_RANGES_INDEX").ok().map(PathBuf::from);
+    let repository = Arc::new(load(Path::new(&root), index_path.as_deref(), false)?);
+    *slot = Some(repository.clone());
+    Ok(repository)
+}
@@ -0,0 +1,458 @@
+// Navigation of solved games.
+//
+// A `GameSession` keeps a solved game alive after the root-node results have been returned, so
+// that later decisions of the same hand (turn, river, facing a raise) are read from the solution
+// instead of solving again. The game is shared with the cache and possibly other sessions, so each
+// session keeps its own action history and re-applies it only when the game was moved elsewhere.
+
+use crate::cache::{SharedGame, SolveStats, SpotKey};
+use crate::columnar::F32Array;
+use crate::locking::{self, Budget, Lock, NodeResults, WhatIfGame};
+use crate::{solve_inputs, CancelToken, SolvedSpot};
+use postflop_solver::*;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use pyo3::types::{PyDict, PyList};
+use std::collections::HashMap;
+use std::time::Duration;
+
+/// A solved game and a current node in it.
+#[pyclass]
+pub struct GameSession {
+    game: SharedGame,
+    history: Vec<usize>,
+    key: SpotKey,
+    digest: String,
+    tier: &'static str,
+    stats: SolveStats,
+}
+
+impl GameSession {
+    pub fn from_solved(key: &SpotKey, solved: &SolvedSpot) -> Self {
+        Self {
+            game: solved.game.clone(),
+            history: Vec::new(),
+            key: key.clone(),
+            digest: key.digest(),
+            tier: solved.tier,
+            stats: solved.stats,
+        }
+    }
+
+    /// Locks the game and moves it to the current node of this session.
+    fn with_game<T>(&self, f: impl FnOnce(&mut PostFlopGame) -> T) -> T {
+        let mut game = self.game.lock().unwrap_or_else(|e| e.into_inner());
+        if game.history() != self.history.as_slice() {
+            game.apply_history(&self.history);
+        }
+        f(&mut game)
+    }
+
+    /// Same as `with_game`, with the normalized weights cached for `equity`/`expected_values`.
+    fn with_weights<T>(&self, f: impl FnOnce(&PostFlopGame) -> T) -> T {
+        self.with_game(|game| {
+            game.cache_normalized_weights();
+            f(game)
+        })
+    }
+}
+
+/// Checks that `action` can be played at the current node (`play` panics otherwise).
+fn check_action(game: &PostFlopGame, action: usize) -> PyResult<()> {
+    if game.is_terminal_node() {
+        return Err(PyValueError::new_err("Current node is terminal"));
+    }
+
+    if game.is_chance_node() {
+        if action != usize::MAX && (action >= 52 || game.possible_cards() & (1u64 << action) == 0) {
+            return Err(PyValueError::new_err(format!(
+                "Card {} cannot be dealt",
+                action
+            )));
+        }
+    } else if action >= game.available_actions().len() {
+        return Err(PyValueError::new_err(format!(
+            "Action {} is out of range",
+            action
+        )));
+    }
+
+    Ok(())
+}
+
+fn check_player(player: usize) -> PyResult<()> {
+    if player > 1 {
+        return Err(PyValueError::new_err("Player must be 0 (OOP) or 1 (IP)"));
+    }
+    Ok(())
+}
+
+impl Lock {
+    /// Extracts a lock from a dictionary with a `history` and a `range` and/or `hands` strategy.
+    fn extract(lock: &PyDict) -> PyResult<Self> {
+        let history = lock
+            .get_item("history")
+            .ok_or_else(|| PyValueError::new_err("Lock has no history"))?
+            .extract()?;
+        let range = match lock.get_item("range") {
+            Some(range) if !range.is_none() => Some(range.extract()?),
+            _ => None,
+        };
+        let hands: HashMap<String, Vec<f32>> = match lock.get_item("hands") {
+            Some(hands) if !hands.is_none() => hands.extract()?,
+            _ => HashMap::new(),
+        };
+        if range.is_none() && hands.is_empty() {
+            return Err(PyValueError::new_err("Lock has no range or hands strategy"));
+        }
+        Ok(Self {
+            history,
+            range,
+            hands,
+        })
+    }
+}
+
+/// Adds the results at a node to `dict`.
+fn set_results(py: Python, dict: &PyDict, results: &NodeResults) -> PyResult<()> {
+    let num_hands = |player: usize| results.expected_values[player].len();
+    match (&results.strategy, results.player) {
+        (Some(strategy), Some(player)) => {
+            let num_actions = strategy.len() / num_hands(player);
+            let strategy = F32Array::new_2d(strategy.clone(), num_actions, num_hands(player));
+            dict.set_item("strategy", Py::new(py, strategy)?)?;
+        }
+        _ => dict.set_item("strategy", py.None())?,
+    }
+    dict.set_item("range_strategy", &results.range_strategy)?;
+    let expected_values = results
+        .expected_values
+        .iter()
+        .map(|ev| Py::new(py, F32Array::new_1d(ev.clone())))
+        .collect::<PyResult<Vec<_>>>()?;
+    dict.set_item("expected_values", expected_values)?;
+    dict.set_item("range_ev", results.range_ev)?;
+    Ok(())
+}
+
+/// Adds the differences of the results of a scenario from the results `base` to `dict`.
+fn set_diffs(py: Python, dict: &PyDict, base: &NodeResults, results: &NodeResults) -> PyResult<()> {
+    let diff = |after: &[f32], before: &[f32]| {
+        after
+            .iter()
+            .zip(before)
+            .map(|(a, b)| a - b)
+            .collect::<Vec<_>>()
+    };
+    match (&base.strategy, &results.strategy, results.player) {
+        (Some(before), Some(after), Some(player)) => {
+            let num_hands = results.expected_values[player].len();
+            let strategy_diff =
+                F32Array::new_2d(diff(after, before), after.len() / num_hands, num_hands);
+            dict.set_item("strategy_diff", Py::new(py, strategy_diff)?)?;
+        }
+        _ => dict.set_item("strategy_diff", py.None())?,
+    }
+    match (&base.range_strategy, &results.range_strategy) {
+        (Some(before), Some(after)) => dict.set_item("range_strategy_diff", diff(after, before))?,
+        _ => dict.set_item("range_strategy_diff", py.None())?,
+    }
+    let ev_diff = (0..2)
+        .map(|player| {
+            let ev_diff = diff(
+                &results.expected_values[player],
+                &base.expected_values[player],
+            );
+            Py::new(py, F32Array::new_1d(ev_diff))
+        })
+        .collect::<PyResult<Vec<_>>>()?;
+    dict.set_item("ev_diff", ev_diff)?;
+    dict.set_item(
+        "range_ev_diff",
+        [
+            results.range_ev[0] - base.range_ev[0],
+            results.range_ev[1] - base.range_ev[1],
+        ],
+    )?;
+    Ok(())
+}
+
+#[pymethods]
+impl GameSession {
+    /// Looks up or solves `inputs` (same format as `solve_poker_spot`) and starts at the root.
+    #[new]
+    #[pyo3(signature = (inputs, cancel = None))]
+    fn new(py: Python, inputs: &PyDict, cancel: Option<CancelToken>) -> PyResult<Self> {
+        let (key, solved) = solve_inputs(py, inputs, cancel)?;
+        Ok(Self::from_solved(&key, &solved))
+    }
+
+    /// Cache key of the solved spot; sessions with the same key share one game.
+    #[getter]
+    fn key(&self) -> &str {
+        &self.digest
+    }
+
+    #[getter]
+    fn tier(&self) -> &'static str {
+        self.tier
+    }
+
+    /// Pot at the root of the game, in chips.
+    #[getter]
+    fn starting_pot(&self) -> i32 {
+        self.key.starting_pot
+    }
+
+    /// Exploitability of the solution, in chips.
+    #[getter]
+    fn exploitability(&self) -> f32 {
+        self.stats.exploitability
+    }
+
+    /// Memory used by the game in bytes.
+    #[getter]
+    fn memory_bytes(&self) -> u64 {
+        let game = self.game.lock().unwrap_or_else(|e| e.into_inner());
+        let (uncompressed, compressed) = game.memory_usage();
+        if game.is_memory_allocated() == Some(true) {
+            compressed
+        } else {
+            uncompressed
+        }
+    }
+
+    /// Action indices (or dealt cards) leading from the root to the current node.
+    #[getter]
+    fn history(&self) -> Vec<usize> {
+        self.history.clone()
+    }
+
+    fn back_to_root(&mut self) {
+        self.history.clear();
+    }
+
+    /// Plays the `action`-th available action, or deals the card of ID `action` at a chance node
+    /// (`usize::MAX` deals the first possible card).
+    fn play(&mut self, py: Python, action: usize) -> PyResult<()> {
+        let history = py.allow_threads(|| {
+            self.with_game(|game| {
+                check_action(game, action)?;
+                game.play(action);
+                Ok::<_, PyErr>(game.history().to_vec())
+            })
+        })?;
+        self.history = history;
+        Ok(())
+    }
+
+    /// Moves to the node reached by playing `history` from the root.
+    ///
+    /// If an action is invalid, `ValueError` is raised and the current node is unchanged.
+    fn apply_history(&mut self, py: Python, history: Vec<usize>) -> PyResult<()> {
+        let history = py.allow_threads(|| {
+            let mut game = self.game.lock().unwrap_or_else(|e| e.into_inner());
+            game.back_to_root();
+            for &action in &history {
+                check_action(&game, action)?;
+                game.play(action);
+            }
+            Ok::<_, PyErr>(game.history().to_vec())
+        })?;
+        self.history = history;
+        Ok(())
+    }
+
+    fn is_terminal_node(&self) -> bool {
+        self.with_game(|game| game.is_terminal_node())
+    }
+
+    fn is_chance_node(&self) -> bool {
+        self.with_game(|game| game.is_chance_node())
+    }
+
+    /// Player to act (0 = OOP, 1 = IP), or `None` at terminal and chance nodes.
+    fn current_player(&self) -> Option<usize> {
+        self.with_game(|game| {
+            if game.is_terminal_node() || game.is_chance_node() {
+                None
+            } else {
+                Some(game.current_player())
+            }
+        })
+    }
+
+    /// Board cards at the current node, e.g. `"Td9d6hQc"`.
+    fn current_board(&self) -> String {
+        self.with_game(|game| {
+            game.current_board()
+                .into_iter()
+                .map(|card| card_to_string(card).unwrap())
+                .collect()
+        })
+    }
+
+    /// Chips put in by OOP and IP on the current street.
+    fn total_bet_amount(&self) -> [i32; 2] {
+        self.with_game(|game| game.total_bet_amount())
+    }
+
+    /// Actions at the current node (e.g. `"Bet(100)"`); empty at terminal nodes.
+    fn available_actions(&self) -> Vec<String> {
+        self.with_game(|game| {
+            game.available_actions()
+                .iter()
+                .map(|action| action.to_string())
+                .collect()
+        })
+    }
+
+    /// IDs of the cards that can be dealt at a chance node (`4 * rank + suit`), empty otherwise.
+    fn possible_cards(&self) -> Vec<u8> {
+        let mask = self.with_game(|game| game.possible_cards());
+        (0..52u8)
+            .filter(|&card| mask & (1u64 << card) != 0)
+            .collect()
+    }
+
+    /// Hand strings of `player`, in the order of the per-hand arrays.
+    fn private_cards(&self, player: usize) -> PyResult<Vec<String>> {
+        check_player(player)?;
+        Ok(self.with_game(|game| holes_to_strings(game.private_cards(player)).unwrap()))
+    }
+
+    /// `[action x hand]` strategy of the player to act.
+    fn strategy(&self, py: Python) -> PyResult<Py<F32Array>> {
+        let (strategy, num_hands) = self.with_game(|game| {
+            if game.is_terminal_node() || game.is_chance_node() {
+                return Err(PyValueError::new_err("No player acts at the current node"));
+            }
+            let num_hands = game.private_cards(game.current_player()).len();
+            Ok((game.strategy(), num_hands))
+        })?;
+        let num_actions = strategy.len() / num_hands;
+        Py::new(py, F32Array::new_2d(strategy, num_actions, num_hands))
+    }
+
+    /// Normalized range weights of `player` at the current node.
+    fn normalized_weights(&self, py: Python, player: usize) -> PyResult<Py<F32Array>> {
+        check_player(player)?;
+        let weights = self.with_weights(|game| game.normalized_weights(player).to_vec());
+        Py::new(py, F32Array::new_1d(weights))
+    }
+
+    fn equity(&self, py: Python, player: usize) -> PyResult<Py<F32Array>> {
+        check_player(player)?;
+        let equity = py.allow_threads(|| self.with_weights(|game| game.equity(player)));
+        Py::new(py, F32Array::new_1d(equity))
+    }
+
+    fn expected_values(&self, py: Python, player: usize) -> PyResult<Py<F32Array>> {
+        check_player(player)?;
+        let ev = py.allow_threads(|| self.with_weights(|game| game.expected_values(player)));
+        Py::new(py, F32Array::new_1d(ev))
+    }
+
+    /// Solves node-locking scenarios and returns how the results at the current node change.
+    ///
+    /// Each scenario is a list of locks: dictionaries with the `history` of a node (from the
+    /// root), and the action probabilities at that node of the whole range (`range`) and/or of
+    /// single hands (`hands`, e.g. `{"AsKd": [0.0, 1.0]}`). The scenarios are solved one after the
+    /// other, each one from the current solution under a budget of `max_iterations` iterations
+    /// (`target_exploitability_pct` of the pot and `deadline_seconds` default to those of the
+    /// spot); the solution of the session is not changed.
+    ///
+    /// Returns a dictionary with the results at the current node before locking (`base`:
+    /// `strategy`, `range_strategy`, `expected_values` and `range_ev` of OOP and IP) and a list of
+    /// the results of each scenario (`scenarios`: the same keys, their differences from `base` as
+    /// `strategy_diff`, `range_strategy_diff`, `ev_diff` and `range_ev_diff`, and the stats of the
+    /// solve). Raises `ValueError` if the current node is terminal or a lock is invalid.
+    #[pyo3(signature = (
+        scenarios,
+        max_iterations = locking::MAX_NUM_ITERATIONS,
+        target_exploitability_pct = None,
+        deadline_seconds = None,
+        cancel = None,
+    ))]
+    fn what_if(
+        &self,
+        py: Python,
+        scenarios: Vec<Vec<&PyDict>>,
+        max_iterations: u32,
+        target_exploitability_pct: Option<f32>,
+        deadline_seconds: Option<f64>,
+        cancel: Option<CancelToken>,
+    ) -> PyResult<PyObject> {
+        let scenarios = scenarios
+            .into_iter()
+            .map(|locks| locks.into_iter().map(Lock::extract).collect())
+            .collect::<PyResult<Vec<Vec<_>>>>()?;
+        let budget = Budget {
+            max_num_iterations: max_iterations,
+            target_exploitability: match target_exploitability_pct {
+                Some(pct) => self.key.starting_pot as f32 * pct / 100.0,
+                None => self.key.target_exploitability,
+            },
+            deadline: match deadline_seconds {
+                Some(seconds) => Duration::from_secs_f64(seconds),
+                None => self.key.deadline,
+            },
+        };
+        // a cold solve to the target of the scenarios (see `warm_start`)
+        let cold_iterations = (self.stats.iterations + self.stats.iterations_saved) as f32
+            * self.key.target_exploitability
+            / budget.target_exploitability;
+        let cold_iterations = Some(cold_iterations.round() as u32);
+        let cancel = cancel.unwrap_or_default();
+
+        let (base, results) = py.allow_threads(|| {
+            let base = self.with_game(|game| {
+                if game.is_terminal_node() {
+                    return Err(PyValueError::new_err("Current node is terminal"));
+                }
+                Ok(locking::node_results(game, &self.history))
+            })?;
+
+            let mut what_if = WhatIfGame::new(&self.game, &self.key, &cancel.flag)?;
+            let scenarios = scenarios
+                .iter()
+                .enumerate()
+                .map(|(i, locks)| {
+                    locks
+                        .iter()
+                        .map(|lock| what_if.resolve(lock))
+                        .collect::<Result<Vec<_>, _>>()
+                        .map_err(|msg| PyValueError::new_err(format!("Scenario {}: {}", i, msg)))
+                })
+                .collect::<PyResult<Vec<_>>>()?;
+
+            let mut results = Vec::with_capacity(scenarios.len());
+            for locks in &scenarios {
+                let stats =
+                    what_if.solve(&self.game, locks, cold_iterations, &budget, &cancel.flag)?;
+                results.push((stats, what_if.node_results(&self.history)));
+            }
+            Ok::<_, PyErr>((base, results))
+        })?;
+
+        let base_dict = PyDict::new(py);
+        set_results(py, base_dict, &base)?;
+        let scenarios = PyList::empty(py);
+        for (stats, results) in &results {
+            let dict = PyDict::new(py);
+            set_results(py, dict, results)?;
+            set_diffs(py, dict, &base, results)?;
+            dict.set_item("iterations", stats.iterations)?;
+            dict.set_item("estimated_iterations_saved", stats.iterations_saved)?;
+            dict.set_item("exploitability", stats.exploitability)?;
+            dict.set_item("solve_seconds", stats.elapsed.as_secs_f64())?;
+            dict.set_item("stop_reason", stats.stop_reason.as_str())?;
+            scenarios.append(dict)?;
+        }
+
+        let result = PyDict::new(py);
+        result.set_item("base", base_dict)?;
+        result.set_item("scenarios", scenarios)?;
+        Ok(result.into())
+    }
+}
@@ -0,0 +1,186 @@
+// Random access to precomputed solutions.
+//
+// `solve_and_save` can also write a solution file (`<digest>.sol`, see `SolutionFile`) next to the
+// saved game. The file is memory-mapped and only the blocks of the requested nodes are decoded, so
+// looking up a node of a large library takes a binary search and one block decompression instead
+// of loading the whole game, and only the touched pages become resident. Root-node requests
+// (`solve_poker_spot_columnar`) are answered from the library file when the game is not in memory.
+
+use crate::cache::{self, SolveStats, SpotKey};
+use crate::columnar::{F32Array, RootValues};
+use crate::SpotRequest;
+use memmap2::Mmap;
+use postflop_solver::*;
+use pyo3::exceptions::{PyIOError, PyValueError};
+use pyo3::prelude::*;
+use pyo3::types::PyDict;
+use std::fs::File;
+use std::path::Path;
+
+/// A memory-mapped solution file.
+#[pyclass]
+pub struct SolutionReader {
+    file: SolutionFile<Mmap>,
+}
+
+impl SolutionReader {
+    fn open(path: &Path) -> Result<Self, String> {
+        let file = File::open(path).map_err(|e| e.to_string())?;
+        // the file is never modified in place (see `cache::save_solution`)
+        let mmap = unsafe { Mmap::map(&file) }.map_err(|e| e.to_string())?;
+        Ok(Self {
+            file: SolutionFile::new(mmap)?,
+        })
+    }
+
+    /// Opens the solution file of `key` in the library, if it exists and was written for `key`.
+    fn open_library(key: &SpotKey) -> Result<Option<Self>, String> {
+        let Some(path) = cache::library_solution(key) else {
+            return Ok(None);
+        };
+        Ok(Self::open_for(&path, key)?.map(|(reader, _)| reader))
+    }
+
+    /// Opens the solution file at `path` if it was written for `key`, with its solve stats.
+    fn open_for(path: &Path, key: &SpotKey) -> Result<Option<(Self, SolveStats)>, String> {
+        let reader = Self::open(path)?;
+        let Some(stats) = cache::parse_memo(reader.file.memo(), &key.canonical()) else {
+            return Ok(None);
+        };
+        Ok(Some((reader, stats)))
+    }
+}
+
+/// Reads the root node of the library solution file of `key`, if there is one for a converged
+/// solve and the game is not in memory (see `cache::root_solution`).
+///
+/// An unreadable file is skipped, so that the spot is served from the game instead.
+pub fn library_root(key: &SpotKey) -> Option<(RootValues, SolveStats)> {
+    let path = cache::root_solution(key)?;
+    let (reader, stats) = SolutionReader::open_for(&path, key).ok()??;
+    if !stats.converged() {
+        return None;
+    }
+    let root = reader.file.node(&[]).ok()??;
+    cache::record_library_hit();
+    Some((RootValues::from_solution(&reader.file, root), stats))
+}
+
+fn check_player(player: usize) -> PyResult<()> {
+    if player > 1 {
+        return Err(PyValueError::new_err("Player must be 0 (OOP) or 1 (IP)"));
+    }
+    Ok(())
+}
+
+#[pymethods]
+impl SolutionReader {
+    #[new]
+    fn new(path: String) -> PyResult<Self> {
+        Self::open(Path::new(&path)).map_err(PyIOError::new_err)
+    }
+
+    /// Memo of the file: the canonical string of the spot and its solve stats.
+    #[getter]
+    fn memo(&self) -> &str {
+        self.file.memo()
+    }
+
+    #[getter]
+    fn num_nodes(&self) -> usize {
+        self.file.num_nodes()
+    }
+
+    /// Board cards at the root, e.g. `"Td9d6h"`.
+    #[getter]
+    fn board(&self) -> String {
+        let (flop, turn, river) = self.file.board();
+        flop.into_iter()
+            .chain([turn, river])
+            .filter(|&card| card != NOT_DEALT)
+            .map(|card| card_to_string(card).unwrap())
+            .collect()
+    }
+
+    /// Hand strings of `player`, in the order of the per-hand arrays.
+    fn private_cards(&self, player: usize) -> PyResult<Vec<String>> {
+        check_player(player)?;
+        Ok(holes_to_strings(self.file.private_cards(player)).unwrap())
+    }
+
+    /// Returns the node reached by `history` (action indices, or card IDs at chance nodes, as in
+    /// `GameSession.history`), or `None` if the file does not contain it.
+    ///
+    /// The dictionary has the node `type` (`"player"`, `"chance"` or `"terminal"`), the acting
+    /// `player`, `total_bet_amount`, `actions`, `possible_cards`, and per player (OOP, IP) the
+    /// `normalized_weights`, `equity` and `expected_values` arrays, plus the `[action x hand]`
+    /// `strategy` of the player to act.
+    fn node(&self, py: Python, history: Vec<usize>) -> PyResult<Option<PyObject>> {
+        let node = py
+            .allow_threads(|| self.file.node(&history))
+            .map_err(PyIOError::new_err)?;
+        let Some(node) = node else {
+            return Ok(None);
+        };
+
+        let result = PyDict::new(py);
+        let (node_type, player) = match node.node_type {
+            SolutionNodeType::Player(player) => ("player", Some(player)),
+            SolutionNodeType::Chance => ("chance", None),
+            SolutionNodeType::Terminal => ("terminal", None),
+        };
+        result.set_item("type", node_type)?;
+        result.set_item("player", player)?;
+        result.set_item("total_bet_amount", node.total_bet_amount)?;
+        result.set_item(
+            "actions",
+            node.actions
+                .iter()
+                .map(|action| action.to_string())
+                .collect::<Vec<_>>(),
+        )?;
+        result.set_item(
+            "possible_cards",
+            (0..52u8)
+                .filter(|&card| node.possible_cards & (1u64 << card) != 0)
+                .collect::<Vec<_>>(),
+        )?;
+
+        let [weights_oop, weights_ip] = node.normalized_weights;
+        let [equity_oop, equity_ip] = node.equity;
+        let [ev_oop, ev_ip] = node.expected_values;
+        let pair = |oop, ip| -> PyResult<_> {
+            Ok((
+                Py::new(py, F32Array::new_1d(oop))?,
+                Py::new(py, F32Array::new_1d(ip))?,
+            ))
+        };
+        result.set_item("normalized_weights", pair(weights_oop, weights_ip)?)?;
+        result.set_item("equity", pair(equity_oop, equity_ip)?)?;
+        result.set_item("expected_values", pair(ev_oop, ev_ip)?)?;
+
+        let strategy = match player {
+            Some(player) => {
+                let num_hands = self.file.private_cards(player).len();
+                let num_actions = node.actions.len();
+                Some(Py::new(
+                    py,
+                    F32Array::new_2d(node.strategy, num_actions, num_hands),
+                )?)
+            }
+            None => None,
+        };
+        result.set_item("strategy", strategy)?;
+
+        Ok(Some(result.into()))
+    }
+}
+
+/// Opens the precomputed solution file of `inputs` (same format as `solve_poker_spot`) in the
+/// library configured with `configure_cache`, or returns `None` if there is none.
+#[pyfunction]
+pub fn open_solution(py: Python, inputs: &PyDict) -> PyResult<Option<SolutionReader>> {
+    let SpotRequest { key, .. } = SpotRequest::extract(inputs)?;
+    py.allow_threads(|| SolutionReader::open_library(&key))
+        .map_err(PyIOError::new_err)
+}
@@ -0,0 +1,83 @@
+// Ranges of turn and river subgames.
+//
+// A turn or river spot solved from the preflop ranges overstates both ranges: hands that would
+// have folded (or bet differently) on the earlier streets are still in them, and the tree spans
+// streets that were already played. A subgame is solved from the start of its street only, with
+// the actual pot and stacks, and with the ranges that reach the street in the solution of the
+// previous street (its upstream spot). Since the inputs only give the chips each player put in on
+// a street, every line of the previous street that ends with the nearest amount is replayed, and
+// the weight of a hand is its total reach over these lines.
+
+use postflop_solver::*;
+
+/// Returns the ranges of OOP and IP that reach the next street in the solved `game`, when each
+/// player put in `bet` chips on the street of its root.
+///
+/// The weights are scaled so that the most likely hand of each player has weight 1. The current
+/// node of `game` is moved back to the root.
+pub fn narrow_ranges(game: &mut PostFlopGame, bet: i32) -> Result<[Range; 2], String> {
+    game.back_to_root();
+    let root_amount = game.total_bet_amount()[0];
+
+    let mut ends = Vec::new();
+    street_ends(game, &mut Vec::new(), &mut ends);
+
+    let distance = |amount: i32| (amount - root_amount - bet).abs();
+    let nearest = ends
+        .iter()
+        .map(|&(amount, _)| distance(amount))
+        .min()
+        .ok_or_else(|| "No line reaches the next street".to_string())?;
+
+    let mut weights = [
+        vec![0.0; game.private_cards(0).len()],
+        vec![0.0; game.private_cards(1).len()],
+    ];
+    for (_, history) in ends
+        .iter()
+        .filter(|&&(amount, _)| distance(amount) == nearest)
+    {
+        game.apply_history(history);
+        for (player, weights) in weights.iter_mut().enumerate() {
+            for (weight, &reach) in weights.iter_mut().zip(game.weights(player)) {
+                *weight += reach;
+            }
+        }
+    }
+    game.back_to_root();
+
+    let range = |player: usize, mut weights: Vec<f32>| {
+        let max = weights.iter().fold(0.0f32, |max, &w| max.max(w));
+        if max <= 0.0 {
+            return Err(format!(
+                "No hand of player {player} reaches the next street"
+            ));
+        }
+        weights.iter_mut().for_each(|w| *w = (*w / max).min(1.0));
+        Range::from_hands_weights(game.private_cards(player), &weights)
+    };
+    let [oop, ip] = weights;
+    Ok([range(0, oop)?, range(1, ip)?])
+}
+
+/// Collects the chance nodes that end the street of the node of `history`, with the bet amount of
+/// OOP (equal to that of IP) and their history.
+fn street_ends(
+    game: &mut PostFlopGame,
+    history: &mut Vec<usize>,
+    ends: &mut Vec<(i32, Vec<usize>)>,
+) {
+    game.apply_history(history);
+    if game.is_terminal_node() {
+        return;
+    }
+    if game.is_chance_node() {
+        ends.push((game.total_bet_amount()[0], history.clone()));
+        return;
+    }
+    for action in 0..game.available_actions().len() {
+        history.push(action);
+        street_ends(game, history, ends);
+        history.pop();
+    }
+}
@@ -0,0 +1,271 @@
+// Step-by-step solving for progress reporting.
+//
+// A `SolveTask` owns an unsolved game and advances it one exploitability check at a time (see
+// `SolverRun`), so that the caller can report progress and show the not yet converged root
+// strategy in between. Once finished, the game is stored in the cache like any other solve.
+
+use crate::bunching::BunchingStatus;
+use crate::cache::{self, CacheStatus, SpotKey};
+use crate::columnar::{build_columnar_result, F32Array, SpotResult};
+use crate::memory::Reservation;
+use crate::metrics::{self, Spans};
+use crate::session::GameSession;
+use crate::{
+    build_game, warm_start, CancelToken, SolveError, SolvedSpot, SolverRun, SpotRequest, Tier,
+};
+use postflop_solver::*;
+use pyo3::exceptions::PyRuntimeError;
+use pyo3::prelude::*;
+use pyo3::types::PyDict;
+
+/// A solve driven from Python, one exploitability check per `step()`.
+#[pyclass]
+pub struct SolveTask {
+    key: SpotKey,
+    tier: &'static Tier,
+    pot: f32,
+    bunching: BunchingStatus,
+    cancel: CancelToken,
+    running: Option<(PostFlopGame, SolverRun, Reservation)>,
+    solved: Option<SolvedSpot>,
+    /// Stages of the solve until it is finished.
+    spans: Spans,
+}
+
+#[pymethods]
+impl SolveTask {
+    /// Prepares the solve of `inputs` (same format as `solve_poker_spot`).
+    ///
+    /// If the spot is already cached, the task is finished from the start.
+    /// If the game does not fit in the solver memory budget right away, this waits for memory like
+    /// `solve_poker_spot` does.
+    #[new]
+    #[pyo3(signature = (inputs, cancel = None))]
+    fn new(py: Python, inputs: &PyDict, cancel: Option<CancelToken>) -> PyResult<Self> {
+        let SpotRequest {
+            key,
+            tier,
+            pot,
+            repository,
+            bunching,
+            spans,
+        } = SpotRequest::extract(inputs)?;
+
+        let cancel = cancel.unwrap_or_default();
+        let (running, solved) = py.allow_threads(|| -> Result<_, SolveError> {
+            if let Some((game, stats, status)) = cache::lookup(&key) {
+                let solved = SolvedSpot {
+                    game,
+                    stats,
+                    status,
+                    tier: tier.name,
+                    pot,
+                    bunching,
+                    spans: spans.take(),
+                };
+                return Ok((None, Some(solved)));
+            }
+
+            let (mut game, reservation) = build_game(&repository, &key, &cancel.flag, &spans)?;
+            let cold_iterations = spans.time("warm_start", || warm_start(&mut game, &key));
+            let run = SolverRun::new(
+                &game,
+                key.max_num_iterations,
+                key.target_exploitability,
+                key.deadline,
+                cold_iterations,
+            );
+            Ok((Some((game, run, reservation)), None))
+        })?;
+
+        Ok(Self {
+            key,
+            tier,
+            pot,
+            bunching,
+            cancel,
+            running,
+            solved,
+            spans,
+        })
+    }
+
+    /// Runs iterations up to the next exploitability check without holding the GIL.
+    ///
+    /// Returns `True` once the solve is finished.
+    fn step(&mut self, py: Python) -> PyResult<bool> {
+        let Some((game, run, _)) = self.running.as_mut() else {
+            return Ok(true);
+        };
+
+        let cancel = &self.cancel.flag;
+        let Some(stop_reason) = py.allow_threads(|| run.step(game, cancel))? else {
+            return Ok(false);
+        };
+
+        let (mut game, mut run, reservation) = self.running.take().unwrap();
+        let key = &self.key;
+        let (game, stats) = py.allow_threads(|| {
+            let stats = run.finish(&mut game, stop_reason);
+            metrics::record_solve(&game, key, &stats);
+            (cache::insert(key, game, stats), stats)
+        });
+        drop(reservation);
+        self.spans.record("solve", stats.elapsed);
+
+        self.solved = Some(SolvedSpot {
+            game,
+            stats,
+            status: CacheStatus::Miss,
+            tier: self.tier.name,
+            pot: self.pot,
+            bunching: self.bunching,
+            spans: self.spans.take(),
+        });
+
+        Ok(true)
+    }
+
+    #[getter]
+    fn done(&self) -> bool {
+        self.solved.is_some()
+    }
+
+    #[getter]
+    fn tier(&self) -> &'static str {
+        self.tier.name
+    }
+
+    #[getter]
+    fn iteration(&self) -> u32 {
+        match (&self.running, &self.solved) {
+            (Some((_, run, _)), _) => run.iteration,
+            (_, Some(solved)) => solved.stats.iterations,
+            _ => 0,
+        }
+    }
+
+    /// Estimated iterations saved by warm-starting the solve from a similar cached spot (0 for a
+    /// cold start or a solve stopped before its target); known once finished.
+    #[getter]
+    fn estimated_iterations_saved(&self) -> u32 {
+        self.solved
+            .as_ref()
+            .map_or(0, |solved| solved.stats.iterations_saved)
+    }
+
+    /// Exploitability at the last check, in chips.
+    #[getter]
+    fn exploitability(&self) -> f32 {
+        match (&self.running, &self.solved) {
+            (Some((_, run, _)), _) => run.exploitability,
+            (_, Some(solved)) => solved.stats.exploitability,
+            _ => f32::NAN,
+        }
+    }
+
+    /// Pot at the root of the game (see `SpotResult.starting_pot`).
+    #[getter]
+    fn starting_pot(&self) -> i32 {
+        self.key.starting_pot
+    }
+
+    #[getter]
+    fn elapsed_seconds(&self) -> f64 {
+        match (&self.running, &self.solved) {
+            (Some((_, run, _)), _) => run.start.elapsed().as_secs_f64(),
+            (_, Some(solved)) => solved.stats.elapsed.as_secs_f64(),
+            _ => 0.0,
+        }
+    }
+
+    /// `"target"`, `"deadline"` or `"max_iterations"` once finished, `None` before.
+    #[getter]
+    fn stop_reason(&self) -> Option<&'static str> {
+        self.solved
+            .as_ref()
+            .map(|solved| solved.stats.stop_reason.as_str())
+    }
+
+    /// Returns the current root strategy of the hero.
+    ///
+    /// The dictionary has the keys `legal_actions`, `range_strategy` (action frequencies of the
+    /// whole range), `strategy` (`[action x hand]` matrix) and `index` (hand string -> column).
+    fn snapshot(&mut self, py: Python) -> PyResult<PyObject> {
+        match (&mut self.running, &self.solved) {
+            (Some((game, _, _)), _) => root_snapshot(py, game),
+            (_, Some(solved)) => {
+                let mut game = solved.game.lock().unwrap_or_else(|e| e.into_inner());
+                root_snapshot(py, &mut game)
+            }
+            _ => Err(PyRuntimeError::new_err("Solve has failed")),
+        }
+    }
+
+    /// Returns the result of the finished solve in columnar form.
+    fn result(&self, py: Python) -> PyResult<SpotResult> {
+        let solved = self
+            .solved
+            .as_ref()
+            .ok_or_else(|| PyRuntimeError::new_err("Solve is not finished"))?;
+        let mut game = solved.game.lock().unwrap_or_else(|e| e.into_inner());
+        build_columnar_result(py, &mut game, solved)
+    }
+
+    /// Returns a `GameSession` at the root of the finished solve.
+    fn session(&self) -> PyResult<GameSession> {
+        let solved = self
+            .solved
+            .as_ref()
+            .ok_or_else(|| PyRuntimeError::new_err("Solve is not finished"))?;
+        Ok(GameSession::from_solved(&self.key, solved))
+    }
+}
+
+fn root_snapshot(py: Python, game: &mut PostFlopGame) -> PyResult<PyObject> {
+    game.back_to_root();
+    game.cache_normalized_weights();
+
+    let strategy = game.strategy();
+    let weights = game.normalized_weights(0);
+    let num_hands = weights.len();
+    let num_actions = strategy.len() / num_hands;
+    let total_weight = weights.iter().sum::<f32>();
+
+    let range_strategy = strategy
+        .chunks_exact(num_hands)
+        .map(|row| {
+            let sum = row.iter().zip(weights).map(|(s, w)| s * w).sum::<f32>();
+            if total_weight > 0.0 {
+                sum / total_weight
+            } else {
+                0.0
+            }
+        })
+        .collect::<Vec<_>>();
+
+    let legal_actions = game
+        .available_actions()
+        .iter()
+        .map(|action| action.to_string())
+        .collect::<Vec<_>>();
+
+    let index = PyDict::new(py);
+    for (i, hand) in holes_to_strings(game.private_cards(0))
+        .unwrap()
+        .iter()
+        .enumerate()
+    {
+        index.set_item(hand, i)?;
+    }
+
+    let result = PyDict::new(py);
+    result.set_item("legal_actions", legal_actions)?;
+    result.set_item("range_strategy", range_strategy)?;
+    result.set_item(
+        "strategy",
+        Py::new(py, F32Array::new_2d(strategy, num_actions, num_hands))?,
+    )?;
+    result.set_item("index", index)?;
+    Ok(result.into())
+}
@@ -153,7 +153,7 @@ pub struct TreeConfig {
 ///
 /// An [`ActionTree`] does not distinguish between possible chance events (i.e., the dealing of turn
 /// and river cards) and treats them as the same action.
-#[derive(Default)]
+#[derive(Clone, Default)]
 pub struct ActionTree {
     config: TreeConfig,
     added_lines: Vec<Vec<Action>>,
@@ -162,7 +162,7 @@ pub struct ActionTree {
     history: Vec<Action>,
 }
 
-#[derive(Default)]
+#[derive(Clone, Default)]
 #[cfg_attr(feature = "bincode", derive(Decode, Encode))]
 pub(crate) struct ActionTreeNode {
     pub(crate) player: u8,
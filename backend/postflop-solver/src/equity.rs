@@ -0,0 +1,481 @@
+use crate::card::*;
+use crate::hand::*;
+use crate::range::*;
+use crate::utility::*;
+
+#[cfg(feature = "rayon")]
+use rayon::prelude::*;
+
+/// Number of chunks the runouts are split into for parallel evaluation.
+const NUM_CHUNKS: usize = 64;
+
+/// Equity of two ranges on a board, without solving the game.
+#[derive(Clone, Debug, Default)]
+pub struct RangeEquity {
+    /// Hands of OOP and IP that do not overlap the board, in the order of
+    /// [`Range::get_hands_weights`] (and of [`PostFlopGame::private_cards`]).
+    ///
+    /// [`PostFlopGame::private_cards`]: crate::PostFlopGame::private_cards
+    pub private_cards: [Vec<(Card, Card)>; 2],
+
+    /// Equity of each hand against the range of the opponent, over every runout of the board.
+    pub equity: [Vec<f32>; 2],
+
+    /// Weight of each hand times the weight of the opponent's hands it can face, like
+    /// [`PostFlopGame::normalized_weights`].
+    ///
+    /// [`PostFlopGame::normalized_weights`]: crate::PostFlopGame::normalized_weights
+    pub normalized_weights: [Vec<f32>; 2],
+}
+
+impl RangeEquity {
+    /// Returns the equity of the whole range of `player`.
+    #[inline]
+    pub fn range_equity(&self, player: usize) -> f32 {
+        compute_average(&self.equity[player], &self.normalized_weights[player])
+    }
+}
+
+/// Sums of the equity of each hand over some runouts.
+struct Sums {
+    /// Opponent's weight beaten, plus half the weight tied.
+    win: [Vec<f64>; 2],
+    /// Opponent's weight faced.
+    total: [Vec<f64>; 2],
+}
+
+impl Sums {
+    fn new(num_hands: [usize; 2]) -> Self {
+        Self {
+            win: num_hands.map(|n| vec![0.0; n]),
+            total: num_hands.map(|n| vec![0.0; n]),
+        }
+    }
+
+    fn merge(&mut self, other: &Self) {
+        for player in 0..2 {
+            self.win[player]
+                .iter_mut()
+                .zip(&other.win[player])
+                .for_each(|(x, y)| *x += y);
+            self.total[player]
+                .iter_mut()
+                .zip(&other.total[player])
+                .for_each(|(x, y)| *x += y);
+        }
+    }
+}
+
+/// Computes the equity of each hand of the ranges of `card_config` by enumerating every runout of
+/// its board.
+///
+/// The flop must be dealt; the turn and river may be [`NOT_DEALT`]. Unlike
+/// [`PostFlopGame::equity`], no game tree is built and no strategy is involved: the hands are
+/// simply run out to showdown, weighted by the ranges and card removal.
+///
+/// [`PostFlopGame::equity`]: crate::PostFlopGame::equity
+pub fn compute_equity(card_config: &CardConfig) -> Result<RangeEquity, String> {
+    let board = board_cards(card_config)?;
+    let board_mask = board.iter().fold(0u64, |mask, &card| mask | (1 << card));
+
+    let range = &card_config.range;
+    if !range[0].is_valid() || !range[1].is_valid() {
+        return Err("Range is invalid (loaded broken data?)".to_string());
+    }
+
+    let (oop_cards, oop_weights) = range[0].get_hands_weights(board_mask);
+    let (ip_cards, ip_weights) = range[1].get_hands_weights(board_mask);
+    if oop_cards.is_empty() {
+        return Err("OOP range is empty".to_string());
+    }
+    if ip_cards.is_empty() {
+        return Err("IP range is empty".to_string());
+    }
+    let private_cards = [oop_cards, ip_cards];
+    let weights = [oop_weights, ip_weights];
+    let same_hand_index = same_hand_index(&private_cards);
+
+    let runouts = runouts(board_mask, 5 - board.len());
+    let num_chunks = NUM_CHUNKS.min(runouts.len());
+    let num_hands = [private_cards[0].len(), private_cards[1].len()];
+
+    let mut board_hand = Hand::new();
+    for &card in &board {
+        board_hand = board_hand.add_card(card as usize);
+    }
+
+    let chunks = into_par_iter(0..num_chunks)
+        .map(|chunk| {
+            let start = runouts.len() * chunk / num_chunks;
+            let end = runouts.len() * (chunk + 1) / num_chunks;
+            let mut sums = Sums::new(num_hands);
+            for runout in &runouts[start..end] {
+                let mut hand = board_hand;
+                for &card in runout {
+                    hand = hand.add_card(card as usize);
+                }
+                let strength = [0, 1].map(|player| hand_strength(&hand, &private_cards[player]));
+                for player in 0..2 {
+                    evaluate_showdown(
+                        &mut sums,
+                        player,
+                        &strength,
+                        &private_cards,
+                        &weights,
+                        &same_hand_index[player],
+                    );
+                }
+            }
+            sums
+        })
+        .collect::<Vec<_>>();
+
+    let mut sums = Sums::new(num_hands);
+    for chunk in &chunks {
+        sums.merge(chunk);
+    }
+
+    // number of runouts that avoid the four hole cards of a showdown
+    let num_cards = 52 - board.len() - 4;
+    let num_runouts = match 5 - board.len() {
+        0 => 1,
+        1 => num_cards,
+        _ => num_cards * (num_cards - 1) / 2,
+    } as f64;
+
+    let mut equity = [Vec::new(), Vec::new()];
+    let mut normalized_weights = [Vec::new(), Vec::new()];
+    for player in 0..2 {
+        equity[player] = sums.win[player]
+            .iter()
+            .zip(&sums.total[player])
+            .map(|(&win, &total)| {
+                if total > 0.0 {
+                    (win / total) as f32
+                } else {
+                    0.0
+                }
+            })
+            .collect();
+        normalized_weights[player] = weights[player]
+            .iter()
+            .zip(&sums.total[player])
+            .map(|(&weight, &total)| (weight as f64 * total / num_runouts) as f32)
+            .collect();
+    }
+
+    if normalized_weights[0].iter().all(|&w| w == 0.0) {
+        return Err("Valid card assignment does not exist".to_string());
+    }
+
+    Ok(RangeEquity {
+        private_cards,
+        equity,
+        normalized_weights,
+    })
+}
+
+/// Returns the dealt cards of the board of `card_config`, after checking them.
+fn board_cards(card_config: &CardConfig) -> Result<Vec<Card>, String> {
+    let (flop, turn, river) = (card_config.flop, card_config.turn, card_config.river);
+
+    if flop.contains(&NOT_DEALT) {
+        return Err("Flop cards not initialized".to_string());
+    }
+
+    if river != NOT_DEALT && turn == NOT_DEALT {
+        return Err(format!(
+            "River card specified without turn card: river = {river}"
+        ));
+    }
+
+    let mut board = flop.to_vec();
+    board.extend([turn, river].iter().filter(|&&card| card != NOT_DEALT));
+
+    if board.iter().any(|&card| 52 <= card) {
+        return Err(format!("Board cards must be in [0, 52): board = {board:?}"));
+    }
+
+    let mask = board.iter().fold(0u64, |mask, &card| mask | (1 << card));
+    if mask.count_ones() as usize != board.len() {
+        return Err(format!("Board cards must be unique: board = {board:?}"));
+    }
+
+    Ok(board)
+}
+
+/// Returns every set of `num_cards` cards that avoids `board_mask`.
+fn runouts(board_mask: u64, num_cards: usize) -> Vec<Vec<Card>> {
+    let deck = (0..52)
+        .filter(|&card| board_mask & (1 << card) == 0)
+        .collect::<Vec<Card>>();
+    match num_cards {
+        0 => vec![Vec::new()],
+        1 => deck.iter().map(|&card| vec![card]).collect(),
+        _ => deck
+            .iter()
+            .enumerate()
+            .flat_map(|(i, &card1)| deck[i + 1..].iter().map(move |&card2| vec![card1, card2]))
+            .collect(),
+    }
+}
+
+/// Returns, for each hand of each player, the index of the same hand in the opponent's hands (or
+/// `u16::MAX`).
+fn same_hand_index(private_cards: &[Vec<(Card, Card)>; 2]) -> [Vec<u16>; 2] {
+    [0, 1].map(|player| {
+        private_cards[player]
+            .iter()
+            .map(|hand| {
+                private_cards[player ^ 1]
+                    .binary_search(hand)
+                    .map_or(u16::MAX, |index| index as u16)
+            })
+            .collect()
+    })
+}
+
+/// Returns the hands of `private_cards` that do not overlap the complete `board`, sorted by
+/// strength.
+fn hand_strength(board: &Hand, private_cards: &[(Card, Card)]) -> Vec<StrengthItem> {
+    let mut strength = private_cards
+        .iter()
+        .enumerate()
+        .filter_map(|(index, &(c1, c2))| {
+            let (c1, c2) = (c1 as usize, c2 as usize);
+            if board.contains(c1) || board.contains(c2) {
+                None
+            } else {
+                let hand = board.add_card(c1).add_card(c2);
+                Some(StrengthItem {
+                    strength: hand.evaluate(),
+                    index: index as u16,
+                })
+            }
+        })
+        .collect::<Vec<_>>();
+    strength.sort_unstable();
+    strength
+}
+
+/// Adds the showdown of one runout to the sums of `player`, given the hands of both players sorted
+/// by strength on the runout.
+fn evaluate_showdown(
+    sums: &mut Sums,
+    player: usize,
+    strength: &[Vec<StrengthItem>; 2],
+    private_cards: &[Vec<(Card, Card)>; 2],
+    weights: &[Vec<f32>; 2],
+    same_hand_index: &[u16],
+) {
+    let player_strength = &strength[player];
+    let opponent_strength = &strength[player ^ 1];
+    let player_cards = &private_cards[player];
+    let opponent_cards = &private_cards[player ^ 1];
+    let opponent_weights = &weights[player ^ 1];
+
+    // weight of the opponent's hands, in total and holding each card
+    let mut weight_sum = 0.0;
+    let mut weight_minus = [0.0; 52];
+    for &StrengthItem { index, .. } in opponent_strength {
+        let (c1, c2) = opponent_cards[index as usize];
+        let weight = opponent_weights[index as usize] as f64;
+        weight_sum += weight;
+        weight_minus[c1 as usize] += weight;
+        weight_minus[c2 as usize] += weight;
+    }
+
+    let total = &mut sums.total[player];
+    let win = &mut sums.win[player];
+    for &StrengthItem { index, .. } in player_strength {
+        let (c1, c2) = player_cards[index as usize];
+        let same_i = same_hand_index[index as usize];
+        let weight_same = if same_i == u16::MAX {
+            0.0
+        } else {
+            opponent_weights[same_i as usize] as f64
+        };
+        let faced =
+            weight_sum - weight_minus[c1 as usize] - weight_minus[c2 as usize] + weight_same;
+        total[index as usize] += faced;
+        // ties count half: they are added here and the stronger hands are subtracted below
+        win[index as usize] += 0.5 * faced;
+    }
+
+    // weaker hands of the opponent
+    let mut j = 0;
+    let mut weight_sum = 0.0;
+    let mut weight_minus = [0.0; 52];
+    for &StrengthItem { strength, index } in player_strength {
+        while j < opponent_strength.len() && opponent_strength[j].strength < strength {
+            let opponent_index = opponent_strength[j].index as usize;
+            let (c1, c2) = opponent_cards[opponent_index];
+            let weight = opponent_weights[opponent_index] as f64;
+            weight_sum += weight;
+            weight_minus[c1 as usize] += weight;
+            weight_minus[c2 as usize] += weight;
+            j += 1;
+        }
+        let (c1, c2) = player_cards[index as usize];
+        let weaker = weight_sum - weight_minus[c1 as usize] - weight_minus[c2 as usize];
+        win[index as usize] += 0.5 * weaker;
+    }
+
+    // stronger hands of the opponent
+    let mut j = opponent_strength.len();
+    let mut weight_sum = 0.0;
+    let mut weight_minus = [0.0; 52];
+    for &StrengthItem { strength, index } in player_strength.iter().rev() {
+        while j > 0 && opponent_strength[j - 1].strength > strength {
+            let opponent_index = opponent_strength[j - 1].index as usize;
+            let (c1, c2) = opponent_cards[opponent_index];
+            let weight = opponent_weights[opponent_index] as f64;
+            weight_sum += weight;
+            weight_minus[c1 as usize] += weight;
+            weight_minus[c2 as usize] += weight;
+            j -= 1;
+        }
+        let (c1, c2) = player_cards[index as usize];
+        let stronger = weight_sum - weight_minus[c1 as usize] - weight_minus[c2 as usize];
+        win[index as usize] -= 0.5 * stronger;
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn card_config(oop: &str, ip: &str, flop: &str, turn: &str, river: &str) -> CardConfig {
+        let card = |s: &str| {
+            if s.is_empty() {
+                NOT_DEALT
+            } else {
+                card_from_str(s).unwrap()
+            }
+        };
+        CardConfig {
+            range: [oop.parse().unwrap(), ip.parse().unwrap()],
+            flop: flop_from_str(flop).unwrap(),
+            turn: card(turn),
+            river: card(river),
+        }
+    }
+
+    /// Computes the equity of each hand of `player` one showdown at a time.
+    fn brute_force_equity(card_config: &CardConfig, player: usize) -> Vec<f32> {
+        let board = board_cards(card_config).unwrap();
+        let board_mask = board.iter().fold(0u64, |mask, &card| mask | (1 << card));
+        let (player_cards, _) = card_config.range[player].get_hands_weights(board_mask);
+        let (opponent_cards, opponent_weights) =
+            card_config.range[player ^ 1].get_hands_weights(board_mask);
+
+        let mut base = Hand::new();
+        for &card in &board {
+            base = base.add_card(card as usize);
+        }
+
+        player_cards
+            .iter()
+            .map(|&(c1, c2)| {
+                let (mut win, mut total) = (0.0, 0.0);
+                for runout in runouts(board_mask, 5 - board.len()) {
+                    let mut hand = base;
+                    for &card in &runout {
+                        hand = hand.add_card(card as usize);
+                    }
+                    for (&(c3, c4), &weight) in opponent_cards.iter().zip(&opponent_weights) {
+                        let cards = [c1, c2, c3, c4];
+                        let used = cards.iter().fold(0u64, |mask, &card| mask | (1 << card));
+                        if used.count_ones() < 4 || cards.iter().any(|&c| hand.contains(c as usize))
+                        {
+                            continue;
+                        }
+                        let mine = hand.add_card(c1 as usize).add_card(c2 as usize).evaluate();
+                        let theirs = hand.add_card(c3 as usize).add_card(c4 as usize).evaluate();
+                        let weight = weight as f64;
+                        total += weight;
+                        win += weight
+                            * if mine > theirs {
+                                1.0
+                            } else if mine == theirs {
+                                0.5
+                            } else {
+                                0.0
+                            };
+                    }
+                }
+                if total > 0.0 {
+                    (win / total) as f32
+                } else {
+                    0.0
+                }
+            })
+            .collect()
+    }
+
+    fn assert_equity(card_config: &CardConfig) {
+        let result = compute_equity(card_config).unwrap();
+        for player in 0..2 {
+            let expected = brute_force_equity(card_config, player);
+            assert_eq!(result.equity[player].len(), expected.len());
+            for (actual, expected) in result.equity[player].iter().zip(&expected) {
+                assert!((actual - expected).abs() < 1e-5);
+            }
+        }
+        let sum = result.range_equity(0) + result.range_equity(1);
+        assert!((sum - 1.0).abs() < 1e-5);
+    }
+
+    #[test]
+    fn equity_river() {
+        assert_equity(&card_config(
+            "AA,KK,QQ,AK,T9s,76s,55:0.5",
+            "QQ-22,AQs+,KQo,JTs:0.75",
+            "Td9d6h",
+            "Qc",
+            "2s",
+        ));
+    }
+
+    #[test]
+    fn equity_turn() {
+        assert_equity(&card_config(
+            "AA,KK,AKs,QJs",
+            "TT+,AK,KQs:0.5",
+            "Ah7d6h",
+            "Kh",
+            "",
+        ));
+    }
+
+    #[test]
+    fn equity_flop() {
+        assert_equity(&card_config(
+            "AhAs,8h7h,Kc2c",
+            "KdKs,QQ:0.5",
+            "Jh9h3c",
+            "",
+            "",
+        ));
+    }
+
+    #[test]
+    fn equity_known() {
+        // AhAs vs KdKc on a dry flop: the kings need one of two kings, or a runner-runner straight
+        let config = card_config("AhAs", "KdKc", "7c2d3s", "", "");
+        let result = compute_equity(&config).unwrap();
+        let expected = brute_force_equity(&config, 0)[0];
+        assert!((result.equity[0][0] - expected).abs() < 1e-6);
+        assert!(result.equity[0][0] > 0.9);
+        assert!((result.equity[0][0] + result.equity[1][0] - 1.0).abs() < 1e-6);
+    }
+
+    #[test]
+    fn equity_invalid_board() {
+        let mut config = card_config("AA", "KK", "7c2d3s", "", "");
+        config.river = card_from_str("4h").unwrap();
+        assert!(compute_equity(&config).is_err());
+        config.turn = config.flop[0];
+        assert!(compute_equity(&config).is_err());
+    }
+}
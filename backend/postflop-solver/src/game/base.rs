@@ -278,6 +278,19 @@ impl PostFlopGame {
         self.memory_usage_bunching_internal()
     }
 
+    /// Returns the number of nodes in the game tree, by street (flop, turn, river).
+    ///
+    /// Chance outcomes are expanded (modulo suit isomorphism), so the turn and river counts grow
+    /// with the number of dealt cards.
+    #[inline]
+    pub fn num_nodes(&self) -> [u64; 3] {
+        if self.state <= State::Uninitialized {
+            panic!("Game is not successfully initialized");
+        }
+
+        self.num_nodes
+    }
+
     /// Remove lines after building the `PostFlopGame` but before allocating memory.
     ///
     /// This allows the removal of chance-specific lines (e.g., remove overbets on board-pairing
@@ -10,7 +10,59 @@ fn decode_signed_slice(slice: &[i16], scale: f32) -> Vec<f32> {
     slice.iter().map(|&x| x as f32 * decoder).collect()
 }
 
+/// Current node of the result interpreter, saved to return to it without replaying its history
+/// from the root.
+pub(crate) struct InterpreterPosition {
+    action_history: Vec<usize>,
+    node_history: Vec<usize>,
+    turn: Card,
+    river: Card,
+    turn_swapped_suit: Option<(u8, u8)>,
+    turn_swap: Option<u8>,
+    river_swap: Option<(u8, u8)>,
+    total_bet_amount: [i32; 2],
+    weights: [Vec<f32>; 2],
+    cfvalues_cache: [Vec<f32>; 2],
+}
+
 impl PostFlopGame {
+    /// Saves the current node, to be restored by [`restore_position`].
+    ///
+    /// [`restore_position`]: #method.restore_position
+    pub(crate) fn save_position(&self) -> InterpreterPosition {
+        InterpreterPosition {
+            action_history: self.action_history.clone(),
+            node_history: self.node_history.clone(),
+            turn: self.turn,
+            river: self.river,
+            turn_swapped_suit: self.turn_swapped_suit,
+            turn_swap: self.turn_swap,
+            river_swap: self.river_swap,
+            total_bet_amount: self.total_bet_amount,
+            weights: self.weights.clone(),
+            cfvalues_cache: self.cfvalues_cache.clone(),
+        }
+    }
+
+    /// Moves the current node back to a node saved by [`save_position`].
+    ///
+    /// [`save_position`]: #method.save_position
+    pub(crate) fn restore_position(&mut self, position: &InterpreterPosition) {
+        self.action_history.clone_from(&position.action_history);
+        self.node_history.clone_from(&position.node_history);
+        self.is_normalized_weight_cached = false;
+        self.turn = position.turn;
+        self.river = position.river;
+        self.turn_swapped_suit = position.turn_swapped_suit;
+        self.turn_swap = position.turn_swap;
+        self.river_swap = position.river_swap;
+        self.total_bet_amount = position.total_bet_amount;
+        for player in 0..2 {
+            self.weights[player].copy_from_slice(&position.weights[player]);
+            self.cfvalues_cache[player].copy_from_slice(&position.cfvalues_cache[player]);
+        }
+    }
+
     /// Moves the current node back to the root node.
     #[inline]
     pub fn back_to_root(&mut self) {
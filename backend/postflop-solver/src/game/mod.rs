@@ -2,6 +2,7 @@ mod base;
 mod evaluation;
 mod interpreter;
 mod node;
+mod warm_start;
 
 #[cfg(feature = "bincode")]
 mod serialization;
@@ -14,6 +15,8 @@ use crate::card::*;
 use crate::mutex_like::*;
 use std::collections::BTreeMap;
 
+pub use warm_start::{WarmStartInfo, WARM_START_ITERATION};
+
 #[cfg(feature = "bincode")]
 use bincode::{Decode, Encode};
 
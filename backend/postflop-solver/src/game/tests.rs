@@ -1141,6 +1141,109 @@ fn set_bunching_effect_always_win() {
     assert!((ev_ip - 0.0).abs() < 1e-4);
 }
 
+#[test]
+fn warm_start() {
+    let new_game = |starting_pot, effective_stack| {
+        let card_config = CardConfig {
+            range: [
+                "66+,A8s+,AJo+,K9s+,KQo,QTs+,JTs,96s+,85s+".parse().unwrap(),
+                "QQ-22,AQs-A2s,ATo+,K5s+,KJo+,Q8s+,J8s+,T7s+"
+                    .parse()
+                    .unwrap(),
+            ],
+            flop: flop_from_str("Td9d6h").unwrap(),
+            turn: card_from_str("Qc").unwrap(),
+            river: card_from_str("3s").unwrap(),
+        };
+        let tree_config = TreeConfig {
+            initial_state: BoardState::River,
+            starting_pot,
+            effective_stack,
+            river_bet_sizes: [
+                ("50%, a", "2.5x").try_into().unwrap(),
+                ("50%, a", "2.5x").try_into().unwrap(),
+            ],
+            ..Default::default()
+        };
+        let action_tree = ActionTree::new(tree_config).unwrap();
+        let mut game = PostFlopGame::with_config(card_config, action_tree).unwrap();
+        game.allocate_memory(false);
+        game
+    };
+
+    let num_iterations = |game: &mut PostFlopGame, first_iteration, target| {
+        let mut t = 0;
+        while compute_exploitability(game) > target {
+            solve_step(game, first_iteration + t);
+            t += 1;
+        }
+        t
+    };
+
+    let mut source = new_game(200, 900);
+    num_iterations(&mut source, 0, 0.2);
+    finalize(&mut source);
+
+    // the same spot starts at the precision of the source
+    let mut game = new_game(200, 900);
+    let info = game.warm_start(&source).unwrap();
+    assert_eq!(info.num_seeded_nodes, info.num_decision_nodes);
+    assert_eq!(info.num_projected_nodes, 0);
+    assert!(compute_exploitability(&game) <= 0.4);
+
+    // a nearby spot with other stacks converges faster than from scratch
+    let mut cold = new_game(220, 800);
+    let cold_iterations = num_iterations(&mut cold, 0, 0.22);
+    let mut warm = new_game(220, 800);
+    warm.warm_start(&source).unwrap();
+    let warm_iterations = num_iterations(&mut warm, WARM_START_ITERATION, 0.22);
+    assert!(warm_iterations < cold_iterations);
+
+    // the source must be solved
+    assert!(new_game(200, 900).warm_start(&new_game(200, 900)).is_err());
+}
+
+#[test]
+fn num_nodes() {
+    let card_config = CardConfig {
+        range: [Range::ones(); 2],
+        flop: flop_from_str("Td9d6h").unwrap(),
+        turn: card_from_str("Qc").unwrap(),
+        ..Default::default()
+    };
+
+    let tree_config = TreeConfig {
+        initial_state: BoardState::Turn,
+        starting_pot: 60,
+        effective_stack: 970,
+        turn_bet_sizes: [("50%", "").try_into().unwrap(), Default::default()],
+        river_bet_sizes: [("50%", "").try_into().unwrap(), Default::default()],
+        ..Default::default()
+    };
+
+    let action_tree = ActionTree::new(tree_config.clone()).unwrap();
+    let game = PostFlopGame::with_config(card_config.clone(), action_tree).unwrap();
+    let turn_nodes = game.num_nodes();
+    assert_eq!(turn_nodes[0], 0);
+    assert_eq!(turn_nodes[1], 6);
+
+    let river_config = CardConfig {
+        river: card_from_str("7s").unwrap(),
+        ..card_config
+    };
+    let river_tree_config = TreeConfig {
+        initial_state: BoardState::River,
+        ..tree_config
+    };
+    let action_tree = ActionTree::new(river_tree_config).unwrap();
+    let game = PostFlopGame::with_config(river_config, action_tree).unwrap();
+    let river_nodes = game.num_nodes();
+    assert_eq!(river_nodes, [0, 0, 6]);
+
+    // check-check and bet-call reach the river, once for each of the 48 river cards
+    assert_eq!(turn_nodes[2], 2 * 48 * river_nodes[2]);
+}
+
 #[test]
 #[ignore]
 fn solve_pio_preset_normal() {
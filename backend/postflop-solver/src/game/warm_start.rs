@@ -0,0 +1,248 @@
+use super::*;
+use crate::interface::*;
+use crate::utility::*;
+use std::mem;
+
+/// The iteration from which a warm-started game should continue the solve.
+///
+/// The discount factor of positive regrets is zero at the first two iterations of Discounted CFR,
+/// which would erase the seeded regrets, so the solve must not restart from zero.
+pub const WARM_START_ITERATION: u32 = 6;
+
+/// Weight of the seeded regrets, in units of the largest counterfactual value of each hand.
+const REGRET_WEIGHT: f32 = 3.0;
+
+/// Result of [`PostFlopGame::warm_start`].
+#[derive(Debug, Clone, Copy, Default, PartialEq, Eq)]
+pub struct WarmStartInfo {
+    /// Number of decision nodes of this game seeded from a node of the source game.
+    pub num_seeded_nodes: usize,
+
+    /// Number of decision nodes of this game.
+    pub num_decision_nodes: usize,
+
+    /// Number of seeded decision nodes whose action set differs from the source node.
+    pub num_projected_nodes: usize,
+}
+
+impl PostFlopGame {
+    /// Seeds the cumulative strategy and regrets of this game from a solved game.
+    ///
+    /// The source game must have the same board and the same private hands (i.e., ranges with the
+    /// same nonzero combinations), but its stacks, pot, and bet sizes may differ. The trees are
+    /// walked together: each action is matched with the source action of the same kind (bets and
+    /// raises with the closest size relative to the pot), and the source strategy is projected onto
+    /// the matched actions. Subtrees without a matching action are left unseeded.
+    ///
+    /// The solve must then be continued from [`WARM_START_ITERATION`], i.e., by calling
+    /// `solve_step(game, WARM_START_ITERATION + t)` for `t = 0, 1, ...`.
+    ///
+    /// The memory of this game must be allocated and it must not be solved yet.
+    pub fn warm_start(&mut self, source: &PostFlopGame) -> Result<WarmStartInfo, String> {
+        if self.state != State::MemoryAllocated {
+            return Err("Game is not ready or already solved".to_string());
+        }
+
+        if source.state != State::Solved {
+            return Err("Source game is not solved".to_string());
+        }
+
+        if self.card_config.flop != source.card_config.flop
+            || self.card_config.turn != source.card_config.turn
+            || self.card_config.river != source.card_config.river
+        {
+            return Err("Source game has a different board".to_string());
+        }
+
+        if self.private_cards != source.private_cards {
+            return Err("Source game has different private hands".to_string());
+        }
+
+        let mut info = WarmStartInfo::default();
+        self.warm_start_recursive(&mut self.root(), source, &source.root(), &mut info);
+        Ok(info)
+    }
+
+    fn warm_start_recursive(
+        &self,
+        node: &mut PostFlopNode,
+        source: &PostFlopGame,
+        source_node: &PostFlopNode,
+        info: &mut WarmStartInfo,
+    ) {
+        if node.is_terminal() {
+            return;
+        }
+
+        let actions = node
+            .children()
+            .iter()
+            .map(|child| child.lock().prev_action)
+            .collect::<Vec<_>>();
+        let source_actions = source_node
+            .children()
+            .iter()
+            .map(|child| child.lock().prev_action)
+            .collect::<Vec<_>>();
+
+        if node.is_chance() {
+            for (action, &card) in actions.iter().enumerate() {
+                if let Some(source_action) = source_actions.iter().position(|&a| a == card) {
+                    self.warm_start_recursive(
+                        &mut node.play(action),
+                        source,
+                        &source_node.play(source_action),
+                        info,
+                    );
+                }
+            }
+            return;
+        }
+
+        info.num_decision_nodes += 1;
+
+        let pot = self.tree_config.starting_pot + 2 * node.amount;
+        let source_pot = source.tree_config.starting_pot + 2 * source_node.amount;
+        let mapping = actions
+            .iter()
+            .map(|&action| match_action(action, pot, &source_actions, source_pot))
+            .collect::<Vec<_>>();
+
+        let num_hands = self.num_private_hands(node.player());
+        let num_actions = actions.len();
+        let num_source_actions = source_actions.len();
+
+        let has_storage = node.num_elements as usize == num_actions * num_hands
+            && source_node.num_elements as usize == num_source_actions * num_hands;
+
+        if has_storage && mapping.iter().any(Option::is_some) {
+            info.num_seeded_nodes += 1;
+            if actions != source_actions {
+                info.num_projected_nodes += 1;
+            }
+            self.seed_node(node, source, source_node, &mapping, num_hands);
+        }
+
+        for (action, source_action) in mapping.into_iter().enumerate() {
+            if let Some(source_action) = source_action {
+                self.warm_start_recursive(
+                    &mut node.play(action),
+                    source,
+                    &source_node.play(source_action),
+                    info,
+                );
+            }
+        }
+    }
+
+    fn seed_node(
+        &self,
+        node: &mut PostFlopNode,
+        source: &PostFlopGame,
+        source_node: &PostFlopNode,
+        mapping: &[Option<usize>],
+        num_hands: usize,
+    ) {
+        let num_actions = mapping.len();
+        let num_source_actions = source_node.num_actions();
+
+        // after `finalize`, the regret storage holds the counterfactual values of each action
+        let (source_strategy, source_cfvalues) = if source.is_compression_enabled {
+            let decoder = source_node.cfvalue_scale() / i16::MAX as f32;
+            (
+                normalized_strategy_compressed(
+                    source_node.strategy_compressed(),
+                    num_source_actions,
+                ),
+                source_node
+                    .cfvalues_compressed()
+                    .iter()
+                    .map(|&v| v as f32 * decoder)
+                    .collect::<Vec<_>>(),
+            )
+        } else {
+            (
+                normalized_strategy(source_node.strategy(), num_source_actions),
+                source_node.cfvalues().to_vec(),
+            )
+        };
+
+        // split the probability of a source action among the actions matched with it
+        let mut multiplicity = vec![0usize; num_source_actions];
+        mapping.iter().flatten().for_each(|&a| multiplicity[a] += 1);
+
+        let mut strategy = vec![0.0; num_actions * num_hands];
+        for (action, source_action) in mapping.iter().enumerate() {
+            if let Some(a) = *source_action {
+                let src = &source_strategy[a * num_hands..(a + 1) * num_hands];
+                let dst = &mut strategy[action * num_hands..(action + 1) * num_hands];
+                let divisor = multiplicity[a] as f32;
+                dst.iter_mut().zip(src).for_each(|(d, &s)| *d = s / divisor);
+            }
+        }
+
+        let mut regrets = vec![0.0; num_actions * num_hands];
+        for hand in 0..num_hands {
+            let sum = (0..num_actions)
+                .map(|action| strategy[action * num_hands + hand])
+                .sum::<f32>();
+            let scale = (0..num_source_actions)
+                .map(|a| source_cfvalues[a * num_hands + hand].abs())
+                .fold(0.0, max);
+            for action in 0..num_actions {
+                let index = action * num_hands + hand;
+                strategy[index] = if sum > 0.0 {
+                    strategy[index] / sum
+                } else {
+                    1.0 / num_actions as f32
+                };
+                regrets[index] = strategy[index] * scale * REGRET_WEIGHT;
+            }
+        }
+
+        if self.is_compression_enabled {
+            let scale = encode_unsigned_slice(node.strategy_compressed_mut(), &strategy);
+            node.set_strategy_scale(scale);
+            let scale = encode_signed_slice(node.regrets_compressed_mut(), &regrets);
+            node.set_regret_scale(scale);
+        } else {
+            node.strategy_mut().copy_from_slice(&strategy);
+            node.regrets_mut().copy_from_slice(&regrets);
+        }
+    }
+}
+
+/// Returns the index of the source action corresponding to `action`.
+///
+/// Bets, raises, and all-ins are matched with the source action of the same kind whose size
+/// relative to the pot is the closest, or with any aggressive action if there is none of the same
+/// kind.
+fn match_action(
+    action: Action,
+    pot: i32,
+    source_actions: &[Action],
+    source_pot: i32,
+) -> Option<usize> {
+    let ratio = |action: Action, pot: i32| match action {
+        Action::Bet(amount) | Action::Raise(amount) | Action::AllIn(amount) => {
+            Some(amount as f64 / pot as f64)
+        }
+        _ => None,
+    };
+
+    let Some(target_ratio) = ratio(action, pot) else {
+        return source_actions.iter().position(|&a| a == action);
+    };
+
+    let closest = |same_kind: bool| {
+        source_actions
+            .iter()
+            .enumerate()
+            .filter(|(_, &a)| !same_kind || mem::discriminant(&a) == mem::discriminant(&action))
+            .filter_map(|(i, &a)| ratio(a, source_pot).map(|r| (i, (r / target_ratio).ln().abs())))
+            .min_by(|(_, x), (_, y)| x.total_cmp(y))
+            .map(|(i, _)| i)
+    };
+
+    closest(true).or_else(|| closest(false))
+}
@@ -44,7 +44,8 @@
 //! - `rayon`: Uses [rayon] crate for parallelization.
 //!   Enabled by default.
 //! - `zstd`: Uses [zstd] crate to compress and decompress the game tree.
-//!   This feature is required to save and load the game tree with compression.
+//!   This feature is required to save and load the game tree with compression,
+//!   and to save and read solution files (see [`SolutionFile`]) with compression.
 //!   Disabled by default.
 //!
 //! [bincode]: https://github.com/bincode-org/bincode
@@ -64,6 +65,7 @@ mod atomic_float;
 mod bet_size;
 mod bunching;
 mod card;
+mod equity;
 mod game;
 mod hand;
 mod hand_table;
@@ -71,6 +73,7 @@ mod interface;
 mod mutex_like;
 mod range;
 mod sliceop;
+mod solution;
 mod solver;
 mod utility;
 
@@ -81,9 +84,11 @@ pub use action_tree::*;
 pub use bet_size::*;
 pub use bunching::*;
 pub use card::*;
+pub use equity::*;
 pub use game::*;
 pub use interface::*;
 pub use mutex_like::*;
 pub use range::*;
+pub use solution::*;
 pub use solver::*;
 pub use utility::*;
@@ -68,6 +68,13 @@ impl<T: ?Sized> MutexLike<T> {
     }
 }
 
+impl<T: Clone> Clone for MutexLike<T> {
+    #[inline]
+    fn clone(&self) -> Self {
+        Self::new(self.lock().clone())
+    }
+}
+
 impl<T: ?Sized + Default> Default for MutexLike<T> {
     #[inline]
     fn default() -> Self {
@@ -0,0 +1,841 @@
+// [Solution file format]
+// A solution file stores the results of a solved game node by node, so that a reader can look up
+// a single node without decoding the rest of the file (e.g., from a memory-mapped file).
+// All integers are little-endian. The file consists of:
+//  - Magic number (4 bytes): 90 57 f1 0a
+//  - Version number (1 byte): 1
+//  - Compression type (1 byte): 0 (none), 1 (zstd; each node block is a separate frame)
+//  - Header length (u32) and header:
+//    - Memo length (u32) and memo (UTF-8)
+//    - Flop (3 bytes), turn and river (1 byte each; `NOT_DEALT` if not dealt)
+//    - Starting pot and effective stack (i32 each)
+//    - For each player: number of private hands (u32) and the private hands (2 bytes each)
+//  - Node blocks, in depth-first order
+//  - Index: one 32-byte entry per node, sorted by history:
+//    - Block offset (u64), block length (u32), decoded block length (u32)
+//    - History offset (u64, relative to the start of the histories), history length (u32)
+//    - Reserved (u32)
+//  - Histories: the history of each node, one byte per action
+//  - Footer (24 bytes): index offset (u64), number of nodes (u64), magic number, reserved (u32)
+//
+// A decoded node block is as follows:
+//  - Node type (1 byte): 0 (OOP), 1 (IP), 2 (chance), 3 (terminal)
+//  - Total bet amount of each player (i32 each)
+//  - Possible cards (u64; 0 if not a chance node)
+//  - Number of actions (u16) and the actions (5 bytes each: type and amount or card)
+//  - Unless terminal, for each player: normalized weights, equity and expected values (f32 each)
+//  - For player nodes: the strategy of the current player (f32 each)
+
+use crate::action_tree::*;
+use crate::card::*;
+use crate::game::*;
+use crate::interface::*;
+use std::cmp::Ordering;
+use std::fs::File;
+use std::io::{BufWriter, Write};
+use std::path::Path;
+
+const MAGIC: u32 = 0x0af15790;
+const VERSION: u8 = 1;
+const INDEX_ENTRY_SIZE: usize = 32;
+const FOOTER_SIZE: usize = 24;
+
+/// The type of a node in a solution file.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+pub enum SolutionNodeType {
+    /// A decision node of the given player (0: OOP, 1: IP).
+    Player(usize),
+    /// A turn/river deal.
+    Chance,
+    /// A terminal node.
+    Terminal,
+}
+
+/// The results of a node read from a solution file.
+///
+/// The per-hand values are those of the [`PostFlopGame`] methods of the same names at the node;
+/// they are empty for terminal nodes. The private hands are those of
+/// [`SolutionFile::private_cards`].
+#[derive(Debug, Clone, PartialEq)]
+pub struct SolutionNode {
+    /// The node type.
+    pub node_type: SolutionNodeType,
+    /// The total bet amount of each player (OOP, IP).
+    pub total_bet_amount: [i32; 2],
+    /// The cards that can be dealt if this is a chance node (see
+    /// [`PostFlopGame::possible_cards`]).
+    pub possible_cards: u64,
+    /// The available actions (see [`PostFlopGame::available_actions`]).
+    pub actions: Vec<Action>,
+    /// The normalized weights of each player.
+    pub normalized_weights: [Vec<f32>; 2],
+    /// The equity of each private hand of each player.
+    pub equity: [Vec<f32>; 2],
+    /// The expected values of each private hand of each player.
+    pub expected_values: [Vec<f32>; 2],
+    /// The strategy of the current player, if this is a player node (`#(actions) * #(private
+    /// hands)`, in the layout of [`PostFlopGame::strategy`]).
+    pub strategy: Vec<f32>,
+}
+
+/// Byte sink that counts the bytes written so far.
+struct CountingWriter<'a, W: Write> {
+    writer: &'a mut W,
+    position: u64,
+}
+
+impl<'a, W: Write> CountingWriter<'a, W> {
+    #[inline]
+    fn write(&mut self, bytes: &[u8]) -> Result<(), String> {
+        self.writer
+            .write_all(bytes)
+            .map_err(|e| format!("Failed to write solution: {}", e))?;
+        self.position += bytes.len() as u64;
+        Ok(())
+    }
+}
+
+/// Index entry of a node, before sorting.
+struct IndexEntry {
+    history: Vec<u8>,
+    offset: u64,
+    length: u32,
+    decoded_length: u32,
+}
+
+#[inline]
+fn put_f32s(buf: &mut Vec<u8>, values: &[f32]) {
+    buf.reserve(4 * values.len());
+    for &value in values {
+        buf.extend_from_slice(&value.to_le_bytes());
+    }
+}
+
+#[inline]
+fn encode_action(buf: &mut Vec<u8>, action: Action) {
+    let (tag, value) = match action {
+        Action::None => (0, 0),
+        Action::Fold => (1, 0),
+        Action::Check => (2, 0),
+        Action::Call => (3, 0),
+        Action::Bet(amount) => (4, amount),
+        Action::Raise(amount) => (5, amount),
+        Action::AllIn(amount) => (6, amount),
+        Action::Chance(card) => (7, card as i32),
+    };
+    buf.push(tag);
+    buf.extend_from_slice(&value.to_le_bytes());
+}
+
+#[inline]
+fn decode_action(tag: u8, value: i32) -> Result<Action, String> {
+    Ok(match tag {
+        0 => Action::None,
+        1 => Action::Fold,
+        2 => Action::Check,
+        3 => Action::Call,
+        4 => Action::Bet(value),
+        5 => Action::Raise(value),
+        6 => Action::AllIn(value),
+        7 => Action::Chance(value as Card),
+        _ => return Err("Action type is invalid".to_string()),
+    })
+}
+
+/// Encodes the current node of `game`.
+fn encode_node(game: &mut PostFlopGame) -> Vec<u8> {
+    let mut buf = Vec::new();
+
+    let node_type = if game.is_terminal_node() {
+        3
+    } else if game.is_chance_node() {
+        2
+    } else {
+        game.current_player() as u8
+    };
+
+    buf.push(node_type);
+    for amount in game.total_bet_amount() {
+        buf.extend_from_slice(&amount.to_le_bytes());
+    }
+    buf.extend_from_slice(&game.possible_cards().to_le_bytes());
+
+    let actions = game.available_actions();
+    buf.extend_from_slice(&(actions.len() as u16).to_le_bytes());
+    for &action in &actions {
+        encode_action(&mut buf, action);
+    }
+
+    if node_type != 3 {
+        game.cache_normalized_weights();
+        for player in 0..2 {
+            put_f32s(&mut buf, game.normalized_weights(player));
+            put_f32s(&mut buf, &game.equity(player));
+            put_f32s(&mut buf, &game.expected_values(player));
+        }
+    }
+
+    if node_type < 2 {
+        put_f32s(&mut buf, &game.strategy());
+    }
+
+    buf
+}
+
+#[cfg(feature = "zstd")]
+#[inline]
+fn compress(block: &[u8], compression_level: Option<i32>) -> Result<Vec<u8>, String> {
+    match compression_level {
+        Some(level) => zstd::bulk::compress(block, level)
+            .map_err(|e| format!("Failed to compress node: {}", e)),
+        None => Ok(block.to_vec()),
+    }
+}
+
+#[cfg(not(feature = "zstd"))]
+#[inline]
+fn compress(block: &[u8], _compression_level: Option<i32>) -> Result<Vec<u8>, String> {
+    Ok(block.to_vec())
+}
+
+/// Returns the deepest street stored in `game` (only a game loaded from a file can store less than
+/// the river).
+#[cfg(feature = "bincode")]
+#[inline]
+fn storage_mode(game: &PostFlopGame) -> BoardState {
+    game.storage_mode()
+}
+
+#[cfg(not(feature = "bincode"))]
+#[inline]
+fn storage_mode(_game: &PostFlopGame) -> BoardState {
+    BoardState::River
+}
+
+/// Writes the current node of `game`, reached by `history`, and its descendants up to
+/// `max_board_state`, in depth-first order.
+///
+/// The children are visited by playing their action from the current node, which is restored
+/// afterwards, so each node costs one `play` instead of replaying its history from the root.
+fn write_subtree<W: Write>(
+    game: &mut PostFlopGame,
+    history: &mut Vec<usize>,
+    max_board_state: BoardState,
+    compression_level: Option<i32>,
+    writer: &mut CountingWriter<W>,
+    index: &mut Vec<IndexEntry>,
+) -> Result<(), String> {
+    let block = encode_node(game);
+    let compressed = compress(&block, compression_level)?;
+    index.push(IndexEntry {
+        history: history.iter().map(|&action| action as u8).collect(),
+        offset: writer.position,
+        length: compressed.len() as u32,
+        decoded_length: block.len() as u32,
+    });
+    writer.write(&compressed)?;
+
+    if game.is_terminal_node() {
+        return Ok(());
+    }
+
+    let children = if game.is_chance_node() {
+        // the street dealt by this chance node
+        let next_state = if game.current_board().len() == 3 {
+            BoardState::Turn
+        } else {
+            BoardState::River
+        };
+        if next_state > max_board_state || next_state > storage_mode(game) {
+            return Ok(());
+        }
+        let mask = game.possible_cards();
+        (0..52).filter(|&card| mask & (1 << card) != 0).collect()
+    } else {
+        (0..game.available_actions().len()).collect::<Vec<_>>()
+    };
+
+    let position = game.save_position();
+    for action in children {
+        history.push(action);
+        game.play(action);
+        write_subtree(
+            game,
+            history,
+            max_board_state,
+            compression_level,
+            writer,
+            index,
+        )?;
+        game.restore_position(&position);
+        history.pop();
+    }
+
+    Ok(())
+}
+
+/// Saves the solution of a solved game into a standard writer.
+///
+/// Every node reachable from the root is saved, down to the street `max_board_state` (later
+/// streets are not saved). Chance nodes are expanded into every card that can be dealt, including
+/// isomorphic ones. The current node of `game` is moved back to the root.
+///
+/// # Arguments
+///
+/// - `game`: The solved game.
+/// - `memo`: A memo string to be saved with the solution.
+/// - `writer`: The writer to write the solution into.
+/// - `max_board_state`: The last street to save.
+/// - `compression_level`: The zstd compression level of the node blocks. If `None`, no compression
+///   is used. `Some(level)` can only be specified if the `zstd` feature is enabled.
+pub fn save_solution_into_std_write<W: Write>(
+    game: &mut PostFlopGame,
+    memo: &str,
+    writer: &mut W,
+    max_board_state: BoardState,
+    compression_level: Option<i32>,
+) -> Result<(), String> {
+    if !game.is_solved() {
+        return Err("Game is not solved".to_string());
+    }
+
+    #[cfg(not(feature = "zstd"))]
+    if compression_level.is_some() {
+        return Err("Compression is not supported".to_string());
+    }
+
+    let mut writer = CountingWriter {
+        writer,
+        position: 0,
+    };
+
+    // header
+    let mut header = Vec::new();
+    header.extend_from_slice(&(memo.len() as u32).to_le_bytes());
+    header.extend_from_slice(memo.as_bytes());
+    let card_config = game.card_config();
+    header.extend_from_slice(&card_config.flop);
+    header.push(card_config.turn);
+    header.push(card_config.river);
+    let tree_config = game.tree_config();
+    header.extend_from_slice(&tree_config.starting_pot.to_le_bytes());
+    header.extend_from_slice(&tree_config.effective_stack.to_le_bytes());
+    for player in 0..2 {
+        let hands = game.private_cards(player);
+        header.extend_from_slice(&(hands.len() as u32).to_le_bytes());
+        for &(card1, card2) in hands {
+            header.extend_from_slice(&[card1, card2]);
+        }
+    }
+
+    writer.write(&MAGIC.to_le_bytes())?;
+    writer.write(&[VERSION, compression_level.is_some() as u8])?;
+    writer.write(&(header.len() as u32).to_le_bytes())?;
+    writer.write(&header)?;
+
+    // node blocks
+    let mut index = Vec::new();
+    game.back_to_root();
+    let result = write_subtree(
+        game,
+        &mut Vec::new(),
+        max_board_state,
+        compression_level,
+        &mut writer,
+        &mut index,
+    );
+    game.back_to_root();
+    result?;
+
+    // index and histories
+    index.sort_unstable_by(|a, b| a.history.cmp(&b.history));
+    let index_offset = writer.position;
+    let mut history_offset = 0u64;
+    for entry in &index {
+        let mut buf = [0; INDEX_ENTRY_SIZE];
+        buf[0..8].copy_from_slice(&entry.offset.to_le_bytes());
+        buf[8..12].copy_from_slice(&entry.length.to_le_bytes());
+        buf[12..16].copy_from_slice(&entry.decoded_length.to_le_bytes());
+        buf[16..24].copy_from_slice(&history_offset.to_le_bytes());
+        buf[24..28].copy_from_slice(&(entry.history.len() as u32).to_le_bytes());
+        writer.write(&buf)?;
+        history_offset += entry.history.len() as u64;
+    }
+    for entry in &index {
+        writer.write(&entry.history)?;
+    }
+
+    // footer
+    writer.write(&index_offset.to_le_bytes())?;
+    writer.write(&(index.len() as u64).to_le_bytes())?;
+    writer.write(&MAGIC.to_le_bytes())?;
+    writer.write(&[0; 4])?;
+
+    writer
+        .writer
+        .flush()
+        .map_err(|e| format!("Failed to flush writer: {}", e))
+}
+
+/// Saves the solution of a solved game into a file.
+///
+/// See [`save_solution_into_std_write`] for the arguments. If the file already exists, it will be
+/// overwritten.
+pub fn save_solution_to_file<P: AsRef<Path>>(
+    game: &mut PostFlopGame,
+    memo: &str,
+    path: P,
+    max_board_state: BoardState,
+    compression_level: Option<i32>,
+) -> Result<(), String> {
+    let file = File::create(path).map_err(|e| format!("Failed to create file: {}", e))?;
+    let mut writer = BufWriter::new(file);
+    save_solution_into_std_write(game, memo, &mut writer, max_board_state, compression_level)
+}
+
+/// Little-endian reader over a byte slice.
+struct Cursor<'a> {
+    bytes: &'a [u8],
+}
+
+impl<'a> Cursor<'a> {
+    #[inline]
+    fn take(&mut self, len: usize) -> Result<&'a [u8], String> {
+        if self.bytes.len() < len {
+            return Err("Solution file is truncated".to_string());
+        }
+        let (head, tail) = self.bytes.split_at(len);
+        self.bytes = tail;
+        Ok(head)
+    }
+
+    #[inline]
+    fn u8(&mut self) -> Result<u8, String> {
+        Ok(self.take(1)?[0])
+    }
+
+    #[inline]
+    fn u16(&mut self) -> Result<u16, String> {
+        Ok(u16::from_le_bytes(self.take(2)?.try_into().unwrap()))
+    }
+
+    #[inline]
+    fn u32(&mut self) -> Result<u32, String> {
+        Ok(u32::from_le_bytes(self.take(4)?.try_into().unwrap()))
+    }
+
+    #[inline]
+    fn i32(&mut self) -> Result<i32, String> {
+        Ok(i32::from_le_bytes(self.take(4)?.try_into().unwrap()))
+    }
+
+    #[inline]
+    fn u64(&mut self) -> Result<u64, String> {
+        Ok(u64::from_le_bytes(self.take(8)?.try_into().unwrap()))
+    }
+
+    #[inline]
+    fn f32s(&mut self, len: usize) -> Result<Vec<f32>, String> {
+        Ok(self
+            .take(4 * len)?
+            .chunks_exact(4)
+            .map(|chunk| f32::from_le_bytes(chunk.try_into().unwrap()))
+            .collect())
+    }
+}
+
+/// A solution file opened for random access.
+///
+/// `data` is the content of the file, typically a memory-mapped file: opening the file only reads
+/// its header, and [`node`] decodes only the block of the requested node, found by a binary search
+/// of the index.
+///
+/// [`node`]: #method.node
+pub struct SolutionFile<B: AsRef<[u8]>> {
+    data: B,
+    compressed: bool,
+    memo: String,
+    flop: [Card; 3],
+    turn: Card,
+    river: Card,
+    starting_pot: i32,
+    effective_stack: i32,
+    private_cards: [Vec<(Card, Card)>; 2],
+    index_offset: usize,
+    num_nodes: usize,
+}
+
+impl<B: AsRef<[u8]>> SolutionFile<B> {
+    /// Opens the solution file whose content is `data`.
+    pub fn new(data: B) -> Result<Self, String> {
+        let bytes = data.as_ref();
+        let mut cursor = Cursor { bytes };
+
+        if cursor.u32()? != MAGIC {
+            return Err("Magic number is invalid".to_string());
+        }
+        if cursor.u8()? != VERSION {
+            return Err("Version number is invalid".to_string());
+        }
+        let compressed = match cursor.u8()? {
+            0 => false,
+            1 => true,
+            _ => return Err("Compression type is invalid".to_string()),
+        };
+
+        #[cfg(not(feature = "zstd"))]
+        if compressed {
+            return Err("Compression is not supported".to_string());
+        }
+
+        let header_len = cursor.u32()? as usize;
+        let mut header = Cursor {
+            bytes: cursor.take(header_len)?,
+        };
+        let memo_len = header.u32()? as usize;
+        let memo = String::from_utf8(header.take(memo_len)?.to_vec())
+            .map_err(|_| "Memo is not valid UTF-8".to_string())?;
+        let flop = header.take(3)?.try_into().unwrap();
+        let turn = header.u8()?;
+        let river = header.u8()?;
+        let starting_pot = header.i32()?;
+        let effective_stack = header.i32()?;
+        let mut private_cards = [Vec::new(), Vec::new()];
+        for hands in &mut private_cards {
+            let num_hands = header.u32()? as usize;
+            *hands = header
+                .take(2 * num_hands)?
+                .chunks_exact(2)
+                .map(|pair| (pair[0], pair[1]))
+                .collect();
+        }
+
+        if bytes.len() < FOOTER_SIZE {
+            return Err("Solution file is truncated".to_string());
+        }
+        let mut footer = Cursor {
+            bytes: &bytes[bytes.len() - FOOTER_SIZE..],
+        };
+        let index_offset = footer.u64()? as usize;
+        let num_nodes = footer.u64()? as usize;
+        if footer.u32()? != MAGIC {
+            return Err("Solution file is truncated".to_string());
+        }
+        if index_offset + num_nodes * INDEX_ENTRY_SIZE > bytes.len() - FOOTER_SIZE {
+            return Err("Index is invalid".to_string());
+        }
+
+        Ok(Self {
+            data,
+            compressed,
+            memo,
+            flop,
+            turn,
+            river,
+            starting_pot,
+            effective_stack,
+            private_cards,
+            index_offset,
+            num_nodes,
+        })
+    }
+
+    /// Returns the memo string.
+    #[inline]
+    pub fn memo(&self) -> &str {
+        &self.memo
+    }
+
+    /// Returns the flop and the turn and river cards of the root (`NOT_DEALT` if not dealt).
+    #[inline]
+    pub fn board(&self) -> ([Card; 3], Card, Card) {
+        (self.flop, self.turn, self.river)
+    }
+
+    /// Returns the starting pot and the effective stack.
+    #[inline]
+    pub fn stacks(&self) -> (i32, i32) {
+        (self.starting_pot, self.effective_stack)
+    }
+
+    /// Returns the private hands of the given player, in the order of the per-hand values.
+    #[inline]
+    pub fn private_cards(&self, player: usize) -> &[(Card, Card)] {
+        &self.private_cards[player]
+    }
+
+    /// Returns the number of saved nodes.
+    #[inline]
+    pub fn num_nodes(&self) -> usize {
+        self.num_nodes
+    }
+
+    /// Returns the index entry `i` as `(block offset, block length, decoded length, history)`.
+    #[inline]
+    fn entry(&self, i: usize) -> Result<(usize, usize, usize, &[u8]), String> {
+        let bytes = self.data.as_ref();
+        let start = self.index_offset + i * INDEX_ENTRY_SIZE;
+        let mut cursor = Cursor {
+            bytes: &bytes[start..start + INDEX_ENTRY_SIZE],
+        };
+        let offset = cursor.u64()? as usize;
+        let length = cursor.u32()? as usize;
+        let decoded_length = cursor.u32()? as usize;
+        let history_offset = cursor.u64()? as usize;
+        let history_len = cursor.u32()? as usize;
+
+        let histories = self.index_offset + self.num_nodes * INDEX_ENTRY_SIZE;
+        let history = bytes
+            .get(histories + history_offset..histories + history_offset + history_len)
+            .ok_or_else(|| "Index is invalid".to_string())?;
+        Ok((offset, length, decoded_length, history))
+    }
+
+    /// Returns the node reached by `history` (the arguments of [`PostFlopGame::play`] from the
+    /// root, with the actual cards at chance nodes), or `None` if the node was not saved.
+    pub fn node(&self, history: &[usize]) -> Result<Option<SolutionNode>, String> {
+        if history.iter().any(|&action| action > u8::MAX as usize) {
+            return Ok(None);
+        }
+        let key = history
+            .iter()
+            .map(|&action| action as u8)
+            .collect::<Vec<_>>();
+
+        // binary search of the index
+        let (mut lo, mut hi) = (0, self.num_nodes);
+        while lo < hi {
+            let mid = (lo + hi) / 2;
+            let (offset, length, decoded_length, entry_history) = self.entry(mid)?;
+            match entry_history.cmp(&key) {
+                Ordering::Less => lo = mid + 1,
+                Ordering::Greater => hi = mid,
+                Ordering::Equal => {
+                    let block = self
+                        .data
+                        .as_ref()
+                        .get(offset..offset + length)
+                        .ok_or_else(|| "Index is invalid".to_string())?;
+                    return self.decode_node(block, decoded_length).map(Some);
+                }
+            }
+        }
+
+        Ok(None)
+    }
+
+    fn decode_node(&self, block: &[u8], decoded_length: usize) -> Result<SolutionNode, String> {
+        #[cfg(feature = "zstd")]
+        let decompressed;
+        let block = if self.compressed {
+            #[cfg(feature = "zstd")]
+            {
+                decompressed = zstd::bulk::decompress(block, decoded_length)
+                    .map_err(|e| format!("Failed to decompress node: {}", e))?;
+                &decompressed[..]
+            }
+            #[cfg(not(feature = "zstd"))]
+            unreachable!()
+        } else {
+            block
+        };
+        if block.len() != decoded_length {
+            return Err("Node length is invalid".to_string());
+        }
+
+        let mut cursor = Cursor { bytes: block };
+        let node_type = match cursor.u8()? {
+            player @ (0 | 1) => SolutionNodeType::Player(player as usize),
+            2 => SolutionNodeType::Chance,
+            3 => SolutionNodeType::Terminal,
+            _ => return Err("Node type is invalid".to_string()),
+        };
+        let total_bet_amount = [cursor.i32()?, cursor.i32()?];
+        let possible_cards = cursor.u64()?;
+        let num_actions = cursor.u16()? as usize;
+        let actions = (0..num_actions)
+            .map(|_| {
+                let tag = cursor.u8()?;
+                decode_action(tag, cursor.i32()?)
+            })
+            .collect::<Result<Vec<_>, _>>()?;
+
+        let mut node = SolutionNode {
+            node_type,
+            total_bet_amount,
+            possible_cards,
+            actions,
+            normalized_weights: Default::default(),
+            equity: Default::default(),
+            expected_values: Default::default(),
+            strategy: Vec::new(),
+        };
+
+        if node_type != SolutionNodeType::Terminal {
+            for player in 0..2 {
+                let num_hands = self.private_cards[player].len();
+                node.normalized_weights[player] = cursor.f32s(num_hands)?;
+                node.equity[player] = cursor.f32s(num_hands)?;
+                node.expected_values[player] = cursor.f32s(num_hands)?;
+            }
+        }
+
+        if let SolutionNodeType::Player(player) = node_type {
+            let num_hands = self.private_cards[player].len();
+            node.strategy = cursor.f32s(num_actions * num_hands)?;
+        }
+
+        Ok(node)
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::range::*;
+    use crate::utility::*;
+
+    fn solved_game() -> PostFlopGame {
+        let card_config = CardConfig {
+            range: [
+                "AA,KK,QQ,AK".parse().unwrap(),
+                "JJ-99,QJs,T9s".parse().unwrap(),
+            ],
+            flop: flop_from_str("Td9d6h").unwrap(),
+            ..Default::default()
+        };
+
+        let tree_config = TreeConfig {
+            starting_pot: 60,
+            effective_stack: 970,
+            flop_bet_sizes: [("50%", "").try_into().unwrap(), Default::default()],
+            turn_bet_sizes: [("50%", "").try_into().unwrap(), Default::default()],
+            ..Default::default()
+        };
+
+        let action_tree = ActionTree::new(tree_config).unwrap();
+        let mut game = PostFlopGame::with_config(card_config, action_tree).unwrap();
+
+        game.allocate_memory(false);
+        finalize(&mut game);
+        game
+    }
+
+    /// Checks the saved node of `history` against the game.
+    fn check_node<B: AsRef<[u8]>>(
+        file: &SolutionFile<B>,
+        game: &mut PostFlopGame,
+        history: &[usize],
+    ) {
+        let node = file.node(history).unwrap().unwrap();
+        game.apply_history(history);
+        game.cache_normalized_weights();
+        assert_eq!(node.actions, game.available_actions());
+        assert_eq!(node.total_bet_amount, game.total_bet_amount());
+        assert_eq!(node.possible_cards, game.possible_cards());
+        for player in 0..2 {
+            assert_eq!(
+                node.normalized_weights[player],
+                game.normalized_weights(player)
+            );
+            assert_eq!(node.equity[player], game.equity(player));
+            assert_eq!(node.expected_values[player], game.expected_values(player));
+        }
+        match node.node_type {
+            SolutionNodeType::Player(player) => {
+                assert_eq!(player, game.current_player());
+                assert_eq!(node.strategy, game.strategy());
+            }
+            SolutionNodeType::Chance => assert!(game.is_chance_node()),
+            SolutionNodeType::Terminal => assert!(game.is_terminal_node()),
+        }
+    }
+
+    #[test]
+    fn save_and_read_solution() {
+        let mut game = solved_game();
+
+        let mut buf = Vec::new();
+        save_solution_into_std_write(&mut game, "memo", &mut buf, BoardState::Turn, None).unwrap();
+        let file = SolutionFile::new(buf).unwrap();
+
+        assert_eq!(file.memo(), "memo");
+        assert_eq!(file.stacks(), (60, 970));
+        assert_eq!(file.private_cards(0), game.private_cards(0));
+        assert_eq!(file.private_cards(1), game.private_cards(1));
+
+        // root, flop bet, turn deal (check-check), turn bet
+        let turn = card_from_str("2c").unwrap() as usize;
+        check_node(&file, &mut game, &[]);
+        check_node(&file, &mut game, &[1]);
+        check_node(&file, &mut game, &[0, 0]);
+        check_node(&file, &mut game, &[0, 0, turn]);
+        check_node(&file, &mut game, &[0, 0, turn, 1]);
+
+        // terminal node (fold)
+        let node = file.node(&[1, 0]).unwrap().unwrap();
+        assert_eq!(node.node_type, SolutionNodeType::Terminal);
+        assert!(node.equity[0].is_empty());
+
+        // the river is not saved
+        let river = card_from_str("3c").unwrap() as usize;
+        assert!(file.node(&[0, 0, turn, 0, 0]).unwrap().is_some());
+        assert!(file.node(&[0, 0, turn, 0, 0, river]).unwrap().is_none());
+        assert!(file.node(&[7]).unwrap().is_none());
+    }
+
+    #[test]
+    fn save_and_read_solution_river() {
+        let mut game = solved_game();
+
+        let mut buf = Vec::new();
+        save_solution_into_std_write(&mut game, "", &mut buf, BoardState::River, None).unwrap();
+        let file = SolutionFile::new(&buf[..]).unwrap();
+
+        let turn = card_from_str("2c").unwrap() as usize;
+        let river = card_from_str("3c").unwrap() as usize;
+        check_node(&file, &mut game, &[0, 0, turn, 0, 0, river]);
+        check_node(&file, &mut game, &[0, 0, turn, 1, 1, river]);
+
+        // a turn isomorphic to 2c, whose suit is swapped back after its subtree
+        let turn_iso = card_from_str("2s").unwrap() as usize;
+        check_node(&file, &mut game, &[0, 0, turn_iso, 1]);
+        check_node(&file, &mut game, &[0, 0, turn_iso, 1, 1, river]);
+        check_node(&file, &mut game, &[1, 1, turn, 0, 0]);
+
+        // every node of the tree is indexed once
+        let num_nodes = file.num_nodes();
+        let mut buf2 = Vec::new();
+        save_solution_into_std_write(&mut game, "", &mut buf2, BoardState::Turn, None).unwrap();
+        assert!(SolutionFile::new(&buf2[..]).unwrap().num_nodes() < num_nodes);
+    }
+
+    #[test]
+    fn read_invalid_solution() {
+        assert!(SolutionFile::new(&[][..]).is_err());
+        assert!(SolutionFile::new(&[0u8; 64][..]).is_err());
+
+        let mut game = solved_game();
+        let mut buf = Vec::new();
+        save_solution_into_std_write(&mut game, "", &mut buf, BoardState::Flop, None).unwrap();
+        buf.truncate(buf.len() - 1);
+        assert!(SolutionFile::new(&buf[..]).is_err());
+    }
+
+    #[test]
+    #[cfg(feature = "zstd")]
+    fn save_and_read_solution_compressed() {
+        let mut game = solved_game();
+
+        let mut raw = Vec::new();
+        save_solution_into_std_write(&mut game, "", &mut raw, BoardState::Turn, None).unwrap();
+        let mut buf = Vec::new();
+        save_solution_into_std_write(&mut game, "", &mut buf, BoardState::Turn, Some(3)).unwrap();
+        assert!(buf.len() < raw.len());
+
+        let file = SolutionFile::new(buf).unwrap();
+        let turn = card_from_str("Qs").unwrap() as usize;
+        check_node(&file, &mut game, &[]);
+        check_node(&file, &mut game, &[0, 0, turn, 1]);
+    }
+}
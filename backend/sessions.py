@@ -0,0 +1,88 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class Session:
+    def __init__(self, game_session, context):
+        self.id = uuid.uuid4().hex
+        self.game = game_session
+        self.context = context
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        # GameSession methods can't run concurrently on one object
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    """LRU store of solved-game sessions (`GameSession`), keyed by session id.
+
+    Holds at most `max_sessions` sessions and `max_bytes` of game memory; the least recently used
+    sessions are evicted beyond that. Sessions on the same spot share one game (same
+    `GameSession.key`), which is counted once. `context` keeps whatever the caller needs with the
+    session (e.g. hole cards and the suit mapping).
+    """
+
+    def __init__(self, max_sessions, max_bytes):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.sessions = OrderedDict()
+        self.games = {}  # game key -> [memory bytes, number of sessions]
+        self.bytes = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def add(self, game_session, **context):
+        session = Session(game_session, context)
+        with self.lock:
+            self.sessions[session.id] = session
+            game = self.games.setdefault(game_session.key, [game_session.memory_bytes, 0])
+            if game[1] == 0:
+                self.bytes += game[0]
+            game[1] += 1
+            self._evict(keep=session.id)
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                session.last_used = time.time()
+            return session
+
+    def remove(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return False
+            self._remove(session)
+            return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "games": len(self.games),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evicted": self.evicted,
+            }
+
+    def _evict(self, keep):
+        while len(self.sessions) > self.max_sessions or self.bytes > self.max_bytes:
+            session_id = next(iter(self.sessions))
+            if session_id == keep:
+                break  # a single game larger than the budget is still usable
+            self._remove(self.sessions[session_id])
+            self.evicted += 1
+
+    def _remove(self, session):
+        del self.sessions[session.id]
+        game = self.games[session.game.key]
+        game[1] -= 1
+        if game[1] == 0:
+            self.bytes -= game[0]
+            del self.games[session.game.key]
@@ -0,0 +1,469 @@
+"""Solver worker processes and the dispatcher that routes spots to them.
+
+A worker is a process with its own solver (caches, memory budget, range repository) serving
+solves over a local socket:
+
+    python solver_workers.py --listen 127.0.0.1:7101
+    python solver_workers.py --spawn 4 --port 7101    # 4 local workers on ports 7101-7104
+
+The backend talks to them through a `SolverPool` when SOLVER_WORKERS lists their addresses
+(`host:port` or Unix socket paths, comma-separated). Spots are routed by consistent hashing of
+their preflop line and flop, so that the solves sharing ranges, bunching tables, warm-start sources
+and subgame upstreams land on the worker that already has them hot; adding a worker only moves the
+spots of its share of the ring. A worker that is full spills the spot over to the next worker on
+the ring, and a pool without any free worker rejects it (backpressure). A worker that cannot be
+reached is skipped for `retry_seconds` and its spots fail over to the next worker on the ring.
+
+Messages are pickled dictionaries (`multiprocessing.connection`), authenticated with
+SOLVER_WORKER_AUTHKEY, which must be set on the workers and the backend: unpickling lets whoever
+holds the key run code on the other side. A request is `{"op": "solve" | "cancel" | "stats", ...}`
+and the reply has a `status`; a dispatcher waits at most `timeout_seconds` for a solve, then
+cancels it.
+"""
+
+import argparse
+import bisect
+import hashlib
+import importlib.util
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+
+log = logging.getLogger(__name__)
+
+
+class WorkerError(Exception):
+    """Raised when a worker failed to solve a spot."""
+
+
+class WorkerTimeout(WorkerError):
+    """Raised when a worker did not answer a solve in time."""
+
+
+def worker_authkey():
+    """The key of SOLVER_WORKER_AUTHKEY; there is no default, since the key guards pickles."""
+    key = os.getenv("SOLVER_WORKER_AUTHKEY")
+    if not key:
+        raise ValueError("SOLVER_WORKER_AUTHKEY must be set to use solver workers")
+    return key.encode()
+
+
+def parse_address(address):
+    """Converts `"host:port"` into a (host, port) tuple; other strings are Unix socket paths."""
+    host, _, port = address.strip().rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address.strip()
+
+
+def format_address(address):
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+
+
+def route_key(inputs):
+    """Part of the (canonical) solver inputs a spot is routed by: its preflop line and flop."""
+    return f"{inputs['preflop_action']}|{inputs['flop_cards']}"
+
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+
+def detach_result(res):
+    """Copies a `SpotResult` into picklable objects with the same attributes (numpy arrays for
+    the per-hand buffers)."""
+    def columns(player):
+        return SimpleNamespace(
+            hands=list(player.hands),
+            index=dict(player.index),
+            weights=np.array(player.weights),
+            equity=np.array(player.equity),
+            ev=np.array(player.ev),
+            eqr=np.array(player.eqr),
+            strategy=None if player.strategy is None else np.array(player.strategy),
+        )
+
+    return SimpleNamespace(
+        hero=columns(res.hero),
+        villain=columns(res.villain),
+        legal_actions=list(res.legal_actions),
+        hero_buckets=list(res.hero_buckets),
+        villain_buckets=list(res.villain_buckets),
+        cache=res.cache,
+        tier=res.tier,
+        exploitability=res.exploitability,
+        iterations=res.iterations,
+        estimated_iterations_saved=res.estimated_iterations_saved,
+        solve_seconds=res.solve_seconds,
+        stop_reason=res.stop_reason,
+        bunching=res.bunching,
+        starting_pot=res.starting_pot,
+        stage_seconds=dict(res.stage_seconds),
+    )
+
+
+class Worker:
+    """Solves the spots received on `address` with `solver` (the module of postflop-solver/main.py).
+
+    At most `max_solves` spots are solved at once and `max_queued` more wait for a slot; further
+    solve requests are answered with the "busy" status.
+    """
+
+    def __init__(self, solver, address, max_solves, max_queued, authkey):
+        self.solver = solver
+        self.address = address
+        self.authkey = authkey
+        self.max_solves = max_solves
+        self.max_queued = max_queued
+        self.slots = threading.BoundedSemaphore(max_solves)
+        self.lock = threading.Lock()
+        self.cancel_tokens = {}
+        self.in_flight = 0
+        self.counts = {"solved": 0, "failed": 0, "cancelled": 0, "rejected": 0, "invalid": 0, "busy": 0}
+
+    def serve_forever(self):
+        # every in-flight solve holds a connection, so the backlog must absorb bursts of requests
+        with Listener(self.address, backlog=128, authkey=self.authkey) as listener:
+            log.info("Solver worker listening on %s", format_address(self.address))
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    log.warning("Rejected connection: %s", e)
+                    continue  # failed handshake
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "pid": os.getpid(),
+                "in_flight": self.in_flight,
+                "max_solves": self.max_solves,
+                "max_queued": self.max_queued,
+                **self.counts,
+            }
+        return {**stats, "cache": self.solver.cache_stats(), "memory": self.solver.memory_status()}
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                request = conn.recv()
+            except (OSError, EOFError):
+                return  # the dispatcher went away
+            try:
+                reply = self._reply(request)
+            except BaseException as e:  # a solver panic is a BaseException; answer it all the same
+                log.exception("Request failed")
+                reply = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+            try:
+                conn.send(reply)
+            except (OSError, EOFError):
+                pass  # the dispatcher went away
+
+    def _reply(self, request):
+        op = request.get("op") if isinstance(request, dict) else None
+        if op == "solve":
+            return self._solve(request)
+        if op == "cancel":
+            return self._cancel(request["id"])
+        if op == "stats":
+            return {"status": "ok", "stats": self.stats()}
+        return {"status": "invalid", "error": f"Unknown op: {op}"}
+
+    def _solve(self, request):
+        with self.lock:
+            if self.in_flight >= self.max_solves + self.max_queued:
+                self.counts["busy"] += 1
+                return {"status": "busy"}
+            self.in_flight += 1
+            cancel = self.solver.CancelToken()
+            self.cancel_tokens[request["id"]] = cancel
+
+        try:
+            with self.slots:
+                if cancel.is_cancelled():
+                    raise self.solver.SolveCancelled("Solve was cancelled")
+                res = self.solver.process_columnar(request["inputs"], cancel)
+            reply = {"status": "ok", "result": detach_result(res)}
+        except self.solver.SolveCancelled as e:
+            reply = {"status": "cancelled", "error": str(e)}
+        except self.solver.SolveRejected as e:
+            reply = {"status": "rejected", "error": str(e)}
+        except ValueError as e:
+            reply = {"status": "invalid", "error": str(e)}
+        except BaseException as e:  # including the PanicException of a solver panic
+            log.exception("Solve failed")
+            reply = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                del self.cancel_tokens[request["id"]]
+
+        with self.lock:
+            self.counts["solved" if reply["status"] == "ok" else reply["status"]] += 1
+        return reply
+
+    def _cancel(self, request_id):
+        with self.lock:
+            cancel = self.cancel_tokens.get(request_id)
+        if cancel is not None:
+            cancel.cancel()
+        return {"status": "ok", "found": cancel is not None}
+
+
+class WorkerState:
+    """What the dispatcher knows about one worker."""
+
+    def __init__(self, address):
+        self.address = address
+        self.name = format_address(address)
+        self.down_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.spilled = 0
+        self.busy = 0
+        self.failures = 0
+        self.last_error = None
+
+    def is_up(self, now):
+        return now >= self.down_until
+
+    def to_dict(self, now):
+        return {
+            "address": self.name,
+            "up": self.is_up(now),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "spilled_in": self.spilled,
+            "busy": self.busy,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class SolverPool:
+    """Dispatches solves to worker processes (see the module docstring).
+
+    `solve(inputs, cancel)` returns the same attributes as `solver.process_columnar`. A spot that
+    no worker can take raises `rejected`, a cancelled one `cancelled`, and invalid inputs
+    `ValueError`; a solve not answered within `timeout_seconds` raises `WorkerTimeout` and other
+    failures on the worker raise `WorkerError`.
+    """
+
+    def __init__(self, addresses, rejected, cancelled, authkey, replicas=64, retry_seconds=5.0,
+                 poll_seconds=0.25, timeout_seconds=300.0):
+        self.workers = [WorkerState(parse_address(address)) for address in addresses]
+        if not self.workers:
+            raise ValueError("No solver worker addresses")
+        self.rejected = rejected
+        self.cancelled = cancelled
+        self.authkey = authkey
+        self.retry_seconds = retry_seconds
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        # `replicas` points per worker on the hash ring even out the share of each worker
+        self.ring = sorted(
+            (ring_hash(f"{worker.name}#{i}"), index)
+            for index, worker in enumerate(self.workers)
+            for i in range(replicas)
+        )
+        self.ring_hashes = [point for point, _ in self.ring]
+
+    def __len__(self):
+        return len(self.workers)
+
+    def candidates(self, inputs):
+        """Workers in the order a spot tries them: its owner on the ring, then the next ones."""
+        start = bisect.bisect(self.ring_hashes, ring_hash(route_key(inputs)))
+        order = []
+        for i in range(len(self.ring)):
+            worker = self.workers[self.ring[(start + i) % len(self.ring)][1]]
+            if worker not in order:
+                order.append(worker)
+        return order
+
+    def solve(self, inputs, cancel=None):
+        request = {"op": "solve", "id": uuid.uuid4().hex, "inputs": inputs}
+        busy = down = 0
+        for rank, worker in enumerate(self.candidates(inputs)):
+            if not worker.is_up(time.time()):
+                down += 1
+                continue
+            try:
+                reply = self._call(worker, request, cancel)
+            except (OSError, EOFError, AuthenticationError) as e:
+                self._mark_down(worker, e)
+                down += 1
+                continue  # fail over to the next worker on the ring
+            if reply["status"] == "busy":
+                with self.lock:
+                    worker.busy += 1
+                busy += 1
+                continue
+            if rank > 0:
+                with self.lock:
+                    worker.spilled += 1
+            return self._result(reply)
+        raise self.rejected(f"No solver worker can take the spot ({busy} busy, {down} down)")
+
+    def stats(self, timeout=1.0):
+        """Dispatcher counters of every worker, with the worker's own stats if it answers."""
+        now = time.time()
+        with self.lock:
+            workers = [worker.to_dict(now) for worker in self.workers]
+        for worker, state in zip(self.workers, workers):
+            if not state["up"]:
+                continue
+            try:
+                with self._connect(worker) as conn:
+                    conn.send({"op": "stats"})
+                    if conn.poll(timeout):
+                        state["worker"] = conn.recv()["stats"]
+            except (OSError, EOFError, AuthenticationError) as e:
+                self._mark_down(worker, e)
+                state["up"] = False
+        return {"workers": workers}
+
+    def _connect(self, worker):
+        return Client(worker.address, authkey=self.authkey)
+
+    def _call(self, worker, request, cancel):
+        deadline = time.monotonic() + self.timeout_seconds
+        with self._connect(worker) as conn:
+            with self.lock:
+                worker.in_flight += 1
+                worker.requests += 1
+            try:
+                conn.send(request)
+                cancel_sent = False
+                while not conn.poll(self.poll_seconds):
+                    timed_out = time.monotonic() >= deadline
+                    if not cancel_sent and (timed_out or (cancel is not None and cancel.is_cancelled())):
+                        self._send_cancel(worker, request["id"])
+                        cancel_sent = True
+                    if timed_out:
+                        raise WorkerTimeout(
+                            f"Solver worker {worker.name} did not answer within {self.timeout_seconds:g} s"
+                        )
+                return conn.recv()
+            finally:
+                with self.lock:
+                    worker.in_flight -= 1
+
+    def _send_cancel(self, worker, request_id):
+        """Asks the worker to cancel a solve; the solve's own connection reports the outcome."""
+        try:
+            with self._connect(worker) as conn:
+                conn.send({"op": "cancel", "id": request_id})
+                if conn.poll(self.poll_seconds):
+                    conn.recv()
+        except (OSError, EOFError, AuthenticationError) as e:
+            log.warning("Could not cancel solve %s on %s: %s", request_id, worker.name, e)
+
+    def _mark_down(self, worker, error):
+        with self.lock:
+            worker.down_until = time.time() + self.retry_seconds
+            worker.failures += 1
+            worker.last_error = f"{type(error).__name__}: {error}"
+
+    def _result(self, reply):
+        status = reply["status"]
+        if status == "ok":
+            return reply["result"]
+        if status == "cancelled":
+            raise self.cancelled(reply["error"])
+        if status == "rejected":
+            raise self.rejected(reply["error"])
+        if status == "invalid":
+            raise ValueError(reply["error"])
+        raise WorkerError(reply["error"])
+
+
+def load_solver():
+    """Imports postflop-solver/main.py and configures it from the same variables as app.py."""
+    spec = importlib.util.spec_from_file_location("solver", HERE / "postflop-solver" / "main.py")
+    solver = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(solver)
+
+    solver.configure_cache(
+        os.getenv("SOLVE_CACHE_DIR", str(HERE / "solve_cache")),
+        int(os.getenv("SOLVE_CACHE_DISK_BYTES", 4 * 1024 ** 3)),
+        int(os.getenv("SOLVE_CACHE_MEMORY_BYTES", 1024 ** 3)),
+        os.getenv("SOLVE_LIBRARY_DIR"),
+    )
+    if os.getenv("SOLVE_MEMORY_BUDGET_BYTES"):
+        solver.configure_memory_budget(
+            int(os.getenv("SOLVE_MEMORY_BUDGET_BYTES")),
+            float(os.getenv("SOLVE_MEMORY_WAIT_SECONDS", 30.0)),
+        )
+    solver.configure_bunching(
+        os.getenv("BUNCHING_CACHE_DIR", str(HERE / "bunching_cache")),
+        int(os.getenv("BUNCHING_WORKERS", 1)),
+        int(os.getenv("BUNCHING_MEMORY_ENTRIES", 2)),
+    )
+    log.info("Range repository loaded: %s", solver.load_range_repository(
+        os.getenv("GTO_RANGES_DIR", str(HERE / "postflop-solver" / "GTOWizard_Scraped_Ranges" / "Cash6m50z100bbGeneral")),
+        os.getenv("GTO_RANGES_INDEX", str(HERE / "postflop-solver" / "ranges.idx")),
+    ))
+    return solver
+
+
+def spawn_local_workers(count, port, solves, queued, host="127.0.0.1"):
+    """Starts `count` workers on consecutive ports, each with its own solve cache directory."""
+    processes = []
+    cache_dir = Path(os.getenv("SOLVE_CACHE_DIR", str(HERE / "solve_cache")))
+    for i in range(count):
+        env = {**os.environ, "SOLVE_CACHE_DIR": str(cache_dir / f"worker-{i}")}
+        processes.append(subprocess.Popen(
+            [sys.executable, __file__, "--listen", f"{host}:{port + i}", "--solves", str(solves), "--queued", str(queued)],
+            env=env,
+        ))
+    log.info("SOLVER_WORKERS=%s", ",".join(f"{host}:{port + i}" for i in range(count)))
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listen", help="address to serve on (host:port or Unix socket path)")
+    parser.add_argument("--spawn", type=int, help="start this many local workers instead")
+    parser.add_argument("--port", type=int, default=7101, help="first port of the --spawn workers")
+    parser.add_argument("--solves", type=int, default=int(os.getenv("SOLVE_WORKERS", 2)), help="concurrent solves per worker")
+    parser.add_argument("--queued", type=int, default=int(os.getenv("SOLVE_QUEUE_DEPTH", 16)), help="solves waiting per worker before it reports busy")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        authkey = worker_authkey()
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.spawn:
+        processes = spawn_local_workers(args.spawn, args.port, args.solves, args.queued)
+        try:
+            for process in processes:
+                process.wait()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+        return
+
+    if not args.listen:
+        parser.error("--listen or --spawn is required")
+    os.chdir(HERE)
+    Worker(load_solver(), parse_address(args.listen), args.solves, args.queued, authkey).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from canonical import canonicalize_board
+
+# solver inputs that determine a solve; the others (hole cards, snapshot interval, ...) don't
+SPOT_FIELDS = (
+    "effective_stack", "pot_before_flop", "preflop_action", "flop_cards", "flop_bet",
+    "turn_card", "turn_bet", "river_card", "river_bet", "tier", "bunching", "subgame",
+)
+DEFAULT_TIER = "standard"  # same as the solver's
+
+
+def spot_key(inputs):
+    """Key of the solve of `inputs` (canonical solver inputs, see `canonicalize_spot`)."""
+    values = {field: inputs.get(field) for field in SPOT_FIELDS}
+    values = {field: None if value == "" else value for field, value in values.items()}
+    values["tier"] = values["tier"] or DEFAULT_TIER
+    values["bunching"] = bool(values["bunching"])
+    values["subgame"] = bool(values["subgame"])
+    return tuple(values.items())
+
+
+def check_spot(inputs):
+    """Raises `ValueError` unless `inputs` has a valid board, a positive stack and pot and
+    non-negative bets, so that a speculative solve never hands the solver a spot it cannot build."""
+    canonicalize_board(inputs["flop_cards"], inputs.get("turn_card"), inputs.get("river_card"))
+    for field in ("effective_stack", "pot_before_flop", "flop_bet", "turn_bet", "river_bet"):
+        value = inputs.get(field)
+        if value is None and field.endswith("_bet"):
+            continue
+        if not isinstance(value, int) or isinstance(value, bool) or value < (0 if field.endswith("_bet") else 1):
+            raise ValueError(f"Invalid {field}: {value!r}")
+
+
+class Speculation:
+    def __init__(self, key, inputs, cancel_token, ttl):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.inputs = inputs
+        self.cancel_token = cancel_token
+        self.state = "queued"
+        self.claimed = False
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
+        # written by the speculation thread between steps
+        self.progress = None
+        self.result = None
+        self.snapshot = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, cancel=None, timeout=120.0):
+        """Waits for the solve; returns the `SpotResult`, or None if it failed, was cancelled or
+        did not finish within `timeout` seconds (then it is cancelled, and the caller solves the
+        spot itself).
+
+        `cancel` is the token of the request that claimed the speculation, which cancels the
+        speculative solve too.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.done.wait(0.1):
+            if cancel is not None and cancel.is_cancelled():
+                self.cancel_token.cancel()
+            if time.monotonic() >= deadline:
+                self.cancel_token.cancel()
+                return None
+        return self.result
+
+
+class SpeculativeSolves:
+    """Solves started in the background before the user submits the spot (e.g. after /fill).
+
+    `start(inputs)` queues a solve of `inputs` with `start_solve(inputs, cancel_token)` (a
+    `SolveTask`), run by a single thread one step at a time; inputs that fail `check_spot` raise
+    `ValueError`. The solve has low priority: while a foreground solve runs (see `foreground`), it
+    pauses between steps, unless a request has already claimed it. `claim(inputs)` hands over the
+    speculation on the same spot, running or finished, so that the request can wait for it instead
+    of solving again; claimed speculations run before unclaimed ones, including one that is paused.
+
+    A speculation that is not claimed within `ttl` seconds is cancelled (or its result dropped),
+    and so is the speculation of a `speculation_id` whose spot differs from the claimed one (the
+    user edited the fields). At most `max_entries` speculations are kept; starting another one
+    cancels the oldest.
+    """
+
+    def __init__(self, start_solve, token_factory, ttl=300.0, max_entries=8, pause=0.05):
+        self.start_solve = start_solve
+        self.token_factory = token_factory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pause = pause
+        self.entries = {}  # key -> Speculation
+        self.by_id = {}
+        self.counts = {"started": 0, "claimed": 0, "cancelled": 0, "expired": 0, "failed": 0}
+        self.foreground_solves = 0
+        self.lock = threading.Lock()
+        self.queued = threading.Condition(self.lock)
+        self.pending = deque()
+        self.worker = threading.Thread(target=self._work, name="speculative-solve", daemon=True)
+        self.worker.start()
+
+    def start(self, inputs):
+        """Queues a speculative solve of `inputs`; returns the existing speculation on the same spot
+        if there is one."""
+        check_spot(inputs)
+        key = spot_key(inputs)
+        with self.lock:
+            self._purge()
+            existing = self.entries.get(key)
+            if existing is not None:
+                return existing
+            speculation = Speculation(key, inputs, self.token_factory(), self.ttl)
+            self.entries[key] = speculation
+            self.by_id[speculation.id] = speculation
+            self.counts["started"] += 1
+            while len(self.entries) > self.max_entries:
+                oldest = min(self.entries.values(), key=lambda s: s.created_at)
+                self._cancel(oldest, "cancelled")
+            self.pending.append(speculation)
+            self.queued.notify()
+        return speculation
+
+    def claim(self, inputs, speculation_id=None):
+        """Returns the speculation on the spot of `inputs` (now owned by the caller), or None.
+
+        If the speculation of `speculation_id` is on another spot, it is cancelled.
+        """
+        key = spot_key(inputs)
+        with self.lock:
+            self._purge()
+            edited = self.by_id.get(speculation_id)
+            if edited is not None and edited.key != key:
+                self._cancel(edited, "cancelled")
+            speculation = self.entries.get(key)
+            if speculation is None or speculation.state in ("failed", "cancelled"):
+                return None
+            speculation.claimed = True
+            self._remove(speculation)
+            self.counts["claimed"] += 1
+            return speculation
+
+    def cancel(self, speculation_id):
+        """Cancels a speculation. Returns False if it is unknown or was claimed."""
+        with self.lock:
+            speculation = self.by_id.get(speculation_id)
+            if speculation is None:
+                return False
+            self._cancel(speculation, "cancelled")
+            return True
+
+    @contextmanager
+    def foreground(self):
+        """Marks a foreground solve, during which unclaimed speculative solves pause."""
+        with self.lock:
+            self.foreground_solves += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.foreground_solves -= 1
+
+    def stats(self):
+        with self.lock:
+            self._purge()
+            states = [speculation.state for speculation in self.entries.values()]
+            return {
+                **self.counts,
+                "entries": len(self.entries),
+                **{state: states.count(state) for state in ("queued", "running", "done")},
+            }
+
+    def _work(self):
+        while True:
+            with self.queued:
+                while not self.pending:
+                    self.queued.wait()
+                speculation = self._next_pending()
+            self._run(speculation)
+
+    def _next_pending(self, claimed_only=False):
+        """Takes the next queued speculation, claimed ones first (with the lock held)."""
+        speculation = next((s for s in self.pending if s.claimed), None)
+        if speculation is None and not claimed_only and self.pending:
+            speculation = self.pending[0]
+        if speculation is not None:
+            self.pending.remove(speculation)
+        return speculation
+
+    def _run(self, speculation):
+        if speculation.done.is_set():
+            return
+        speculation.state = "running"
+        state, error = "failed", None
+        try:
+            task = self.start_solve(speculation.inputs, speculation.cancel_token)
+            started = time.monotonic()
+            while True:
+                if not speculation.claimed:
+                    with self.lock:
+                        if time.time() >= speculation.expires_at:
+                            self._cancel(speculation, "expired")
+                        paused = self.foreground_solves > 0 and not speculation.cancel_token.is_cancelled()
+                        claimed = self._next_pending(claimed_only=True) if paused else None
+                    if paused:
+                        # a request waits for the claimed one, not for this one
+                        if claimed is not None:
+                            self._run(claimed)
+                        else:
+                            time.sleep(self.pause)
+                        continue
+                if task.step():
+                    break
+                speculation.progress = {
+                    "iteration": task.iteration,
+                    "exploitability": task.exploitability,
+                    "starting_pot": task.starting_pot,
+                    "elapsed": time.monotonic() - started,
+                }
+            speculation.snapshot = task.snapshot()
+            speculation.result = task.result()
+            state = "done"
+        except BaseException as e:  # including the PanicException of a solver panic
+            if speculation.cancel_token.is_cancelled():
+                state = "cancelled"
+            else:
+                error = str(e) or type(e).__name__
+        finally:
+            # the speculation always ends, so that its waiters never hang
+            if state != "done":
+                with self.lock:
+                    self._remove(speculation)
+                    if state == "failed":
+                        self.counts["failed"] += 1
+                speculation.error = error
+            self._finish(speculation, state)
+
+    def _finish(self, speculation, state):
+        speculation.state = state
+        speculation.done.set()
+
+    def _cancel(self, speculation, reason):
+        if speculation.cancel_token.is_cancelled():
+            return
+        speculation.cancel_token.cancel()
+        self.counts[reason] += 1
+        self._remove(speculation)
+        if speculation.state == "queued":
+            self._finish(speculation, "cancelled")
+
+    def _remove(self, speculation):
+        if self.entries.get(speculation.key) is speculation:
+            del self.entries[speculation.key]
+        self.by_id.pop(speculation.id, None)
+
+    def _purge(self):
+        now = time.time()
+        for speculation in [s for s in self.entries.values() if s.expires_at <= now]:
+            self._cancel(speculation, "expired")
@@ -0,0 +1,82 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# the backend modules are imported as top-level modules, as app.py does
+sys.path.insert(0, str(BACKEND))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py on top of `fake_python_lib`, with the stub LLM backend and no solver workers."""
+    from tests import fake_python_lib
+
+    sys.modules["python_lib"] = fake_python_lib
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "SOLVE_CACHE_DIR": str(tmp_path_factory.mktemp("solve_cache")),
+        "BUNCHING_CACHE_DIR": str(tmp_path_factory.mktemp("bunching_cache")),
+    })
+    os.environ.pop("SOLVER_WORKERS", None)
+    cwd = os.getcwd()
+    os.chdir(BACKEND)  # app.py loads the solver and the prompts by relative paths
+    try:
+        return importlib.import_module("app")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def spot():
+    """A complete /submit form."""
+    return {
+        "effective_stack": "900", "hole_cards": "As,Ks", "pot_before_flop": "200",
+        "preflop_action": "BTN,BB", "flop_cards": "Td,9d,6h", "flop_bet": "120",
+        "turn_card": "Qc", "turn_bet": "200", "river_card": "7s", "river_bet": "300",
+    }
+
+
+@pytest.fixture(scope="session")
+def binding(tmp_path_factory):
+    """The compiled `python_lib` binding, on a two-range preflop tree (the "BTN,BB" line) and with
+    its own solve cache. Tests using it are skipped where the binding isn't built."""
+    # `fake_python_lib` may already stand in for it
+    fake = sys.modules.pop("python_lib", None)
+    try:
+        lib = importlib.import_module("python_lib")
+    except ModuleNotFoundError:
+        lib = None
+    finally:
+        if fake is not None:
+            sys.modules["python_lib"] = fake
+    # the crate's source directory imports as an empty namespace package
+    if not hasattr(lib, "solve_poker_spot_columnar"):
+        pytest.skip("python_lib is not built")
+
+    ranges = tmp_path_factory.mktemp("ranges")
+    line = ranges / "BTN" / "2.5bb" / "BB" / "call"
+    line.mkdir(parents=True)
+    (line / "BTN.txt").write_text("AA,KK,QQ,AKs")
+    (line / "BB.txt").write_text("JJ,TT,99,AQs")
+    lib.load_range_repository(str(ranges))
+    lib.configure_cache(str(tmp_path_factory.mktemp("binding_cache")), 1 << 30, 1 << 30)
+    return lib
+
+
+def binding_spot(flop="Td9d6h", **fields):
+    """Inputs of a flop spot of the "BTN,BB" line of the `binding` range tree."""
+    return {
+        "effective_stack": 900, "pot_before_flop": 200, "preflop_action": "BTN,BB", "flop_cards": flop,
+        "flop_bet": None, "turn_card": None, "turn_bet": None, "river_card": None, "river_bet": None,
+        "tier": "fast", **fields,
+    }
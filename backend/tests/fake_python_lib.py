@@ -0,0 +1,181 @@
+"""Stand-in for the compiled `python_lib` binding, installed by conftest.py.
+
+It answers every spot instantly with the same small result. The preflop action selects failures:
+"invalid" raises ValueError like a spot the solver rejects, "panic" raises `PanicException`
+(a `BaseException`, as PyO3 raises for a Rust panic), "slow" takes `SLOW_SECONDS` and honours the
+cancel token. Other actions must be sequences of 6-max positions and the tier one of `TIERS`,
+otherwise ValueError is raised as by the binding. `calls` records the inputs of every solve.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+SLOW_SECONDS = 1.0
+calls = []
+lock = threading.Lock()
+
+
+class PanicException(BaseException):
+    pass
+
+
+class SolveCancelled(Exception):
+    pass
+
+
+class SolveRejected(Exception):
+    pass
+
+
+class CancelToken:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+
+HANDS = ["AsKs", "QhQd", "Tc9c"]
+POSITIONS = ("UTG", "HJ", "CO", "BTN", "SB", "BB")
+TIERS = ("fast", "standard", "precise")
+
+
+def check(inputs, cancel=None):
+    with lock:
+        calls.append(dict(inputs))
+    tier = inputs.get("tier")
+    if tier is not None and tier not in TIERS:
+        raise ValueError(f"Unknown tier: {tier} (expected one of {', '.join(TIERS)})")
+    action = inputs["preflop_action"]
+    if action == "invalid":
+        raise ValueError("Invalid preflop action")
+    if action == "panic":
+        raise PanicException("called `Option::unwrap()` on a `None` value")
+    if action == "slow":
+        deadline = time.monotonic() + SLOW_SECONDS
+        while time.monotonic() < deadline:
+            if cancel is not None and cancel.is_cancelled():
+                raise SolveCancelled("Solve was cancelled")
+            time.sleep(0.01)
+        return
+    for position in action.split(","):
+        if position not in POSITIONS:
+            raise ValueError(f"Unknown position: {position}")
+
+
+def columns():
+    return SimpleNamespace(
+        hands=list(HANDS),
+        index={hand: i for i, hand in enumerate(HANDS)},
+        # the weights make the range strategy differ from the unweighted mean of the hands
+        weights=np.array([1.0, 1.0, 2.0], dtype=np.float32),
+        equity=np.array([0.6, 0.7, 0.4], dtype=np.float32),
+        ev=np.array([10.0, 12.0, 3.0], dtype=np.float32),
+        eqr=np.array([1.0, 1.1, 0.8], dtype=np.float32),
+        strategy=np.array([[0.2, 0.4, 0.9], [0.8, 0.6, 0.1]], dtype=np.float32),
+    )
+
+
+def spot_result(inputs):
+    return SimpleNamespace(
+        hero=columns(), villain=columns(), legal_actions=["Check", "Bet(100)"],
+        hero_buckets=[0] * 7, villain_buckets=[0] * 7, cache="miss", tier=inputs.get("tier") or "standard",
+        exploitability=0.1, iterations=100, estimated_iterations_saved=0, solve_seconds=0.01, stop_reason="target",
+        bunching="off", starting_pot=inputs["pot_before_flop"], stage_seconds={"solve": 0.01},
+    )
+
+
+def solve_poker_spot_columnar(inputs, cancel=None):
+    check(inputs, cancel)
+    return spot_result(inputs)
+
+
+class SolveTask:
+    def __init__(self, inputs, cancel=None):
+        self.inputs = inputs
+        self.cancel = cancel
+        self.iteration = 0
+        self.exploitability = 100.0
+        self.elapsed_seconds = 0.0
+        self.starting_pot = inputs["pot_before_flop"]
+        self.tier = inputs.get("tier") or "standard"
+
+    def step(self):
+        if self.iteration == 0:
+            check(self.inputs, self.cancel)
+        if self.cancel is not None and self.cancel.is_cancelled():
+            raise SolveCancelled("Solve was cancelled")
+        self.iteration += 10
+        self.exploitability /= 4
+        self.elapsed_seconds += 0.01
+        return self.iteration >= 30
+
+    def snapshot(self):
+        res = columns()
+        return {
+            "legal_actions": ["Check", "Bet(100)"],
+            "range_strategy": ((res.strategy * res.weights).sum(axis=1) / res.weights.sum()).tolist(),
+            "strategy": res.strategy,
+            "index": res.index,
+        }
+
+    def result(self):
+        return spot_result(self.inputs)
+
+
+def solve_poker_spots(inputs_list, max_parallel=None, memory_budget=None, cancel=None):
+    for i, inputs in enumerate(inputs_list):
+        try:
+            yield i, solve_poker_spot_columnar(inputs, cancel)
+        except Exception as e:
+            yield i, e
+
+
+def range_equity(inputs):
+    check(inputs)
+    hands = {hand: {"Equity": 0.5} for hand in HANDS}
+    return {
+        "Hero": hands, "Villain": hands, "Hero Equity Buckets": [0] * 7, "Villain Equity Buckets": [0] * 7,
+        "Hero Range Equity": 0.5, "Villain Range Equity": 0.5, "Stage Seconds": {"equity": 0.001},
+    }
+
+
+def configure_cache(*args):
+    pass
+
+
+def cache_stats():
+    return {"memory_hits": 0, "disk_hits": 0, "library_hits": 0, "misses": 0, "memory_entries": 0,
+            "memory_bytes": 0, "disk_entries": 0, "disk_bytes": 0, "directory": None, "library": None}
+
+
+def configure_memory_budget(budget_bytes, max_wait_seconds=30.0):
+    pass
+
+
+def memory_status():
+    return {"budget_bytes": 1 << 30, "reserved_bytes": 0, "available_bytes": 1 << 30, "active_solves": 0,
+            "waiting_solves": 0, "admitted": 0, "compressed": 0, "queued": 0, "rejected": 0}
+
+
+def configure_bunching(directory=None, workers=1, memory_entries=2):
+    pass
+
+
+def bunching_status():
+    return {"directory": None, "workers": 1, "memory_entries": 0, "pending": 0, "memory_hits": 0,
+            "disk_hits": 0, "computed": 0, "failed": 0, "last_error": None}
+
+
+def load_range_repository(root, index_path=None, rebuild=False):
+    return {"root": root, "nodes": 0, "ranges": 0}
+
+
+def solver_metrics():
+    return {"stage_seconds": {}, "solves": {}}
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize("field, value", [
+    ("flop_cards", "Kd,2c"),
+    ("flop_cards", "Ah,Ah,Kd"),
+    ("flop_cards", ""),
+    ("turn_card", "Q"),
+    ("hole_cards", "Td,2c"),
+])
+@pytest.mark.parametrize("route", ["/submit", "/jobs", "/equity", "/stream", "/sessions"])
+def test_invalid_spots_are_rejected_before_the_solver(client, spot, route, field, value):
+    from tests import fake_python_lib
+
+    calls = len(fake_python_lib.calls)
+    response = client.post(route, data={**spot, field: value})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    assert len(fake_python_lib.calls) == calls
+
+
+def test_missing_field_is_a_bad_request(client, spot):
+    del spot["hole_cards"]
+    response = client.post("/submit", data=spot)
+    assert response.status_code == 400
+    assert "hole_cards" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("action", ["XX,BB", "BTN,XX", "BTN,SB,XX"])
+def test_unknown_position_is_a_bad_request(client, spot, action):
+    response = client.post("/submit", data={**spot, "preflop_action": action})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Unknown position: XX"
+
+
+def test_submit(client, spot):
+    response = client.post("/submit", data=spot)
+    assert response.status_code == 200
+    assert json.loads(response.data)["Solver"]["Tier"] == "standard"
+
+
+def sse_events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_summary_and_snapshots_agree_on_the_range_strategy(app_module, client, spot):
+    from tests import fake_python_lib
+
+    res = fake_python_lib.spot_result({"pot_before_flop": 200})
+    summary = app_module.solution_summary(res, "AsKs")["Hero overall range action probabilities"]
+    # weights [1, 1, 2]: (0.2 + 0.4 + 2 * 0.9) / 4, not the unweighted mean 0.5
+    assert summary == pytest.approx([0.6, 0.4])
+
+    events = sse_events(client.post("/stream", data=spot))
+    snapshots = [data for event, data in events if event == "snapshot"]
+    assert snapshots
+    assert snapshots[-1]["range_strategy"] == pytest.approx(summary)
+    assert events[-1][0] == "explanation"
+
+
+@pytest.mark.parametrize("interval, expected", [
+    # a snapshot only at the end
+    ("60", ["progress", "progress", "snapshot", "solved", "explanation"]),
+    # a snapshot after every step
+    ("0", ["progress", "snapshot", "progress", "snapshot", "snapshot", "solved", "explanation"]),
+])
+def test_stream_event_sequence(client, spot, interval, expected):
+    events = sse_events(client.post("/stream", data={**spot, "snapshot_interval": interval}))
+    assert [event for event, _ in events] == expected
+
+    progress = [data for event, data in events if event == "progress"]
+    assert [data["iteration"] for data in progress] == [10, 20]
+    assert progress[0]["exploitability_pct"] > progress[1]["exploitability_pct"]
+    snapshot = [data for event, data in events if event == "snapshot"][-1]
+    assert snapshot["iteration"] == 30
+    assert snapshot["actions"] == ["Check", "Bet(100)"]
+    solved = dict(events)["solved"]
+    assert (solved["tier"], solved["stop_reason"], solved["cache"]) == ("standard", "target", "miss")
+    assert dict(events)["explanation"]["Solver"]["Tier"] == "standard"
+
+
+@pytest.mark.parametrize("action", ["invalid", "panic"])
+def test_stream_failure_ends_with_an_error_event(client, spot, action):
+    events = sse_events(client.post("/stream", data={**spot, "preflop_action": action}))
+    assert events[-1][0] == "error"
+    assert events[-1][1]["error"]
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+
+def post_batch(client, spots, **body):
+    response = client.post("/batch", json={"spots": spots, **body})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(line["index"] for line in lines) == list(range(len(spots)))
+    return {line["index"]: line for line in lines}
+
+
+def test_every_spot_gets_a_result(client, spot):
+    lines = post_batch(client, [spot, {**spot, "flop_bet": "60"}, spot])
+    for line in lines.values():
+        assert line["result"]["Hero overall range action probabilities"] == pytest.approx([0.6, 0.4])
+
+
+def test_a_failed_spot_does_not_stop_the_others(client, spot):
+    lines = post_batch(client, [spot, {**spot, "preflop_action": "invalid"}, spot])
+    assert lines[1]["error"] == "Invalid preflop action"
+    assert "result" in lines[0] and "result" in lines[2]
+
+
+def test_an_unknown_position_fails_only_its_spot(client, spot):
+    lines = post_batch(client, [spot, {**spot, "preflop_action": "BTN,XX"}, spot])
+    assert lines[1]["error"] == "Unknown position: XX"
+    assert "result" in lines[0] and "result" in lines[2]
+
+
+def test_spots_left_by_a_failed_batch_get_an_error(client, spot):
+    lines = post_batch(client, [spot, {**spot, "preflop_action": "panic"}, spot])
+    assert "result" in lines[0]
+    for index in (1, 2):
+        assert lines[index]["error"].startswith("Spot was not solved")
+
+
+def test_hole_cards_outside_the_range(client, spot):
+    lines = post_batch(client, [{**spot, "hole_cards": "2c,3h"}])
+    assert lines[0]["error"] == "Hole cards are not in the hero's range"
+
+
+def test_explained_spots(client, spot):
+    lines = post_batch(client, [spot], explain=True)
+    assert lines[0]["result"]["Solver"]["Tier"] == "standard"
+
+
+@pytest.mark.parametrize("body", [{}, {"spots": []}, {"spots": "x"}, {"spots": [{"flop_cards": "Td,9d"}]}])
+def test_invalid_batches_are_bad_requests(client, body):
+    response = client.post("/batch", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
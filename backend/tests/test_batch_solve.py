@@ -0,0 +1,41 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+from tests import fake_python_lib
+
+SOLVER_DIR = Path(__file__).resolve().parent.parent / "postflop-solver"
+
+
+@pytest.fixture(scope="module")
+def batch_solve(app_module):
+    # batch_solve.py imports the solver as `main`, from its own directory
+    sys.path.insert(0, str(SOLVER_DIR))
+    try:
+        return importlib.import_module("batch_solve")
+    finally:
+        sys.path.remove(str(SOLVER_DIR))
+
+
+def failing_solve(error):
+    def solve_and_save(*args):
+        raise error
+    return solve_and_save
+
+
+@pytest.mark.parametrize("error, message", [
+    (ValueError("Invalid preflop action"), "Invalid preflop action"),
+    (fake_python_lib.PanicException("boom"), "PanicException: boom"),
+])
+def test_a_failed_spot_is_recorded_as_an_error(batch_solve, monkeypatch, error, message):
+    monkeypatch.setattr(batch_solve.solver, "solve_and_save", failing_solve(error))
+    entry = batch_solve.solve_one("BTN,BB|Td9d6h", {}, "out", None, None)
+    assert entry == {"spot": "BTN,BB|Td9d6h", "error": message}
+
+
+def test_an_interrupt_stops_the_build(batch_solve, monkeypatch):
+    monkeypatch.setattr(batch_solve.solver, "solve_and_save", failing_solve(KeyboardInterrupt()))
+    with pytest.raises(KeyboardInterrupt):
+        batch_solve.solve_one("BTN,BB|Td9d6h", {}, "out", None, None)
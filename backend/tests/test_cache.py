@@ -0,0 +1,46 @@
+from tests.conftest import binding_spot
+
+
+def test_a_solved_spot_is_served_from_memory(binding):
+    first = binding.solve_poker_spot_columnar(binding_spot("Ts9s5h"))
+    assert (first.cache, first.stop_reason) == ("miss", "target")
+    hits = binding.cache_stats()["memory_hits"]
+
+    again = binding.solve_poker_spot_columnar(binding_spot("Ts9s5h"))
+    assert again.cache == "memory"
+    assert again.iterations == first.iterations
+    assert list(again.hero.hands) == list(first.hero.hands)
+    assert binding.cache_stats()["memory_hits"] == hits + 1
+
+
+def test_a_suit_isomorphic_spot_is_a_hit(binding):
+    assert binding.solve_poker_spot_columnar(binding_spot("8c7c2d")).cache == "miss"
+    assert binding.solve_poker_spot_columnar(binding_spot("8h7h2s")).cache == "memory"
+
+
+def test_other_inputs_are_other_spots(binding):
+    assert binding.solve_poker_spot_columnar(binding_spot("Kd4c3h")).cache == "miss"
+    assert binding.solve_poker_spot_columnar(binding_spot("Kd4c3h", effective_stack=800)).cache == "miss"
+    assert binding.solve_poker_spot_columnar(binding_spot("Kd4c3h", tier="standard")).cache == "miss"
+
+
+def test_solved_spots_persist_on_disk(binding, tmp_path):
+    binding.configure_cache(str(tmp_path), 1 << 30, 1 << 30)
+    assert binding.solve_poker_spot_columnar(binding_spot("Jc8d4s")).cache == "miss"
+    assert binding.cache_stats()["disk_entries"] == 1
+    assert list(tmp_path.glob("*.bin"))
+
+    # a restarted backend: the memory tier is empty, the directory is the same
+    binding.configure_cache(str(tmp_path), 1 << 30, 1 << 30)
+    assert binding.cache_stats()["disk_entries"] == 1
+    res = binding.solve_poker_spot_columnar(binding_spot("Jc8d4s"))
+    assert res.cache == "disk"
+    assert binding.solve_poker_spot_columnar(binding_spot("Jc8d4s")).cache == "memory"
+
+
+def test_a_full_disk_budget_evicts_the_least_recently_used_spot(binding, tmp_path):
+    binding.configure_cache(str(tmp_path), 1, 1 << 30)
+    binding.solve_poker_spot_columnar(binding_spot("Qh6c2d"))
+    binding.solve_poker_spot_columnar(binding_spot("9h5c3d"))
+    assert binding.cache_stats()["disk_entries"] == 1
+    assert len(list(tmp_path.glob("*.bin"))) == 1
@@ -0,0 +1,62 @@
+import pytest
+
+from canonical import canonical_flops, canonicalize_board, canonicalize_spot, card_from_str, cards_from_str
+
+
+def test_card_from_str():
+    assert card_from_str("2c") == 0
+    assert card_from_str("As") == 51
+    assert card_from_str("td") == card_from_str("Td")
+
+
+@pytest.mark.parametrize("card", ["", "A", "Asx", "1c", "Ax", 5, None])
+def test_card_from_str_rejects_invalid_cards(card):
+    with pytest.raises(ValueError):
+        card_from_str(card)
+
+
+def test_cards_from_str_accepts_separators():
+    assert cards_from_str("Td,9d, 6h") == cards_from_str("Td9d6h")
+
+
+def test_suit_isomorphic_boards_share_a_canonical_form():
+    (flop1, _, _), _ = canonicalize_board("Td9d6h")
+    (flop2, _, _), _ = canonicalize_board("Th9h6s")
+    assert flop1 == flop2
+
+
+def test_canonicalize_spot_maps_hands_back():
+    data, hc, suit_map = canonicalize_spot({"flop_cards": "Td9d6h", "turn_card": "Qc"}, "AsKd")
+    assert sorted(cards_from_str(data["flop_cards"])) == sorted(cards_from_str(suit_map.to_canonical("Td9d6h")))
+    assert suit_map.hand_to_user(hc) == "AsKd"
+    assert suit_map.to_user(data["turn_card"]) == "Qc"
+
+
+@pytest.mark.parametrize("board", [
+    {"flop_cards": ""},
+    {"flop_cards": "Kd2c"},
+    {"flop_cards": "AhAhKd"},
+    {"flop_cards": "Kd2c7h8s"},
+    {"flop_cards": "Kd2cXx"},
+    {"flop_cards": "Kd2c7h", "turn_card": "Kd"},
+    {"flop_cards": "Kd2c7h", "turn_card": "9"},
+    {"flop_cards": "Kd2c7h", "river_card": "9s"},
+])
+def test_canonicalize_spot_rejects_invalid_boards(board):
+    with pytest.raises(ValueError):
+        canonicalize_spot(board, "AsKs")
+
+
+@pytest.mark.parametrize("hole_cards", ["As", "AsAs", "AsKsQs", "Kd2s"])
+def test_canonicalize_spot_rejects_invalid_hole_cards(hole_cards):
+    with pytest.raises(ValueError):
+        canonicalize_spot({"flop_cards": "Kd2c7h"}, hole_cards)
+
+
+def test_canonicalize_spot_allows_unknown_hole_cards():
+    _, hc, _ = canonicalize_spot({"flop_cards": "Kd2c7h"}, "")
+    assert hc == ""
+
+
+def test_canonical_flops():
+    assert len(canonical_flops()) == 1755
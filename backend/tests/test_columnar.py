@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from tests.conftest import binding_spot
+
+
+@pytest.fixture(scope="module")
+def res(binding):
+    return binding.solve_poker_spot_columnar(binding_spot("Kh9c4d"))
+
+
+@pytest.mark.parametrize("player", ["hero", "villain"])
+@pytest.mark.parametrize("column", ["weights", "equity", "ev", "eqr"])
+def test_columns_are_read_only_f32_buffers(res, player, column):
+    columns = getattr(res, player)
+    array = getattr(columns, column)
+    view = memoryview(array)
+    assert (view.format, view.itemsize, view.readonly) == ("f", 4, True)
+    assert view.shape == (len(columns.hands),) == tuple(array.shape)
+    assert len(array) == len(columns.hands)
+    with pytest.raises(TypeError):
+        view[0] = 1.0
+
+
+def test_the_strategy_is_an_action_by_hand_matrix(res):
+    view = memoryview(res.hero.strategy)
+    num_actions, num_hands = len(res.legal_actions), len(res.hero.hands)
+    assert view.shape == (num_actions, num_hands)
+    assert view.strides == (4 * num_hands, 4)
+    assert view.c_contiguous
+
+    strategy = np.asarray(res.hero.strategy)
+    weights = np.asarray(res.hero.weights)
+    np.testing.assert_allclose(strategy.sum(axis=0)[weights > 0], 1.0, rtol=1e-4)
+    # only the player to act has one
+    assert res.villain.strategy is None
+
+
+def test_numpy_reads_the_buffers_without_copying(res):
+    first, second = np.asarray(res.hero.equity), np.asarray(res.hero.equity)
+    assert first.dtype == np.float32
+    assert np.shares_memory(first, second)
+    assert not first.flags.writeable
+
+
+def test_the_index_maps_hands_to_their_position(res):
+    for columns in (res.hero, res.villain):
+        assert {hand: i for i, hand in enumerate(columns.hands)} == dict(columns.index)
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from images import ExtractionCache, InvalidImage, prepare_image
+
+
+def screenshot(pot="120", image_format="PNG", **params):
+    image = Image.new("RGB", (800, 500), (20, 90, 40))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 100, 700, 400), fill=(30, 120, 60))
+    draw.text((380, 240), f"Pot: {pot}", fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **params)
+    buffer.seek(0)
+    return buffer
+
+
+def test_same_pixels_share_a_digest():
+    first = prepare_image(screenshot())
+    again = prepare_image(screenshot(compress_level=1))
+    assert first.digest == again.digest
+
+
+def test_a_changed_number_changes_the_digest():
+    assert prepare_image(screenshot("120")).digest != prepare_image(screenshot("128")).digest
+
+
+def test_extraction_cache_matches_exact_screenshots_only():
+    cache = ExtractionCache(max_entries=2)
+    pot_120 = prepare_image(screenshot("120"))
+    pot_128 = prepare_image(screenshot("128"))
+    cache.put("fill", pot_120, "pot 120")
+    assert cache.get("fill", prepare_image(screenshot("120"))) == "pot 120"
+    assert cache.get("fill", pot_128) is None
+    assert cache.get("upload", pot_120) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_extraction_cache_is_bounded():
+    cache = ExtractionCache(max_entries=2)
+    images = [prepare_image(screenshot(str(pot))) for pot in (1, 2, 3)]
+    for image in images:
+        cache.put("fill", image, image.digest)
+    assert cache.get("fill", images[0]) is None
+    assert cache.get("fill", images[2]) == images[2].digest
+
+
+def test_unreadable_uploads_are_invalid():
+    with pytest.raises(InvalidImage):
+        prepare_image(io.BytesIO(b"not an image"))
+    with pytest.raises(InvalidImage, match="not allowed"):
+        prepare_image(screenshot(image_format="GIF"))
+
+
+def test_decompression_bombs_are_invalid(monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(InvalidImage, match="too many pixels"):
+        prepare_image(screenshot())
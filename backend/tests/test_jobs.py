@@ -0,0 +1,179 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobQueue, QueueFull
+from tests.conftest import binding_spot
+from tests.fake_python_lib import CancelToken, PanicException
+
+
+class Rejected(Exception):
+    pass
+
+
+def make_queue(handler, max_workers=1, max_queued=4):
+    return JobQueue(handler, max_workers=max_workers, max_queued=max_queued, token_factory=CancelToken,
+                    rejected=(Rejected,))
+
+
+def wait(job):
+    assert job.done.wait(5)
+    return job
+
+
+def test_job_result():
+    jobs = make_queue(lambda payload, cancel: payload * 2)
+    job = wait(jobs.submit(21))
+    assert (job.state, job.result, job.error) == ("done", 42, None)
+    assert job.started_at is not None and job.finished_at >= job.started_at
+    assert jobs.get(job.id) is job
+
+
+@pytest.mark.parametrize("error, state", [
+    (ValueError("bad spot"), "failed"),
+    (Rejected("no memory"), "rejected"),
+    (PanicException("panicked"), "failed"),
+])
+def test_failing_jobs_dont_stop_the_worker(error, state):
+    def handler(payload, cancel):
+        if payload == "fail":
+            raise error
+        return payload
+
+    jobs = make_queue(handler)
+    failed = wait(jobs.submit("fail"))
+    assert failed.state == state and failed.error == str(error)
+    # the only worker is still running
+    assert wait(jobs.submit("next")).result == "next"
+
+
+def test_queue_full():
+    started, release = threading.Event(), threading.Event()
+
+    def handler(payload, cancel):
+        started.set()
+        release.wait(5)
+
+    jobs = make_queue(handler, max_queued=1)
+    jobs.submit(1)
+    assert started.wait(5)
+    jobs.submit(2)
+    with pytest.raises(QueueFull):
+        jobs.submit(3)
+    release.set()
+
+
+def test_cancel_queued_and_running_jobs():
+    started = threading.Event()
+
+    def handler(payload, cancel):
+        started.set()
+        while not cancel.is_cancelled():
+            cancel.event.wait(0.01)
+        raise RuntimeError("cancelled")
+
+    jobs = make_queue(handler)
+    running = jobs.submit(1)
+    queued = jobs.submit(2)
+    assert started.wait(5)
+    assert jobs.cancel(queued.id)
+    assert queued.state == "cancelled" and queued.done.is_set()
+    assert jobs.cancel(running.id)
+    assert wait(running).state == "cancelled"
+    assert not jobs.cancel(running.id)
+    assert not jobs.cancel("unknown")
+    assert jobs.stats()["cancelled"] == 2
+
+
+def test_cancelled_queued_job_never_runs():
+    release = threading.Event()
+    ran = []
+
+    def handler(payload, cancel):
+        ran.append(payload)
+        release.wait(5)
+
+    jobs = make_queue(handler)
+    jobs.submit("first")
+    queued = jobs.submit("second")
+    jobs.cancel(queued.id)
+    release.set()
+    last = wait(jobs.submit("third"))
+    assert last.state == "done"
+    assert ran == ["first", "third"]
+
+
+def job_result(client, job_id):
+    """Polls /jobs/<id>/result until the job has finished."""
+    for _ in range(500):
+        response = client.get(f"/jobs/{job_id}/result")
+        if response.status_code != 202:
+            return response
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_routes(client, spot):
+    response = client.post("/jobs", data=spot)
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    response = job_result(client, job_id)
+    assert response.status_code == 200
+    assert "Solver" in response.get_json(force=True)
+    assert client.get(f"/jobs/{job_id}").get_json()["state"] == "done"
+    assert client.delete(f"/jobs/{job_id}").status_code == 404
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+def test_job_route_survives_a_solver_panic(client, spot):
+    job_id = client.post("/jobs", data={**spot, "preflop_action": "panic"}).get_json()["job_id"]
+    response = job_result(client, job_id)
+    assert response.status_code == 500
+    # the workers still run jobs
+    job_id = client.post("/jobs", data=spot).get_json()["job_id"]
+    response = job_result(client, job_id)
+    assert response.status_code == 200
+
+
+def test_job_states(client, spot):
+    job_id = client.post("/jobs", data={**spot, "preflop_action": "slow"}).get_json()["job_id"]
+    states = []
+    for _ in range(500):
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if not states or states[-1] != job["state"]:
+            states.append(job["state"])
+        if job["state"] not in ("queued", "running"):
+            break
+        time.sleep(0.01)
+    assert states[-2:] == ["running", "done"]
+    assert set(states) <= {"queued", "running", "done"}
+    assert job["submitted_at"] <= job["started_at"] <= job["finished_at"]
+
+
+def test_a_solve_releases_the_gil(binding):
+    cancel = binding.CancelToken()
+    outcome = []
+
+    def solve():
+        try:
+            binding.solve_poker_spot_columnar(binding_spot("Ac8d3h", tier="precise"), cancel)
+        except binding.SolveCancelled as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=solve)
+    thread.start()
+
+    # this thread keeps running while the solve does
+    ticks = []
+    deadline = time.monotonic() + 0.5
+    while time.monotonic() < deadline:
+        ticks.append(time.monotonic())
+        time.sleep(0.001)
+    solving = thread.is_alive()
+    cancel.cancel()
+    thread.join(10)
+
+    assert solving
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+    assert len(outcome) == 1
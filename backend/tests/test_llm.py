@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from llm import LLMError, LLMGateway, LLMTimeout, StubBackend, text_message
+
+
+def messages(text="hi"):
+    return [text_message(text)]
+
+
+@pytest.fixture
+def gateway_factory():
+    gateways = []
+
+    def make(backend, **kwargs):
+        gateway = LLMGateway(backend, **kwargs)
+        gateways.append(gateway)
+        return gateway
+
+    yield make
+    for gateway in gateways:
+        gateway.close()
+
+
+def test_responses_are_cached(gateway_factory):
+    backend = StubBackend(lambda model, messages: messages[0]["content"].upper())
+    gateway = gateway_factory(backend)
+    assert gateway.complete("m", messages("a")) == "A"
+    assert gateway.complete("m", messages("a")) == "A"
+    assert gateway.complete("m", messages("b")) == "B"
+    assert backend.calls == 2
+    assert gateway.stats()["cache_hits"] == 1
+
+
+def test_calls_are_queued_up_to_the_concurrency_limit(gateway_factory):
+    backend = StubBackend(delay=0.1)
+    gateway = gateway_factory(backend, max_concurrency=2)
+    peak = 0
+    stop = threading.Event()
+
+    def watch():
+        nonlocal peak
+        while not stop.is_set():
+            peak = max(peak, gateway.in_flight)
+            time.sleep(0.005)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    start = time.monotonic()
+    futures = [gateway.submit("m", messages(str(i))) for i in range(6)]
+    assert all(future.result(5) for future in futures)
+    elapsed = time.monotonic() - start
+    stop.set()
+    watcher.join()
+
+    assert backend.calls == 6
+    assert peak == 2
+    # three rounds of two calls
+    assert elapsed >= 0.25
+
+
+def test_failures_are_not_cached_so_the_next_call_retries(gateway_factory):
+    attempts = []
+
+    def respond(model, messages):
+        attempts.append(model)
+        if len(attempts) == 1:
+            raise ConnectionError("connection reset")
+        return "ok"
+
+    gateway = gateway_factory(StubBackend(respond))
+    with pytest.raises(LLMError, match="connection reset"):
+        gateway.complete("m", messages())
+    assert gateway.complete("m", messages()) == "ok"
+    assert len(attempts) == 2
+    assert gateway.stats()["failures"] == 1
+
+
+def test_empty_responses_are_errors(gateway_factory):
+    gateway = gateway_factory(StubBackend(lambda model, messages: ""))
+    with pytest.raises(LLMError, match="empty"):
+        gateway.complete("m", messages())
+
+
+def test_slow_calls_time_out(gateway_factory):
+    gateway = gateway_factory(StubBackend(delay=5.0))
+    start = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        gateway.complete("m", messages(), timeout=0.1)
+    assert time.monotonic() - start < 1.0
+
+
+def test_a_timed_out_call_is_cancelled(gateway_factory):
+    gateway = gateway_factory(StubBackend(delay=5.0))
+    with pytest.raises(LLMTimeout):
+        gateway.submit("m", messages(), timeout=0.1).result(5)
+    # the backend call was cancelled with the timeout, not left running on the loop
+    assert gateway.in_flight == 0
+
+
+def test_close_cancels_the_calls_in_progress(gateway_factory):
+    gateway = gateway_factory(StubBackend(delay=5.0))
+    future = gateway.submit("m", messages())
+    time.sleep(0.05)
+    gateway.close()
+    assert future.cancelled()
+    assert not gateway.thread.is_alive()
+    gateway.close()  # again, e.g. from the fixture
+
+
+def test_the_timeout_includes_the_wait_for_a_free_slot(gateway_factory):
+    gateway = gateway_factory(StubBackend(delay=0.5), max_concurrency=1)
+    busy = gateway.submit("m", messages("first"))
+    time.sleep(0.05)
+    start = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        gateway.complete("m", messages("second"), timeout=0.1)
+    assert time.monotonic() - start < 0.4
+    assert busy.result(5)
+
+
+def test_complete_returns_even_if_the_loop_is_stuck(gateway_factory):
+    class BlockingBackend:
+        async def complete(self, model, messages, timeout, **params):
+            time.sleep(0.5)  # blocks the gateway loop, so its own timeout can't fire
+            return "late"
+
+    gateway = gateway_factory(BlockingBackend())
+    start = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        gateway.complete("m", messages(), timeout=0.1)
+    assert time.monotonic() - start < 0.4
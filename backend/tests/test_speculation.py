@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from speculation import SpeculativeSolves, check_spot
+from tests import fake_python_lib
+
+
+def inputs(action="BTN,BB", flop="Td9d6h", **fields):
+    return {
+        "effective_stack": 900, "pot_before_flop": 200, "preflop_action": action, "flop_cards": flop,
+        "flop_bet": None, "turn_card": None, "turn_bet": None, "river_card": None, "river_bet": None,
+        "tier": None, "bunching": False, "subgame": False, **fields,
+    }
+
+
+@pytest.fixture
+def speculations():
+    return SpeculativeSolves(fake_python_lib.SolveTask, fake_python_lib.CancelToken, pause=0.01)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_claimed_speculation_returns_the_result(speculations):
+    speculation = speculations.start(inputs())
+    assert speculations.start(inputs()) is speculation
+    assert speculations.claim(inputs()) is speculation
+    assert speculation.wait(timeout=5).hero.hands == fake_python_lib.HANDS
+    assert speculation.state == "done"
+
+
+def test_a_solver_panic_fails_the_speculation_and_the_thread_goes_on(speculations):
+    panic = speculations.start(inputs("panic"))
+    assert panic.wait(timeout=5) is None
+    assert panic.state == "failed"
+    assert "unwrap" in panic.error
+    assert speculations.stats()["failed"] == 1
+
+    speculation = speculations.start(inputs())
+    assert speculation.wait(timeout=5) is not None
+
+
+def test_claimed_speculations_run_before_paused_ones(speculations):
+    with speculations.foreground():
+        paused = speculations.start(inputs(flop="Td9d6h"))
+        wait_until(lambda: paused.state == "running")
+        claimed = speculations.start(inputs(flop="AsKd2c"))
+        assert speculations.claim(inputs(flop="AsKd2c")) is claimed
+        assert claimed.wait(timeout=5) is not None
+        assert not paused.done.is_set()
+    assert paused.wait(timeout=5) is not None
+
+
+def test_wait_gives_up_after_the_timeout_and_cancels_the_solve(speculations):
+    speculation = speculations.start(inputs("slow"))
+    assert speculations.claim(inputs("slow")) is speculation
+    assert speculation.wait(timeout=0.1) is None
+    assert speculation.cancel_token.is_cancelled()
+    wait_until(speculation.done.is_set)
+    assert speculation.state == "cancelled"
+
+
+def test_claim_cancels_the_speculation_of_an_edited_spot(speculations):
+    with speculations.foreground():
+        edited = speculations.start(inputs())
+        assert speculations.claim(inputs(flop_bet=120), edited.id) is None
+    wait_until(edited.done.is_set)
+    assert edited.state == "cancelled"
+
+
+@pytest.mark.parametrize("fields", [
+    {"flop_cards": "Td9d"},
+    {"flop_cards": "TdTd6h"},
+    {"river_card": "7s"},
+    {"turn_card": "Td"},
+    {"effective_stack": "900.5"},
+    {"pot_before_flop": 0},
+    {"flop_bet": -10},
+])
+def test_invalid_spots_are_not_speculated(speculations, fields):
+    with pytest.raises(ValueError):
+        check_spot(inputs(**fields))
+    with pytest.raises(ValueError):
+        speculations.start(inputs(**fields))
+    assert speculations.stats()["started"] == 0
+
+
+def test_fill_fields_start_a_speculation_claimed_by_submit(app_module, client, spot):
+    fields = {**spot, "flop_cards": "Ah,Kd,2c"}
+    speculation = app_module.start_speculation(fields, {})
+    assert speculation is not None
+    claimed = app_module.speculations.stats()["claimed"]
+
+    response = client.post("/submit", data={**fields, "speculation_id": speculation.id})
+    assert response.status_code == 200
+    assert app_module.speculations.stats()["claimed"] == claimed + 1
+
+
+@pytest.mark.parametrize("fields", [
+    {"effective_stack": "900.5"},
+    {"flop_cards": "Kd,2c"},
+    {"preflop_action": None},
+])
+def test_incomplete_or_invalid_fill_fields_are_not_speculated(app_module, spot, fields):
+    assert app_module.start_speculation({**spot, **fields}, {}) is None
+
+
+def test_worker_solves_have_the_task_interface(app_module, monkeypatch):
+    class Pool:
+        def solve(self, inputs, cancel=None):
+            return fake_python_lib.spot_result(inputs)
+
+    monkeypatch.setattr(app_module, "workers", Pool())
+    task = app_module.WorkerSolve(inputs())
+    assert task.step()
+    assert task.result().hero.hands == fake_python_lib.HANDS
+    assert task.snapshot()["range_strategy"] == pytest.approx([0.6, 0.4])
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from tests.conftest import binding_spot
+
+DEADLINES = {"fast": 3, "standard": 15}
+
+
+@pytest.mark.parametrize("tier", ["fast", "standard"])
+def test_a_tier_stops_at_its_target_or_its_deadline(binding, tier):
+    res = binding.solve_poker_spot_columnar(binding_spot("Qs8h3c", tier=tier))
+    assert res.tier == tier
+    assert res.stop_reason in ("target", "deadline")
+    assert res.solve_seconds <= DEADLINES[tier] + 1.0
+
+
+def test_the_default_tier_is_standard(binding):
+    assert binding.solve_poker_spot_columnar(binding_spot("Qs8h3c", tier=None)).tier == "standard"
+
+
+def test_an_unknown_tier_is_a_value_error(binding):
+    with pytest.raises(ValueError, match="Unknown tier: instant"):
+        binding.solve_poker_spot_columnar(binding_spot(tier="instant"))
+
+
+def test_a_solve_stopped_by_its_deadline_is_not_saved(binding, tmp_path):
+    with pytest.raises(RuntimeError, match="stopped by deadline"):
+        binding.solve_and_save(binding_spot("7d6d2c", tier="precise"), str(tmp_path), None, 0.01)
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("tier", ["fast", "precise"])
+def test_submit_reports_the_tier(client, spot, tier):
+    response = client.post("/submit", data={**spot, "tier": tier})
+    assert response.status_code == 200
+    solver = json.loads(response.data)["Solver"]
+    assert solver["Tier"] == tier
+    assert solver["Stopped by"] == "target"
+
+
+def test_submit_rejects_an_unknown_tier(client, spot):
+    response = client.post("/submit", data={**spot, "tier": "instant"})
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Unknown tier: instant")
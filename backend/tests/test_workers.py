@@ -0,0 +1,141 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from solver_workers import SolverPool, Worker, WorkerError, WorkerTimeout, route_key
+from tests import fake_python_lib
+
+AUTHKEY = b"test-key"
+
+
+def start_worker(solver, max_solves=1, max_queued=0):
+    address = str(Path(tempfile.mkdtemp()) / "worker.sock")
+    worker = Worker(solver, address, max_solves, max_queued, AUTHKEY)
+    threading.Thread(target=worker.serve_forever, daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not Path(address).exists():
+        assert time.monotonic() < deadline, "worker did not start"
+        time.sleep(0.01)
+    return worker
+
+
+@pytest.fixture
+def solver(app_module):
+    return app_module.solver
+
+
+@pytest.fixture
+def worker(solver):
+    return start_worker(solver)
+
+
+def new_pool(solver, addresses, **kwargs):
+    return SolverPool(
+        addresses, rejected=solver.SolveRejected, cancelled=solver.SolveCancelled,
+        authkey=kwargs.pop("authkey", AUTHKEY), poll_seconds=0.02, **kwargs,
+    )
+
+
+def inputs(action="BTN,BB", flop="Td9d6h"):
+    return {
+        "effective_stack": 900, "pot_before_flop": 200, "preflop_action": action, "flop_cards": flop,
+        "flop_bet": None, "turn_card": None, "turn_bet": None, "river_card": None, "river_bet": None,
+    }
+
+
+def test_spots_of_a_line_and_flop_have_the_same_owner(solver):
+    pool = new_pool(solver, ["a:1", "b:2", "c:3"])
+    order = pool.candidates(inputs())
+    assert sorted(worker.name for worker in order) == ["a:1", "b:2", "c:3"]
+    assert pool.candidates({**inputs(), "flop_bet": 120, "tier": "fast"}) == order
+    owners = {pool.candidates(inputs(flop=flop))[0].name for flop in ["Td9d6h", "AsKd2c", "7h7c3s", "QdJs5h"]}
+    assert len(owners) > 1
+    assert route_key(inputs()) == "BTN,BB|Td9d6h"
+
+
+def test_solve_on_a_worker(solver, worker):
+    res = new_pool(solver, [worker.address]).solve(inputs())
+    assert res.hero.hands == fake_python_lib.HANDS
+    assert res.hero.strategy.shape == (2, 3)
+    assert worker.stats()["solved"] == 1
+
+
+def test_invalid_inputs_raise_value_error(solver, worker):
+    with pytest.raises(ValueError, match="Invalid preflop action"):
+        new_pool(solver, [worker.address]).solve(inputs("invalid"))
+
+
+def test_a_solver_panic_is_answered_and_the_worker_keeps_serving(solver, worker):
+    pool = new_pool(solver, [worker.address])
+    with pytest.raises(WorkerError, match="PanicException"):
+        pool.solve(inputs("panic"))
+    assert pool.solve(inputs()).cache == "miss"
+    assert worker.stats()["failed"] == 1
+
+
+def test_unreachable_workers_fail_over_to_the_next_on_the_ring(solver, worker):
+    missing = str(Path(tempfile.mkdtemp()) / "missing.sock")
+    pool = new_pool(solver, [missing, worker.address])
+    for flop in ["Td9d6h", "AsKd2c", "7h7c3s", "QdJs5h"]:
+        assert pool.solve(inputs(flop=flop)).cache == "miss"
+    state = {w.name: w for w in pool.workers}[missing]
+    assert state.failures == 1
+    assert not state.is_up(time.time())
+
+
+def test_a_wrong_key_marks_the_worker_down(solver, worker):
+    pool = new_pool(solver, [worker.address], authkey=b"wrong")
+    with pytest.raises(solver.SolveRejected, match="1 down"):
+        pool.solve(inputs())
+    assert "AuthenticationError" in pool.workers[0].last_error
+
+
+def test_a_full_worker_rejects_the_spot(solver, worker):
+    pool = new_pool(solver, [worker.address])
+    slow = threading.Thread(target=pool.solve, args=(inputs("slow"),))
+    slow.start()
+    while worker.stats()["in_flight"] == 0:
+        time.sleep(0.01)
+    with pytest.raises(solver.SolveRejected, match="1 busy"):
+        pool.solve(inputs())
+    slow.join()
+
+
+def test_a_solve_that_outlives_the_timeout_is_cancelled(solver, worker):
+    pool = new_pool(solver, [worker.address], timeout_seconds=0.2)
+    with pytest.raises(WorkerTimeout):
+        pool.solve(inputs("slow"))
+    deadline = time.monotonic() + 5
+    while worker.stats()["cancelled"] == 0:
+        assert time.monotonic() < deadline, "solve was not cancelled"
+        time.sleep(0.01)
+
+
+def test_cancelling_a_dispatched_solve(solver, worker):
+    cancel = solver.CancelToken()
+    threading.Timer(0.1, cancel.cancel).start()
+    with pytest.raises(solver.SolveCancelled):
+        new_pool(solver, [worker.address]).solve(inputs("slow"), cancel)
+
+
+class FailingPool:
+    def __init__(self, error):
+        self.error = error
+
+    def solve(self, inputs, cancel=None):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, status", [
+    (WorkerError("PanicException: boom"), 503),
+    (WorkerTimeout("Solver worker a:1 did not answer within 300 s"), 504),
+    (ValueError("Invalid preflop action"), 400),
+])
+def test_submit_maps_worker_failures(app_module, client, spot, monkeypatch, error, status):
+    monkeypatch.setattr(app_module, "workers", FailingPool(error))
+    response = client.post("/submit", data=spot)
+    assert response.status_code == status
+    assert response.get_json()["error"] == str(error)
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://127.0.0.1:5000")
+
+# form fields that don't change the backend's answer
+IGNORED_FIELDS = ("speculation_id",)
+
+
+class BackendError(Exception):
+    """Raised when the backend answers a request with an error."""
+
+
+def payload_key(data, image=None):
+    """Cache key of a form payload: field values with surrounding and inner whitespace removed, sorted
+    by field name, plus a hash of the uploaded image if any."""
+    fields = sorted(
+        (name, "".join(str(value).split()))
+        for name, value in data.items()
+        if name not in IGNORED_FIELDS
+    )
+    key = repr(fields)
+    if image is not None:
+        key += ":" + hashlib.sha1(image.getvalue()).hexdigest()
+    return key
+
+
+class LRUCache:
+    """Thread-safe mapping holding the `max_entries` most recently used items."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_entries:
+                self.items.popitem(last=False)
+
+
+class PendingSolve:
+    """A spot solved as a backend job, polled by a background thread until it finishes.
+
+    `state` is "submitting" until the backend accepts the job, then follows it ("queued",
+    "running", then "done", "failed", "rejected" or "cancelled"; "error" if the backend couldn't
+    be reached). `started_at` is the backend's start time of the job once it runs. Once `done` is
+    set, `result` holds the backend's response for "done" and `error` the message otherwise.
+    """
+
+    def __init__(self, key, job_id=None):
+        self.key = key
+        self.job_id = job_id
+        self.state = "submitting"
+        self.started_at = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.done = threading.Event()
+
+    def finish(self, state, result=None, error=None):
+        self.state = state
+        self.result = result
+        self.error = error
+        self.done.set()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.submitted_at
+
+    @property
+    def queued_seconds(self):
+        """Seconds the job waited for a solver; up to now while it's still queued."""
+        if self.started_at is None:
+            return self.elapsed
+        return max(self.started_at - self.submitted_at, 0.0)
+
+    @property
+    def running_seconds(self):
+        """Seconds the job has been solving, or None until it starts."""
+        if self.started_at is None:
+            return None
+        return max(time.time() - self.started_at, 0.0)
+
+
+class BackendClient:
+    """Client of the Flask backend shared by all Streamlit sessions.
+
+    Requests go through one `requests.Session`, so connections to the backend are reused across
+    reruns. Responses and their rendered HTML are kept in LRU caches of `max_entries` keyed by
+    `payload_key`, so showing a spot again doesn't call the backend. Spots are solved as jobs
+    (`/jobs`) polled in background threads every `poll_interval` seconds; identical spots
+    submitted while a job is being submitted or running share that job.
+    """
+
+    def __init__(self, base_url=BACKEND_URL, pool_size=8, max_entries=64, poll_interval=0.5, timeout=60):
+        self.base_url = base_url
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.responses = LRUCache(max_entries)
+        self.html = LRUCache(max_entries)
+        self.pending = {}  # payload key -> PendingSolve
+        self.lock = threading.Lock()
+
+    def request(self, method, path, **kwargs):
+        return self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+
+    def fill(self, image):
+        """Extracts the spot from a screenshot (`/fill`)."""
+        response = self.request("POST", "/fill", files=image_files(image))
+        if response.status_code != 200:
+            raise BackendError(error_message(response))
+        return response.json()
+
+    def upload(self, data, image):
+        """Analyzes an uploaded screenshot with the form `data` (`/upload`), from the cache if the
+        same image and form were analyzed before. Returns `(key, response)`."""
+        key = payload_key(data, image)
+        cached = self.responses.get(key)
+        if cached is not None:
+            return key, cached
+        response = self.request("POST", "/upload", files=image_files(image), data=data)
+        if response.status_code != 200:
+            raise BackendError(error_message(response))
+        result = response.json()
+        self.responses.put(key, result)
+        return key, result
+
+    def solve(self, data):
+        """Submits the spot `data` (the `/submit` form) as a job and returns its `PendingSolve`
+        without waiting. A spot in the cache returns an already finished `PendingSolve`.
+
+        Raises `BackendError` if the backend refuses the job; sessions that shared the submission
+        see its `PendingSolve` finish with the same error.
+        """
+        key = payload_key(data)
+        cached = self.responses.get(key)
+        if cached is not None:
+            pending = PendingSolve(key)
+            pending.finish("done", result=cached)
+            return pending
+        # the placeholder dedups identical spots while the job is submitted outside the lock
+        with self.lock:
+            pending = self.pending.get(key)
+            if pending is not None:
+                return pending
+            pending = PendingSolve(key)
+            self.pending[key] = pending
+        try:
+            try:
+                response = self.request("POST", "/jobs", data=data)
+                if response.status_code != 202:
+                    raise BackendError(error_message(response))
+                pending.job_id = response.json()["job_id"]
+            except (requests.RequestException, ValueError, KeyError) as e:
+                raise BackendError(str(e)) from e
+        except BackendError as e:
+            pending.finish("error", error=str(e))
+            self._forget(pending)
+            raise
+        pending.state = "queued"
+        threading.Thread(target=self._poll, args=(pending,), name=f"poll-{pending.job_id}", daemon=True).start()
+        return pending
+
+    def render(self, key, result, to_html):
+        """`to_html(result)`, from the cache if the response of `key` was rendered before."""
+        html = self.html.get(key)
+        if html is None:
+            html = to_html(result)
+            self.html.put(key, html)
+        return html
+
+    def _poll(self, pending):
+        path = f"/jobs/{pending.job_id}"
+        try:
+            # the job's status until it finishes, then its result
+            while True:
+                response = self.request("GET", path)
+                if response.status_code != 200:
+                    break
+                status = response.json()
+                pending.started_at = status["started_at"]
+                if status["state"] not in ("queued", "running"):
+                    response = self.request("GET", path + "/result")
+                    break
+                pending.state = status["state"]
+                time.sleep(self.poll_interval)
+            if response.status_code == 200:
+                result = response.json()
+                self.responses.put(pending.key, result)
+                pending.finish("done", result=result)
+            else:
+                state = {409: "cancelled", 503: "rejected"}.get(response.status_code, "failed")
+                pending.finish(state, error=error_message(response))
+        except (requests.RequestException, ValueError, KeyError) as e:
+            pending.finish("error", error=str(e))
+        finally:
+            self._forget(pending)
+
+    def _forget(self, pending):
+        with self.lock:
+            if self.pending.get(pending.key) is pending:
+                del self.pending[pending.key]
+
+
+def image_files(image):
+    # the bytes rather than the file object, which can't be read again once sent
+    return {"image": (image.name, image.getvalue(), image.type)}
+
+
+def error_message(response):
+    try:
+        return response.json()["error"]
+    except (ValueError, KeyError, TypeError):
+        return f"HTTP {response.status_code}"
@@ -1,6 +1,6 @@
 import streamlit as st
-import requests
-import json
+import time
+from client import BackendClient, BackendError
 
 def dict_to_markdown(d, level=0):
     md_content = ""
@@ -51,6 +51,13 @@ st.set_page_config(
     initial_sidebar_state="auto",
 )
 
+@st.cache_resource
+def get_client():
+    # one client per server process: its connections and caches are shared by all sessions
+    return BackendClient()
+
+client = get_client()
+
 # Initialize session state variables
 if 'uploaded_file' not in st.session_state:
     st.session_state['uploaded_file'] = None
@@ -117,10 +124,11 @@ if image_type == 'Game':
         if uploaded_file is not None:
             with st.spinner('Extracting information from the image...'):
                 # Send image to backend to extract info
-                files = {'image': uploaded_file.getvalue()}
-                response = requests.post('http://127.0.0.1:5000/fill', files={'image': uploaded_file})
-                if response.status_code == 200:
-                    extracted_info = response.json()
+                try:
+                    extracted_info = client.fill(uploaded_file)
+                except BackendError:
+                    extracted_info = None
+                if extracted_info is not None:
                     # Update st.session_state with extracted info
                     st.session_state['effective_stack'] = extracted_info.get('effective_stack', '')
                     st.session_state['hole_cards'] = extracted_info.get('hole_cards', '')
@@ -132,6 +140,8 @@ if image_type == 'Game':
                     st.session_state['turn_bet'] = extracted_info.get('turn_bet', '')
                     st.session_state['river_card'] = extracted_info.get('river_card', '')
                     st.session_state['river_bet'] = extracted_info.get('river_bet', '')
+                    # the backend starts solving the extracted spot while the form is reviewed
+                    st.session_state['speculation_id'] = extracted_info.get('speculation_id', '')
                     st.success('Form auto-filled from the image!')
                 else:
                     st.error('Error extracting information from the image.')
@@ -213,6 +223,14 @@ if image_type == 'Game':
             help="Enter the bet amount on the river (e.g., 75)"
         )
 
+        tier = st.selectbox(
+            "Accuracy",
+            ('fast', 'standard', 'precise'),
+            index=1,
+            key='tier',
+            help="Faster tiers use a smaller bet tree and stop the solver earlier"
+        )
+
         submit_button = st.form_submit_button(label='Submit for Game Analysis')
 
     if submit_button:
@@ -249,6 +267,7 @@ if image_type == 'Game':
         else:
             # Clear any previous errors
             st.session_state['errors'] = {}
+            st.session_state.pop('solve', None)
             # Prepare data to send
             data = {
                 'effective_stack': effective_stack,
@@ -261,29 +280,46 @@ if image_type == 'Game':
                 'turn_bet': turn_bet,
                 'river_card': river_card,
                 'river_bet': river_bet,
+                'tier': st.session_state.get('tier', 'standard'),
+                'speculation_id': st.session_state.get('speculation_id', ''),
                 'is_game': True
             }
-            with st.spinner('Submitting data for analysis...'):
-                # Check if uploaded_file exists in session state
-                uploaded_file = st.session_state.get('uploaded_file', None)
-                if uploaded_file is not None:
+            # Check if uploaded_file exists in session state
+            uploaded_file = st.session_state.get('uploaded_file', None)
+            if uploaded_file is not None:
+                with st.spinner('Submitting data for analysis...'):
                     # Send image and data to backend
-                    response = requests.post('http://127.0.0.1:5000/upload', files={'image': uploaded_file}, data=data)
-                else:
-                    # Send data without image
-                    print(data)
-                    response = requests.post('http://127.0.0.1:5000/submit', data=data)
-
-                if response.status_code == 200:
-                    st.success('Your data has been submitted successfully!')
-                    gto_response = response.json()
-                    markdown_data = dict_to_markdown(gto_response)
-                    html_data = dict_to_html(gto_response)
-                    # display_json_hierarchy(gto_response)
-                    # st.markdown(markdown_data)
-                    st.markdown(html_data, unsafe_allow_html=True)
-                else:
-                    st.error('Error submitting the data. Please try again.')
+                    try:
+                        key, gto_response = client.upload(data, uploaded_file)
+                    except BackendError:
+                        st.error('Error submitting the data. Please try again.')
+                    else:
+                        st.success('Your data has been submitted successfully!')
+                        st.markdown(client.render(key, gto_response, dict_to_html), unsafe_allow_html=True)
+            else:
+                # Send data without image; the spot is solved as a backend job, polled below
+                try:
+                    st.session_state['solve'] = client.solve(data)
+                except BackendError as e:
+                    st.error(f"Error submitting the data: {e}")
+
+    # Show the solve of the last submitted spot; reruns poll it until it's done without blocking
+    solve = st.session_state.get('solve')
+    if solve is not None:
+        if not solve.done.is_set():
+            if solve.state == 'running':
+                st.info(f"Solving... ({solve.running_seconds:.0f}s, after {solve.queued_seconds:.0f}s in the queue)")
+            elif solve.state == 'queued':
+                st.info(f"Waiting for a solver... ({solve.queued_seconds:.0f}s in the queue)")
+            else:
+                st.info("Submitting the spot...")
+            time.sleep(0.5)
+            st.rerun()
+        elif solve.state == 'done':
+            st.success('Your data has been submitted successfully!')
+            st.markdown(client.render(solve.key, solve.result, dict_to_html), unsafe_allow_html=True)
+        else:
+            st.error(f"Error analyzing the data: {solve.error}")
 
 elif image_type == 'GTO':
     st.subheader("Upload Image for GTO Analysis")
@@ -316,16 +352,12 @@ elif image_type == 'GTO':
                 # Prepare data
                 data = {'is_game': False}
                 # Send image to backend
-                response = requests.post('http://127.0.0.1:5000/upload', files={'image': uploaded_file}, data=data)
-                if response.status_code == 200:
-                    st.success('Your image has been submitted successfully!')
-                    gto_response = response.json()
-                    markdown_data = dict_to_markdown(gto_response)
-                    html_data = dict_to_html(gto_response)
-                    # display_json_hierarchy(gto_response)
-                    # st.markdown(markdown_data)
-                    st.markdown(html_data, unsafe_allow_html=True)
-                else:
+                try:
+                    key, gto_response = client.upload(data, uploaded_file)
+                except BackendError:
                     st.error('Error submitting the image. Please try again.')
+                else:
+                    st.success('Your image has been submitted successfully!')
+                    st.markdown(client.render(key, gto_response, dict_to_html), unsafe_allow_html=True)
         else:
             st.warning('Please upload an image before submitting.')
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+FRONTEND = Path(__file__).resolve().parent.parent
+
+# client.py is imported as a top-level module, as main.py does
+sys.path.insert(0, str(FRONTEND))
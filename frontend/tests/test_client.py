@@ -0,0 +1,154 @@
+import threading
+
+import pytest
+import requests
+
+from client import BackendClient, BackendError, payload_key
+
+SPOT = {"effective_stack": "900", "pot_before_flop": "200", "preflop_action": "BTN,BB", "flop_cards": "Td,9d,6h"}
+RESULT = {"Hero overall range action probabilities": [0.6, 0.4]}
+
+
+class Response:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self.body
+
+
+class FakeSession:
+    """Answers `request` from `routes`, a mapping of `(method, path)` to a list of responses
+    returned in turn (the last one repeats) or to a function of the request's kwargs."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        path = url.removeprefix("http://backend")
+        self.calls.append((method, path))
+        route = self.routes[method, path]
+        if callable(route):
+            return route(**kwargs)
+        return route.pop(0) if len(route) > 1 else route[0]
+
+
+def status(state, started_at=None):
+    return Response(200, {"job_id": "1", "state": state, "started_at": started_at})
+
+
+def new_client(routes):
+    client = BackendClient("http://backend", poll_interval=0.01)
+    client.session = FakeSession(routes)
+    return client
+
+
+def job_routes(statuses, result=Response(200, RESULT)):
+    return {
+        ("POST", "/jobs"): [Response(202, {"job_id": "1"})],
+        ("GET", "/jobs/1"): statuses,
+        ("GET", "/jobs/1/result"): [result],
+    }
+
+
+def test_a_solve_follows_the_job_and_caches_its_result():
+    client = new_client(job_routes([status("queued"), status("running", 1.0), status("done", 1.0)]))
+    pending = client.solve(SPOT)
+    assert pending.done.wait(5)
+    assert pending.state == "done"
+    assert pending.result == RESULT
+    assert pending.started_at == 1.0
+    assert client.pending == {}
+    assert client.session.calls.count(("GET", "/jobs/1/result")) == 1
+
+    # the same spot, spelled differently, is served from the cache
+    again = client.solve({**SPOT, "flop_cards": " Td, 9d, 6h", "speculation_id": "x"})
+    assert again.done.is_set() and again.result == RESULT
+    assert client.session.calls.count(("POST", "/jobs")) == 1
+
+
+@pytest.mark.parametrize("result, state", [
+    (Response(409, {"error": "Job was cancelled"}), "cancelled"),
+    (Response(503, {"error": "Solver is out of memory"}), "rejected"),
+    (Response(500, ValueError("not JSON")), "failed"),
+])
+def test_a_job_that_does_not_finish_fails_the_solve(result, state):
+    client = new_client(job_routes([status(state)], result))
+    pending = client.solve(SPOT)
+    assert pending.done.wait(5)
+    assert pending.state == state
+    assert pending.error == (result.body["error"] if state != "failed" else "HTTP 500")
+    assert client.responses.get(payload_key(SPOT)) is None
+
+
+def test_identical_spots_share_the_job_while_it_is_submitted():
+    submitting = threading.Event()
+    release = threading.Event()
+
+    def submit(**kwargs):
+        submitting.set()
+        assert release.wait(5)
+        return Response(202, {"job_id": "1"})
+
+    client = new_client({**job_routes([status("done")]), ("POST", "/jobs"): submit})
+    first = []
+    thread = threading.Thread(target=lambda: first.append(client.solve(SPOT)))
+    thread.start()
+    assert submitting.wait(5)
+
+    # the identical spot doesn't wait for the first submission
+    shared = client.solve(SPOT)
+    assert shared.state == "submitting"
+    release.set()
+    thread.join(5)
+    assert first == [shared]
+    assert shared.done.wait(5)
+    assert shared.result == RESULT
+    assert client.session.calls.count(("POST", "/jobs")) == 1
+
+
+def refused(**kwargs):
+    raise requests.ConnectionError("refused")
+
+
+@pytest.mark.parametrize("post, error", [
+    (lambda **kwargs: Response(503, {"error": "3 jobs are already queued"}), "3 jobs are already queued"),
+    (lambda **kwargs: Response(202, {}), "'job_id'"),
+    (refused, "refused"),
+])
+def test_a_refused_submission_raises_and_can_be_retried(post, error):
+    client = new_client({**job_routes([status("done")]), ("POST", "/jobs"): post})
+    with pytest.raises(BackendError, match=error):
+        client.solve(SPOT)
+    assert client.pending == {}
+
+    client.session.routes["POST", "/jobs"] = [Response(202, {"job_id": "1"})]
+    pending = client.solve(SPOT)
+    assert pending.done.wait(5)
+    assert pending.state == "done"
+
+
+def test_a_lost_backend_fails_the_solve():
+    client = new_client({**job_routes([status("queued")]), ("GET", "/jobs/1"): refused})
+    pending = client.solve(SPOT)
+    assert pending.done.wait(5)
+    assert pending.state == "error"
+    assert pending.error == "refused"
+    assert client.pending == {}
+
+
+def test_render_reuses_the_html():
+    client = new_client({})
+    calls = []
+
+    def to_html(result):
+        calls.append(result)
+        return "<p>html</p>"
+
+    assert client.render("key", RESULT, to_html) == "<p>html</p>"
+    assert client.render("key", RESULT, to_html) == "<p>html</p>"
+    assert calls == [RESULT]